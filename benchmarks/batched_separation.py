@@ -0,0 +1,79 @@
+"""
+Throughput and latency of the batching Demucs separator under a burst of concurrent
+clips, against the same separator with batching turned off (max batch size 1).
+
+    python -m benchmarks.batched_separation path/to/clip.wav --clips 16 --batch-sizes 1,2,4,8
+"""
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.audio_source_separator.impl_demucs_batching import DemucsBatchingSeparator
+
+
+def run_burst(separator: DemucsBatchingSeparator, input_file: str, clips: int):
+    def separate(_):
+        with tempfile.TemporaryDirectory() as output_dir:
+            started = time.perf_counter()
+            separator.separate(input_file, output_dir)
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clips) as executor:
+        latencies = list(executor.map(separate, range(clips)))
+    return time.perf_counter() - started, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input_file")
+    parser.add_argument("--clips", type=int, default=16, help="Clips per burst")
+    parser.add_argument(
+        "--batch-sizes", default="1,2,4,8", help="Comma-separated sizes"
+    )
+    parser.add_argument("--max-wait-ms", type=float, default=50.0)
+    parser.add_argument("--num-threads", type=int, default=None)
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark")
+
+    results = []
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        separator = DemucsBatchingSeparator(
+            logger,
+            max_batch_size=batch_size,
+            max_wait_ms=args.max_wait_ms,
+            num_threads=args.num_threads,
+        )
+        # Load the model and warm up outside the timed burst
+        run_burst(separator, args.input_file, 1)
+        seconds, latencies = run_burst(separator, args.input_file, args.clips)
+        stats = separator.stats()
+        separator.close()
+
+        result = {
+            "max_batch_size": batch_size,
+            "seconds": seconds,
+            "jobs_per_second": args.clips / seconds,
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "mean_batch_size": stats["mean_batch_size"],
+            "mean_wait_ms": stats["mean_wait_ms"],
+            "padding_ratio": stats["padding_ratio"],
+        }
+        results.append(result)
+        print(
+            f"batch {batch_size}: {result['jobs_per_second']:.2f} jobs/s, "
+            f"p50 {result['latency_p50']:.2f}s, p95 {result['latency_p95']:.2f}s, "
+            f"mean batch {result['mean_batch_size']:.2f}"
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
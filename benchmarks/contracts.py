@@ -0,0 +1,377 @@
+"""
+Latency and throughput of every registered ObjectStorage and Kv implementation,
+through the same operations their contract tests cover.
+
+    python -m benchmarks.contracts --output results.json
+    python -m benchmarks.contracts --sizes 4KB,1MB,500MB --concurrency 1,8,64
+    python -m benchmarks.contracts --compare baseline.json results.json
+
+Object storage is measured on upload and download per object size and concurrency,
+Kv on single-key and batched operations per concurrency. Each run reports p50, p95
+and p99 latencies, operations per second and, for storage, MB/s.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+from fastapi import APIRouter
+from src.kv.factory import KvFactory
+from src.object_storage.factory import ObjectStorageFactory
+from src.object_storage.s3_standin import STANDIN_CREDENTIALS, S3StandIn
+from src.settings import Settings
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+
+def s3_options(tmp_dir: str) -> dict:
+    """
+    A bucket on the service DEMO_POLISHER_S3_* configures if DEMO_POLISHER_S3_BUCKET
+    is set, otherwise on an S3 stand-in serving from the scratch directory.
+    """
+    settings = Settings.from_env()
+    if not settings.s3_bucket:
+        standin = S3StandIn(os.path.join(tmp_dir, "s3")).start()
+        settings.s3_endpoint_url = standin.endpoint_url
+        settings.s3_bucket = "bench"
+        settings.s3_access_key_id = STANDIN_CREDENTIALS.access_key_id
+        settings.s3_secret_access_key = STANDIN_CREDENTIALS.secret_access_key
+    return {
+        "bucket": settings.s3_bucket,
+        "endpoint_url": settings.s3_endpoint_url,
+        "logger": logging.getLogger("benchmark"),
+        "region": settings.s3_region,
+        "access_key_id": settings.s3_access_key_id,
+        "secret_access_key": settings.s3_secret_access_key,
+        "addressing_style": settings.s3_addressing_style,
+    }
+
+
+# Constructor arguments of each storage implementation, given a scratch directory.
+# Implementations without an entry are reported as skipped.
+STORAGE_OPTIONS: Dict[str, Callable[[str], dict]] = {
+    "local": lambda tmp_dir: {
+        "base_dir": os.path.join(tmp_dir, "storage"),
+        "base_url": "",
+        "router": APIRouter(),
+        "logger": logging.getLogger("benchmark"),
+    },
+    "s3": s3_options,
+}
+
+KV_OPTIONS: Dict[str, Callable[[str], dict]] = {
+    "dict": lambda tmp_dir: {},
+    "sqlite": lambda tmp_dir: {"path": os.path.join(tmp_dir, "kv.sqlite3")},
+}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[: -len(unit)]) * factor)
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit, factor in reversed(SIZE_UNITS.items()):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return f"{size}B"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    index = min(
+        len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+async def measure(
+    operation: Callable[[int], Awaitable[None]], count: int, concurrency: int
+) -> dict:
+    """
+    Run an operation count times from concurrency tasks and time every call.
+
+    Args:
+        operation (Callable[[int], Awaitable[None]]): Called with the index of the call
+        count (int): Number of calls
+        concurrency (int): Number of tasks issuing calls
+
+    Returns:
+        dict: count, seconds, ops_per_second and p50/p95/p99 latencies in milliseconds
+    """
+    latencies: List[float] = []
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < count:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            await operation(index)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "count": count,
+        "seconds": seconds,
+        "ops_per_second": count / seconds,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+    }
+
+
+async def bench_storage(impl: str, args, tmp_dir: str) -> List[dict]:
+    storage = ObjectStorageFactory.create(impl, **STORAGE_OPTIONS[impl](tmp_dir))
+    download_dir = os.path.join(tmp_dir, "downloads")
+    os.makedirs(download_dir, exist_ok=True)
+
+    results = []
+    for size in args.sizes:
+        payload = os.urandom(size)
+        for concurrency in args.concurrency:
+            if size * concurrency > args.max_inflight_bytes:
+                print(
+                    f"  skip {format_size(size)} x {concurrency}: over --max-inflight"
+                )
+                continue
+            # Enough calls for stable percentiles without moving more than the byte budget
+            count = max(concurrency, min(args.max_ops, args.bytes_per_run // size))
+            names = [f"bench/{format_size(size)}/{i}" for i in range(count)]
+
+            async def upload(index):
+                await storage.aupload(names[index], payload)
+
+            async def download(index):
+                path = os.path.join(download_dir, str(index % concurrency))
+                await storage.adownload(names[index], path)
+
+            for op, operation in (("upload", upload), ("download", download)):
+                result = await measure(operation, count, concurrency)
+                result.update(
+                    suite="object_storage",
+                    impl=impl,
+                    op=op,
+                    size=size,
+                    concurrency=concurrency,
+                    mb_per_second=result["ops_per_second"] * size / SIZE_UNITS["MB"],
+                )
+                results.append(result)
+                print(
+                    f"  {op:8} {format_size(size):>6} x {concurrency:<3} "
+                    f"{result['mb_per_second']:9.1f} MB/s  p50 {result['p50_ms']:8.2f} ms  "
+                    f"p99 {result['p99_ms']:8.2f} ms"
+                )
+
+            for name in names:
+                await storage.adelete(name)
+
+    if hasattr(storage, "close"):
+        storage.close()
+    return results
+
+
+async def bench_kv(impl: str, args, tmp_dir: str) -> List[dict]:
+    kv = KvFactory.create(impl, **KV_OPTIONS[impl](tmp_dir))
+    value = {"payload": "x" * args.kv_value_bytes}
+    batch = args.kv_batch_size
+
+    results = []
+    for concurrency in args.concurrency:
+        count = max(concurrency, args.kv_ops)
+        keys = [f"bench:{i}" for i in range(count)]
+
+        async def put(index):
+            await kv.put(keys[index], value)
+
+        async def get(index):
+            await kv.get(keys[index])
+
+        async def put_many(index):
+            await kv.put_many({f"{keys[index]}:{j}": value for j in range(batch)})
+
+        async def get_many(index):
+            await kv.get_many([f"{keys[index]}:{j}" for j in range(batch)])
+
+        async def zap_many(index):
+            await kv.zap_many([f"{keys[index]}:{j}" for j in range(batch)])
+
+        operations = (
+            ("put", put, 1),
+            ("get", get, 1),
+            ("put_many", put_many, batch),
+            ("get_many", get_many, batch),
+            ("zap_many", zap_many, batch),
+        )
+        for op, operation, keys_per_op in operations:
+            # Batched calls move batch keys each, so fewer of them are needed
+            op_count = max(concurrency, count // keys_per_op)
+            result = await measure(operation, op_count, concurrency)
+            result.update(
+                suite="kv",
+                impl=impl,
+                op=op,
+                size=keys_per_op,
+                concurrency=concurrency,
+                keys_per_second=result["ops_per_second"] * keys_per_op,
+            )
+            results.append(result)
+            print(
+                f"  {op:8} x {concurrency:<3} {result['keys_per_second']:12,.0f} keys/s  "
+                f"p50 {result['p50_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms"
+            )
+
+        await kv.zap_many(keys)
+
+    if hasattr(kv, "close"):
+        kv.close()
+    return results
+
+
+async def run(args) -> dict:
+    results = []
+    skipped = []
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp_dir:
+        if "object_storage" in args.suites:
+            for impl in ObjectStorageFactory.get_available_implementations():
+                if impl not in STORAGE_OPTIONS:
+                    skipped.append(f"object_storage/{impl}")
+                    continue
+                print(f"object_storage/{impl}")
+                results += await bench_storage(impl, args, tmp_dir)
+
+        if "kv" in args.suites:
+            for impl in KvFactory.get_available_implementations():
+                if impl not in KV_OPTIONS:
+                    skipped.append(f"kv/{impl}")
+                    continue
+                print(f"kv/{impl}")
+                results += await bench_kv(impl, args, tmp_dir)
+
+    if skipped:
+        print(f"No benchmark options for: {', '.join(skipped)}")
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def result_key(result: dict) -> tuple:
+    return (
+        result["suite"],
+        result["impl"],
+        result["op"],
+        result["size"],
+        result["concurrency"],
+    )
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """
+    Print how each measurement changed between two runs.
+
+    Args:
+        baseline (dict): The earlier run
+        current (dict): The later run
+        threshold (float): Relative change in p50 latency or throughput counted as
+                           a regression, e.g. 0.1 for 10%
+
+    Returns:
+        bool: True if any measurement regressed beyond the threshold
+    """
+    before = {result_key(r): r for r in baseline["results"]}
+    regressed = False
+    for result in current["results"]:
+        old = before.get(result_key(result))
+        if old is None:
+            continue
+        throughput = result["ops_per_second"] / old["ops_per_second"] - 1
+        p50 = result["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        p99 = result["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+        is_regression = throughput < -threshold or p50 > threshold
+        regressed = regressed or is_regression
+        suite, impl, op, size, concurrency = result_key(result)
+        label = format_size(size) if suite == "object_storage" else f"batch {size}"
+        print(
+            f"{'REGRESSION' if is_regression else 'ok':10} {suite}/{impl} {op} "
+            f"{label} x {concurrency}: throughput {throughput:+.1%}, "
+            f"p50 {p50:+.1%}, p99 {p99:+.1%}"
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--suites", default="object_storage,kv")
+    parser.add_argument("--sizes", default="4KB,64KB,1MB,16MB,100MB,500MB")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument(
+        "--bytes-per-run",
+        default="256MB",
+        help="Bytes each storage measurement aims to move",
+    )
+    parser.add_argument("--max-ops", type=int, default=500)
+    parser.add_argument(
+        "--max-inflight",
+        default="2GB",
+        help="Skip size and concurrency pairs that would hold more than this at once",
+    )
+    parser.add_argument("--kv-ops", type=int, default=5000)
+    parser.add_argument("--kv-batch-size", type=int, default=100)
+    parser.add_argument("--kv-value-bytes", type=int, default=256)
+    parser.add_argument("--tmp-dir", default=None, help="Where scratch files go")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASELINE", "CURRENT"),
+        help="Compare two result files instead of running",
+    )
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    args.suites = args.suites.split(",")
+    args.sizes = [parse_size(size) for size in args.sizes.split(",")]
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.bytes_per_run = parse_size(args.bytes_per_run)
+    args.max_inflight_bytes = parse_size(args.max_inflight)
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {len(report['results'])} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Load test of the upload-and-separate flow with synthetic audio.
+
+Starts the app with the fake separator, or targets a running server with --url,
+then uploads synthetic demos from concurrent clients and follows each job to its result.
+
+    python -m benchmarks.load_test --uploads 200 --concurrency 16 --durations 10,30
+    python -m benchmarks.load_test --seconds-per-audio-second 0.2 --busy --workers 4
+    python -m benchmarks.load_test --url http://localhost:8000 --server-pid 1234
+
+Reports upload latency and time to result percentiles, the error rate, throughput,
+and the server's resident memory (including its separation worker processes).
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import requests
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+
+PREFIX = "/upload-demo"
+
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(fraction):
+        return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": values[-1]}
+
+
+def process_tree_rss(pid: int) -> Optional[int]:
+    """Resident memory of a process and all its descendants in bytes, from /proc."""
+    total = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            if current == pid:
+                return None
+    return total
+
+
+class MemorySampler:
+    """Samples a process tree's RSS in the background and keeps the peak."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = process_tree_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def report(self) -> dict:
+        if not self.samples:
+            return {}
+        mb = 1024 * 1024
+        return {
+            "start_rss_mb": self.samples[0] / mb,
+            "peak_rss_mb": max(self.samples) / mb,
+            "end_rss_mb": self.samples[-1] / mb,
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, base_dir: str):
+    port = free_port()
+    env = dict(
+        os.environ,
+        DEMO_POLISHER_BASE_DIR=base_dir,
+        DEMO_POLISHER_SEPARATOR_IMPL=args.separator,
+        DEMO_POLISHER_SEPARATION_WORKERS=str(args.workers),
+        DEMO_POLISHER_SEPARATION_QUEUE_MAX=str(args.queue_max),
+        # Every simulated client shares one address
+        DEMO_POLISHER_SEPARATION_QUEUE_MAX_PER_CLIENT="0",
+        DEMO_POLISHER_SEPARATOR_OPTIONS=json.dumps(
+            {
+                "seconds_per_audio_second": args.seconds_per_audio_second,
+                "busy": args.busy,
+            }
+            if args.separator == "fake"
+            else {}
+        ),
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.app:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{url}{PREFIX}/", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            if process.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not start within 30s")
+
+
+def run_upload(session: requests.Session, url: str, name: str, content: bytes, args):
+    result = {"name": name, "bytes": len(content)}
+    started = time.perf_counter()
+    try:
+        response = session.post(
+            f"{url}{PREFIX}/",
+            files={"audio_demo_file": (name, content, "audio/wav")},
+            allow_redirects=False,
+            timeout=args.timeout,
+        )
+    except requests.RequestException as e:
+        result["error"] = f"upload: {e}"
+        return result
+    result["upload_seconds"] = time.perf_counter() - started
+    if response.status_code == 429:
+        result["rejected"] = True
+        result["error"] = "upload: HTTP 429"
+        return result
+    if response.status_code != 303:
+        result["error"] = f"upload: HTTP {response.status_code}"
+        return result
+    result["cache"] = response.headers.get("x-separation-cache")
+
+    job_id = response.headers["location"].rsplit("/", 1)[1]
+    deadline = started + args.timeout
+    while time.perf_counter() < deadline:
+        try:
+            job = session.get(f"{url}{PREFIX}/jobs/{job_id}", timeout=args.timeout)
+            status = job.json()["status"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            result["error"] = f"poll: {e}"
+            return result
+        if status in ("done", "failed"):
+            result["result_seconds"] = time.perf_counter() - started
+            if status == "failed":
+                result["error"] = f"job: {job.json().get('error')}"
+            return result
+        time.sleep(args.poll_interval)
+    result["error"] = "timeout"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", help="Target a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="PID of --url's server, for RSS")
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--durations", default="10", help="Comma-separated audio lengths, in seconds"
+    )
+    parser.add_argument(
+        "--repeat-fraction",
+        type=float,
+        default=0.0,
+        help="Share of uploads reusing earlier content, to exercise the caches",
+    )
+    parser.add_argument("--separator", default="fake")
+    parser.add_argument("--seconds-per-audio-second", type=float, default=0.05)
+    parser.add_argument("--busy", action="store_true", help="Fake cost spins the CPU")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--queue-max",
+        type=int,
+        default=0,
+        help="Separations waiting before uploads get 429; 0 queues them all",
+    )
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    durations = [float(d) for d in args.durations.split(",")]
+    unique = max(1, round(args.uploads * (1 - args.repeat_fraction)))
+    print(f"Synthesizing {unique} demos")
+    demos = [
+        to_wav_bytes(synthesize(durations[i % len(durations)], seed=i))
+        for i in range(unique)
+    ]
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        process = None
+        url, pid = args.url, args.server_pid
+        if url is None:
+            process, url = start_server(args, base_dir)
+            pid = process.pid
+
+        try:
+            local = threading.local()
+
+            def upload(index):
+                if not hasattr(local, "session"):
+                    local.session = requests.Session()
+                content = demos[index % unique]
+                return run_upload(
+                    local.session, url, f"demo_{index}.wav", content, args
+                )
+
+            with MemorySampler(pid) as memory:
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                    results = list(executor.map(upload, range(args.uploads)))
+                seconds = time.perf_counter() - started
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    errors = [r for r in results if "error" in r]
+    report = {
+        "uploads": args.uploads,
+        "concurrency": args.concurrency,
+        "durations": durations,
+        "separator": args.separator,
+        "seconds": seconds,
+        "uploads_per_second": args.uploads / seconds,
+        "upload_mb_per_second": sum(r["bytes"] for r in results) / seconds / 2**20,
+        "upload_latency": percentiles(
+            [r["upload_seconds"] for r in results if "upload_seconds" in r]
+        ),
+        "time_to_result": percentiles(
+            [r["result_seconds"] for r in results if "result_seconds" in r]
+        ),
+        "cache_hits": sum(1 for r in results if r.get("cache") == "hit"),
+        "error_rate": len(errors) / len(results),
+        "rejected": sum(1 for r in results if r.get("rejected")),
+        "errors": sorted({r["error"] for r in errors})[:10],
+        "memory": memory.report(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
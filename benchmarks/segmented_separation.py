@@ -0,0 +1,92 @@
+"""
+Wall-clock speedup of segmented Demucs separation against the number of worker
+processes, with a numeric check of the stitched stems against a single pass.
+
+    python -m benchmarks.segmented_separation path/to/track.wav --workers 1,2,4,8
+"""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import numpy as np
+from src.audio_source_separator.impl_demucs_inprocess import DemucsInProcessSeparator
+
+
+def read_stems(output_dir: str) -> np.ndarray:
+    import torchaudio
+
+    stems = []
+    for name in sorted(os.listdir(output_dir)):
+        wav, _ = torchaudio.load(os.path.join(output_dir, name))
+        stems.append(wav.numpy())
+    return np.stack(stems)
+
+
+def run(separator: DemucsInProcessSeparator, input_file: str):
+    with tempfile.TemporaryDirectory() as output_dir:
+        started = time.perf_counter()
+        separator.separate(input_file, output_dir)
+        seconds = time.perf_counter() - started
+        return seconds, read_stems(output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("input_file")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated counts")
+    parser.add_argument("--segment-seconds", type=float, default=30.0)
+    parser.add_argument("--segment-overlap-seconds", type=float, default=1.0)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.05,
+        help="Largest accepted RMS difference to the single pass, relative to its RMS",
+    )
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark")
+
+    single = DemucsInProcessSeparator(logger)
+    # Load outside the timed runs; only inference is compared
+    single.load()
+    baseline_seconds, baseline = run(single, args.input_file)
+    baseline_rms = float(np.sqrt(np.mean(baseline**2)))
+
+    results = [{"workers": 0, "seconds": baseline_seconds, "speedup": 1.0}]
+    print(f"single pass: {baseline_seconds:.2f}s")
+
+    for workers in (int(w) for w in args.workers.split(",")):
+        separator = DemucsInProcessSeparator(
+            logger,
+            segment_seconds=args.segment_seconds,
+            segment_overlap_seconds=args.segment_overlap_seconds,
+            segment_workers=workers,
+        )
+        # Warm the worker processes so their model load is not timed
+        run(separator, args.input_file)
+        seconds, stems = run(separator, args.input_file)
+        separator.close()
+
+        relative_rms = float(np.sqrt(np.mean((stems - baseline) ** 2))) / baseline_rms
+        result = {
+            "workers": workers,
+            "seconds": seconds,
+            "speedup": baseline_seconds / seconds,
+            "relative_rms_difference": relative_rms,
+            "within_tolerance": relative_rms <= args.tolerance,
+        }
+        results.append(result)
+        print(
+            f"{workers} worker(s): {seconds:.2f}s, {result['speedup']:.2f}x, "
+            f"relative RMS difference {relative_rms:.4f} "
+            f"({'ok' if result['within_tolerance'] else 'OVER TOLERANCE'})"
+        )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
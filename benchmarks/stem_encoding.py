@@ -0,0 +1,137 @@
+"""
+Size reduction and encode throughput of each stem output format and bitrate.
+
+Encodes synthetic stems (or your own WAV files) one at a time and then all at once
+through the StemEncoder's parallel stage, the way separation jobs store them.
+
+    python -m benchmarks.stem_encoding --stems 4 --seconds 180
+    python -m benchmarks.stem_encoding --input drums.wav no_drums.wav --formats mp3:128,mp3:320
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+from src.audio_encoder.factory import AudioEncoderFactory
+from src.stem_encoding import StemEncoder
+from src.waveform_peaks import open_wav
+
+DEFAULT_FORMATS = "mp3:128,mp3:192,mp3:320,opus:64,opus:96,opus:128"
+
+
+def parse_formats(formats: str):
+    for item in formats.split(","):
+        name, _, bitrate = item.partition(":")
+        yield name, int(bitrate) if bitrate else None
+
+
+def audio_seconds(path: str) -> float:
+    frames, sample_rate, _, _ = open_wav(path)
+    return len(frames) / sample_rate
+
+
+def run_format(name, bitrate, wav_files, workers, logger) -> dict:
+    options = {"bitrate_kbps": bitrate} if bitrate else {}
+    encoder = AudioEncoderFactory.create(name, logger, **options)
+    wav_bytes = sum(os.path.getsize(path) for path in wav_files)
+    seconds_of_audio = sum(audio_seconds(path) for path in wav_files)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # One stem at a time: the per-stream encode speed
+        sequential = 0.0
+        encoded_bytes = 0
+        for index, path in enumerate(wav_files):
+            output_file = os.path.join(work_dir, f"{index}{encoder.extension}")
+            started = time.perf_counter()
+            encoder.encode(path, output_file)
+            sequential += time.perf_counter() - started
+            encoded_bytes += os.path.getsize(output_file)
+
+        # All stems at once, as a separation job's output stage runs them
+        stems_dir = os.path.join(work_dir, "stems")
+        os.makedirs(stems_dir)
+        for index, path in enumerate(wav_files):
+            shutil.copyfile(path, os.path.join(stems_dir, f"{index}.wav"))
+        stem_encoder = StemEncoder(encoder, logger, max_workers=workers)
+        started = time.perf_counter()
+        asyncio.run(stem_encoder.encode_dir(stems_dir))
+        parallel = time.perf_counter() - started
+        stem_encoder.close()
+
+    mb = 1024 * 1024
+    return {
+        "format": name,
+        "bitrate_kbps": encoder.options().get("bitrate_kbps"),
+        "wav_mb": wav_bytes / mb,
+        "encoded_mb": encoded_bytes / mb,
+        "size_ratio": encoded_bytes / wav_bytes,
+        "size_reduction_percent": 100 * (1 - encoded_bytes / wav_bytes),
+        "sequential_seconds": sequential,
+        "sequential_wav_mb_per_second": wav_bytes / mb / sequential,
+        "sequential_realtime_factor": seconds_of_audio / sequential,
+        "parallel_seconds": parallel,
+        "parallel_wav_mb_per_second": wav_bytes / mb / parallel,
+        "parallel_speedup": sequential / parallel,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--input", nargs="*", help="WAV stems; synthesized if omitted")
+    parser.add_argument("--stems", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument(
+        "--formats",
+        default=DEFAULT_FORMATS,
+        help="Comma-separated format:bitrate pairs; unavailable formats are skipped",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("benchmark")
+    available = AudioEncoderFactory.get_available_implementations()
+
+    with tempfile.TemporaryDirectory() as input_dir:
+        wav_files = args.input
+        if not wav_files:
+            wav_files = []
+            for seed in range(args.stems):
+                path = os.path.join(input_dir, f"stem_{seed}.wav")
+                with open(path, "wb") as f:
+                    f.write(to_wav_bytes(synthesize(args.seconds, seed=seed)))
+                wav_files.append(path)
+
+        results = []
+        skipped = set()
+        for name, bitrate in parse_formats(args.formats):
+            if name not in available:
+                if name not in skipped:
+                    print(f"Skipping {name}: its encoder is not installed")
+                    skipped.add(name)
+                continue
+            result = run_format(name, bitrate, wav_files, args.workers, logger)
+            print(
+                f"{name:>5} {result['bitrate_kbps'] or '':>4} kbps: "
+                f"{result['size_reduction_percent']:5.1f}% smaller, "
+                f"{result['sequential_realtime_factor']:6.1f}x realtime per stream, "
+                f"{result['parallel_speedup']:.2f}x speedup over {len(wav_files)} stems"
+            )
+            results.append(result)
+
+    report = {"stems": len(wav_files), "cpu_count": os.cpu_count(), "results": results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
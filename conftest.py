@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    """Run async tests on asyncio only; the app does not support trio."""
+    return "asyncio"
@@ -0,0 +1,381 @@
+import asyncio
+import itertools
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+from src.metrics import MetricsRegistry
+
+
+def usable_cores() -> int:
+    """Cores this process may run on, which can be fewer than the host has."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def available_memory_bytes() -> Optional[int]:
+    """
+    Memory that can be allocated without swapping.
+
+    Returns:
+        Optional[int]: MemAvailable from /proc/meminfo, or free physical memory where
+                       there is no /proc, or None if neither is known
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def default_concurrency(
+    memory_per_job_bytes: int, cores_per_job: int = 1, reserved_bytes: int = 0
+) -> int:
+    """
+    How many CPU-bound jobs can run at once without oversubscribing the cores or
+    pushing the host into swap.
+
+    Args:
+        memory_per_job_bytes (int): Peak memory of one job, 0 if unknown
+        cores_per_job (int): Cores one job keeps busy
+        reserved_bytes (int): Memory taken whatever the concurrency, e.g. by a shared pool
+
+    Returns:
+        int: The concurrency, at least 1
+    """
+    limit = usable_cores() // max(1, cores_per_job)
+    available = available_memory_bytes()
+    if memory_per_job_bytes and available is not None:
+        limit = min(limit, max(0, available - reserved_bytes) // memory_per_job_bytes)
+    return max(1, limit)
+
+
+@dataclass(frozen=True)
+class SegmentedConcurrency:
+    """How a host's cores are split when each separation fans out over segment processes."""
+
+    separation_workers: int
+    # Segment processes of each separator, each holding its own model
+    segment_workers: int
+    # torch threads of each separation, split between its segment processes
+    threads_per_separation: int
+
+
+def segmented_concurrency(
+    separation_workers: int,
+    memory_per_job_bytes: int,
+    memory_per_segment_worker_bytes: int,
+    segment_workers: int = 0,
+    shared_pool: bool = False,
+) -> SegmentedConcurrency:
+    """
+    Size separation workers and their segment pools together, so the pools' processes
+    neither oversubscribe the cores nor go uncounted in memory.
+
+    Args:
+        separation_workers (int): Separations run at once, 0 to size them here; unless
+                                  segment_workers is set, each one is given every core,
+                                  trading throughput for the latency of a single file
+        memory_per_job_bytes (int): Peak memory of one separation, besides its pool
+        memory_per_segment_worker_bytes (int): Peak memory of one segment process
+        segment_workers (int): Segment processes per pool, 0 to split the cores
+        shared_pool (bool): Whether every separation shares one pool, as they do when
+                            the workers are threads sharing one separator
+
+    Returns:
+        SegmentedConcurrency: The sizes
+    """
+    cores = usable_cores()
+    if shared_pool:
+        pool_size = segment_workers or cores
+        workers = separation_workers or default_concurrency(
+            memory_per_job_bytes,
+            reserved_bytes=pool_size * memory_per_segment_worker_bytes,
+        )
+        return SegmentedConcurrency(workers, pool_size, cores)
+
+    if not separation_workers:
+        cores_per_job = segment_workers or cores
+        separation_workers = default_concurrency(
+            memory_per_job_bytes + cores_per_job * memory_per_segment_worker_bytes,
+            cores_per_job=cores_per_job,
+        )
+    cores_per_separation = max(1, cores // separation_workers)
+    return SegmentedConcurrency(
+        separation_workers,
+        segment_workers or cores_per_separation,
+        cores_per_separation,
+    )
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job cannot even wait for a slot, so the caller can back off."""
+
+    def __init__(self, reason: str, retry_after_seconds: int):
+        super().__init__(f"Too many separations queued ({reason})")
+        self.reason = reason
+        self.retry_after_seconds = retry_after_seconds
+
+
+@dataclass(eq=False)
+class Ticket:
+    """A job's place in the admission queue, from `AdmissionController.reserve`."""
+
+    client_id: str
+    reserved_at: float
+    # "queued" until it holds a slot, then "running", then "released"
+    state: str = "queued"
+    started_at: Optional[float] = None
+
+
+class AdmissionController:
+    """
+    Admits CPU-bound jobs to a fixed number of slots.
+    Jobs beyond the slots wait in a bounded queue; a freed slot goes to the waiting
+    client served least recently, so one client's burst cannot starve the others.
+    Once the queue is full, `reserve` fails at once with a retry delay estimated
+    from recent job durations.
+    Runs on the event loop; not thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        logger: logging.Logger,
+        max_queued: Optional[int] = None,
+        max_queued_per_client: Optional[int] = None,
+        initial_job_seconds: float = 60.0,
+        metrics: Optional[MetricsRegistry] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrent (int): Jobs run at once
+            logger (logging.Logger): Logger for rejections
+            max_queued (Optional[int]): Jobs waiting for a slot before new ones are
+                                        rejected, None for no limit
+            max_queued_per_client (Optional[int]): Jobs one client may have waiting,
+                                                   None for no limit
+            initial_job_seconds (float): Job duration assumed until one has finished,
+                                         for Retry-After
+            metrics (Optional[MetricsRegistry]): Where queue depth, wait times and
+                                                 rejections are recorded
+            clock (Callable[[], float]): Monotonic time in seconds
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.logger = logger.getChild(AdmissionController.__name__)
+        self.clock = clock
+
+        self.running = 0
+        self.queued = 0
+        self._queued_by_client: Dict[str, int] = {}
+        self._running_by_client: Dict[str, int] = {}
+        # Tickets waiting for a slot by client, each client's in arrival order
+        self._waiters: Dict[str, Deque[Tuple[Ticket, asyncio.Future]]] = {}
+        # When each client with queued or running jobs last got a slot
+        self._last_served: Dict[str, int] = {}
+        self._serves = itertools.count()
+        # Moving average of how long jobs hold a slot
+        self._job_seconds = initial_job_seconds
+
+        metrics = metrics or MetricsRegistry()
+        self.queue_depth = metrics.gauge(
+            "separation_queue_depth", "Separation jobs waiting for a worker"
+        )
+        self.wait_seconds = metrics.histogram(
+            "separation_admission_wait_seconds",
+            "Time from a separation job being admitted to getting a worker",
+        )
+        self.rejections = metrics.counter(
+            "separation_admission_rejections_total",
+            "Separation jobs rejected because the queue was full",
+            ["reason"],
+        )
+
+    def retry_after_seconds(self) -> int:
+        """
+        Estimate when a place in the queue will be free.
+
+        Returns:
+            int: Seconds until about one job has finished, at least 1
+        """
+        return max(1, math.ceil(self._job_seconds / self.max_concurrent))
+
+    def reserve(self, client_id: str, bounded: bool = True) -> Ticket:
+        """
+        Take a place in the queue. Call before doing any work for the job, so an
+        overloaded service rejects it early.
+
+        Args:
+            client_id (str): Who the job is for, e.g. the client address
+            bounded (bool): Whether the queue limits apply; unbounded tickets still
+                            wait their turn
+
+        Returns:
+            Ticket: Pass to `slot` to run the job, or to `release` to drop it
+
+        Raises:
+            AdmissionRejected: If the queue, or the client's share of it, is full
+        """
+        if bounded:
+            reason = None
+            if self.max_queued is not None and self.queued >= self.max_queued:
+                reason = "queue_full"
+            elif (
+                self.max_queued_per_client is not None
+                and self._queued_by_client.get(client_id, 0)
+                >= self.max_queued_per_client
+            ):
+                reason = "client_limit"
+            if reason is not None:
+                self.rejections.inc(reason=reason)
+                retry_after = self.retry_after_seconds()
+                self.logger.warning(
+                    f"Rejected a separation for {client_id} ({reason}), "
+                    f"{self.queued} queued; retry after {retry_after}s"
+                )
+                raise AdmissionRejected(reason, retry_after)
+
+        self.queued += 1
+        self._queued_by_client[client_id] = self._queued_by_client.get(client_id, 0) + 1
+        self.queue_depth.inc()
+        return Ticket(client_id=client_id, reserved_at=self.clock())
+
+    @asynccontextmanager
+    async def slot(self, ticket: Ticket) -> AsyncIterator[None]:
+        """
+        Wait for the ticket's turn and hold a slot while the context is open.
+
+        Args:
+            ticket (Ticket): From `reserve`
+        """
+        await self._acquire(ticket)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    async def _acquire(self, ticket: Ticket):
+        if ticket.state != "queued":
+            raise ValueError(f"Ticket is already {ticket.state}")
+        if self.running < self.max_concurrent and not self._waiters:
+            self._start(ticket)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(ticket.client_id, deque()).append((ticket, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Also hands the slot on if it was granted just as the wait was cancelled
+            self.release(ticket)
+            raise
+
+    def _start(self, ticket: Ticket):
+        self._unqueue(ticket)
+        ticket.state = "running"
+        ticket.started_at = self.clock()
+        self.running += 1
+        self._running_by_client[ticket.client_id] = (
+            self._running_by_client.get(ticket.client_id, 0) + 1
+        )
+        self._last_served[ticket.client_id] = next(self._serves)
+        self.wait_seconds.observe(ticket.started_at - ticket.reserved_at)
+
+    def _unqueue(self, ticket: Ticket):
+        self.queued -= 1
+        self.queue_depth.dec()
+        remaining = self._queued_by_client[ticket.client_id] - 1
+        if remaining:
+            self._queued_by_client[ticket.client_id] = remaining
+        else:
+            del self._queued_by_client[ticket.client_id]
+
+    def _remove_waiter(self, ticket: Ticket):
+        waiters = self._waiters.get(ticket.client_id)
+        if waiters is None:
+            return
+        for entry in waiters:
+            if entry[0] is ticket:
+                waiters.remove(entry)
+                break
+        if not waiters:
+            del self._waiters[ticket.client_id]
+
+    def release(self, ticket: Ticket):
+        """
+        Give back a ticket's slot, or its place in the queue if it never ran.
+        Releasing a ticket twice does nothing.
+
+        Args:
+            ticket (Ticket): From `reserve`
+        """
+        if ticket.state == "released":
+            return
+        client_id = ticket.client_id
+        if ticket.state == "running":
+            self.running -= 1
+            self._running_by_client[client_id] -= 1
+            if not self._running_by_client[client_id]:
+                del self._running_by_client[client_id]
+            seconds = self.clock() - ticket.started_at
+            self._job_seconds = 0.8 * self._job_seconds + 0.2 * seconds
+        else:
+            self._remove_waiter(ticket)
+            self._unqueue(ticket)
+        ticket.state = "released"
+        if (
+            client_id not in self._queued_by_client
+            and client_id not in self._running_by_client
+        ):
+            # A client that comes back later is as new
+            self._last_served.pop(client_id, None)
+        self._wake()
+
+    def _wake(self):
+        """Start waiting tickets while slots are free, least recently served client first."""
+        while self.running < self.max_concurrent and self._waiters:
+            client_id = min(
+                self._waiters, key=lambda client: self._last_served.get(client, -1)
+            )
+            waiters = self._waiters[client_id]
+            ticket, future = waiters.popleft()
+            if not waiters:
+                del self._waiters[client_id]
+            if future.done():
+                # Cancelled; its waiter releases the ticket
+                continue
+            self._start(ticket)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        """
+        Get the controller's current load.
+
+        Returns:
+            dict: Running and queued jobs, clients with queued jobs, and the
+                  current Retry-After estimate
+        """
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "clients_queued": len(self._queued_by_client),
+            "retry_after_seconds": self.retry_after_seconds(),
+        }
@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import logging
+import pytest
+from src.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    SegmentedConcurrency,
+    default_concurrency,
+    segmented_concurrency,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class Fixture:
+    def __init__(self, max_concurrent: int = 1, **kwargs):
+        self.controller = AdmissionController(
+            max_concurrent,
+            logging.getLogger(__name__),
+            clock=itertools.count().__next__,
+            **kwargs,
+        )
+        self.started = []
+
+    async def run(self, ticket, name: str, done: asyncio.Event):
+        async with self.controller.slot(ticket):
+            self.started.append(name)
+            await done.wait()
+
+
+async def test_clients_are_served_fairly():
+    """Test one client's burst does not hold back another client's jobs"""
+    f = Fixture()
+    done = asyncio.Event()
+    names = ["a1", "a2", "a3", "b1", "b2"]
+    tasks = [
+        asyncio.create_task(f.run(f.controller.reserve(name[0]), name, done))
+        for name in names
+    ]
+    await asyncio.sleep(0)
+    assert f.started == ["a1"]
+    assert f.controller.stats()["queued"] == 4
+
+    done.set()
+    await asyncio.gather(*tasks)
+    assert f.started == ["a1", "b1", "a2", "b2", "a3"]
+    assert f.controller.stats()["running"] == 0
+    assert f.controller.wait_seconds.count() == 5
+
+
+async def test_full_queue_is_rejected():
+    """Test reservations beyond the queue bounds fail at once with a retry delay"""
+    f = Fixture(max_concurrent=2, max_queued=3, max_queued_per_client=2)
+    f.controller.reserve("a")
+    f.controller.reserve("a")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        f.controller.reserve("a")
+    assert rejected.value.reason == "client_limit"
+
+    f.controller.reserve("b")
+    with pytest.raises(AdmissionRejected) as rejected:
+        f.controller.reserve("c")
+    assert rejected.value.reason == "queue_full"
+    # About when one of the 2 slots frees, given the default 60s job estimate
+    assert rejected.value.retry_after_seconds == 30
+
+    # Jobs enqueued from within the service skip the bounds
+    f.controller.reserve("c", bounded=False)
+    assert f.controller.queued == 4
+
+
+async def test_released_places_are_reused():
+    """Test releasing a ticket that never ran, or releasing twice, frees one place"""
+    f = Fixture(max_queued=1)
+    ticket = f.controller.reserve("a")
+    with pytest.raises(AdmissionRejected):
+        f.controller.reserve("b")
+
+    f.controller.release(ticket)
+    f.controller.release(ticket)
+    assert f.controller.queued == 0
+    f.controller.reserve("b")
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    """Test a job cancelled while waiting leaves the queue and blocks no one"""
+    f = Fixture()
+    done = asyncio.Event()
+    first = asyncio.create_task(f.run(f.controller.reserve("a"), "first", done))
+    second = asyncio.create_task(f.run(f.controller.reserve("b"), "second", done))
+    third = asyncio.create_task(f.run(f.controller.reserve("c"), "third", done))
+    await asyncio.sleep(0)
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    assert f.controller.queued == 1
+
+    done.set()
+    await asyncio.gather(first, third)
+    assert f.started == ["first", "third"]
+
+
+async def test_retry_after_follows_job_durations():
+    """Test Retry-After tracks how long jobs actually hold a slot"""
+    f = Fixture(max_concurrent=1, initial_job_seconds=60.0)
+    assert f.controller.retry_after_seconds() == 60
+    for _ in range(30):
+        async with f.controller.slot(f.controller.reserve("a")):
+            pass
+    # The fake clock advances a second between a job's start and end
+    assert f.controller.retry_after_seconds() == 2
+
+
+def test_default_concurrency(monkeypatch):
+    """Test the concurrency is bounded by both cores and available memory"""
+    monkeypatch.setattr("src.admission.usable_cores", lambda: 8)
+    monkeypatch.setattr("src.admission.available_memory_bytes", lambda: 10 * 2**30)
+
+    assert default_concurrency(3 * 2**30) == 3
+    assert default_concurrency(2**30, cores_per_job=4) == 2
+    assert default_concurrency(0) == 8
+    assert default_concurrency(64 * 2**30) == 1
+
+
+def test_segmented_concurrency(monkeypatch):
+    """Test segment pools share the cores and are counted against memory"""
+    monkeypatch.setattr("src.admission.usable_cores", lambda: 8)
+    monkeypatch.setattr("src.admission.available_memory_bytes", lambda: 10 * 2**30)
+    gib = 2**30
+
+    # Each separation gets every core, and its pool's models count against memory
+    assert segmented_concurrency(0, gib, gib) == SegmentedConcurrency(1, 8, 8)
+    # Two workers split the cores instead of each starting a pool per core
+    assert segmented_concurrency(2, gib, gib) == SegmentedConcurrency(2, 4, 4)
+    # Pools of 2 leave room in memory for 3 separations of 1 + 2 GiB
+    assert segmented_concurrency(0, gib, gib, segment_workers=2) == (
+        SegmentedConcurrency(3, 2, 2)
+    )
+    # One shared pool is counted once
+    assert segmented_concurrency(0, gib, gib, shared_pool=True) == (
+        SegmentedConcurrency(2, 8, 8)
+    )
@@ -1,12 +1,88 @@
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import PlainTextResponse, RedirectResponse
+from src.services import build_services, close_services
+from src.settings import Settings
 import src.upload_demo as upload_demo
 
-app = FastAPI()
 
-app.include_router(upload_demo.router)
+class RequestMetricsMiddleware:
+    """
+    Records the latency of every HTTP request by route template, method and status.
+    Plain ASGI rather than BaseHTTPMiddleware, so responses still stream and use pathsend.
+    """
 
+    def __init__(self, app):
+        self.app = app
 
-@app.get("/")
-async def root_post():
-    return RedirectResponse(url=upload_demo.router.prefix)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            services = getattr(scope["app"].state, "services", None)
+            if services is not None:
+                # The template, not the path, so IDs do not explode the label values
+                route = getattr(scope.get("route"), "path", "unmatched")
+                services.metrics.histogram(
+                    "http_request_seconds",
+                    "Latency of HTTP requests",
+                    ["method", "route", "status"],
+                ).observe(
+                    time.perf_counter() - started,
+                    method=scope["method"],
+                    route=route,
+                    status=str(status),
+                )
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    settings = settings or Settings.from_env()
+    logger = logging.getLogger(__name__)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Storage registers its routes once, on a router included after it is built
+        storage_router = APIRouter(prefix=upload_demo.router.prefix)
+        app.state.services = build_services(settings, storage_router, logger)
+        app.include_router(storage_router)
+        if app.state.services.separation_worker is not None:
+            app.state.services.separation_worker.start()
+        yield
+        await close_services(app.state.services)
+
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(RequestMetricsMiddleware)
+
+    app.include_router(upload_demo.router)
+
+    @app.get("/")
+    async def root_post():
+        return RedirectResponse(url=upload_demo.router.prefix)
+
+    @app.get("/metrics")
+    async def metrics(request: Request):
+        return PlainTextResponse(
+            request.app.state.services.metrics.render(),
+            media_type="text/plain; version=0.0.4",
+        )
+
+    return app
+
+
+app = create_app()
@@ -0,0 +1,619 @@
+import hashlib
+import html
+import json
+import urllib.parse
+import uuid
+import anyio
+import pytest
+import requests
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+from src.app import create_app
+from src.object_storage.s3_standin import STANDIN_CREDENTIALS, S3StandIn
+from src.separation_job.impl_distributed import DistributedSeparationJobQueue
+from src.settings import Settings
+from worker import run_worker
+
+pytestmark = pytest.mark.anyio
+
+
+class Fixture:
+    def __init__(self, tmp_path, **settings):
+        self.app = create_app(Settings(base_dir=str(tmp_path), **settings))
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers=()):
+        """Send one request straight through the ASGI app and return its status, headers and body."""
+        messages = []
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if body_sent:
+                # The client stays connected until the response is complete
+                await anyio.sleep_forever()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        path, _, query_string = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query_string.encode(),
+            "headers": [(k.encode(), v.encode()) for k, v in headers],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        await self.app(scope, receive, send)
+        start = next(m for m in messages if m["type"] == "http.response.start")
+        body = b"".join(
+            m.get("body", b"") for m in messages if m["type"] == "http.response.body"
+        )
+        return (
+            start["status"],
+            {k.decode(): v.decode() for k, v in start["headers"]},
+            body,
+        )
+
+    def object_path(self, content: bytes, extension: str = ".wav") -> str:
+        """Path the storage route serves an uploaded file's content from."""
+        content_hash = hashlib.sha256(content).hexdigest()
+        return f"/upload-demo/local-object-storage/demos/{content_hash}{extension}"
+
+    async def upload(
+        self, filename: str, content: bytes, declare_content_length: bool = True
+    ):
+        boundary = "test-boundary"
+        body = (
+            (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="audio_demo_file"; filename="{filename}"\r\n'
+                f"Content-Type: audio/wav\r\n\r\n"
+            ).encode()
+            + content
+            + f"\r\n--{boundary}--\r\n".encode()
+        )
+        return await self.request(
+            "POST",
+            "/upload-demo/",
+            body,
+            headers=[("content-type", f"multipart/form-data; boundary={boundary}")]
+            + ([("content-length", str(len(body)))] if declare_content_length else []),
+        )
+
+
+async def test_route_count_constant_across_uploads(tmp_path):
+    """Test uploads do not register new routes"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        route_count = len(f.app.routes)
+
+        for i in range(5):
+            status, _, _ = await f.upload(f"demo_{i}.wav", b"RIFF" + bytes(1024))
+            assert status == 303
+            assert len(f.app.routes) == route_count
+
+
+async def test_uploaded_object_is_served(tmp_path):
+    """Test stored objects are reachable through the storage route"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        await f.upload("demo.wav", b"RIFF" + bytes(1024))
+
+        status, _, _ = await f.request("GET", f.object_path(b"RIFF" + bytes(1024)))
+        assert status == 200
+
+
+async def test_stored_object_range_request(tmp_path):
+    """Test byte ranges of stored objects are served as partial content"""
+    f = Fixture(tmp_path)
+    content = bytes(range(256)) * 16
+    async with f.app.router.lifespan_context(f.app):
+        await f.upload("demo.wav", content)
+
+        status, headers, body = await f.request(
+            "GET",
+            f.object_path(content),
+            headers=[("range", "bytes=100-199")],
+        )
+        assert status == 206
+        assert headers["content-range"] == f"bytes 100-199/{len(content)}"
+        assert body == content[100:200]
+
+
+async def test_stored_object_conditional_get(tmp_path):
+    """Test revalidating a stored object with its ETag or Last-Modified returns 304"""
+    f = Fixture(tmp_path)
+    path = f.object_path(b"RIFF" + bytes(1024))
+    async with f.app.router.lifespan_context(f.app):
+        await f.upload("demo.wav", b"RIFF" + bytes(1024))
+
+        status, headers, _ = await f.request("GET", path)
+        assert status == 200
+        # The type the file was uploaded with, not one guessed from its extension
+        assert headers["content-type"] == "audio/wav"
+
+        status, _, body = await f.request(
+            "GET", path, headers=[("if-none-match", headers["etag"])]
+        )
+        assert status == 304
+        assert body == b""
+
+        status, _, _ = await f.request(
+            "GET", path, headers=[("if-modified-since", headers["last-modified"])]
+        )
+        assert status == 304
+
+        status, _, _ = await f.request(
+            "GET", path, headers=[("if-none-match", '"stale"')]
+        )
+        assert status == 200
+
+
+async def test_stored_object_outside_base_dir(tmp_path):
+    """Test paths escaping the storage directory are not served"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        status, _, _ = await f.request(
+            "GET", "/upload-demo/local-object-storage/../../etc/passwd"
+        )
+        assert status == 404
+
+
+async def test_duplicate_uploads_stored_once(tmp_path):
+    """Test uploads with the same content share one stored object"""
+    f = Fixture(tmp_path)
+    content = b"RIFF" + bytes(1024)
+    async with f.app.router.lifespan_context(f.app):
+        await f.upload("first.wav", content)
+        await f.upload("second.WAV", content)
+
+        storage = f.app.state.services.storage
+        assert len(storage.list_objects("demos/")) == 1
+        assert storage.list_objects("incoming/") == []
+
+
+@pytest.mark.parametrize("declare_content_length", [True, False])
+async def test_oversized_upload_is_rejected(tmp_path, declare_content_length):
+    """Test uploads over the size limit get 413 and leave nothing stored, whether
+    the body declares its length or is only found too large while it is read"""
+    f = Fixture(tmp_path, ingest_max_bytes=4096)
+    async with f.app.router.lifespan_context(f.app):
+        status, _, _ = await f.upload(
+            "demo.wav", b"RIFF" + bytes(8192), declare_content_length
+        )
+        assert status == 413
+
+        storage = f.app.state.services.storage
+        assert storage.list_objects("demos/") == []
+        assert storage.list_objects("incoming/") == []
+
+        # Uploads within the limit are still accepted
+        status, _, _ = await f.upload(
+            "demo.wav", b"RIFF" + bytes(1024), declare_content_length
+        )
+        assert status == 303
+        assert len(storage.list_objects("demos/")) == 1
+
+
+@pytest.mark.parametrize("failing", ["aexists", "arename"])
+async def test_failed_upload_leaves_nothing_incoming(tmp_path, monkeypatch, failing):
+    """Test a storage error after the upload was read removes the partial object"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        storage = f.app.state.services.storage
+
+        async def fail(*args, **kwargs):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(storage, failing, fail)
+        with pytest.raises(OSError):
+            await f.upload("demo.wav", b"RIFF" + bytes(1024))
+
+        assert storage.list_objects("incoming/") == []
+        assert storage.list_objects("demos/") == []
+
+
+async def test_cache_bounds_keep_upload_records(tmp_path):
+    """Test bounding the caches' store never evicts upload records or their indexes"""
+    f = Fixture(tmp_path, cache_kv_max_entries=2)
+    async with f.app.router.lifespan_context(f.app):
+        services = f.app.state.services
+        assert services.cache_kv is not services.kv
+        for i in range(5):
+            status, _, _ = await f.upload("demo.wav", b"RIFF" + bytes([i]) * 1024)
+            assert status == 303
+
+        page = await services.upload_record_repository.list_recent()
+        assert len(page.records) == 5
+        assert services.cache_kv.stats()["entries"] <= 2
+
+
+async def test_cached_separation_is_reused(tmp_path):
+    """Test an upload whose separation is cached skips the separator"""
+    f = Fixture(tmp_path)
+    content = b"RIFF" + bytes(1024)
+    async with f.app.router.lifespan_context(f.app):
+        services = f.app.state.services
+        cache_key = services.separation_cache_key(hashlib.sha256(content).hexdigest())
+        await services.storage.aupload(f"stems/{cache_key}/drums.wav", b"drums")
+        await services.separation_cache.put(cache_key, [f"stems/{cache_key}/drums.wav"])
+
+        status, headers, _ = await f.upload("demo.wav", content)
+        assert status == 303
+        assert headers["x-separation-cache"] == "hit"
+
+        job_id = headers["location"].rsplit("/", 1)[1]
+        record = await services.upload_record_repository.get(job_id)
+        assert record.status == "done"
+        assert record.stem_object_names == [f"stems/{cache_key}/drums.wav"]
+        assert services.separation_cache.stats()["hits"] == 1
+
+
+async def test_history_pages(tmp_path):
+    """Test the history lists uploads newest first, one cursor page at a time"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        for i in range(5):
+            await f.upload(f"demo_{i}.wav", b"RIFF" + bytes([i]) * 64)
+
+        names, path = [], "/upload-demo/history.json?limit=2"
+        while True:
+            status, _, body = await f.request("GET", path)
+            assert status == 200
+            page = json.loads(body)
+            names += [upload["name"] for upload in page["uploads"]]
+            if page["next_cursor"] is None:
+                break
+            path = "/upload-demo/history.json?" + urllib.parse.urlencode(
+                {"limit": 2, "cursor": page["next_cursor"]}
+            )
+
+        assert names == [f"demo_{i}.wav" for i in reversed(range(5))]
+
+        status, _, body = await f.request("GET", "/upload-demo/history")
+        assert status == 200
+        assert b"demo_4.wav" in body
+
+
+async def test_history_conditional_get(tmp_path):
+    """Test an unchanged history page revalidates with 304 until an upload changes it"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        await f.upload("demo.wav", b"RIFF" + bytes(64))
+        services = f.app.state.services
+        await services.separation_job_queue.shutdown()
+
+        status, headers, _ = await f.request("GET", "/upload-demo/history.json")
+        assert status == 200
+
+        status, _, body = await f.request(
+            "GET",
+            "/upload-demo/history.json",
+            headers=[("if-none-match", headers["etag"])],
+        )
+        assert status == 304
+        assert body == b""
+
+        record = (await services.upload_record_repository.list_recent()).records[0]
+        record.status = "done"
+        await services.upload_record_repository.put(record)
+
+        status, _, _ = await f.request(
+            "GET",
+            "/upload-demo/history.json",
+            headers=[("if-none-match", headers["etag"])],
+        )
+        assert status == 200
+
+
+async def test_upload_is_separated(tmp_path):
+    """Test an upload runs through the fake separator to stored stems"""
+    f = Fixture(
+        tmp_path,
+        separator_impl="fake",
+        separator_options='{"seconds_per_audio_second": 0}',
+        separation_job_queue_impl="thread_pool",
+    )
+    async with f.app.router.lifespan_context(f.app):
+        status, headers, _ = await f.upload("demo.wav", to_wav_bytes(synthesize(1.0)))
+        assert status == 303
+        services = f.app.state.services
+        await services.separation_job_queue.shutdown()
+
+        job_id = headers["location"].rsplit("/", 1)[1]
+        record = await services.upload_record_repository.get(job_id)
+        assert record.status == "done"
+        assert sorted(name.rsplit("/", 1)[1] for name in record.stem_object_names) == [
+            "drums.mp3",
+            "no_drums.mp3",
+        ]
+        for name in record.stem_object_names:
+            assert await services.storage.aexists(name)
+
+
+async def test_metrics_endpoint(tmp_path):
+    """Test request, upload stage and storage timings are exposed for Prometheus"""
+    f = Fixture(tmp_path)
+    async with f.app.router.lifespan_context(f.app):
+        await f.upload("demo.wav", b"RIFF" + bytes(1024))
+        status, _, _ = await f.request("GET", "/upload-demo/jobs/missing")
+        assert status == 404
+
+        status, headers, body = await f.request("GET", "/metrics")
+        assert status == 200
+        assert headers["content-type"].startswith("text/plain")
+        text = body.decode()
+        assert (
+            'demo_polisher_upload_stage_seconds_count{stage="store_upload"} 1' in text
+        )
+        assert 'demo_polisher_storage_operation_seconds_count{op="upload"}' in text
+        assert "demo_polisher_kv_operation_seconds_bucket" in text
+        assert (
+            'demo_polisher_http_request_seconds_count{method="GET",'
+            'route="/upload-demo/jobs/{job_id}",status="404"} 1'
+        ) in text
+
+
+async def test_waveform_peaks(tmp_path):
+    """Test peaks of the upload and its stems are stored and served as immutable"""
+    f = Fixture(
+        tmp_path,
+        separator_impl="fake",
+        separator_options='{"seconds_per_audio_second": 0}',
+        separation_job_queue_impl="thread_pool",
+    )
+    content = to_wav_bytes(synthesize(2.0))
+    async with f.app.router.lifespan_context(f.app):
+        _, headers, _ = await f.upload("demo.wav", content)
+        services = f.app.state.services
+        await services.separation_job_queue.shutdown()
+        job_id = headers["location"].rsplit("/", 1)[1]
+        record = await services.upload_record_repository.get(job_id)
+
+        for name in [record.input_object_name] + record.stem_object_names:
+            assert await services.storage.aexists(f"{name}.peaks")
+            status, headers, body = await f.request("GET", f"/upload-demo/peaks/{name}")
+            assert status == 200
+            assert "immutable" in headers["cache-control"]
+            assert body[:4] == b"WFPK"
+            assert len(body) < len(content) / 50
+
+        _, _, body = await f.request("GET", f"/upload-demo/result/{job_id}")
+        assert body.count(b'class="waveform"') == 3
+
+        for path in (
+            f"/upload-demo/peaks/{record.input_object_name}.peaks",
+            "/upload-demo/peaks/incoming/anything.wav",
+            "/upload-demo/peaks/demos/missing.wav",
+        ):
+            status, _, _ = await f.request("GET", path)
+            assert status == 404
+
+
+def parse_events(body: bytes):
+    """(event, data) of each server-sent event, skipping heartbeat comments."""
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if line[:1] != ":"
+        )
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def test_job_events(tmp_path):
+    """Test a job's progress and stems stream over server-sent events until it is done"""
+    f = Fixture(
+        tmp_path,
+        separator_impl="fake",
+        separator_options='{"seconds_per_audio_second": 0, "fixed_seconds": 0.5}',
+        separation_job_queue_impl="thread_pool",
+    )
+    async with f.app.router.lifespan_context(f.app):
+        _, headers, _ = await f.upload("demo.wav", to_wav_bytes(synthesize(1.0)))
+        job_id = headers["location"].rsplit("/", 1)[1]
+        path = f"/upload-demo/jobs/{job_id}/events"
+
+        _, _, body = await f.request("GET", f"/upload-demo/result/{job_id}")
+        assert path.encode() in body
+
+        status, headers, body = await f.request("GET", path)
+        assert status == 200
+        assert headers["content-type"].startswith("text/event-stream")
+        events = parse_events(body)
+
+        assert events[-1] == ("done", {"status": "done", "error": None})
+        percents = [data["percent"] for event, data in events if event == "progress"]
+        assert percents == sorted(percents)
+        stages = [data["stage"] for event, data in events if event == "progress"]
+        # The fake separator reports each of its segments
+        assert stages.count("separate") >= 5
+        assert {"encode", "store"} <= set(stages)
+        stems = [data["name"] for event, data in events if event == "stem"]
+        assert sorted(name.rsplit("/", 1)[1] for name in stems) == [
+            "drums.mp3",
+            "no_drums.mp3",
+        ]
+
+        # Once done, the stream replays the stems and ends
+        _, _, body = await f.request("GET", path)
+        assert [event for event, _ in parse_events(body)] == ["stem", "stem", "done"]
+        _, _, body = await f.request("GET", f"/upload-demo/result/{job_id}")
+        assert path.encode() not in body
+
+        status, _, _ = await f.request("GET", "/upload-demo/jobs/missing/events")
+        assert status == 404
+
+
+async def test_overloaded_upload_is_rejected(tmp_path):
+    """Test uploads beyond the separation queue are turned away with 429 and Retry-After"""
+    f = Fixture(tmp_path, separation_queue_max=1)
+    async with f.app.router.lifespan_context(f.app):
+        services = f.app.state.services
+        ticket = services.admission.reserve("someone else")
+
+        status, headers, _ = await f.upload("demo.wav", b"RIFF" + bytes(1024))
+        assert status == 429
+        assert int(headers["retry-after"]) >= 1
+        # Rejected before the upload was read
+        assert not services.storage.list_objects("demos/")
+
+        services.admission.release(ticket)
+        status, _, _ = await f.upload("demo.wav", b"RIFF" + bytes(1024))
+        assert status == 303
+
+        _, _, body = await f.request("GET", "/metrics")
+        assert (
+            'demo_polisher_separation_admission_rejections_total{reason="queue_full"} 1'
+            in body.decode()
+        )
+
+
+async def test_job_is_run_by_another_nodes_worker(tmp_path, monkeypatch):
+    """Test a job queued in the shared job store is run by a worker of another node"""
+    monkeypatch.setattr("src.upload_demo.EVENTS_POLL_SECONDS", 0.05)
+    settings = dict(
+        kv_impl="sqlite",
+        separation_job_store="sqlite",
+        separator_impl="fake",
+        separator_options='{"seconds_per_audio_second": 0}',
+        separation_job_queue_impl="thread_pool",
+    )
+    api = Fixture(tmp_path, run_separation_worker=False, **settings)
+    async with api.app.router.lifespan_context(api.app):
+        services = api.app.state.services
+        assert services.separation_worker is None
+
+        _, headers, _ = await api.upload("demo.wav", to_wav_bytes(synthesize(1.0)))
+        job_id = headers["location"].rsplit("/", 1)[1]
+        assert (await services.job_store.stats())["pending"] == 1
+        assert services.admission.stats()["queued"] == 0
+
+        results = {}
+
+        async def read_events():
+            _, _, body = await api.request("GET", f"/upload-demo/jobs/{job_id}/events")
+            results["events"] = parse_events(body)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(read_events)
+            worker = Fixture(tmp_path, **settings)
+            async with worker.app.router.lifespan_context(worker.app):
+                with anyio.fail_after(10):
+                    while "events" not in results:
+                        await anyio.sleep(0.05)
+
+        # This node never saw the job's progress; the stream learned of it from the record
+        assert [event for event, _ in results["events"]] == [
+            "progress",
+            "stem",
+            "stem",
+            "done",
+        ]
+        record = await services.upload_record_repository.get(job_id)
+        assert record.status == "done"
+        assert (await services.job_store.stats())["done"] == 1
+
+
+async def test_worker_needs_a_shared_kv(tmp_path, monkeypatch):
+    """Test a worker with the in-memory Kv, which could not read the records of the
+    jobs it claims, refuses to start"""
+    monkeypatch.setenv("DEMO_POLISHER_BASE_DIR", str(tmp_path))
+    monkeypatch.setenv("DEMO_POLISHER_SEPARATION_JOB_STORE", "sqlite")
+    with pytest.raises(ValueError, match="kv_impl"):
+        await run_worker()
+
+
+async def test_job_store_backlog_is_bounded(tmp_path):
+    """Test uploads are turned away once the shared job store holds a full backlog"""
+    settings = dict(
+        kv_impl="sqlite",
+        separation_job_store="sqlite",
+        separator_impl="fake",
+        separator_options='{"seconds_per_audio_second": 0}',
+        separation_job_queue_impl="thread_pool",
+        separation_queue_max=2,
+        run_separation_worker=False,
+    )
+    api = Fixture(tmp_path, **settings)
+    other = Fixture(tmp_path, **settings)
+    async with api.app.router.lifespan_context(
+        api.app
+    ), other.app.router.lifespan_context(other.app):
+        services = api.app.state.services
+        for seed, node in enumerate((api, other)):
+            status, _, _ = await node.upload(
+                "demo.wav", to_wav_bytes(synthesize(1.0, seed=seed))
+            )
+            assert status == 303
+        assert (await services.job_store.stats())["pending"] == 2
+        # Each node released its ticket once the job was in the store
+        assert services.admission.stats()["queued"] == 0
+
+        status, headers, _ = await api.upload(
+            "demo.wav", to_wav_bytes(synthesize(1.0, seed=2))
+        )
+        assert status == 429
+        # Nothing has finished yet, so the estimate falls back on this node's jobs
+        assert int(headers["retry-after"]) >= 1
+        assert len(services.storage.list_objects("demos/")) == 2
+        assert services.admission.stats()["queued"] == 0
+
+        # A worker finishing a job makes room, and the estimate follows the store
+        await services.job_store.complete(await services.job_store.claim("worker", 30))
+        window = DistributedSeparationJobQueue.COMPLETION_RATE_WINDOW_SECONDS
+        assert await services.separation_job_queue.retry_after_seconds() == window
+        status, _, _ = await other.upload(
+            "demo.wav", to_wav_bytes(synthesize(1.0, seed=3))
+        )
+        assert status == 303
+
+        _, _, body = await api.request("GET", "/metrics")
+        assert (
+            'demo_polisher_separation_admission_rejections_total{reason="backlog_full"} 1'
+            in body.decode()
+        )
+
+
+async def test_upload_is_separated_on_s3(tmp_path):
+    """Test uploads and stems are kept in an S3 bucket and linked with presigned URLs"""
+    standin = S3StandIn.shared()
+    f = Fixture(
+        tmp_path,
+        storage_impl="s3",
+        s3_endpoint_url=standin.endpoint_url,
+        s3_bucket=f"app-{uuid.uuid4().hex[:12]}",
+        s3_access_key_id=STANDIN_CREDENTIALS.access_key_id,
+        s3_secret_access_key=STANDIN_CREDENTIALS.secret_access_key,
+        separator_impl="fake",
+        separator_options='{"seconds_per_audio_second": 0}',
+        separation_job_queue_impl="thread_pool",
+    )
+    async with f.app.router.lifespan_context(f.app):
+        status, headers, _ = await f.upload("demo.wav", to_wav_bytes(synthesize(1.0)))
+        assert status == 303
+        services = f.app.state.services
+        await services.separation_job_queue.shutdown()
+
+        job_id = headers["location"].rsplit("/", 1)[1]
+        record = await services.upload_record_repository.get(job_id)
+        assert record.status == "done"
+        assert not (tmp_path / "demos").exists()
+
+        _, _, body = await f.request("GET", f"/upload-demo/result/{job_id}")
+        for name in [record.input_object_name] + record.stem_object_names:
+            url = services.storage.get_url(name)
+            assert html.escape(url).encode() in body
+            assert "X-Amz-Signature=" in url
+            response = await anyio.to_thread.run_sync(requests.get, url)
+            assert response.status_code == 200
+            assert response.content == await services.storage.adownload(name)
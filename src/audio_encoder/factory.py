@@ -0,0 +1,63 @@
+import logging
+from typing import Dict, Literal, Type, Union
+from src.audio_encoder.impl_mp3 import LameMp3Encoder
+from src.audio_encoder.impl_opus import FfmpegOpusEncoder
+from src.audio_encoder.impl_wav import WavEncoder
+from src.audio_encoder.inter import AudioEncoder
+
+
+class AudioEncoderFactory:
+    """
+    Factory class for creating AudioEncoder instances.
+    """
+
+    _encoders: Dict[str, Type[AudioEncoder]] = {
+        "wav": WavEncoder,
+        "mp3": LameMp3Encoder,
+        "opus": FfmpegOpusEncoder,
+    }
+
+    @classmethod
+    def create(
+        cls,
+        impl: Union[Literal["wav"], Literal["mp3"], Literal["opus"]],
+        logger: logging.Logger,
+        **kwargs,
+    ) -> AudioEncoder:
+        """
+        Create an instance of the specified audio encoder.
+
+        Args:
+            impl (Literal["wav", "mp3", "opus"]): The output format
+            logger (logging.Logger): Logger passed to the encoder
+            **kwargs: Additional arguments to pass to the encoder constructor
+                      (e.g., bitrate_kbps for LameMp3Encoder)
+
+        Returns:
+            AudioEncoder: An instance of the requested encoder
+
+        Raises:
+            ValueError: If the format is not supported
+            RuntimeError: If the format's encoder is not installed
+        """
+        if impl not in cls._encoders:
+            raise ValueError(
+                f"Unsupported audio encoder: {impl}. "
+                f"Supported formats are: {', '.join(cls._encoders.keys())}"
+            )
+
+        return cls._encoders[impl](logger, **kwargs)
+
+    @classmethod
+    def get_available_implementations(cls) -> list[str]:
+        """
+        Get the formats whose encoders can run here.
+
+        Returns:
+            list[str]: Names of the available formats
+        """
+        return [
+            name
+            for name, encoder in cls._encoders.items()
+            if getattr(encoder, "is_available", lambda: True)()
+        ]
@@ -0,0 +1,71 @@
+import logging
+import os
+import numpy as np
+from src.audio_encoder.inter import AudioEncoder
+from src.waveform_peaks import open_wav
+
+
+class LameMp3Encoder(AudioEncoder):
+    """
+    Encodes WAV files to MP3 with LAME through lameenc.
+    The WAV is memory-mapped and fed to the encoder in chunks, so memory use
+    does not grow with the length of the audio.
+    """
+
+    extension = ".mp3"
+    content_type = "audio/mpeg"
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        bitrate_kbps: int = 192,
+        quality: int = 2,
+        chunk_frames: int = 1024 * 1024,
+    ):
+        """
+        Initialize the encoder.
+
+        Args:
+            logger (logging.Logger): Logger to report progress to
+            bitrate_kbps (int): Constant bitrate of the MP3
+            quality (int): LAME algorithm quality, 2 (best) to 7 (fastest)
+            chunk_frames (int): Frames converted and encoded at a time
+        """
+        self.logger = logger.getChild(LameMp3Encoder.__name__)
+        self.bitrate_kbps = bitrate_kbps
+        self.quality = quality
+        self.chunk_frames = chunk_frames
+
+    def options(self) -> dict:
+        return {
+            "format": "mp3",
+            "bitrate_kbps": self.bitrate_kbps,
+            "quality": self.quality,
+        }
+
+    def encode(self, input_file: str, output_file: str):
+        import lameenc
+
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+
+        frames, sample_rate, offset, scale = open_wav(input_file)
+        channels = frames.shape[1]
+        if channels not in (1, 2):
+            raise ValueError(f"MP3 takes 1 or 2 channels, not {channels}")
+
+        encoder = lameenc.Encoder()
+        encoder.set_bit_rate(self.bitrate_kbps)
+        encoder.set_in_sample_rate(sample_rate)
+        encoder.set_channels(channels)
+        encoder.set_quality(self.quality)
+
+        with open(output_file, "wb") as f:
+            for start in range(0, len(frames), self.chunk_frames):
+                chunk = frames[start : start + self.chunk_frames]
+                if frames.dtype != np.int16:
+                    # LAME takes interleaved 16-bit PCM
+                    chunk = np.clip((chunk - offset) / scale * 32768, -32768, 32767)
+                    chunk = chunk.astype("<i2")
+                f.write(encoder.encode(np.ascontiguousarray(chunk).tobytes()))
+            f.write(encoder.flush())
@@ -0,0 +1,94 @@
+import functools
+import logging
+import os
+import shutil
+import subprocess
+from src.audio_encoder.inter import AudioEncoder
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_has_encoder(name: str) -> bool:
+    """
+    Check whether an ffmpeg with the named encoder is installed.
+
+    Args:
+        name (str): Encoder name as listed by `ffmpeg -encoders`, e.g. "libopus"
+
+    Returns:
+        bool: True if ffmpeg is on the PATH and has the encoder
+    """
+    if shutil.which("ffmpeg") is None:
+        return False
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True
+    )
+    return any(line.split()[1:2] == [name] for line in result.stdout.splitlines())
+
+
+class FfmpegOpusEncoder(AudioEncoder):
+    """
+    Encodes WAV files to Opus in an Ogg container with ffmpeg's libopus encoder.
+    Only available where ffmpeg was built with libopus, see `is_available`.
+    """
+
+    extension = ".opus"
+    content_type = "audio/ogg"
+
+    def __init__(self, logger: logging.Logger, bitrate_kbps: int = 96):
+        """
+        Initialize the encoder.
+
+        Args:
+            logger (logging.Logger): Logger to report progress to
+            bitrate_kbps (int): Target bitrate of the variable-bitrate Opus stream
+
+        Raises:
+            RuntimeError: If ffmpeg with libopus is not installed
+        """
+        if not self.is_available():
+            raise RuntimeError("Opus encoding needs ffmpeg built with libopus")
+        self.logger = logger.getChild(FfmpegOpusEncoder.__name__)
+        self.bitrate_kbps = bitrate_kbps
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Check whether this encoder can run here.
+
+        Returns:
+            bool: True if ffmpeg with libopus is installed
+        """
+        return ffmpeg_has_encoder("libopus")
+
+    def options(self) -> dict:
+        return {"format": "opus", "bitrate_kbps": self.bitrate_kbps}
+
+    def encode(self, input_file: str, output_file: str):
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+
+        result = subprocess.run(
+            [
+                "ffmpeg",
+                "-nostdin",
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-y",
+                "-i",
+                input_file,
+                "-c:a",
+                "libopus",
+                "-b:a",
+                f"{self.bitrate_kbps}k",
+                "-f",
+                "ogg",
+                output_file,
+            ],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise ValueError(
+                f"ffmpeg could not encode {input_file}: {result.stderr.strip()}"
+            )
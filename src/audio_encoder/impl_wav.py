@@ -0,0 +1,28 @@
+import logging
+import os
+import shutil
+from src.audio_encoder.inter import AudioEncoder
+
+
+class WavEncoder(AudioEncoder):
+    """
+    Keeps stems as the separator wrote them, uncompressed.
+    """
+
+    extension = ".wav"
+    content_type = "audio/wav"
+
+    def __init__(self, logger: logging.Logger):
+        """
+        Initialize the encoder.
+
+        Args:
+            logger (logging.Logger): Logger to report progress to
+        """
+        self.logger = logger.getChild(WavEncoder.__name__)
+
+    def encode(self, input_file: str, output_file: str):
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+        if os.path.abspath(input_file) != os.path.abspath(output_file):
+            shutil.copyfile(input_file, output_file)
@@ -0,0 +1,37 @@
+from abc import ABC, abstractmethod
+
+
+class AudioEncoder(ABC):
+    """
+    Interface for encoding a WAV file into a stored audio format.
+    """
+
+    # File extension of the encoded output, including the dot
+    extension: str = ""
+    # MIME type the encoded output is stored and served with
+    content_type: str = ""
+
+    @abstractmethod
+    def encode(self, input_file: str, output_file: str):
+        """
+        Encode a WAV file.
+
+        Args:
+            input_file (str): Path to the WAV file
+            output_file (str): Path the encoded audio is written to
+
+        Raises:
+            FileNotFoundError: If the input file does not exist
+            ValueError: If the input is not audio the encoder reads
+        """
+        pass
+
+    def options(self) -> dict:
+        """
+        Options that change the encoded output, such as the format and bitrate.
+        Separation results are cached by these, so equal options must mean equal output.
+
+        Returns:
+            dict: JSON-serializable options
+        """
+        return {"format": self.extension.lstrip(".")}
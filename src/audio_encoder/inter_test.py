@@ -0,0 +1,80 @@
+import logging
+import numpy as np
+import pytest
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+from src.audio_encoder.factory import AudioEncoderFactory
+from src.waveform_peaks_test import float_wav_bytes
+
+
+@pytest.fixture(params=["wav", "mp3", "opus"])
+def impl(request):
+    if request.param not in AudioEncoderFactory.get_available_implementations():
+        pytest.skip(f"{request.param} encoder is not installed")
+    return request.param
+
+
+class Fixture:
+    def __init__(self, impl: str, tmp_path, **kwargs):
+        self.encoder = AudioEncoderFactory.create(
+            impl, logging.getLogger(__name__), **kwargs
+        )
+        self.input_file = str(tmp_path / "stem.wav")
+        self.output_file = str(tmp_path / f"encoded{self.encoder.extension}")
+        self.audio = synthesize(5.0)
+        with open(self.input_file, "wb") as f:
+            f.write(to_wav_bytes(self.audio))
+
+
+def test_encode(impl, tmp_path):
+    """Test a WAV file is encoded to a non-empty file of the encoder's format"""
+    f = Fixture(impl, tmp_path)
+    f.encoder.encode(f.input_file, f.output_file)
+
+    with open(f.output_file, "rb") as encoded, open(f.input_file, "rb") as wav:
+        data = encoded.read()
+        wav_data = wav.read()
+    if impl == "wav":
+        assert data == wav_data
+    else:
+        # Compressed at least fourfold
+        assert 0 < len(data) < len(wav_data) / 4
+    assert f.encoder.content_type.startswith("audio/")
+    assert f.encoder.options()["format"] == impl
+
+
+def test_encode_missing_input(impl, tmp_path):
+    """Test encoding a missing file raises FileNotFoundError"""
+    f = Fixture(impl, tmp_path)
+    with pytest.raises(FileNotFoundError):
+        f.encoder.encode(str(tmp_path / "missing.wav"), f.output_file)
+
+
+def test_bitrate_sets_size(tmp_path):
+    """Test the MP3 size follows the bitrate"""
+    sizes = {}
+    for bitrate in (64, 192):
+        f = Fixture("mp3", tmp_path, bitrate_kbps=bitrate)
+        f.encoder.encode(f.input_file, f.output_file)
+        with open(f.output_file, "rb") as encoded:
+            sizes[bitrate] = len(encoded.read())
+        assert f.encoder.options()["bitrate_kbps"] == bitrate
+
+    # 5 seconds at the bitrate, give or take framing
+    for bitrate, size in sizes.items():
+        assert size == pytest.approx(5 * bitrate * 1000 / 8, rel=0.1)
+
+
+def test_mp3_encodes_float_wav(tmp_path):
+    """Test float WAV stems, as some separators write, are converted for LAME"""
+    f = Fixture("mp3", tmp_path)
+    with open(f.input_file, "wb") as wav:
+        wav.write(float_wav_bytes(np.clip(f.audio * 2, -1, 1)))
+    f.encoder.encode(f.input_file, f.output_file)
+    with open(f.output_file, "rb") as encoded:
+        assert len(encoded.read()) > 0
+
+
+def test_unsupported_format():
+    """Test unknown formats are rejected"""
+    with pytest.raises(ValueError):
+        AudioEncoderFactory.create("flac", logging.getLogger(__name__))
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Iterator, List, Optional
+import numpy as np
+
+
+@dataclass
+class _Request:
+    wav: np.ndarray
+    bucket: int
+    enqueued_at: float
+    future: Future = field(default_factory=Future)
+
+
+class MicroBatcher:
+    """
+    Groups clips submitted from many threads into batches for one model call.
+    A batch is run once it holds max_batch_size clips of the same length bucket,
+    or once its oldest clip has waited max_wait_seconds. Clips are zero-padded
+    to their bucket's length and the outputs trimmed back to each clip's length.
+    """
+
+    def __init__(
+        self,
+        apply_batch: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 4,
+        max_wait_seconds: float = 0.05,
+        bucket_samples: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the batcher and start its scheduler thread.
+
+        Args:
+            apply_batch (Callable[[np.ndarray], np.ndarray]): Runs the model on clips shaped
+                (batch, channels, samples), returning outputs with samples on the last axis
+            max_batch_size (int): Most clips run in one call
+            max_wait_seconds (float): Longest a clip waits for others to join its batch
+            bucket_samples (int): Clips are grouped by their length rounded up to a multiple
+                                  of this, which bounds the padding added to each clip
+            clock (Callable[[], float]): Monotonic clock, in seconds
+        """
+        if max_batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+
+        self.apply_batch = apply_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.bucket_samples = max(1, bucket_samples)
+        self.clock = clock
+
+        self.batches = 0
+        self.clips = 0
+        self.padded_samples = 0
+        self.total_samples = 0
+        self.total_wait_seconds = 0.0
+
+        self._pending: Deque[_Request] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._schedule, name="micro-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, wav: np.ndarray) -> Future:
+        """
+        Queue one clip for the next batch of its length.
+
+        Args:
+            wav (np.ndarray): Clip shaped (channels, samples)
+
+        Returns:
+            Future: Resolves to the clip's output, trimmed to its length
+        """
+        num_samples = wav.shape[-1]
+        bucket = -(-num_samples // self.bucket_samples) * self.bucket_samples
+        request = _Request(wav=wav, bucket=bucket, enqueued_at=self.clock())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._pending.append(request)
+            self._condition.notify()
+        return request.future
+
+    def __call__(self, wav: np.ndarray) -> np.ndarray:
+        """Submit a clip and wait for its output."""
+        return self.submit(wav).result()
+
+    def map(self, fn: Callable, wavs: List[np.ndarray]) -> Iterator[np.ndarray]:
+        """
+        Submit several clips at once so they can share batches, and yield their outputs
+        as they finish. Shaped like the builtin map so it can be passed as
+        separate_segmented's map_fn.
+
+        Args:
+            fn (Callable): Ignored; clips always go through apply_batch
+            wavs (List[np.ndarray]): Clips shaped (channels, samples)
+
+        Returns:
+            Iterator[np.ndarray]: Output of each clip, in order
+        """
+        futures = [self.submit(wav) for wav in wavs]
+        return (future.result() for future in futures)
+
+    def _take_batch(self) -> Optional[List[_Request]]:
+        """
+        Wait until a batch is ready and remove it from the pending clips.
+        Must be called with the condition held. Returns None once closed and drained.
+        """
+        while True:
+            if not self._pending:
+                if self._closed:
+                    return None
+                self._condition.wait()
+                continue
+
+            # The oldest clip decides which bucket runs next, so no clip starves
+            oldest = self._pending[0]
+            same_bucket = [r for r in self._pending if r.bucket == oldest.bucket]
+            waited = self.clock() - oldest.enqueued_at
+            if (
+                len(same_bucket) >= self.max_batch_size
+                or waited >= self.max_wait_seconds
+                or self._closed
+            ):
+                batch = same_bucket[: self.max_batch_size]
+                for request in batch:
+                    self._pending.remove(request)
+                return batch
+
+            self._condition.wait(self.max_wait_seconds - waited)
+
+    def _schedule(self):
+        while True:
+            with self._condition:
+                batch = self._take_batch()
+            if batch is None:
+                return
+            self._run(batch)
+
+    def _run(self, batch: List[_Request]):
+        started = self.clock()
+        bucket = batch[0].bucket
+        wav = batch[0].wav
+        wavs = np.zeros((len(batch),) + wav.shape[:-1] + (bucket,), dtype=wav.dtype)
+        for index, request in enumerate(batch):
+            wavs[index, ..., : request.wav.shape[-1]] = request.wav
+
+        self.batches += 1
+        self.clips += len(batch)
+        for request in batch:
+            num_samples = request.wav.shape[-1]
+            self.total_samples += num_samples
+            self.padded_samples += bucket - num_samples
+            self.total_wait_seconds += started - request.enqueued_at
+
+        try:
+            outputs = self.apply_batch(wavs)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        for index, request in enumerate(batch):
+            request.future.set_result(outputs[index, ..., : request.wav.shape[-1]])
+
+    def stats(self) -> dict:
+        """
+        Get batching counters since the batcher was created.
+
+        Returns:
+            dict: batches, clips, mean_batch_size, mean_wait_ms and padding_ratio,
+                  the share of model input that was padding
+        """
+        run_samples = self.total_samples + self.padded_samples
+        return {
+            "batches": self.batches,
+            "clips": self.clips,
+            "mean_batch_size": self.clips / self.batches if self.batches else 0.0,
+            "mean_wait_ms": (
+                1000 * self.total_wait_seconds / self.clips if self.clips else 0.0
+            ),
+            "padding_ratio": self.padded_samples / run_samples if run_samples else 0.0,
+        }
+
+    def close(self):
+        """Run the clips still pending and stop the scheduler thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
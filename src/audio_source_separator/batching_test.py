@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from src.audio_source_separator.batching import MicroBatcher
+
+
+class Fixture:
+    def __init__(self, **kwargs):
+        self.batch_shapes = []
+        self.batcher = MicroBatcher(self.apply_batch, **kwargs)
+
+    def apply_batch(self, wavs: np.ndarray) -> np.ndarray:
+        """Fake model with two sources: the input and its negation"""
+        self.batch_shapes.append(wavs.shape)
+        return np.stack([wavs, -wavs], axis=1)
+
+    def clip(self, num_samples: int, seed: int = 0) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        return rng.standard_normal((2, num_samples)).astype(np.float32)
+
+
+def test_outputs_match_unbatched():
+    """Test each clip gets its own output, trimmed to its length"""
+    f = Fixture(max_batch_size=3, max_wait_seconds=10.0, bucket_samples=100)
+    clips = [f.clip(250, 0), f.clip(220, 1), f.clip(300, 2)]
+
+    outputs = f.batcher.map(None, clips)
+    f.batcher.close()
+
+    for clip, output in zip(clips, outputs):
+        assert output.shape == (2,) + clip.shape
+        np.testing.assert_array_equal(output[0], clip)
+        np.testing.assert_array_equal(output[1], -clip)
+
+
+def test_full_batch_runs_in_one_call():
+    """Test clips of one bucket submitted together share a single call"""
+    f = Fixture(max_batch_size=4, max_wait_seconds=10.0, bucket_samples=100)
+
+    f.batcher.map(None, [f.clip(250, seed) for seed in range(4)])
+    f.batcher.close()
+
+    assert f.batch_shapes == [(4, 2, 300)]
+    stats = f.batcher.stats()
+    assert stats["batches"] == 1
+    assert stats["mean_batch_size"] == 4
+    assert stats["padding_ratio"] == pytest.approx(50 / 300)
+
+
+def test_buckets_are_not_mixed():
+    """Test clips of different length buckets run in separate calls"""
+    f = Fixture(max_batch_size=2, max_wait_seconds=0.01, bucket_samples=100)
+
+    f.batcher.map(None, [f.clip(150), f.clip(450)])
+    f.batcher.close()
+
+    assert sorted(f.batch_shapes) == [(1, 2, 200), (1, 2, 500)]
+
+
+def test_partial_batch_runs_after_wait():
+    """Test a lone clip is not held longer than the wait limit"""
+    f = Fixture(max_batch_size=8, max_wait_seconds=0.01)
+
+    output = f.batcher(f.clip(100))
+    f.batcher.close()
+
+    assert output.shape == (2, 2, 100)
+    assert f.batch_shapes == [(1, 2, 100)]
+
+
+def test_errors_reach_every_caller():
+    """Test a failed call fails every clip of its batch"""
+
+    def fail(wavs):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(fail, max_batch_size=2, max_wait_seconds=10.0)
+    futures = [batcher.submit(np.zeros((2, 10), dtype=np.float32)) for _ in range(2)]
+    batcher.close()
+
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
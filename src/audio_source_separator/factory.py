@@ -3,25 +3,41 @@ from typing import Dict, Type, Literal, Union
 from src.audio_source_separator.inter import AudioSourceSeparator
 from src.audio_source_separator.impl_spleeter import SpleeterSeparator
 from src.audio_source_separator.impl_demucs import DemucsSeparator
+from src.audio_source_separator.impl_demucs_inprocess import DemucsInProcessSeparator
+from src.audio_source_separator.impl_demucs_batching import DemucsBatchingSeparator
+from src.audio_source_separator.impl_fake import FakeSeparator
 
 
 class AudioSourceSeparatorFactory:
     _separators: Dict[str, Type[AudioSourceSeparator]] = {
         "spleeter": SpleeterSeparator,
         "demucs": DemucsSeparator,
+        "demucs_inprocess": DemucsInProcessSeparator,
+        "demucs_batching": DemucsBatchingSeparator,
+        "fake": FakeSeparator,
     }
 
     @classmethod
     def create(
         cls,
-        impl: Union[Literal["spleeter"], Literal["demucs"]],
+        impl: Union[
+            Literal["spleeter"],
+            Literal["demucs"],
+            Literal["demucs_inprocess"],
+            Literal["demucs_batching"],
+            Literal["fake"],
+        ],
         logger: logging.Logger,
+        **kwargs,
     ) -> AudioSourceSeparator:
         """
         Create an instance of the specified audio source separator.
 
         Args:
-            separator_type (Literal["spleeter", "demucs"]): The type of separator to create ('spleeter' or 'demucs')
+            separator_type (Literal["spleeter", "demucs", "demucs_inprocess", "demucs_batching", "fake"]): The type of separator to create
+            **kwargs: Additional arguments to pass to the separator constructor
+                      (e.g., num_threads for DemucsInProcessSeparator,
+                      max_batch_size for DemucsBatchingSeparator)
 
         Returns:
             AudioSourceSeparator: An instance of the requested separator
@@ -35,4 +51,4 @@ class AudioSourceSeparatorFactory:
                 f"Supported types are: {', '.join(cls._separators.keys())}"
             )
 
-        return cls._separators[impl](logger)
+        return cls._separators[impl](logger, **kwargs)
@@ -1,8 +1,8 @@
 import logging
 import subprocess
 import os
-from typing import List
-from src.audio_source_separator.inter import AudioSourceSeparator
+from typing import List, Optional
+from src.audio_source_separator.inter import AudioSourceSeparator, ProgressCallback
 
 
 class DemucsSeparator(AudioSourceSeparator):
@@ -10,7 +10,16 @@ class DemucsSeparator(AudioSourceSeparator):
         self.default_stems = ["drums", "other"]
         self.logger = logger
 
-    def separate(self, input_file: str, output_dir: str):
+    def options(self) -> dict:
+        # The CLI's default model
+        return {"model": "htdemucs", "two_stems": "drums"}
+
+    def separate(
+        self,
+        input_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
         # Ensure input file exists
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"Input file not found: {input_file}")
@@ -40,6 +49,9 @@ class DemucsSeparator(AudioSourceSeparator):
                 text=True,
             )
             self.logger.info(f"Separation complete. Files saved to {abs_output}")
+            # The CLI reports nothing in between, so the only progress is its end
+            if progress is not None:
+                progress(1.0)
         except subprocess.CalledProcessError as e:
             self.logger.error(f"Demucs separation failed: {e.stderr}")
             raise
@@ -0,0 +1,160 @@
+import logging
+import os
+import time
+from typing import Optional, Tuple
+import numpy as np
+from src.audio_source_separator.batching import MicroBatcher
+from src.audio_source_separator.impl_demucs_inprocess import DemucsInProcessSeparator
+from src.audio_source_separator.inter import AudioSourceSeparator, ProgressCallback
+from src.audio_source_separator.segmented import separate_segmented
+
+
+class DemucsBatchingSeparator(AudioSourceSeparator):
+    """
+    In-process Demucs separator that batches concurrent calls into one forward pass.
+    Meant to be shared by several threads: each caller decodes and writes its own
+    files, while the model runs on clips from all of them at once.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        max_batch_size: int = 4,
+        max_wait_ms: float = 50.0,
+        bucket_seconds: float = 5.0,
+        **kwargs,
+    ):
+        """
+        Initialize the separator. The model is not loaded until the first call.
+
+        Args:
+            logger (logging.Logger): Logger to report progress and timings to
+            max_batch_size (int): Most clips run in one forward pass
+            max_wait_ms (float): Longest a clip waits for others to join its batch
+            bucket_seconds (float): Clips are batched with others whose length rounds up
+                                    to the same multiple of this, bounding the padding
+            **kwargs: Passed to DemucsInProcessSeparator, e.g. model_name or num_threads
+        """
+        self.logger = logger
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.bucket_seconds = bucket_seconds
+        self.separator = DemucsInProcessSeparator(logger, **kwargs)
+        self.default_stems = self.separator.default_stems
+        self._batcher: Optional[MicroBatcher] = None
+
+    def _get_batcher(self) -> MicroBatcher:
+        """Load the model and start the batcher once."""
+        if self._batcher is None:
+            model = self.separator.load()
+            with self.separator._lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(
+                        self.separator.apply_batch,
+                        max_batch_size=self.max_batch_size,
+                        max_wait_seconds=self.max_wait_ms / 1000,
+                        bucket_samples=int(self.bucket_seconds * model.samplerate),
+                    )
+        return self._batcher
+
+    def options(self) -> dict:
+        # Zero padding is trimmed off, so batching does not change the stems
+        return self.separator.options()
+
+    def decoded_format(self) -> Optional[Tuple[int, int]]:
+        return self.separator.decoded_format()
+
+    def stats(self) -> dict:
+        """
+        Get batching counters since the first call.
+
+        Returns:
+            dict: See MicroBatcher.stats
+        """
+        if self._batcher is None:
+            return {
+                "batches": 0,
+                "clips": 0,
+                "mean_batch_size": 0.0,
+                "mean_wait_ms": 0.0,
+                "padding_ratio": 0.0,
+            }
+        return self._batcher.stats()
+
+    def close(self):
+        """Run the clips still pending and stop the batcher."""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
+        self.separator.close()
+
+    def separate(
+        self,
+        input_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+
+        abs_input = os.path.abspath(input_file)
+        self.logger.info(f"Separating {abs_input} using batched in-process Demucs")
+
+        self._get_batcher()
+        self._separate_normalized(*self.separator.read(abs_input), output_dir, progress)
+
+    def separate_decoded(
+        self,
+        decoded_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        if not os.path.exists(decoded_file):
+            raise FileNotFoundError(f"Decoded file not found: {decoded_file}")
+
+        self.logger.info(
+            f"Separating decoded {decoded_file} using batched in-process Demucs"
+        )
+        self._get_batcher()
+        self._separate_normalized(
+            *self.separator.read_decoded(decoded_file), output_dir, progress
+        )
+
+    def _separate_normalized(
+        self,
+        wav: np.ndarray,
+        mean: float,
+        std: float,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        os.makedirs(output_dir, exist_ok=True)
+        abs_output = os.path.abspath(output_dir)
+        batcher = self._get_batcher()
+
+        started = time.perf_counter()
+        if self.separator.segment_seconds:
+            # Windows of one track are batched with each other and with other tracks'
+            samplerate = self.separator.load().samplerate
+            sources = separate_segmented(
+                wav,
+                batcher,
+                segment_samples=int(self.separator.segment_seconds * samplerate),
+                overlap_samples=int(
+                    self.separator.segment_overlap_seconds * samplerate
+                ),
+                map_fn=batcher.map,
+                progress=progress,
+            )
+        else:
+            sources = batcher(wav)
+            if progress is not None:
+                progress(1.0)
+        seconds = time.perf_counter() - started
+
+        self.separator.write(sources, mean, std, abs_output)
+
+        self.logger.info(
+            f"Separation complete in {seconds:.2f}s including batch wait. "
+            f"Files saved to {abs_output}"
+        )
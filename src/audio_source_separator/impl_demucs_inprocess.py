@@ -0,0 +1,368 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import numpy as np
+from src.admission import usable_cores
+from src.audio_source_separator.inter import AudioSourceSeparator, ProgressCallback
+from src.audio_source_separator.segmented import separate_segmented
+from src.decoded_audio import open_decoded
+
+# Every pretrained Demucs model takes stereo audio at 44.1 kHz
+DEMUCS_SAMPLE_RATE = 44_100
+DEMUCS_CHANNELS = 2
+
+# Separator owned by the current segment worker process, created once by _init_segment_worker
+_segment_separator: Optional["DemucsInProcessSeparator"] = None
+
+
+def _init_segment_worker(kwargs: dict):
+    global _segment_separator
+    _segment_separator = DemucsInProcessSeparator(logging.getLogger(__name__), **kwargs)
+    _segment_separator.load()
+
+
+def _apply_segment(wav: np.ndarray) -> np.ndarray:
+    return _segment_separator.apply(wav)
+
+
+class DemucsInProcessSeparator(AudioSourceSeparator):
+    """
+    In-process implementation of AudioSourceSeparator using the Demucs Python API.
+    The model is loaded once and kept resident, so each call only pays for
+    decoding and inference instead of an interpreter start, torch import and model load.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        model_name: str = "htdemucs",
+        two_stems: str = "drums",
+        num_threads: Optional[int] = None,
+        device: str = "cpu",
+        shifts: int = 1,
+        overlap: float = 0.25,
+        segment_seconds: Optional[float] = None,
+        segment_overlap_seconds: float = 1.0,
+        segment_workers: Optional[int] = None,
+    ):
+        """
+        Initialize the separator. The model is not loaded until `load` or `separate` is called.
+
+        Args:
+            logger (logging.Logger): Logger to report progress and timings to
+            model_name (str): Name of the pretrained Demucs model
+            two_stems (str): Stem to isolate; the rest is mixed into "no_{stem}"
+            num_threads (Optional[int]): torch intra-op thread count, None keeps the torch default;
+                                         when segmenting, the budget split between the
+                                         segment processes, defaulting to the usable cores
+            device (str): torch device to run inference on
+            shifts (int): Number of random shifts for the shift trick (1 disables it)
+            overlap (float): Overlap between the model's internal split windows
+            segment_seconds (Optional[float]): If set, split the audio into windows of this
+                                               length and separate them in parallel processes
+            segment_overlap_seconds (float): Overlap between windows, crossfaded when stitching
+            segment_workers (Optional[int]): Number of segment processes, each loading the model;
+                                             defaults to the usable cores, so give several
+                                             separators on one host a share each
+        """
+        self.default_stems = ["drums", "other"]
+        self.logger = logger
+        self.model_name = model_name
+        self.two_stems = two_stems
+        self.num_threads = num_threads
+        self.device = device
+        self.shifts = shifts
+        self.overlap = overlap
+        self.segment_seconds = segment_seconds
+        self.segment_overlap_seconds = segment_overlap_seconds
+        self.segment_workers = segment_workers or usable_cores()
+
+        self.load_seconds: Optional[float] = None
+        self.last_inference_seconds: Optional[float] = None
+
+        self._model = None
+        self._lock = threading.Lock()
+        self._segment_executor: Optional[ProcessPoolExecutor] = None
+
+    def load(self):
+        """
+        Load the model if it is not loaded yet and return it.
+        Safe to call from several threads; only the first call loads.
+        """
+        if self._model is not None:
+            return self._model
+
+        with self._lock:
+            if self._model is not None:
+                return self._model
+
+            import torch
+            from demucs.pretrained import get_model
+
+            if self.num_threads is not None:
+                # Process-wide setting, so every separator in this process shares it
+                torch.set_num_threads(self.num_threads)
+
+            started = time.perf_counter()
+            model = get_model(name=self.model_name)
+            model.to(self.device)
+            model.eval()
+            self.load_seconds = time.perf_counter() - started
+
+            if self.two_stems not in model.sources:
+                raise ValueError(
+                    f"Model {self.model_name} has no stem {self.two_stems}. "
+                    f"Available stems are: {', '.join(model.sources)}"
+                )
+
+            self.logger.info(
+                f"Loaded Demucs model {self.model_name} in {self.load_seconds:.2f}s "
+                f"(threads={torch.get_num_threads()}, device={self.device})"
+            )
+            self._model = model
+            return model
+
+    def options(self) -> dict:
+        # Thread count and device change speed, not output, so they are left out
+        options = {
+            "model": self.model_name,
+            "two_stems": self.two_stems,
+            "shifts": self.shifts,
+            "overlap": self.overlap,
+        }
+        if self.segment_seconds:
+            options["segment_seconds"] = self.segment_seconds
+            options["segment_overlap_seconds"] = self.segment_overlap_seconds
+        return options
+
+    def decoded_format(self) -> Optional[Tuple[int, int]]:
+        return DEMUCS_SAMPLE_RATE, DEMUCS_CHANNELS
+
+    def _get_segment_executor(self) -> ProcessPoolExecutor:
+        """Start the segment worker processes once; each keeps its own model loaded."""
+        if self._segment_executor is None:
+            # Split the thread budget between workers instead of multiplying it
+            threads = max(
+                1, (self.num_threads or usable_cores()) // self.segment_workers
+            )
+            self._segment_executor = ProcessPoolExecutor(
+                max_workers=self.segment_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_segment_worker,
+                initargs=(
+                    {
+                        "model_name": self.model_name,
+                        "two_stems": self.two_stems,
+                        "num_threads": threads,
+                        "device": self.device,
+                        "shifts": self.shifts,
+                        "overlap": self.overlap,
+                    },
+                ),
+            )
+        return self._segment_executor
+
+    def close(self):
+        """Stop the segment worker processes, if any were started."""
+        if self._segment_executor is not None:
+            self._segment_executor.shutdown(wait=True)
+            self._segment_executor = None
+
+    def apply(self, wav: np.ndarray) -> np.ndarray:
+        """
+        Run the model on normalized audio.
+
+        Args:
+            wav (np.ndarray): Normalized audio, shaped (channels, samples)
+
+        Returns:
+            np.ndarray: Every source of the model, shaped (sources, channels, samples)
+        """
+        return self.apply_batch(wav[None])[0]
+
+    def apply_batch(self, wavs: np.ndarray) -> np.ndarray:
+        """
+        Run the model on a batch of normalized clips of equal length in one forward pass.
+
+        Args:
+            wavs (np.ndarray): Normalized audio, shaped (batch, channels, samples)
+
+        Returns:
+            np.ndarray: Every source of the model, shaped (batch, sources, channels, samples)
+        """
+        import torch
+        from demucs.apply import apply_model
+
+        model = self.load()
+        with torch.inference_mode():
+            sources = apply_model(
+                model,
+                torch.from_numpy(np.ascontiguousarray(wavs)),
+                device=self.device,
+                shifts=self.shifts,
+                split=True,
+                overlap=self.overlap,
+                progress=False,
+            )
+        return sources.cpu().numpy()
+
+    def read(self, input_file: str) -> Tuple[np.ndarray, float, float]:
+        """
+        Decode an audio file at the model's sample rate and normalize it.
+
+        Args:
+            input_file (str): Path to the audio file
+
+        Returns:
+            Tuple[np.ndarray, float, float]: Normalized audio shaped (channels, samples),
+                                             and the mean and scale to undo the normalization
+        """
+        from demucs.audio import AudioFile
+
+        model = self.load()
+        wav = (
+            AudioFile(input_file)
+            .read(
+                streams=0,
+                samplerate=model.samplerate,
+                channels=model.audio_channels,
+            )
+            .numpy()
+        )
+        return self.normalize(wav)
+
+    def read_decoded(self, decoded_file: str) -> Tuple[np.ndarray, float, float]:
+        """
+        Memory-map PCM decoded in `decoded_format` and normalize it, skipping ffmpeg.
+
+        Args:
+            decoded_file (str): Path to the PCM
+
+        Returns:
+            Tuple[np.ndarray, float, float]: See `read`
+
+        Raises:
+            ValueError: If the model takes another sample rate or channel count
+        """
+        model = self.load()
+        if (model.samplerate, model.audio_channels) != self.decoded_format():
+            raise ValueError(
+                f"Model {self.model_name} takes {model.audio_channels} channel(s) "
+                f"at {model.samplerate} Hz, not the decoded format"
+            )
+        return self.normalize(open_decoded(decoded_file, model.audio_channels))
+
+    @staticmethod
+    def normalize(wav: np.ndarray) -> Tuple[np.ndarray, float, float]:
+        """
+        Normalize audio the way Demucs expects, by the mean and scale of its mono mix.
+
+        Args:
+            wav (np.ndarray): Audio shaped (channels, samples); only read, never written
+
+        Returns:
+            Tuple[np.ndarray, float, float]: See `read`
+        """
+        ref = wav.mean(0)
+        mean, std = float(ref.mean()), float(ref.std()) + 1e-8
+        return ((wav - mean) / std).astype(np.float32, copy=False), mean, std
+
+    def write(self, sources: np.ndarray, mean: float, std: float, output_dir: str):
+        """
+        Undo the normalization and save the isolated stem and the rest as WAV files.
+
+        Args:
+            sources (np.ndarray): Every source of the model, shaped (sources, channels, samples)
+            mean (float): Mean returned by `read`
+            std (float): Scale returned by `read`
+            output_dir (str): Directory the stems are written to
+        """
+        import torch
+        from demucs.audio import save_audio
+
+        model = self.load()
+        sources = torch.from_numpy(sources * std + mean)
+
+        stem_index = model.sources.index(self.two_stems)
+        stem = sources[stem_index]
+        rest = sources.sum(0) - stem
+
+        for name, source in ((self.two_stems, stem), (f"no_{self.two_stems}", rest)):
+            save_audio(
+                source,
+                os.path.join(output_dir, f"{name}.wav"),
+                samplerate=model.samplerate,
+            )
+
+    def separate(
+        self,
+        input_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        # Ensure input file exists
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+
+        # Get the absolute paths to ensure proper handling
+        abs_input = os.path.abspath(input_file)
+
+        self.logger.info(f"Separating {abs_input} using in-process Demucs")
+
+        # Normalized over the whole track so every segment sees the same scale
+        self._separate_normalized(*self.read(abs_input), output_dir, progress)
+
+    def separate_decoded(
+        self,
+        decoded_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        if not os.path.exists(decoded_file):
+            raise FileNotFoundError(f"Decoded file not found: {decoded_file}")
+
+        self.logger.info(f"Separating decoded {decoded_file} using in-process Demucs")
+        self._separate_normalized(
+            *self.read_decoded(decoded_file), output_dir, progress
+        )
+
+    def _separate_normalized(
+        self,
+        wav: np.ndarray,
+        mean: float,
+        std: float,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        # Create output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+        abs_output = os.path.abspath(output_dir)
+        samplerate = self.load().samplerate
+
+        started = time.perf_counter()
+        if self.segment_seconds:
+            sources = separate_segmented(
+                wav,
+                _apply_segment,
+                segment_samples=int(self.segment_seconds * samplerate),
+                overlap_samples=int(self.segment_overlap_seconds * samplerate),
+                map_fn=self._get_segment_executor().map,
+                progress=progress,
+            )
+        else:
+            # One model call, so the only progress is its end
+            sources = self.apply(wav)
+            if progress is not None:
+                progress(1.0)
+        self.last_inference_seconds = time.perf_counter() - started
+
+        self.write(sources, mean, std, abs_output)
+
+        self.logger.info(
+            f"Separation complete in {self.last_inference_seconds:.2f}s. "
+            f"Files saved to {abs_output}"
+        )
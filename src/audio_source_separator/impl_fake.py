@@ -0,0 +1,88 @@
+import logging
+import os
+import shutil
+import time
+import wave
+from typing import Optional
+from src.audio_source_separator.inter import AudioSourceSeparator, ProgressCallback
+
+
+class FakeSeparator(AudioSourceSeparator):
+    """
+    Stand-in AudioSourceSeparator for load tests and development without Demucs.
+    Copies the input to each stem after a simulated cost that scales with the audio length.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        seconds_per_audio_second: float = 0.05,
+        fixed_seconds: float = 0.0,
+        busy: bool = False,
+        two_stems: str = "drums",
+        segments: int = 10,
+    ):
+        """
+        Initialize the separator.
+
+        Args:
+            logger (logging.Logger): Logger to report progress to
+            seconds_per_audio_second (float): Simulated cost per second of input audio
+            fixed_seconds (float): Simulated cost added to every call
+            busy (bool): Spin the CPU for the simulated cost instead of sleeping,
+                         to load the host like a real model would
+            two_stems (str): Name of the isolated stem; the other is "no_{stem}"
+            segments (int): Parts the simulated cost is split into, with progress
+                            reported after each like a segmented separator does
+        """
+        self.default_stems = [two_stems, "other"]
+        self.logger = logger
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.fixed_seconds = fixed_seconds
+        self.busy = busy
+        self.two_stems = two_stems
+        self.segments = max(1, segments)
+
+    def options(self) -> dict:
+        # The simulated cost does not change the output
+        return {"model": "fake", "two_stems": self.two_stems}
+
+    def _audio_seconds(self, input_file: str) -> float:
+        """Length of a WAV file, or an estimate from its size for anything else."""
+        try:
+            with wave.open(input_file, "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError):
+            # As if it were 44.1 kHz 16-bit stereo PCM
+            return os.path.getsize(input_file) / (44_100 * 2 * 2)
+
+    def _simulate(self, seconds: float):
+        if not self.busy:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    def separate(
+        self,
+        input_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(f"Input file not found: {input_file}")
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        cost = self.fixed_seconds + self.seconds_per_audio_second * self._audio_seconds(
+            input_file
+        )
+        self.logger.info(f"Separating {input_file} with a simulated {cost:.2f}s cost")
+        for segment in range(self.segments):
+            self._simulate(cost / self.segments)
+            if progress is not None:
+                progress((segment + 1) / self.segments)
+
+        for name in (self.two_stems, f"no_{self.two_stems}"):
+            shutil.copyfile(input_file, os.path.join(output_dir, f"{name}.wav"))
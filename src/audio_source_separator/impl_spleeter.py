@@ -2,7 +2,7 @@ import subprocess
 import os
 import logging
 from typing import List, Optional
-from src.audio_source_separator.inter import AudioSourceSeparator
+from src.audio_source_separator.inter import AudioSourceSeparator, ProgressCallback
 
 
 class SpleeterSeparator(AudioSourceSeparator):
@@ -10,7 +10,15 @@ class SpleeterSeparator(AudioSourceSeparator):
         self.default_stems = ["vocals", "drums", "bass", "other"]
         self.logger = logger or logging.getLogger(__name__)
 
-    def separate(self, input_file: str, output_dir: str):
+    def options(self) -> dict:
+        return {"model": "4stems"}
+
+    def separate(
+        self,
+        input_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
         # Ensure input file exists
         if not os.path.exists(input_file):
             raise FileNotFoundError(f"Input file not found: {input_file}")
@@ -32,6 +40,9 @@ class SpleeterSeparator(AudioSourceSeparator):
                 text=True,
             )
             self.logger.info(f"Separation complete. Files saved to {abs_output}")
+            # The CLI reports nothing in between, so the only progress is its end
+            if progress is not None:
+                progress(1.0)
         except subprocess.CalledProcessError as e:
             self.logger.error(f"Spleeter separation failed: {e.stderr}")
             raise
@@ -1,18 +1,69 @@
 from abc import ABC, abstractmethod
+from typing import Callable, Optional, Tuple
+
+# Called with the share of a separation done so far, from 0 to 1
+ProgressCallback = Callable[[float], None]
 
 
 class AudioSourceSeparator(ABC):
 
     @abstractmethod
-    def separate(self, input_file: str, output_dir: str):
+    def separate(
+        self,
+        input_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
         """
         Separate an audio file into individual stems.
 
         Args:
             input_file (str): Path to the input audio file.
             output_dir (str): Path to the output directory where separated stems will be saved.
+            progress (Optional[ProgressCallback]): Called as the separation advances,
+                e.g. once per segment, from the thread running it
 
         Returns:
             None
         """
         pass
+
+    def options(self) -> dict:
+        """
+        Options that change the separated output, such as the model and stems.
+        Separation results are cached by these, so equal options must mean equal output.
+
+        Returns:
+            dict: JSON-serializable options
+        """
+        return {}
+
+    def decoded_format(self) -> Optional[Tuple[int, int]]:
+        """
+        Sample rate and channel count of the PCM `separate_decoded` takes.
+
+        Returns:
+            Optional[Tuple[int, int]]: (sample rate, channels), or None if the separator
+                                       only takes files through `separate`
+        """
+        return None
+
+    def separate_decoded(
+        self,
+        decoded_file: str,
+        output_dir: str,
+        progress: Optional[ProgressCallback] = None,
+    ):
+        """
+        Separate audio already decoded to interleaved float32 PCM in `decoded_format`,
+        e.g. by DecodedAudioCache, instead of decoding the compressed file again.
+
+        Args:
+            decoded_file (str): Path to the PCM, see `src.decoded_audio.open_decoded`
+            output_dir (str): Path to the output directory where separated stems will be saved.
+            progress (Optional[ProgressCallback]): See `separate`
+
+        Raises:
+            NotImplementedError: If `decoded_format` is None
+        """
+        raise NotImplementedError(f"{type(self).__name__} only separates files")
@@ -0,0 +1,131 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+import numpy as np
+
+
+def plan_segments(
+    num_samples: int, segment_samples: int, overlap_samples: int
+) -> List[Tuple[int, int]]:
+    """
+    Split a signal into overlapping windows.
+    Each window starts overlap_samples before the previous one ends; the last one
+    is shortened to end with the signal.
+
+    Args:
+        num_samples (int): Length of the signal
+        segment_samples (int): Length of each window
+        overlap_samples (int): Samples shared by consecutive windows
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) sample offsets of each window
+    """
+    if overlap_samples < 0 or 2 * overlap_samples > segment_samples:
+        raise ValueError("Overlap must be at least 0 and at most half a segment")
+
+    windows = []
+    start = 0
+    while True:
+        end = min(start + segment_samples, num_samples)
+        windows.append((start, end))
+        if end >= num_samples:
+            return windows
+        start = end - overlap_samples
+
+
+def crossfade_weights(
+    windows: List[Tuple[int, int]], index: int, overlap_samples: int
+) -> np.ndarray:
+    """
+    Weights for one window so that linear fades of consecutive windows sum to one.
+
+    Args:
+        windows (List[Tuple[int, int]]): All windows, as returned by plan_segments
+        index (int): Which window to build weights for
+        overlap_samples (int): Samples shared by consecutive windows
+
+    Returns:
+        np.ndarray: float32 weights, one per sample of the window
+    """
+    start, end = windows[index]
+    weights = np.ones(end - start, dtype=np.float32)
+    if overlap_samples == 0:
+        return weights
+
+    ramp = (np.arange(overlap_samples, dtype=np.float32) + 0.5) / overlap_samples
+    if index > 0:
+        fade_in = min(overlap_samples, windows[index - 1][1] - start)
+        weights[:fade_in] *= ramp[:fade_in]
+    if index < len(windows) - 1:
+        fade_out = min(overlap_samples, end - windows[index + 1][0])
+        weights[len(weights) - fade_out :] *= 1.0 - ramp[overlap_samples - fade_out :]
+    return weights
+
+
+def overlap_add(
+    outputs: Iterable[np.ndarray],
+    windows: List[Tuple[int, int]],
+    num_samples: int,
+    overlap_samples: int,
+) -> np.ndarray:
+    """
+    Stitch per-window outputs back together with linear crossfades.
+
+    Args:
+        outputs (Iterable[np.ndarray]): Output of each window, in window order,
+                                        with samples on the last axis
+        windows (List[Tuple[int, int]]): The windows the outputs were computed on
+        num_samples (int): Length of the stitched signal
+        overlap_samples (int): Samples shared by consecutive windows
+
+    Returns:
+        np.ndarray: The stitched output
+    """
+    result = None
+    for index, output in enumerate(outputs):
+        start, end = windows[index]
+        if result is None:
+            result = np.zeros(output.shape[:-1] + (num_samples,), dtype=output.dtype)
+        result[..., start:end] += output * crossfade_weights(
+            windows, index, overlap_samples
+        )
+    return result
+
+
+def separate_segmented(
+    wav: np.ndarray,
+    separate_window: Callable[[np.ndarray], np.ndarray],
+    segment_samples: int,
+    overlap_samples: int,
+    map_fn: Callable = map,
+    progress: Optional[Callable[[float], None]] = None,
+) -> np.ndarray:
+    """
+    Separate a signal window by window and stitch the stems back together.
+
+    Args:
+        wav (np.ndarray): Signal with samples on the last axis
+        separate_window (Callable[[np.ndarray], np.ndarray]): Separates one window,
+            returning stems with samples on the last axis
+        segment_samples (int): Length of each window
+        overlap_samples (int): Samples shared by consecutive windows
+        map_fn (Callable): How windows are dispatched, e.g. an executor's map
+                           to separate them in parallel
+        progress (Optional[Callable[[float], None]]): Called with the share of windows
+                                                      done as each one is stitched in
+
+    Returns:
+        np.ndarray: Stitched stems
+    """
+    num_samples = wav.shape[-1]
+    windows = plan_segments(num_samples, segment_samples, overlap_samples)
+    outputs = map_fn(separate_window, [wav[..., start:end] for start, end in windows])
+    if progress is not None:
+        outputs = _reporting(outputs, len(windows), progress)
+    return overlap_add(outputs, windows, num_samples, overlap_samples)
+
+
+def _reporting(
+    outputs: Iterable[np.ndarray], total: int, progress: Callable[[float], None]
+) -> Iterable[np.ndarray]:
+    for index, output in enumerate(outputs):
+        yield output
+        progress((index + 1) / total)
@@ -0,0 +1,467 @@
+import asyncio
+import logging
+import os
+import subprocess
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from src.kv.inter import Kv, KvTransaction
+from src.kv.paged_index import PagedIndex
+from src.metrics import MetricsRegistry
+from src.object_storage.inter import ObjectStorage
+
+# Interleaved little-endian float32, the layout ffmpeg's f32le muxer writes
+PCM_DTYPE = np.dtype("<f4")
+PCM_SUFFIX = ".f32"
+
+
+def decode_with_ffmpeg(
+    input_file: str, output_file: str, sample_rate: int, channels: int
+):
+    """
+    Decode any audio file ffmpeg reads to raw interleaved float32 PCM.
+
+    Args:
+        input_file (str): Path to the compressed audio
+        output_file (str): Path the PCM is written to
+        sample_rate (int): Sample rate to resample to
+        channels (int): Channel count to up- or downmix to
+
+    Raises:
+        RuntimeError: If ffmpeg fails
+    """
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        "-i",
+        input_file,
+        # First audio stream only, resampled and mixed to the model's format
+        "-map",
+        "0:a:0",
+        "-ac",
+        str(channels),
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "-acodec",
+        "pcm_f32le",
+        output_file,
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg could not decode {input_file}: "
+            f"{result.stderr.decode(errors='replace').strip()}"
+        )
+
+
+def open_decoded(path: str, channels: int) -> np.ndarray:
+    """
+    Memory-map decoded PCM read-only, without copying it.
+
+    Args:
+        path (str): Path to interleaved float32 PCM, as written by `decode_with_ffmpeg`
+        channels (int): Channel count the PCM was decoded to
+
+    Returns:
+        np.ndarray: float32 audio shaped (channels, samples); a strided view of the file
+    """
+    if os.path.getsize(path) == 0:
+        # mmap cannot map an empty file
+        return np.zeros((channels, 0), dtype=np.float32)
+    frames = np.memmap(path, dtype=PCM_DTYPE, mode="r")
+    return frames.reshape(-1, channels).T
+
+
+class DecodedAudioCache:
+    """
+    Decodes stored audio once to float32 PCM at a fixed sample rate and keeps the result
+    in storage next to the object, so every later stage memory-maps it instead of
+    running ffmpeg again. The total size is bounded; the least recently used PCM goes first.
+
+    Each entry is its own Kv pair, ordered by last use in a paged index, and every
+    change to the entries, the order and the total size is one Kv transaction. Several
+    processes sharing the Kv and the storage therefore share one bounded cache, and PCM
+    one of them is reading is pinned for all of them. Every decode is stored under a
+    fresh name, so an eviction finishing late cannot delete a newer decode.
+    """
+
+    _KEY_PREFIX = "decoded_audio"
+    # Entries inspected per read of the last-use index while evicting
+    _EVICTION_BATCH = 64
+
+    def __init__(
+        self,
+        storage: ObjectStorage,
+        kv: Kv,
+        logger: logging.Logger,
+        sample_rate: int = 44_100,
+        channels: int = 2,
+        max_bytes: int = 2 * 1024**3,
+        decode: Callable[[str, str, int, int], None] = decode_with_ffmpeg,
+        clock: Callable[[], float] = time.time,
+        metrics: Optional[MetricsRegistry] = None,
+        pin_seconds: float = 60 * 60,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            storage (ObjectStorage): Where the audio is read from and the PCM is stored
+            kv (Kv): Where the size and last use of each cached PCM object are kept
+            logger (logging.Logger): Logger for decodes and evictions
+            sample_rate (int): Sample rate every object is decoded to
+            channels (int): Channel count every object is decoded to
+            max_bytes (int): Most PCM bytes kept before the least recently used are deleted
+            decode (Callable[[str, str, int, int], None]): Decodes an input path to a PCM path
+                at a sample rate and channel count
+            clock (Callable[[], float]): Source of the last-use times and pin expiries,
+                                         shared by every process using the Kv
+            metrics (Optional[MetricsRegistry]): Where lookups and the cached size are recorded
+            pin_seconds (float): How long a reader's pin lasts if its process dies before
+                                 releasing it; longer than any one separation
+        """
+        self.storage = storage
+        self.kv = kv
+        self.logger = logger.getChild(DecodedAudioCache.__name__)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.max_bytes = max_bytes
+        self.pin_seconds = pin_seconds
+        self._decode = decode
+        self._clock = clock
+        self._last_use_index = PagedIndex(f"{self._KEY_PREFIX}:last_use")
+        # Decodes in progress, so concurrent lookups of one object decode it once;
+        # two processes missing at the same time may both decode it
+        self._decoding: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        metrics = metrics or MetricsRegistry()
+        self.lookups_total = metrics.counter(
+            "decoded_audio_lookups_total", "Decoded-PCM cache lookups", ["result"]
+        )
+        self.decode_seconds = metrics.histogram(
+            "decoded_audio_decode_seconds", "Time to decode an object to PCM"
+        )
+        self.cached_bytes = metrics.gauge(
+            "decoded_audio_cached_bytes", "Bytes of decoded PCM in storage"
+        )
+
+    def pcm_object_name(self, object_name: str) -> str:
+        """
+        Name the decoded PCM of an object is cached under. Each decode is stored as
+        its own object whose name starts with this one without the suffix, so deleting
+        an evicted decode never removes a newer one of the same audio.
+
+        Args:
+            object_name (str): Name/path of the compressed audio
+
+        Returns:
+            str: Cache key of the PCM
+        """
+        return f"{object_name}.{self.sample_rate}x{self.channels}{PCM_SUFFIX}"
+
+    def _stored_object_name(self, pcm_object_name: str) -> str:
+        """Fresh name to store one decode of the PCM under."""
+        stem = pcm_object_name[: -len(PCM_SUFFIX)]
+        return f"{stem}.{uuid.uuid4().hex[:12]}{PCM_SUFFIX}"
+
+    def _entry_key(self, pcm_object_name: str) -> str:
+        # [size in bytes, last use, stored object name]
+        return f"{self._KEY_PREFIX}:entry:{pcm_object_name}"
+
+    def _pins_key(self, pcm_object_name: str) -> str:
+        # {pin ID: expiry}
+        return f"{self._KEY_PREFIX}:pins:{pcm_object_name}"
+
+    def _total_key(self) -> str:
+        return f"{self._KEY_PREFIX}:total_bytes"
+
+    @staticmethod
+    def _last_use_key(last_use: float, pcm_object_name: str) -> str:
+        return f"{round(last_use * 1_000_000):020d}:{pcm_object_name}"
+
+    def _set_entry(
+        self,
+        transaction: KvTransaction,
+        pcm_object_name: str,
+        size: int,
+        now: float,
+        stored_object_name: str,
+    ) -> int:
+        """Add or replace an entry, returning the new total size."""
+        total = transaction.get(self._total_key()) or 0
+        entry = transaction.get(self._entry_key(pcm_object_name))
+        if entry is not None:
+            self._last_use_index.remove(
+                transaction, self._last_use_key(entry[1], pcm_object_name)
+            )
+            total -= entry[0]
+        transaction.put(
+            self._entry_key(pcm_object_name), [size, now, stored_object_name]
+        )
+        self._last_use_index.add(transaction, self._last_use_key(now, pcm_object_name))
+        total += size
+        transaction.put(self._total_key(), total)
+        return total
+
+    def _remove_entry(self, transaction: KvTransaction, pcm_object_name: str) -> list:
+        """Drop an entry that is cached, returning it."""
+        entry = transaction.get(self._entry_key(pcm_object_name))
+        self._last_use_index.remove(
+            transaction, self._last_use_key(entry[1], pcm_object_name)
+        )
+        transaction.zap(self._entry_key(pcm_object_name))
+        total = transaction.get(self._total_key()) or 0
+        transaction.put(self._total_key(), max(0, total - entry[0]))
+        return entry
+
+    def _is_pinned(self, transaction: KvTransaction, pcm_object_name: str) -> bool:
+        pins = transaction.get(self._pins_key(pcm_object_name)) or {}
+        now = self._clock()
+        return any(expires_at > now for expires_at in pins.values())
+
+    async def _touch(self, pcm_object_name: str) -> Optional[str]:
+        """Mark a cached entry used, returning its stored object name; None if it is not cached."""
+
+        def touch(transaction: KvTransaction) -> Optional[str]:
+            entry = transaction.get(self._entry_key(pcm_object_name))
+            if entry is None:
+                return None
+            size, _, stored_object_name = entry
+            self._set_entry(
+                transaction, pcm_object_name, size, self._clock(), stored_object_name
+            )
+            return stored_object_name
+
+        stored_object_name = await self.kv.transaction(touch)
+        if stored_object_name is None:
+            return None
+        if not await self.storage.aexists(stored_object_name):
+            self.logger.warning(f"Decoded audio {stored_object_name} is gone")
+
+            def forget(transaction: KvTransaction):
+                # Unless another process has since stored a new decode
+                entry = transaction.get(self._entry_key(pcm_object_name))
+                if entry is not None and entry[2] == stored_object_name:
+                    self._remove_entry(transaction, pcm_object_name)
+
+            await self.kv.transaction(forget)
+            return None
+        return stored_object_name
+
+    async def _add(
+        self, pcm_object_name: str, stored_object_name: str, size: int
+    ) -> str:
+        """
+        Record a new decode and evict the least recently used entries over the bound.
+        Returns the stored object name to read, which is another process's decode
+        if it was recorded first.
+        """
+
+        def add(transaction: KvTransaction) -> Tuple[str, List[list], int]:
+            now = self._clock()
+            entry = transaction.get(self._entry_key(pcm_object_name))
+            if entry is not None:
+                size_recorded, _, stored_recorded = entry
+                total = self._set_entry(
+                    transaction, pcm_object_name, size_recorded, now, stored_recorded
+                )
+                return stored_recorded, [], total
+
+            total = self._set_entry(
+                transaction, pcm_object_name, size, now, stored_object_name
+            )
+            evicted: List[list] = []
+            cursor = None
+            while total > self.max_bytes:
+                keys = self._last_use_index.after(
+                    transaction, cursor, self._EVICTION_BATCH
+                )
+                if not keys:
+                    break
+                cursor = keys[-1]
+                for key in keys:
+                    if total <= self.max_bytes:
+                        break
+                    name = key.split(":", 1)[1]
+                    if name == pcm_object_name or self._is_pinned(transaction, name):
+                        continue
+                    if transaction.get(self._entry_key(name)) is None:
+                        # Dropped by a bounded Kv; only its place in the order is left
+                        self._last_use_index.remove(transaction, key)
+                        continue
+                    evicted_entry = self._remove_entry(transaction, name)
+                    total -= evicted_entry[0]
+                    evicted.append(evicted_entry)
+            return stored_object_name, evicted, total
+
+        recorded, evicted, total = await self.kv.transaction(add)
+        if recorded != stored_object_name:
+            await self.storage.adelete(stored_object_name)
+        # Deleted once no other process can find them in the index
+        for entry_size, _, evicted_object_name in evicted:
+            await self.storage.adelete(evicted_object_name)
+            self.evictions += 1
+            self.logger.info(
+                f"Evicted decoded audio {evicted_object_name} ({entry_size} bytes)"
+            )
+        self.cached_bytes.set(total)
+        return recorded
+
+    async def _pin(self, pcm_object_name: str) -> str:
+        """Keep an entry from being evicted by any process until it is unpinned."""
+        pin_id = uuid.uuid4().hex
+
+        def pin(transaction: KvTransaction):
+            now = self._clock()
+            pins = {
+                id: expires_at
+                for id, expires_at in (
+                    transaction.get(self._pins_key(pcm_object_name)) or {}
+                ).items()
+                if expires_at > now
+            }
+            pins[pin_id] = now + self.pin_seconds
+            transaction.put(self._pins_key(pcm_object_name), pins)
+
+        await self.kv.transaction(pin)
+        return pin_id
+
+    async def _unpin(self, pcm_object_name: str, pin_id: str):
+        def unpin(transaction: KvTransaction):
+            pins = dict(transaction.get(self._pins_key(pcm_object_name)) or {})
+            pins.pop(pin_id, None)
+            if pins:
+                transaction.put(self._pins_key(pcm_object_name), pins)
+            else:
+                transaction.zap(self._pins_key(pcm_object_name))
+
+        await self.kv.transaction(unpin)
+
+    async def _decode_and_store(self, object_name: str, pcm_object_name: str) -> str:
+        stored_object_name = self._stored_object_name(pcm_object_name)
+        fd, pcm_path = tempfile.mkstemp(suffix=PCM_SUFFIX)
+        os.close(fd)
+        try:
+            async with self.storage.alocal_path(object_name) as input_file:
+                with self.decode_seconds.time():
+                    await asyncio.to_thread(
+                        self._decode,
+                        input_file,
+                        pcm_path,
+                        self.sample_rate,
+                        self.channels,
+                    )
+            size = os.path.getsize(pcm_path)
+            await self.storage.aupload(
+                stored_object_name, pcm_path, content_type="application/octet-stream"
+            )
+        finally:
+            os.remove(pcm_path)
+        self.logger.info(f"Decoded {object_name} to {size} bytes of PCM")
+        return await self._add(pcm_object_name, stored_object_name, size)
+
+    async def ensure(self, object_name: str) -> str:
+        """
+        Decode an object unless its PCM is already cached.
+
+        Args:
+            object_name (str): Name/path of the compressed audio
+
+        Returns:
+            str: Object name the PCM is stored under
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+            RuntimeError: If the object cannot be decoded
+        """
+        pcm_object_name = self.pcm_object_name(object_name)
+        task = self._decoding.get(pcm_object_name)
+        if task is None:
+            stored_object_name = await self._touch(pcm_object_name)
+            if stored_object_name is not None:
+                self.hits += 1
+                self.lookups_total.inc(result="hit")
+                return stored_object_name
+
+        # A decode may have started while the index was read
+        task = self._decoding.get(pcm_object_name)
+        if task is None:
+            self.misses += 1
+            self.lookups_total.inc(result="miss")
+            task = asyncio.create_task(
+                self._decode_and_store(object_name, pcm_object_name)
+            )
+            self._decoding[pcm_object_name] = task
+            task.add_done_callback(lambda _: self._decoding.pop(pcm_object_name, None))
+        else:
+            self.hits += 1
+            self.lookups_total.inc(result="hit")
+        # Shielded, so a cancelled caller does not cancel a decode others wait for
+        return await asyncio.shield(task)
+
+    @asynccontextmanager
+    async def alocal_path(self, object_name: str) -> AsyncIterator[str]:
+        """
+        Get a local path to an object's decoded PCM, decoding it first if needed.
+        The PCM is not evicted, by this process or any other sharing the Kv,
+        while the context is open.
+
+        Args:
+            object_name (str): Name/path of the compressed audio
+
+        Yields:
+            str: Local path to interleaved float32 PCM, see `open_decoded`
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+            RuntimeError: If the object cannot be decoded
+        """
+        pcm_object_name = self.pcm_object_name(object_name)
+        pin_id = await self._pin(pcm_object_name)
+        try:
+            stored_object_name = await self.ensure(object_name)
+            async with self.storage.alocal_path(stored_object_name) as path:
+                yield path
+        finally:
+            await self._unpin(pcm_object_name, pin_id)
+
+    @asynccontextmanager
+    async def open(self, object_name: str) -> AsyncIterator[np.ndarray]:
+        """
+        Memory-map an object's decoded PCM, decoding it first if needed.
+
+        Args:
+            object_name (str): Name/path of the compressed audio
+
+        Yields:
+            np.ndarray: Read-only float32 audio shaped (channels, samples)
+        """
+        async with self.alocal_path(object_name) as path:
+            yield open_decoded(path, self.channels)
+
+    def stats(self) -> dict:
+        """
+        Get hit, miss and eviction counts since the cache was created.
+
+        Returns:
+            dict: hits, misses, evictions and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
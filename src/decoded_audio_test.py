@@ -0,0 +1,178 @@
+import asyncio
+import itertools
+import logging
+import shutil
+import wave
+import numpy as np
+import pytest
+from fastapi import APIRouter
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+from src.decoded_audio import (
+    PCM_SUFFIX,
+    DecodedAudioCache,
+    decode_with_ffmpeg,
+    open_decoded,
+)
+from src.kv.factory import KvFactory
+from src.kv.impl_sqlite import SqliteKv
+from src.object_storage.factory import ObjectStorageFactory
+
+pytestmark = pytest.mark.anyio
+
+
+def decode_wav(input_file: str, output_file: str, sample_rate: int, channels: int):
+    """Stand-in for ffmpeg that reads 16-bit WAV at the target rate and channel count"""
+    with wave.open(input_file, "rb") as wav:
+        assert (wav.getframerate(), wav.getnchannels()) == (sample_rate, channels)
+        pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+    (pcm.astype("<f4") / 32768).tofile(output_file)
+
+
+class Fixture:
+    def __init__(self, tmp_path, **kwargs):
+        self.storage = ObjectStorageFactory.create(
+            impl="local",
+            base_dir=str(tmp_path / "storage"),
+            base_url="http://testserver",
+            router=APIRouter(),
+            logger=logging.getLogger(__name__),
+        )
+        self.decodes = []
+
+        def decode(*args):
+            self.decodes.append(args[0])
+            decode_wav(*args)
+
+        self.cache = DecodedAudioCache(
+            self.storage,
+            kwargs.pop("kv", None) or KvFactory.create("dict"),
+            logging.getLogger(__name__),
+            decode=kwargs.pop("decode", decode),
+            **kwargs,
+        )
+
+    def cached_pcm(self, object_name: str = "") -> list:
+        """Stored PCM objects, of one object or of all"""
+        return [
+            info
+            for info in self.storage.list_objects(object_name or "demos/")
+            if info.name.endswith(PCM_SUFFIX)
+        ]
+
+    def upload_demo(self, object_name: str, seconds: float = 1.0, seed: int = 0):
+        audio = synthesize(seconds, seed=seed)
+        self.storage.upload(object_name, to_wav_bytes(audio))
+        return audio
+
+
+async def test_decodes_once(tmp_path):
+    """Test an object is decoded on first use and memory-mapped afterwards"""
+    f = Fixture(tmp_path)
+    audio = f.upload_demo("demos/a.wav")
+
+    for _ in range(3):
+        async with f.cache.open("demos/a.wav") as pcm:
+            assert isinstance(pcm.base, np.memmap)
+            assert pcm.shape == audio.shape
+            np.testing.assert_allclose(pcm, audio, atol=1 / 16384)
+
+    assert len(f.decodes) == 1
+    assert len(f.cached_pcm("demos/a.wav")) == 1
+    assert f.cache.stats()["hits"] == 2
+    assert f.cache.stats()["misses"] == 1
+
+
+async def test_concurrent_lookups_decode_once(tmp_path):
+    """Test concurrent lookups of one object share a single decode"""
+    f = Fixture(tmp_path)
+    f.upload_demo("demos/a.wav")
+
+    names = await asyncio.gather(*(f.cache.ensure("demos/a.wav") for _ in range(5)))
+
+    assert set(names) == {info.name for info in f.cached_pcm("demos/a.wav")}
+    assert len(set(names)) == 1
+    assert len(f.decodes) == 1
+
+
+async def test_evicts_least_recently_used(tmp_path):
+    """Test the total size stays bounded by deleting the least recently used PCM"""
+    pcm_bytes = 44_100 * 2 * 4
+    f = Fixture(
+        tmp_path, max_bytes=int(3.5 * pcm_bytes), clock=itertools.count().__next__
+    )
+    for name in ("a", "b", "c"):
+        f.upload_demo(f"demos/{name}.wav")
+        await f.cache.ensure(f"demos/{name}.wav")
+    # a was used most recently, so b goes first
+    await f.cache.ensure("demos/a.wav")
+
+    f.upload_demo("demos/d.wav")
+    await f.cache.ensure("demos/d.wav")
+
+    cached = {
+        name for name in ("a", "b", "c", "d") if f.cached_pcm(f"demos/{name}.wav")
+    }
+    assert cached == {"a", "c", "d"}
+    assert f.cache.stats()["evictions"] == 1
+
+    # An evicted object is decoded again on its next use
+    await f.cache.ensure("demos/b.wav")
+    assert len(f.decodes) == 5
+
+
+async def test_pinned_entries_are_not_evicted(tmp_path):
+    """Test PCM being read is kept even when it is over the bound"""
+    f = Fixture(tmp_path, max_bytes=1)
+    f.upload_demo("demos/a.wav")
+    f.upload_demo("demos/b.wav")
+
+    async with f.cache.open("demos/a.wav") as pcm:
+        await f.cache.ensure("demos/b.wav")
+        assert f.cached_pcm("demos/a.wav")
+        assert pcm.shape[1] == 44_100
+
+
+async def test_caches_sharing_a_store(tmp_path):
+    """Test caches in separate processes share one bound and respect each other's pins"""
+    pcm_bytes = 44_100 * 2 * 4
+    kv_path = str(tmp_path / "kv.sqlite3")
+    f = Fixture(tmp_path, kv=SqliteKv(kv_path), max_bytes=int(2.5 * pcm_bytes))
+    other = Fixture(tmp_path, kv=SqliteKv(kv_path), max_bytes=int(2.5 * pcm_bytes))
+    for seed, name in enumerate("abcdef"):
+        f.upload_demo(f"demos/{name}.wav", seed=seed)
+
+    async with f.cache.alocal_path("demos/a.wav"):
+        await asyncio.gather(
+            *(
+                cache.ensure(f"demos/{name}.wav")
+                for name in "bcdef"
+                for cache in (f.cache, other.cache)
+            )
+        )
+        # Only the pinned PCM may push the total over the bound
+        assert f.cached_pcm("demos/a.wav")
+        assert sum(info.size for info in f.cached_pcm()) <= 3.5 * pcm_bytes
+
+    # Once unpinned, the other process may evict it
+    f.upload_demo("demos/g.wav")
+    await other.cache.ensure("demos/g.wav")
+    assert len(f.cached_pcm()) == 2
+    assert not f.cached_pcm("demos/a.wav")
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+async def test_decode_with_ffmpeg(tmp_path):
+    """Test ffmpeg resamples and downmixes to the requested format"""
+    f = Fixture(tmp_path, sample_rate=22_050, channels=1, decode=decode_with_ffmpeg)
+    f.upload_demo("demos/a.wav", seconds=2.0)
+
+    async with f.cache.open("demos/a.wav") as pcm:
+        assert pcm.shape[0] == 1
+        assert abs(pcm.shape[1] - 44_100) < 100
+
+
+async def test_open_decoded_empty(tmp_path):
+    """Test empty PCM opens as zero samples"""
+    path = tmp_path / "empty.f32"
+    path.write_bytes(b"")
+    assert open_decoded(str(path), 2).shape == (2, 0)
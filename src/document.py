@@ -18,6 +18,9 @@ def view(child: str) -> str:
                     <ul>
                         <li><a href="/">Demo Polisher</a></li>
                     </ul>
+                    <ul>
+                        <li><a href="/upload-demo/history">History</a></li>
+                    </ul>
                 </nav>
             </header>
             {child}
@@ -0,0 +1,34 @@
+from typing import Dict, Type
+from src.job_store.inter import JobStore
+from src.job_store.impl_sqlite import SqliteJobStore
+
+
+class JobStoreFactory:
+    """
+    Factory class for creating JobStore instances.
+    """
+
+    _implementations: Dict[str, Type[JobStore]] = {"sqlite": SqliteJobStore}
+
+    @classmethod
+    def create(cls, impl: str, **kwargs) -> JobStore:
+        """
+        Create an instance of the specified job store.
+
+        Args:
+            impl (str): The name of the implementation to create
+            **kwargs: Arguments to pass to the implementation constructor
+
+        Returns:
+            JobStore: An instance of the requested store
+
+        Raises:
+            ValueError: If the implementation is not supported
+        """
+        if impl not in cls._implementations:
+            raise ValueError(
+                f"Unsupported job store: {impl}. "
+                f"Supported stores are: {', '.join(cls._implementations.keys())}"
+            )
+
+        return cls._implementations[impl](**kwargs)
@@ -0,0 +1,198 @@
+import asyncio
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+from src.job_store.inter import JobStore, Lease
+from src.separation_job.separation_job import SeparationJob
+
+_AVAILABLE = "state = 'pending' OR (state = 'leased' AND lease_expires_at <= :now)"
+
+
+class SqliteJobStore(JobStore):
+    """
+    JobStore on a SQLite database file. Every process on this host opening the file
+    shares one queue; claims take SQLite's write lock, so each job goes to one worker
+    at a time. The WAL journal needs memory shared by those processes, so the file
+    must not be on a network filesystem such as NFS or SMB; workers on several
+    hosts need a networked JobStore.
+    """
+
+    def __init__(
+        self,
+        path: str = "jobs.sqlite3",
+        retention_seconds: float = 24 * 60 * 60,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Open the database, creating it if it does not exist.
+
+        Args:
+            path (str): Path of the database file
+            retention_seconds (float): How long finished jobs are kept, so late
+                                       completions of them stay no-ops
+            clock (Callable[[], float]): Wall clock, in seconds; leases are compared
+                                         across processes, so not a monotonic one
+        """
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.clock = clock
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # One thread and connection: claims serialize on the write lock anyway
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="sqlite-job-store"
+        )
+        self._connection = sqlite3.connect(
+            path, timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self._lock = threading.Lock()
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, "
+            "payload TEXT NOT NULL, "
+            "state TEXT NOT NULL, "
+            "enqueued_at REAL NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "worker_id TEXT, "
+            "lease_token TEXT, "
+            "lease_expires_at REAL, "
+            "finished_at REAL, "
+            "error TEXT)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_by_state " "ON jobs (state, enqueued_at)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_by_finished_at ON jobs (finished_at)"
+        )
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _transaction(self, fn, *args):
+        """Run fn under SQLite's write lock, taken up front so claims never race."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def _put(self, job: SeparationJob) -> bool:
+        now = self.clock()
+        self._connection.execute(
+            "DELETE FROM jobs WHERE state IN ('done', 'failed') AND finished_at <= ?",
+            (now - self.retention_seconds,),
+        )
+        cursor = self._connection.execute(
+            "INSERT INTO jobs (id, payload, state, enqueued_at) "
+            "VALUES (?, ?, 'pending', ?) ON CONFLICT (id) DO NOTHING",
+            (job.id, json.dumps(dataclasses.asdict(job)), now),
+        )
+        return cursor.rowcount > 0
+
+    def _claim(self, worker_id: str, lease_seconds: float) -> Optional[Lease]:
+        now = self.clock()
+        row = self._connection.execute(
+            f"SELECT id, payload, attempts FROM jobs WHERE {_AVAILABLE} "
+            "ORDER BY enqueued_at LIMIT 1",
+            {"now": now},
+        ).fetchone()
+        if row is None:
+            return None
+
+        job_id, payload, attempts = row
+        token = uuid.uuid4().hex
+        expires_at = now + lease_seconds
+        self._connection.execute(
+            "UPDATE jobs SET state = 'leased', attempts = attempts + 1, "
+            "worker_id = ?, lease_token = ?, lease_expires_at = ? WHERE id = ?",
+            (worker_id, token, expires_at, job_id),
+        )
+        return Lease(
+            job=SeparationJob(**json.loads(payload)),
+            worker_id=worker_id,
+            token=token,
+            expires_at=expires_at,
+            attempt=attempts + 1,
+        )
+
+    def _renew(self, lease: Lease, lease_seconds: float) -> bool:
+        expires_at = self.clock() + lease_seconds
+        cursor = self._connection.execute(
+            "UPDATE jobs SET lease_expires_at = ? "
+            "WHERE id = ? AND lease_token = ? AND state = 'leased'",
+            (expires_at, lease.job.id, lease.token),
+        )
+        if cursor.rowcount == 0:
+            return False
+        lease.expires_at = expires_at
+        return True
+
+    def _complete(self, lease: Lease, error: Optional[str]) -> bool:
+        # Also accepted after the lease expired, as long as no one reclaimed the job
+        cursor = self._connection.execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, error = ?, "
+            "lease_token = NULL, lease_expires_at = NULL "
+            "WHERE id = ? AND lease_token = ? AND state = 'leased'",
+            (
+                "failed" if error is not None else "done",
+                self.clock(),
+                error,
+                lease.job.id,
+                lease.token,
+            ),
+        )
+        return cursor.rowcount > 0
+
+    def _stats(self) -> Dict[str, int]:
+        counts = {state: 0 for state in ("pending", "leased", "done", "failed")}
+        for state, count in self._connection.execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+        ):
+            counts[state] = count
+        (counts["expired"],) = self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND lease_expires_at <= ?",
+            (self.clock(),),
+        ).fetchone()
+        return counts
+
+    def _completion_rate(self, window_seconds: float) -> float:
+        (finished,) = self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE finished_at > ?",
+            (self.clock() - window_seconds,),
+        ).fetchone()
+        return finished / window_seconds
+
+    async def put(self, job: SeparationJob) -> bool:
+        return await self._run(self._transaction, self._put, job)
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Optional[Lease]:
+        return await self._run(self._transaction, self._claim, worker_id, lease_seconds)
+
+    async def renew(self, lease: Lease, lease_seconds: float) -> bool:
+        return await self._run(self._transaction, self._renew, lease, lease_seconds)
+
+    async def complete(self, lease: Lease, error: Optional[str] = None) -> bool:
+        return await self._run(self._transaction, self._complete, lease, error)
+
+    async def stats(self) -> Dict[str, int]:
+        return await self._run(self._transaction, self._stats)
+
+    async def completion_rate(self, window_seconds: float) -> float:
+        return await self._run(self._transaction, self._completion_rate, window_seconds)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._connection.close()
@@ -0,0 +1,110 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Optional
+from src.separation_job.separation_job import SeparationJob
+
+
+@dataclass
+class Lease:
+    """A worker's time-limited claim on a job, from `JobStore.claim`."""
+
+    job: SeparationJob
+    worker_id: str
+    # Changes with every claim, so a worker whose lease was reclaimed cannot renew
+    # or complete the job on top of its new owner
+    token: str
+    expires_at: float
+    # 1 on the first claim; higher when the job was reclaimed from a worker that died
+    attempt: int
+
+
+class JobStore(ABC):
+    """
+    Interface for a durable queue of separation jobs shared by workers on many nodes.
+    Workers claim jobs under leases they keep renewing; a job whose lease runs out,
+    e.g. because its worker died, can be claimed again by another worker.
+    """
+
+    @abstractmethod
+    async def put(self, job: SeparationJob) -> bool:
+        """
+        Add a job to the queue. Adding a job with an existing ID does nothing.
+
+        Args:
+            job (SeparationJob): The job
+
+        Returns:
+            bool: True if the job was added, False if it already existed
+        """
+        pass
+
+    @abstractmethod
+    async def claim(self, worker_id: str, lease_seconds: float) -> Optional[Lease]:
+        """
+        Lease the oldest job that is pending or whose lease has expired.
+
+        Args:
+            worker_id (str): Who is claiming, for diagnostics
+            lease_seconds (float): How long the lease lasts unless renewed
+
+        Returns:
+            Optional[Lease]: The lease, or None if no job is available
+        """
+        pass
+
+    @abstractmethod
+    async def renew(self, lease: Lease, lease_seconds: float) -> bool:
+        """
+        Extend a lease, as a heartbeat of the worker holding it.
+
+        Args:
+            lease (Lease): The lease; its expires_at is updated on success
+            lease_seconds (float): How long the lease lasts from now
+
+        Returns:
+            bool: True if renewed, False if the lease was lost to another worker
+                  or the job is finished
+        """
+        pass
+
+    @abstractmethod
+    async def complete(self, lease: Lease, error: Optional[str] = None) -> bool:
+        """
+        Finish a leased job. Idempotent: completing a finished job changes nothing.
+
+        Args:
+            lease (Lease): The lease
+            error (Optional[str]): Why the job failed, None if it succeeded
+
+        Returns:
+            bool: True if this call finished the job, False if it was already
+                  finished or the lease was lost
+        """
+        pass
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, int]:
+        """
+        Count the jobs in each state.
+
+        Returns:
+            Dict[str, int]: Jobs "pending", "leased", "expired" (leased, but the lease
+                            ran out), "done" and "failed"
+        """
+        pass
+
+    @abstractmethod
+    async def completion_rate(self, window_seconds: float) -> float:
+        """
+        How fast jobs have been finishing lately, done or failed, across every worker.
+
+        Args:
+            window_seconds (float): How far back to count
+
+        Returns:
+            float: Jobs finished per second over the window
+        """
+        pass
+
+    def close(self):
+        """Release the store's connections."""
@@ -0,0 +1,148 @@
+import pytest
+from src.job_store.factory import JobStoreFactory
+from src.separation_job.separation_job import SeparationJob
+
+pytestmark = [pytest.mark.anyio, pytest.mark.parametrize("impl", ["sqlite"])]
+
+
+class FakeClock:
+    """Clock the tests move forward by hand instead of sleeping"""
+
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class Fixture:
+    def __init__(self, impl: str, tmp_path, **kwargs):
+        self.clock = FakeClock()
+        if impl == "sqlite":
+            kwargs["path"] = str(tmp_path / "jobs.sqlite3")
+        self.kwargs = kwargs
+        self.impl = impl
+        self.store = self.open()
+
+    def open(self):
+        """Another handle on the same store, as another process would have"""
+        return JobStoreFactory.create(self.impl, clock=self.clock, **self.kwargs)
+
+    def job(self, index: int) -> SeparationJob:
+        return SeparationJob(
+            id=f"job-{index}",
+            input_object_name=f"demos/{index}.wav",
+            output_prefix=f"stems/{index}",
+            cache_key=f"key-{index}",
+            client_id="127.0.0.1",
+        )
+
+
+async def test_jobs_are_claimed_oldest_first_once(impl, tmp_path):
+    """Test each job goes to one worker, in the order jobs were added"""
+    f = Fixture(impl, tmp_path)
+    other = f.open()
+    for index in range(3):
+        assert await f.store.put(f.job(index))
+        f.clock.advance(1)
+    assert not await f.store.put(f.job(0))
+
+    first = await f.store.claim("a", 30)
+    second = await other.claim("b", 30)
+    third = await f.store.claim("a", 30)
+    assert [first.job, second.job, third.job] == [f.job(0), f.job(1), f.job(2)]
+    assert first.attempt == 1
+    assert await other.claim("b", 30) is None
+    assert await f.store.stats() == {
+        "pending": 0,
+        "leased": 3,
+        "expired": 0,
+        "done": 0,
+        "failed": 0,
+    }
+    other.close()
+
+
+async def test_expired_lease_is_reclaimed(impl, tmp_path):
+    """Test a job whose worker stopped renewing goes to another worker"""
+    f = Fixture(impl, tmp_path)
+    await f.store.put(f.job(0))
+    dead = await f.store.claim("dead", 30)
+
+    f.clock.advance(20)
+    assert await f.store.claim("b", 30) is None
+    f.clock.advance(20)
+    assert (await f.store.stats())["expired"] == 1
+
+    reclaimed = await f.store.claim("b", 30)
+    assert reclaimed.job == f.job(0)
+    assert reclaimed.attempt == 2
+    # The dead worker's lease is void
+    assert not await f.store.renew(dead, 30)
+    assert not await f.store.complete(dead)
+    assert await f.store.complete(reclaimed)
+
+
+async def test_renewed_lease_is_kept(impl, tmp_path):
+    """Test heartbeats keep a long job from being reclaimed"""
+    f = Fixture(impl, tmp_path)
+    await f.store.put(f.job(0))
+    lease = await f.store.claim("a", 30)
+
+    for _ in range(5):
+        f.clock.advance(20)
+        assert await f.store.renew(lease, 30)
+        assert await f.store.claim("b", 30) is None
+    assert lease.expires_at == f.clock() + 30
+
+
+async def test_complete_is_idempotent(impl, tmp_path):
+    """Test completing a job twice, or renewing it after, changes nothing"""
+    f = Fixture(impl, tmp_path)
+    await f.store.put(f.job(0))
+    await f.store.put(f.job(1))
+    done = await f.store.claim("a", 30)
+    failed = await f.store.claim("a", 30)
+
+    assert await f.store.complete(done)
+    assert not await f.store.complete(done)
+    assert not await f.store.complete(done, error="late")
+    assert not await f.store.renew(done, 30)
+    assert await f.store.complete(failed, error="boom")
+
+    stats = await f.store.stats()
+    assert (stats["done"], stats["failed"], stats["leased"]) == (1, 1, 0)
+    # Finished jobs are not claimed or added again
+    assert await f.store.claim("a", 30) is None
+    assert not await f.store.put(f.job(0))
+
+
+async def test_finished_jobs_are_purged(impl, tmp_path):
+    """Test finished jobs are dropped once past their retention"""
+    f = Fixture(impl, tmp_path, retention_seconds=60)
+    await f.store.put(f.job(0))
+    await f.store.complete(await f.store.claim("a", 30))
+
+    f.clock.advance(61)
+    await f.store.put(f.job(1))
+    assert (await f.store.stats())["done"] == 0
+
+
+async def test_completion_rate(impl, tmp_path):
+    """Test the rate counts the jobs of every worker finished within the window"""
+    f = Fixture(impl, tmp_path)
+    other = f.open()
+    for index in range(3):
+        await f.store.put(f.job(index))
+    await f.store.complete(await f.store.claim("a", 30))
+    f.clock.advance(30)
+    await other.complete(await other.claim("b", 30), error="boom")
+    await f.store.complete(await f.store.claim("a", 30))
+
+    assert await f.store.completion_rate(60) == 3 / 60
+    assert await other.completion_rate(20) == 2 / 20
+    f.clock.advance(60)
+    assert await f.store.completion_rate(60) == 0
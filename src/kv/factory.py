@@ -1,6 +1,7 @@
 from typing import Optional, Dict, Type
 from src.kv.inter import Kv
 from src.kv.impl_dict import DictKv
+from src.kv.impl_sqlite import SqliteKv
 
 
 class KvFactory:
@@ -50,3 +51,6 @@ class KvFactory:
             list[str]: A list of names of available implementations
         """
         return list(cls._implementations.keys())
+
+
+KvFactory.register_implementation("sqlite", SqliteKv)
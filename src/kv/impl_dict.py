@@ -1,16 +1,219 @@
-from typing import Any, Dict, Optional
-from src.kv.inter import Kv
+import heapq
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from src.kv.inter import Kv, KvTransaction, T
+
+
+class _Entry(NamedTuple):
+    value: Any
+    expires_at: Optional[float]
+    size: int
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a value, following the containers Kv values are built from.
+
+    Args:
+        value (Any): The value to measure
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class _DictTransaction(KvTransaction):
+    """Writes are held back until the transaction's function returns."""
+
+    def __init__(self, kv: "DictKv", now: float):
+        self.kv = kv
+        self.now = now
+        # Key to (value, ttl), or None once zapped
+        self.writes: Dict[str, Optional[Tuple[Any, Optional[float]]]] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        if key in self.writes:
+            write = self.writes[key]
+            return None if write is None else write[0]
+        entry = self.kv._lookup(key, self.now)
+        return None if entry is None else entry.value
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.writes[key] = (value, ttl)
+
+    def zap(self, key: str) -> bool:
+        existed = self.get(key) is not None
+        self.writes[key] = None
+        return existed
+
+    def apply(self):
+        """
+        Make every write, or none.
+
+        Raises:
+            ValueError: If the writes alone do not fit in the store's bounds
+        """
+        kv = self.kv
+        puts = {key: write for key, write in self.writes.items() if write is not None}
+        sizes = {key: kv._size(key, write[0]) for key, write in puts.items()}
+        if kv.max_entries is not None and len(puts) > kv.max_entries:
+            raise ValueError(
+                f"Transaction writes {len(puts)} pairs, over {kv.max_entries}"
+            )
+        if kv.max_bytes is not None and sum(sizes.values()) > kv.max_bytes:
+            raise ValueError(
+                f"Transaction writes {sum(sizes.values())} bytes, over {kv.max_bytes}"
+            )
+
+        for key, write in self.writes.items():
+            if write is not None:
+                kv._insert(key, write[0], write[1], sizes[key], self.now)
+            elif key in kv._storage:
+                kv._remove(key)
+        # Pairs written together are kept together
+        kv._evict(keep=puts.keys())
 
 
 class DictKv(Kv):
     """
     In-memory implementation of the Kv interface using a Python dictionary.
     This implementation stores all key-value pairs in memory and is not persistent.
+    It can be bounded by entry count and approximate size, evicting the least recently
+    used pairs first, and pairs put with a TTL expire.
     """
 
-    def __init__(self):
-        """Initialize an empty dictionary for storage."""
-        self._storage: Dict[str, Any] = {}
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize an empty dictionary for storage.
+
+        Args:
+            max_entries (Optional[int]): Most pairs kept, None for no limit
+            max_bytes (Optional[int]): Most approximate bytes of keys and values kept,
+                                       None for no limit
+            sweep_interval (float): Seconds between sweeps removing every expired pair;
+                                    between sweeps, expired pairs are removed when read
+            clock (Callable[[], float]): Monotonic clock, in seconds
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+
+        # Ordered from least to most recently used
+        self._storage: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        # (expires_at, key) of pairs put with a TTL; stale once the key is rewritten
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._next_sweep_at = clock() + sweep_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str) -> _Entry:
+        entry = self._storage.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def _is_expired(self, entry: _Entry, now: float) -> bool:
+        return entry.expires_at is not None and entry.expires_at <= now
+
+    def _maybe_sweep(self, now: float):
+        if now < self._next_sweep_at:
+            return
+        self._next_sweep_at = now + self.sweep_interval
+        self.sweep()
+
+    def sweep(self) -> int:
+        """
+        Remove every expired pair.
+
+        Returns:
+            int: Number of pairs removed
+        """
+        now = self.clock()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            entry = self._storage.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(key)
+                removed += 1
+        self.expirations += removed
+
+        # Rewritten keys leave stale heap items behind; drop them once they dominate
+        if len(self._expiry_heap) > 2 * len(self._storage) + 64:
+            self._expiry_heap = [
+                (entry.expires_at, key)
+                for key, entry in self._storage.items()
+                if entry.expires_at is not None
+            ]
+            heapq.heapify(self._expiry_heap)
+        return removed
+
+    def _lookup(self, key: str, now: float) -> Optional[_Entry]:
+        entry = self._storage.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self._is_expired(entry, now):
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._storage.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _size(self, key: str, value: Any) -> int:
+        # Sizing walks the whole value, so it is only paid for when bytes are bounded
+        if self.max_bytes is None:
+            return 0
+        return approximate_size(key) + approximate_size(value)
+
+    def _insert(
+        self, key: str, value: Any, ttl: Optional[float], size: int, now: float
+    ):
+        if key in self._storage:
+            self._remove(key)
+        expires_at = None if ttl is None else now + ttl
+        self._storage[key] = _Entry(value, expires_at, size)
+        self._bytes += size
+        if expires_at is not None:
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+
+    def _evict(self, keep: Iterable[str] = ()):
+        """Remove the least recently used pairs, other than keep, until within bounds."""
+        keep = set(keep)
+        while (
+            self.max_entries is not None and len(self._storage) > self.max_entries
+        ) or (self.max_bytes is not None and self._bytes > self.max_bytes):
+            # Kept pairs were just written, so they are at the recently used end
+            self._remove(next(key for key in self._storage if key not in keep))
+            self.evictions += 1
+
+    def _store(self, key: str, value: Any, ttl: Optional[float], now: float) -> bool:
+        size = self._size(key, value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return False
+        self._insert(key, value, ttl, size, now)
+        self._evict()
+        return True
 
     async def get(self, key: str) -> Optional[Any]:
         """
@@ -22,24 +225,26 @@ class DictKv(Kv):
         Returns:
             Optional[Any]: The value if found, None otherwise
         """
-        return self._storage.get(key)
+        now = self.clock()
+        self._maybe_sweep(now)
+        entry = self._lookup(key, now)
+        return None if entry is None else entry.value
 
-    async def put(self, key: str, value: Any) -> bool:
+    async def put(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
         """
-        Store a key-value pair.
+        Store a key-value pair, evicting the least recently used pairs beyond the limits.
 
         Args:
             key (str): The key to store
             value (Any): The value to store
+            ttl (Optional[float]): Seconds until the pair expires, None to keep it
 
         Returns:
-            bool: True if storage was successful, False otherwise
+            bool: True if storage was successful, False if the pair alone exceeds max_bytes
         """
-        try:
-            self._storage[key] = value
-            return True
-        except Exception:
-            return False
+        now = self.clock()
+        self._maybe_sweep(now)
+        return self._store(key, value, ttl, now)
 
     async def zap(self, key: str) -> bool:
         """
@@ -51,7 +256,114 @@ class DictKv(Kv):
         Returns:
             bool: True if deletion was successful, False otherwise
         """
-        if key in self._storage:
-            del self._storage[key]
-            return True
-        return False
+        entry = self._storage.get(key)
+        if entry is None:
+            return False
+        self._remove(key)
+        if self._is_expired(entry, self.clock()):
+            self.expirations += 1
+            return False
+        return True
+
+    async def transaction(
+        self, fn: Callable[[KvTransaction], T], read_only: bool = False
+    ) -> T:
+        """
+        Read, change and write several pairs atomically. The store lives on the event
+        loop, so running fn without awaiting is enough to keep other calls out.
+
+        Args:
+            fn (Callable[[KvTransaction], T]): Makes the reads and writes; if it raises,
+                                               nothing is written
+            read_only (bool): Whether fn only reads; makes no difference here
+
+        Returns:
+            T: What fn returned
+
+        Raises:
+            ValueError: If the writes alone do not fit in the bounds; nothing is written
+        """
+        now = self.clock()
+        self._maybe_sweep(now)
+        transaction = _DictTransaction(self, now)
+        result = fn(transaction)
+        transaction.apply()
+        return result
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Retrieve the values of several keys.
+
+        Args:
+            keys (Iterable[str]): The keys to retrieve the values for
+
+        Returns:
+            Dict[str, Any]: The found keys and their values; missing keys are left out
+        """
+        now = self.clock()
+        self._maybe_sweep(now)
+        values = {}
+        for key in keys:
+            entry = self._lookup(key, now)
+            if entry is not None:
+                values[key] = entry.value
+        return values
+
+    async def put_many(
+        self, items: Dict[str, Any], ttl: Optional[float] = None
+    ) -> bool:
+        """
+        Store several key-value pairs.
+
+        Args:
+            items (Dict[str, Any]): The keys and values to store
+            ttl (Optional[float]): Seconds until the pairs expire, None to keep them
+
+        Returns:
+            bool: True if every pair was stored, False otherwise
+        """
+        now = self.clock()
+        self._maybe_sweep(now)
+        stored = True
+        for key, value in items.items():
+            stored = self._store(key, value, ttl, now) and stored
+        return stored
+
+    async def zap_many(self, keys: Iterable[str]) -> int:
+        """
+        Delete several key-value pairs.
+
+        Args:
+            keys (Iterable[str]): The keys to delete
+
+        Returns:
+            int: Number of keys that existed and were deleted
+        """
+        now = self.clock()
+        deleted = 0
+        for key in keys:
+            entry = self._storage.get(key)
+            if entry is not None:
+                self._remove(key)
+                if self._is_expired(entry, now):
+                    self.expirations += 1
+                else:
+                    deleted += 1
+        return deleted
+
+    def stats(self) -> dict:
+        """
+        Get the store's size and counters since it was created.
+
+        Returns:
+            dict: entries, bytes (0 unless max_bytes is set), hits, misses,
+                  evictions and expirations
+        """
+        return {
+            "entries": len(self._storage),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
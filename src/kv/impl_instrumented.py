@@ -0,0 +1,69 @@
+from typing import Any, Callable, Dict, Iterable, Optional
+from src.kv.inter import Kv, KvTransaction, T
+from src.metrics import MetricsRegistry
+
+
+class InstrumentedKv(Kv):
+    """
+    Kv wrapper recording the latency of every call, and the keys moved by bulk calls.
+    """
+
+    def __init__(self, kv: Kv, metrics: MetricsRegistry):
+        """
+        Initialize the wrapper.
+
+        Args:
+            kv (Kv): The store to instrument
+            metrics (MetricsRegistry): Where the measurements are recorded
+        """
+        self.kv = kv
+        self.operation_seconds = metrics.histogram(
+            "kv_operation_seconds", "Latency of key-value store calls", ["op"]
+        )
+        self.keys_total = metrics.counter(
+            "kv_keys_total", "Keys read, written or deleted", ["op"]
+        )
+
+    def __getattr__(self, name):
+        # Implementation-specific extras, e.g. stats or close
+        return getattr(self.kv, name)
+
+    async def get(self, key: str) -> Optional[Any]:
+        self.keys_total.inc(op="get")
+        with self.operation_seconds.time(op="get"):
+            return await self.kv.get(key)
+
+    async def put(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        self.keys_total.inc(op="put")
+        with self.operation_seconds.time(op="put"):
+            return await self.kv.put(key, value, ttl=ttl)
+
+    async def zap(self, key: str) -> bool:
+        self.keys_total.inc(op="zap")
+        with self.operation_seconds.time(op="zap"):
+            return await self.kv.zap(key)
+
+    async def transaction(
+        self, fn: Callable[[KvTransaction], T], read_only: bool = False
+    ) -> T:
+        with self.operation_seconds.time(op="transaction"):
+            return await self.kv.transaction(fn, read_only=read_only)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        self.keys_total.inc(len(keys), op="get_many")
+        with self.operation_seconds.time(op="get_many"):
+            return await self.kv.get_many(keys)
+
+    async def put_many(
+        self, items: Dict[str, Any], ttl: Optional[float] = None
+    ) -> bool:
+        self.keys_total.inc(len(items), op="put_many")
+        with self.operation_seconds.time(op="put_many"):
+            return await self.kv.put_many(items, ttl=ttl)
+
+    async def zap_many(self, keys: Iterable[str]) -> int:
+        keys = list(keys)
+        self.keys_total.inc(len(keys), op="zap_many")
+        with self.operation_seconds.time(op="zap_many"):
+            return await self.kv.zap_many(keys)
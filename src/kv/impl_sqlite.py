@@ -0,0 +1,321 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from src.kv.inter import Kv, KvTransaction, T
+
+# Expired rows stay until the next sweep, so every read and delete skips them
+_LIVE = "(expires_at IS NULL OR expires_at > ?)"
+_GET = f"SELECT value FROM kv WHERE key = ? AND {_LIVE}"
+_PUT = (
+    "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET "
+    "value = excluded.value, expires_at = excluded.expires_at"
+)
+_ZAP = f"DELETE FROM kv WHERE key = ? AND {_LIVE}"
+_SWEEP = "DELETE FROM kv WHERE expires_at <= ?"
+# Placeholders per bulk read; below SQLite's default host parameter limit
+_GET_MANY_CHUNK = 500
+
+
+class _SqliteTransaction(KvTransaction):
+    """Statements on a connection inside BEGIN IMMEDIATE, committed by SqliteKv."""
+
+    def __init__(self, kv: "SqliteKv", connection: sqlite3.Connection, now: float):
+        self.kv = kv
+        self.connection = connection
+        self.now = now
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self.connection.execute(_GET, (key, self.now)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.connection.execute(
+            _PUT,
+            (
+                key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self.kv._expires_at(ttl, self.now),
+            ),
+        )
+
+    def zap(self, key: str) -> bool:
+        return self.connection.execute(_ZAP, (key, self.now)).rowcount > 0
+
+
+class SqliteKv(Kv):
+    """
+    Persistent implementation of the Kv interface on a SQLite database file.
+    Several processes opening the same file share one store, e.g. uvicorn workers.
+    Values are pickled, so anything DictKv can hold round-trips unchanged.
+    """
+
+    def __init__(
+        self,
+        path: str = "kv.sqlite3",
+        max_workers: int = 4,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Open the database, creating it if it does not exist.
+
+        Args:
+            path (str): Path of the database file
+            max_workers (int): Threads the blocking SQLite calls run on
+            sweep_interval (float): Seconds between writes that also delete expired rows
+            clock (Callable[[], float]): Wall clock, in seconds; shared by every process
+                                         using the file, so not a monotonic one
+        """
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._next_sweep_at = clock() + sweep_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sqlite-kv"
+        )
+
+        connection = self._connection()
+        # WAL lets readers in any process run alongside the single writer
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS kv "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL) "
+                "WITHOUT ROWID"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at) "
+                "WHERE expires_at IS NOT NULL"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Statements are compiled once per connection and reused from its cache
+            connection = sqlite3.connect(
+                self.path, timeout=30.0, cached_statements=64, check_same_thread=False
+            )
+            # Durable at each WAL checkpoint rather than each commit
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _expires_at(self, ttl: Optional[float], now: float) -> Optional[float]:
+        return None if ttl is None else now + ttl
+
+    def _maybe_sweep(self, connection: sqlite3.Connection, now: float):
+        """Delete expired rows inside the caller's transaction, at most once per interval."""
+        if now < self._next_sweep_at:
+            return
+        self._next_sweep_at = now + self.sweep_interval
+        connection.execute(_SWEEP, (now,))
+
+    def _get(self, key: str) -> Optional[Any]:
+        row = self._connection().execute(_GET, (key, self.clock())).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def _put(self, key: str, value: Any, ttl: Optional[float]) -> bool:
+        connection = self._connection()
+        now = self.clock()
+        with connection:
+            self._maybe_sweep(connection, now)
+            connection.execute(
+                _PUT,
+                (
+                    key,
+                    pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                    self._expires_at(ttl, now),
+                ),
+            )
+        return True
+
+    def _zap(self, key: str) -> bool:
+        connection = self._connection()
+        with connection:
+            return connection.execute(_ZAP, (key, self.clock())).rowcount > 0
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Any]:
+        connection = self._connection()
+        now = self.clock()
+        values = {}
+        for start in range(0, len(keys), _GET_MANY_CHUNK):
+            chunk = keys[start : start + _GET_MANY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, value FROM kv WHERE key IN ({placeholders}) AND {_LIVE}",
+                chunk + [now],
+            )
+            for key, value in rows:
+                values[key] = pickle.loads(value)
+        return values
+
+    def _put_many(self, items: Dict[str, Any], ttl: Optional[float]) -> bool:
+        connection = self._connection()
+        now = self.clock()
+        expires_at = self._expires_at(ttl, now)
+        with connection:
+            self._maybe_sweep(connection, now)
+            connection.executemany(
+                _PUT,
+                (
+                    (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at)
+                    for key, value in items.items()
+                ),
+            )
+        return True
+
+    def _zap_many(self, keys: List[str]) -> int:
+        connection = self._connection()
+        now = self.clock()
+        with connection:
+            return connection.executemany(_ZAP, ((key, now) for key in keys)).rowcount
+
+    def _transaction(self, fn: Callable[[KvTransaction], T], read_only: bool) -> T:
+        connection = self._connection()
+        now = self.clock()
+        if read_only:
+            # Reads from one WAL snapshot, alongside any writer
+            connection.execute("BEGIN")
+        else:
+            # Takes the write lock up front, so the reads cannot go stale before the writes
+            connection.execute("BEGIN IMMEDIATE")
+        try:
+            if not read_only:
+                self._maybe_sweep(connection, now)
+            result = fn(_SqliteTransaction(self, connection, now))
+        except BaseException:
+            connection.rollback()
+            raise
+        connection.commit()
+        return result
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Retrieve a value by its key.
+
+        Args:
+            key (str): The key to retrieve the value for
+
+        Returns:
+            Optional[Any]: The value if found, None otherwise
+        """
+        return await self._run(self._get, key)
+
+    async def put(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        Store a key-value pair.
+
+        Args:
+            key (str): The key to store
+            value (Any): The value to store
+            ttl (Optional[float]): Seconds until the pair expires, None to keep it
+
+        Returns:
+            bool: True if storage was successful, False otherwise
+        """
+        try:
+            return await self._run(self._put, key, value, ttl)
+        except (sqlite3.Error, pickle.PicklingError, TypeError, AttributeError):
+            return False
+
+    async def zap(self, key: str) -> bool:
+        """
+        Delete a key-value pair by its key.
+
+        Args:
+            key (str): The key to delete
+
+        Returns:
+            bool: True if deletion was successful, False otherwise
+        """
+        return await self._run(self._zap, key)
+
+    async def transaction(
+        self, fn: Callable[[KvTransaction], T], read_only: bool = False
+    ) -> T:
+        """
+        Read, change and write several pairs in one transaction holding the database's
+        write lock, so writers in other processes wait rather than interleave.
+
+        Args:
+            fn (Callable[[KvTransaction], T]): Makes the reads and writes; runs on one of
+                                               the store's threads. If it raises, the
+                                               transaction is rolled back.
+            read_only (bool): Whether fn only reads, which then see one snapshot
+                              without taking the write lock
+
+        Returns:
+            T: What fn returned
+        """
+        return await self._run(self._transaction, fn, read_only)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Retrieve the values of several keys in one query per 500 keys.
+
+        Args:
+            keys (Iterable[str]): The keys to retrieve the values for
+
+        Returns:
+            Dict[str, Any]: The found keys and their values; missing keys are left out
+        """
+        return await self._run(self._get_many, list(keys))
+
+    async def put_many(
+        self, items: Dict[str, Any], ttl: Optional[float] = None
+    ) -> bool:
+        """
+        Store several key-value pairs in one transaction.
+
+        Args:
+            items (Dict[str, Any]): The keys and values to store
+            ttl (Optional[float]): Seconds until the pairs expire, None to keep them
+
+        Returns:
+            bool: True if every pair was stored, False if none were
+        """
+        try:
+            return await self._run(self._put_many, dict(items), ttl)
+        except (sqlite3.Error, pickle.PicklingError, TypeError, AttributeError):
+            return False
+
+    async def zap_many(self, keys: Iterable[str]) -> int:
+        """
+        Delete several key-value pairs in one transaction.
+
+        Args:
+            keys (Iterable[str]): The keys to delete
+
+        Returns:
+            int: Number of keys that existed and were deleted
+        """
+        return await self._run(self._zap_many, list(keys))
+
+    def close(self):
+        """Wait for pending calls and close every connection."""
+        self._executor.shutdown(wait=True)
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
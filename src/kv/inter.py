@@ -1,11 +1,33 @@
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class KvTransaction(ABC):
+    """
+    Reads and writes of one `Kv.transaction`. Reads see the transaction's own writes,
+    and the writes are applied together or not at all.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+    @abstractmethod
+    def zap(self, key: str) -> bool:
+        pass
 
 
 class Kv(ABC):
     """
     Interface for key-value database operations.
-    Provides methods for retrieving, storing, and deleting key-value pairs.
+    Provides methods for retrieving, storing, and deleting key-value pairs,
+    one at a time or in bulk.
     """
 
     @abstractmethod
@@ -22,13 +44,14 @@ class Kv(ABC):
         pass
 
     @abstractmethod
-    async def put(self, key: str, value: Any) -> bool:
+    async def put(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
         """
         Store a key-value pair.
 
         Args:
             key (str): The key to store
             value (Any): The value to store
+            ttl (Optional[float]): Seconds until the pair expires, None to keep it
 
         Returns:
             bool: True if storage was successful, False otherwise
@@ -47,3 +70,77 @@ class Kv(ABC):
             bool: True if deletion was successful, False otherwise
         """
         pass
+
+    @abstractmethod
+    async def transaction(
+        self, fn: Callable[[KvTransaction], T], read_only: bool = False
+    ) -> T:
+        """
+        Read, change and write several pairs atomically, so that no other user of the
+        store, in this process or another sharing it, interleaves with the change.
+
+        Args:
+            fn (Callable[[KvTransaction], T]): Makes the reads and writes; synchronous,
+                                               and may run on another thread. If it
+                                               raises, nothing is written.
+            read_only (bool): Whether fn only reads, which then see one consistent
+                              state without keeping writers waiting
+
+        Returns:
+            T: What fn returned
+        """
+        pass
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Retrieve the values of several keys.
+        Implementations that can should read them in a single round trip.
+
+        Args:
+            keys (Iterable[str]): The keys to retrieve the values for
+
+        Returns:
+            Dict[str, Any]: The found keys and their values; missing keys are left out
+        """
+        values = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    async def put_many(
+        self, items: Dict[str, Any], ttl: Optional[float] = None
+    ) -> bool:
+        """
+        Store several key-value pairs.
+        Implementations that can should store them in a single transaction.
+
+        Args:
+            items (Dict[str, Any]): The keys and values to store
+            ttl (Optional[float]): Seconds until the pairs expire, None to keep them
+
+        Returns:
+            bool: True if every pair was stored, False otherwise
+        """
+        stored = True
+        for key, value in items.items():
+            stored = await self.put(key, value, ttl=ttl) and stored
+        return stored
+
+    async def zap_many(self, keys: Iterable[str]) -> int:
+        """
+        Delete several key-value pairs.
+        Implementations that can should delete them in a single transaction.
+
+        Args:
+            keys (Iterable[str]): The keys to delete
+
+        Returns:
+            int: Number of keys that existed and were deleted
+        """
+        deleted = 0
+        for key in keys:
+            if await self.zap(key):
+                deleted += 1
+        return deleted
@@ -1,17 +1,40 @@
-from kv.factory import KvFactory
+import asyncio
+import pytest
+from src.kv.factory import KvFactory
 
+pytestmark = [pytest.mark.anyio, pytest.mark.parametrize("impl", ["dict", "sqlite"])]
+
+
+class FakeClock:
+    """Clock the tests move forward by hand instead of sleeping"""
 
-class Fixture:
     def __init__(self):
-        self.kv = KvFactory.create("dict")
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class Fixture:
+    def __init__(self, impl: str, tmp_path, **kwargs):
+        self.clock = FakeClock()
+        if impl == "sqlite":
+            kwargs["path"] = str(tmp_path / "kv.sqlite3")
+        self.kv = KvFactory.create(impl, clock=self.clock, **kwargs)
 
         self.test_key = "test_key"
         self.test_value = "test_value"
+        self.test_items = {
+            f"key_{i}": {"index": i, "tags": ["a", "b"]} for i in range(10)
+        }
 
 
-async def test_put_get(self):
+async def test_put_get(impl, tmp_path):
     """Test basic put and get operations"""
-    f = Fixture()
+    f = Fixture(impl, tmp_path)
     # Test putting a value
     success = await f.kv.put(f.test_key, f.test_value)
     assert success is True
@@ -21,16 +44,16 @@ async def test_put_get(self):
     assert value == f.test_value
 
 
-async def test_get_nonexistent(self):
+async def test_get_nonexistent(impl, tmp_path):
     """Test getting a nonexistent key returns None"""
-    f = Fixture()
+    f = Fixture(impl, tmp_path)
     value = await f.kv.get("nonexistent_key")
     assert value is None
 
 
-async def test_zap(self):
+async def test_zap(impl, tmp_path):
     """Test zap operation"""
-    f = Fixture()
+    f = Fixture(impl, tmp_path)
     # First put a value
     await f.kv.put(f.test_key, f.test_value)
 
@@ -43,16 +66,16 @@ async def test_zap(self):
     assert value is None
 
 
-async def test_zap_nonexistent(self):
+async def test_zap_nonexistent(impl, tmp_path):
     """Test zapping a nonexistent key returns False"""
-    f = Fixture()
+    f = Fixture(impl, tmp_path)
     success = await f.kv.zap("nonexistent_key")
     assert success is False
 
 
-async def test_put_update(self):
+async def test_put_update(impl, tmp_path):
     """Test updating an existing key"""
-    f = Fixture()
+    f = Fixture(impl, tmp_path)
     # Put initial value
     await f.kv.put(f.test_key, f.test_value)
 
@@ -64,3 +87,208 @@ async def test_put_update(self):
     # Verify update
     value = await f.kv.get(f.test_key)
     assert value == new_value
+
+
+async def test_put_many_get_many(impl, tmp_path):
+    """Test bulk put and get, leaving missing keys out"""
+    f = Fixture(impl, tmp_path)
+    success = await f.kv.put_many(f.test_items)
+    assert success is True
+
+    values = await f.kv.get_many(list(f.test_items) + ["nonexistent_key"])
+    assert values == f.test_items
+
+
+async def test_zap_many(impl, tmp_path):
+    """Test bulk zap counts only the keys that existed"""
+    f = Fixture(impl, tmp_path)
+    await f.kv.put_many(f.test_items)
+
+    deleted = await f.kv.zap_many(["key_0", "key_1", "nonexistent_key"])
+    assert deleted == 2
+
+    values = await f.kv.get_many(f.test_items)
+    assert set(values) == set(f.test_items) - {"key_0", "key_1"}
+
+
+async def test_get_many_empty(impl, tmp_path):
+    """Test bulk operations on no keys"""
+    f = Fixture(impl, tmp_path)
+    assert await f.kv.get_many([]) == {}
+    assert await f.kv.zap_many([]) == 0
+
+
+async def test_sqlite_shared_between_instances(impl, tmp_path):
+    """Test a SQLite store is visible to every instance opening the same file"""
+    if impl != "sqlite":
+        pytest.skip("Only persistent stores are shared")
+    first = Fixture(impl, tmp_path)
+    await first.kv.put(first.test_key, first.test_value)
+
+    second = Fixture(impl, tmp_path)
+    assert await second.kv.get(first.test_key) == first.test_value
+
+
+async def test_transaction(impl, tmp_path):
+    """Test a transaction sees its own writes and applies them together"""
+    f = Fixture(impl, tmp_path)
+    await f.kv.put("a", 1)
+
+    def move(transaction):
+        value = transaction.get("a")
+        transaction.put("b", value + 1)
+        assert transaction.zap("a")
+        assert transaction.get("a") is None
+        return transaction.get("b")
+
+    assert await f.kv.transaction(move) == 2
+    assert await f.kv.get_many(["a", "b"]) == {"b": 2}
+
+
+async def test_transaction_rolled_back(impl, tmp_path):
+    """Test nothing a failing transaction wrote is kept"""
+    f = Fixture(impl, tmp_path)
+    await f.kv.put("a", 1)
+
+    def fail(transaction):
+        transaction.put("a", 2)
+        transaction.put("b", 2)
+        raise RuntimeError("changed my mind")
+
+    with pytest.raises(RuntimeError):
+        await f.kv.transaction(fail)
+    assert await f.kv.get_many(["a", "b"]) == {"a": 1}
+
+
+async def test_concurrent_transactions(impl, tmp_path):
+    """Test read-modify-writes from stores sharing one file do not lose updates"""
+    f = Fixture(impl, tmp_path)
+    stores = [f.kv, Fixture(impl, tmp_path).kv if impl == "sqlite" else f.kv]
+
+    def increment(transaction):
+        transaction.put("count", (transaction.get("count") or 0) + 1)
+
+    await asyncio.gather(*(stores[i % 2].transaction(increment) for i in range(60)))
+    assert await f.kv.get("count") == 60
+
+
+async def test_ttl_expiry(impl, tmp_path):
+    """Test a pair put with a TTL is gone once the TTL has passed"""
+    f = Fixture(impl, tmp_path)
+    await f.kv.put(f.test_key, f.test_value, ttl=10)
+
+    f.clock.advance(9)
+    assert await f.kv.get(f.test_key) == f.test_value
+
+    f.clock.advance(1)
+    assert await f.kv.get(f.test_key) is None
+    assert await f.kv.zap(f.test_key) is False
+
+
+async def test_put_without_ttl_clears_expiry(impl, tmp_path):
+    """Test rewriting a pair without a TTL keeps it indefinitely"""
+    f = Fixture(impl, tmp_path)
+    await f.kv.put(f.test_key, f.test_value, ttl=10)
+    await f.kv.put(f.test_key, f.test_value)
+
+    f.clock.advance(3600)
+    assert await f.kv.get(f.test_key) == f.test_value
+
+
+async def test_put_many_ttl(impl, tmp_path):
+    """Test bulk puts with a TTL expire together"""
+    f = Fixture(impl, tmp_path)
+    await f.kv.put_many(f.test_items, ttl=10)
+    await f.kv.put("kept", 1)
+
+    f.clock.advance(10)
+    assert await f.kv.get_many(list(f.test_items) + ["kept"]) == {"kept": 1}
+
+
+async def test_sweep_removes_expired(impl, tmp_path):
+    """Test expired pairs are removed by the periodic sweep without being read"""
+    if impl != "dict":
+        pytest.skip("Only DictKv reports its size")
+    f = Fixture(impl, tmp_path, sweep_interval=60)
+    await f.kv.put_many(f.test_items, ttl=10)
+
+    f.clock.advance(60)
+    await f.kv.put(f.test_key, f.test_value)
+
+    stats = f.kv.stats()
+    assert stats["entries"] == 1
+    assert stats["expirations"] == len(f.test_items)
+
+
+async def test_lru_eviction_by_entries(impl, tmp_path):
+    """Test the least recently used pair is evicted beyond max_entries"""
+    if impl != "dict":
+        pytest.skip("Only DictKv is bounded")
+    f = Fixture(impl, tmp_path, max_entries=2)
+    await f.kv.put("a", 1)
+    await f.kv.put("b", 2)
+    # Reading "a" makes "b" the least recently used
+    await f.kv.get("a")
+    await f.kv.put("c", 3)
+
+    assert await f.kv.get_many(["a", "b", "c"]) == {"a": 1, "c": 3}
+    assert f.kv.stats()["evictions"] == 1
+
+
+async def test_lru_eviction_by_bytes(impl, tmp_path):
+    """Test pairs are evicted to stay within max_bytes, and oversized pairs are refused"""
+    if impl != "dict":
+        pytest.skip("Only DictKv is bounded")
+    f = Fixture(impl, tmp_path, max_bytes=4096)
+    for i in range(10):
+        assert await f.kv.put(f"key_{i}", "x" * 1000) is True
+
+    stats = f.kv.stats()
+    assert stats["bytes"] <= 4096
+    assert stats["evictions"] == 10 - stats["entries"]
+    assert await f.kv.get("key_9") is not None
+    assert await f.kv.put("too_big", "x" * 8192) is False
+
+
+async def test_bounded_transaction_is_all_or_nothing(impl, tmp_path):
+    """Test a transaction's writes are never evicted by each other or half applied"""
+    if impl != "dict":
+        pytest.skip("Only DictKv is bounded")
+    f = Fixture(impl, tmp_path, max_entries=3)
+    await f.kv.put("old", 0)
+
+    def write(keys):
+        def fn(transaction):
+            for key in keys:
+                transaction.put(key, key)
+
+        return fn
+
+    await f.kv.transaction(write(["a", "b", "c"]))
+    assert await f.kv.get_many(["old", "a", "b", "c"]) == {
+        "a": "a",
+        "b": "b",
+        "c": "c",
+    }
+
+    with pytest.raises(ValueError):
+        await f.kv.transaction(write(["d", "e", "f", "g"]))
+    assert await f.kv.get_many(["a", "b", "c", "d"]) == {
+        "a": "a",
+        "b": "b",
+        "c": "c",
+    }
+
+
+async def test_hit_miss_counters(impl, tmp_path):
+    """Test reads are counted as hits or misses"""
+    if impl != "dict":
+        pytest.skip("Only DictKv counts reads")
+    f = Fixture(impl, tmp_path)
+    await f.kv.put(f.test_key, f.test_value)
+    await f.kv.get(f.test_key)
+    await f.kv.get_many([f.test_key, "nonexistent_key"])
+
+    stats = f.kv.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
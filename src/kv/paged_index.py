@@ -0,0 +1,183 @@
+import bisect
+from typing import List, Optional
+from src.kv.inter import KvTransaction
+
+
+class PagedIndex:
+    """
+    Sorted set of string keys kept in a Kv store as a two-level B-tree-like structure:
+    a meta list of the first key of every page, and pages of at most page_size sorted keys.
+    Adding, removing and reading a page of keys touches the meta and one or two pages,
+    however many keys the index holds.
+    Every method works inside a `Kv.transaction`, so changes made by several processes
+    sharing the store never interleave, and can be made atomically with other writes.
+    """
+
+    def __init__(self, name: str, page_size: int = 512):
+        """
+        Initialize the index.
+
+        Args:
+            name (str): Prefix of the index's Kv keys
+            page_size (int): Most keys per page; a full page is split in two
+        """
+        if page_size < 2:
+            raise ValueError("Pages must hold at least 2 keys")
+        self.name = name
+        self.page_size = page_size
+
+    def _meta_key(self) -> str:
+        return f"{self.name}:meta"
+
+    def _page_key(self, page_id: int) -> str:
+        return f"{self.name}:page:{page_id}"
+
+    def _get_meta(self, transaction: KvTransaction) -> dict:
+        # {"next_id": int, "pages": [[page_id, first_key], ...]} ordered by first_key
+        meta = transaction.get(self._meta_key())
+        if meta is None:
+            return {"next_id": 0, "pages": []}
+        return {"next_id": meta["next_id"], "pages": [list(p) for p in meta["pages"]]}
+
+    def _get_page(self, transaction: KvTransaction, page_id: int) -> List[str]:
+        # Copied so changes are never made to a value the Kv still holds
+        return list(transaction.get(self._page_key(page_id)) or [])
+
+    def _page_index(self, meta: dict, key: str) -> int:
+        """Position in the meta of the page that holds, or would hold, the key."""
+        first_keys = [first_key for _, first_key in meta["pages"]]
+        return max(0, bisect.bisect_right(first_keys, key) - 1)
+
+    def add(self, transaction: KvTransaction, key: str) -> None:
+        """
+        Add a key; adding a key already in the index does nothing.
+
+        Args:
+            transaction (KvTransaction): Transaction of the store holding the index
+            key (str): The key to add
+        """
+        meta = self._get_meta(transaction)
+        if not meta["pages"]:
+            page_id = meta["next_id"]
+            meta["next_id"] += 1
+            meta["pages"].append([page_id, key])
+            transaction.put(self._meta_key(), meta)
+            transaction.put(self._page_key(page_id), [key])
+            return
+
+        index = self._page_index(meta, key)
+        page_id = meta["pages"][index][0]
+        page = self._get_page(transaction, page_id)
+        position = bisect.bisect_left(page, key)
+        if position < len(page) and page[position] == key:
+            return
+        page.insert(position, key)
+
+        meta_changed = position == 0
+        if meta_changed:
+            meta["pages"][index][1] = key
+        if len(page) > self.page_size:
+            # Keys mostly arrive in order, so keep the old page nearly full
+            split = self.page_size if position == len(page) - 1 else len(page) // 2
+            new_id = meta["next_id"]
+            meta["next_id"] += 1
+            meta["pages"].insert(index + 1, [new_id, page[split]])
+            transaction.put(self._page_key(new_id), page[split:])
+            page = page[:split]
+            meta_changed = True
+        transaction.put(self._page_key(page_id), page)
+        if meta_changed:
+            transaction.put(self._meta_key(), meta)
+
+    def remove(self, transaction: KvTransaction, key: str) -> bool:
+        """
+        Remove a key.
+
+        Args:
+            transaction (KvTransaction): Transaction of the store holding the index
+            key (str): The key to remove
+
+        Returns:
+            bool: True if the key was in the index, False otherwise
+        """
+        meta = self._get_meta(transaction)
+        if not meta["pages"]:
+            return False
+
+        index = self._page_index(meta, key)
+        page_id = meta["pages"][index][0]
+        page = self._get_page(transaction, page_id)
+        position = bisect.bisect_left(page, key)
+        if position == len(page) or page[position] != key:
+            return False
+        del page[position]
+
+        if not page:
+            del meta["pages"][index]
+            transaction.put(self._meta_key(), meta)
+            transaction.zap(self._page_key(page_id))
+            return True
+
+        transaction.put(self._page_key(page_id), page)
+        if position == 0:
+            meta["pages"][index][1] = page[0]
+            transaction.put(self._meta_key(), meta)
+        return True
+
+    def after(
+        self, transaction: KvTransaction, cursor: Optional[str], limit: int
+    ) -> List[str]:
+        """
+        Get the smallest keys above a cursor, smallest first.
+
+        Args:
+            transaction (KvTransaction): Transaction of the store holding the index
+            cursor (Optional[str]): Only keys strictly above it are returned; None for no bound
+            limit (int): Most keys returned
+
+        Returns:
+            List[str]: The keys, in ascending order
+        """
+        meta = self._get_meta(transaction)
+        if not meta["pages"] or limit <= 0:
+            return []
+
+        index = 0 if cursor is None else self._page_index(meta, cursor)
+        keys: List[str] = []
+        while index < len(meta["pages"]) and len(keys) < limit:
+            page = self._get_page(transaction, meta["pages"][index][0])
+            start = 0 if cursor is None else bisect.bisect_right(page, cursor)
+            keys.extend(page[start : start + limit - len(keys)])
+            index += 1
+        return keys
+
+    def before(
+        self, transaction: KvTransaction, cursor: Optional[str], limit: int
+    ) -> List[str]:
+        """
+        Get the greatest keys below a cursor, greatest first.
+
+        Args:
+            transaction (KvTransaction): Transaction of the store holding the index,
+                                         so the meta and pages are read consistently
+            cursor (Optional[str]): Only keys strictly below it are returned; None for no bound
+            limit (int): Most keys returned
+
+        Returns:
+            List[str]: The keys, in descending order
+        """
+        meta = self._get_meta(transaction)
+        if not meta["pages"] or limit <= 0:
+            return []
+
+        index = (
+            len(meta["pages"]) - 1 if cursor is None else self._page_index(meta, cursor)
+        )
+        keys: List[str] = []
+        while index >= 0 and len(keys) < limit:
+            page = self._get_page(transaction, meta["pages"][index][0])
+            end = len(page) if cursor is None else bisect.bisect_left(page, cursor)
+            start = max(0, end - (limit - len(keys)))
+            keys.extend(reversed(page[start:end]))
+            index -= 1
+        return keys
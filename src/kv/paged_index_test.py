@@ -0,0 +1,55 @@
+import pytest
+from src.kv.factory import KvFactory
+from src.kv.paged_index import PagedIndex
+
+pytestmark = [pytest.mark.anyio, pytest.mark.parametrize("impl", ["dict", "sqlite"])]
+
+
+class Fixture:
+    def __init__(self, impl: str, tmp_path):
+        kwargs = {"path": str(tmp_path / "kv.sqlite3")} if impl == "sqlite" else {}
+        self.kv = KvFactory.create(impl, **kwargs)
+        self.index = PagedIndex("test_index", page_size=3)
+        self.keys = [f"{i:03d}" for i in range(10)]
+
+    async def add(self, keys):
+        def add(transaction):
+            for key in keys:
+                self.index.add(transaction, key)
+
+        await self.kv.transaction(add)
+
+    async def read(self, method: str, cursor, limit: int):
+        return await self.kv.transaction(
+            lambda transaction: getattr(self.index, method)(transaction, cursor, limit),
+            read_only=True,
+        )
+
+
+async def test_walks_across_pages(impl, tmp_path):
+    """Test reading in both directions from a cursor spans pages"""
+    f = Fixture(impl, tmp_path)
+    await f.add(reversed(f.keys))
+
+    assert await f.read("after", None, 20) == f.keys
+    assert await f.read("after", "003", 4) == ["004", "005", "006", "007"]
+    assert await f.read("before", None, 20) == f.keys[::-1]
+    assert await f.read("before", "007", 4) == ["006", "005", "004", "003"]
+    assert await f.read("after", "009", 4) == []
+
+
+async def test_remove(impl, tmp_path):
+    """Test removed keys are no longer read and removing twice reports it"""
+    f = Fixture(impl, tmp_path)
+    await f.add(f.keys)
+
+    removed = await f.kv.transaction(
+        lambda transaction: [
+            f.index.remove(transaction, key) for key in ("000", "004", "004")
+        ]
+    )
+
+    assert removed == [True, True, False]
+    assert await f.read("after", None, 20) == [
+        key for key in f.keys if key not in ("000", "004")
+    ]
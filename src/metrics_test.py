@@ -0,0 +1,68 @@
+import pytest
+from src.metrics import MetricsRegistry
+
+
+class Fixture:
+    def __init__(self):
+        self.metrics = MetricsRegistry(namespace="test")
+
+
+def test_histogram_render():
+    """Test histograms render cumulative buckets, sum and count"""
+    f = Fixture()
+    histogram = f.metrics.histogram(
+        "latency_seconds", "Latency", ["op"], buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, op="get")
+
+    lines = f.metrics.render().splitlines()
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{op="get",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{op="get",le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{op="get",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_sum{op="get"} 6.05' in lines
+    assert 'test_latency_seconds_count{op="get"} 4' in lines
+
+
+def test_counter_and_gauge():
+    """Test counters add up and gauges move both ways"""
+    f = Fixture()
+    counter = f.metrics.counter("bytes_total", "Bytes")
+    counter.inc(10)
+    counter.inc(5)
+    gauge = f.metrics.gauge("depth", "Depth")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+
+    lines = f.metrics.render().splitlines()
+    assert "test_bytes_total 15" in lines
+    assert "test_depth 1" in lines
+
+
+def test_histogram_time_records_failures():
+    """Test a timed block is observed even when it raises"""
+    f = Fixture()
+    histogram = f.metrics.histogram("span_seconds", "Span")
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError("failed")
+    assert histogram.count() == 1
+
+
+def test_registry_reuses_metrics():
+    """Test asking for a metric twice returns the same one, and clashing types fail"""
+    f = Fixture()
+    assert f.metrics.counter("requests", "Requests") is f.metrics.counter(
+        "requests", "Requests"
+    )
+    with pytest.raises(ValueError):
+        f.metrics.gauge("requests", "Requests")
+
+
+def test_label_values_escaped():
+    """Test label values cannot break the exposition format"""
+    f = Fixture()
+    f.metrics.counter("errors_total", "Errors", ["reason"]).inc(reason='bad "quote"\n')
+    assert 'test_errors_total{reason="bad \\"quote\\"\\n"} 1' in f.metrics.render()
@@ -1,6 +1,7 @@
 from typing import Dict, Type, Literal, Union
 from src.object_storage.inter import ObjectStorage
 from src.object_storage.impl_local import LocalObjectStorage
+from src.object_storage.impl_s3 import S3ObjectStorage
 
 
 class ObjectStorageFactory:
@@ -10,17 +11,18 @@ class ObjectStorageFactory:
 
     _storage_types: Dict[str, Type[ObjectStorage]] = {
         "local": LocalObjectStorage,
+        "s3": S3ObjectStorage,
     }
 
     @classmethod
-    def create(cls, impl: Literal["local"], **kwargs) -> ObjectStorage:
+    def create(cls, impl: Literal["local", "s3"], **kwargs) -> ObjectStorage:
         """
         Create an instance of the specified object storage.
 
         Args:
-            storage_type (Literal["local"]): The type of storage to create
+            storage_type (Literal["local", "s3"]): The type of storage to create
             **kwargs: Arguments to pass to the storage constructor
-                      (e.g., base_dir for LocalObjectStorage)
+                      (e.g., base_dir for LocalObjectStorage, bucket for S3ObjectStorage)
 
         Returns:
             ObjectStorage: An instance of the requested storage
@@ -35,3 +37,13 @@ class ObjectStorageFactory:
             )
 
         return cls._storage_types[impl](**kwargs)
+
+    @classmethod
+    def get_available_implementations(cls) -> list[str]:
+        """
+        Get a list of available ObjectStorage implementations.
+
+        Returns:
+            list[str]: A list of names of available implementations
+        """
+        return list(cls._storage_types.keys())
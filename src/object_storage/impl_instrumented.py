@@ -0,0 +1,173 @@
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, BinaryIO, Iterator, Optional, Union
+from src.metrics import MetricsRegistry
+from src.object_storage.inter import ObjectStorage
+
+
+def _position(data) -> Optional[int]:
+    try:
+        return data.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class _Transfer:
+    """Measures the bytes of one upload or download, whatever form the data takes."""
+
+    def __init__(self, data):
+        self.data = data
+        self.start = _position(data) if data is not None else None
+
+    def size(self, result=None) -> Optional[int]:
+        if isinstance(result, (bytes, bytearray, memoryview)):
+            return len(result)
+        if isinstance(self.data, (bytes, bytearray, memoryview)):
+            return len(self.data)
+        if isinstance(self.data, str):
+            try:
+                return os.path.getsize(self.data)
+            except OSError:
+                return None
+        end = _position(self.data)
+        if self.start is not None and end is not None:
+            return end - self.start
+        return None
+
+
+class InstrumentedObjectStorage(ObjectStorage):
+    """
+    ObjectStorage wrapper recording the latency of every operation and the bytes moved.
+    Local-path access is passed straight through, so zero-copy reads stay zero-copy.
+    """
+
+    def __init__(self, storage: ObjectStorage, metrics: MetricsRegistry):
+        """
+        Initialize the wrapper.
+
+        Args:
+            storage (ObjectStorage): The storage to instrument
+            metrics (MetricsRegistry): Where the measurements are recorded
+        """
+        self.storage = storage
+        self.operation_seconds = metrics.histogram(
+            "storage_operation_seconds",
+            "Latency of object storage operations",
+            ["op"],
+        )
+        self.bytes_total = metrics.counter(
+            "storage_bytes_total",
+            "Bytes uploaded to and downloaded from object storage",
+            ["op"],
+        )
+
+    def __getattr__(self, name):
+        # Implementation-specific extras, e.g. base_dir
+        return getattr(self.storage, name)
+
+    def _count(self, op: str, size: Optional[int]):
+        if size is not None:
+            self.bytes_total.inc(size, op=op)
+
+    def upload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        transfer = _Transfer(data)
+        with self.operation_seconds.time(op="upload"):
+            result = self.storage.upload(object_name, data, content_type, metadata)
+        self._count("upload", transfer.size())
+        return result
+
+    def download(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        transfer = _Transfer(destination)
+        with self.operation_seconds.time(op="download"):
+            result = self.storage.download(object_name, destination)
+        self._count("download", transfer.size(result))
+        return result
+
+    def delete(self, object_name: str) -> bool:
+        with self.operation_seconds.time(op="delete"):
+            return self.storage.delete(object_name)
+
+    def exists(self, object_name: str) -> bool:
+        with self.operation_seconds.time(op="exists"):
+            return self.storage.exists(object_name)
+
+    def rename(self, source_object_name: str, destination_object_name: str) -> str:
+        with self.operation_seconds.time(op="rename"):
+            return self.storage.rename(source_object_name, destination_object_name)
+
+    def get_url(self, object_name: str, expires: Optional[int] = None) -> str:
+        return self.storage.get_url(object_name, expires)
+
+    async def aupload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        transfer = _Transfer(data)
+        with self.operation_seconds.time(op="upload"):
+            result = await self.storage.aupload(
+                object_name, data, content_type, metadata
+            )
+        self._count("upload", transfer.size())
+        return result
+
+    async def adownload(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        transfer = _Transfer(destination)
+        with self.operation_seconds.time(op="download"):
+            result = await self.storage.adownload(object_name, destination)
+        self._count("download", transfer.size(result))
+        return result
+
+    async def adelete(self, object_name: str) -> bool:
+        with self.operation_seconds.time(op="delete"):
+            return await self.storage.adelete(object_name)
+
+    async def aexists(self, object_name: str) -> bool:
+        with self.operation_seconds.time(op="exists"):
+            return await self.storage.aexists(object_name)
+
+    async def arename(
+        self, source_object_name: str, destination_object_name: str
+    ) -> str:
+        with self.operation_seconds.time(op="rename"):
+            return await self.storage.arename(
+                source_object_name, destination_object_name
+            )
+
+    # Only getting the path is timed; that is where a remote object is fetched
+    @contextmanager
+    def local_path(self, object_name: str) -> Iterator[str]:
+        started = time.perf_counter()
+        with self.storage.local_path(object_name) as path:
+            self.operation_seconds.observe(
+                time.perf_counter() - started, op="local_path"
+            )
+            yield path
+
+    @asynccontextmanager
+    async def alocal_path(self, object_name: str) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        async with self.storage.alocal_path(object_name) as path:
+            self.operation_seconds.observe(
+                time.perf_counter() - started, op="local_path"
+            )
+            yield path
+
+    def open_local(self, object_name: str):
+        return self.storage.open_local(object_name)
+
+    def mmap_local(self, object_name: str):
+        return self.storage.mmap_local(object_name)
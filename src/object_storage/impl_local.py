@@ -1,25 +1,91 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import io
 import logging
+import mimetypes
 import os
+import re
 import shutil
-from typing import BinaryIO, Optional, Union
-from fastapi import FastAPI, HTTPException, APIRouter
-from fastapi.responses import FileResponse
+import stat
+import tempfile
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate
+from typing import AsyncIterator, BinaryIO, Iterator, List, Optional, Union
+from fastapi import FastAPI, HTTPException, APIRouter, Request
+from fastapi.responses import FileResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
 from src.object_storage.inter import ObjectStorage
+from src.object_storage.metadata_index import MetadataIndex, ObjectInfo
+
+# Stored objects can be overwritten, so clients revalidate with the ETag before reuse
+SERVE_CACHE_CONTROL = "no-cache"
+# Read size when the server streams the file itself instead of using sendfile
+SERVE_CHUNK_SIZE = 1024 * 1024
+# Read size when writing an object, which is hashed as it is copied
+COPY_CHUNK_SIZE = 1024 * 1024
+# Database file of the metadata index, in the base directory
+INDEX_FILE_NAME = "index.sqlite3"
+# Index property set once objects are stored by the digest of their names
+_LAYOUT_PROPERTY = "layout"
+_SHARDED_LAYOUT = "sharded"
+
+# Directories of the sharded layout: two hex digits of the object name's digest
+_SHARD = re.compile(r"^[0-9a-f]{2}$")
+# Extensions kept on stored files; anything else is dropped from the path
+_EXTENSION = re.compile(r"^\.[A-Za-z0-9]{1,16}$")
+
+# Shared by every LocalObjectStorage that is not given its own executor,
+# so file I/O never runs on the event loop or competes with the default executor
+_io_executor = ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix="local-object-storage-io"
+)
+
+
+def _is_not_modified(
+    request_headers: Headers, response_headers: MutableHeaders
+) -> bool:
+    """Whether a conditional GET can be answered with 304 Not Modified."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        etag = response_headers["etag"]
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since is not None:
+        since = parsedate(if_modified_since)
+        last_modified = parsedate(response_headers["last-modified"])
+        return (
+            since is not None and last_modified is not None and since >= last_modified
+        )
+
+    return False
 
 
 class LocalObjectStorage(ObjectStorage):
     """
     Local filesystem implementation of ObjectStorage interface.
     Stores objects as files in a specified base directory and serves them via FastAPI.
+    Files are spread over 65536 directories by the digest of the object name, and a
+    SQLite index in the base directory holds each object's size, content type,
+    checksum, modification time and metadata, so lookups never scan directories.
     """
 
-    def __init__(self, base_dir, base_url, router, logger):
+    def __init__(
+        self, base_dir, base_url, router, logger, io_executor: Optional[Executor] = None
+    ):
         """
         Initialize local storage with a base directory and FastAPI router.
 
         Args:
             base_dir (str): Base directory where objects will be stored
             router (APIRouter): FastAPI router to add routes to
+            io_executor (Optional[Executor]): Thread pool for the async methods,
+                                              defaults to a pool shared by all local storages
         """
 
         if not isinstance(base_dir, str):
@@ -40,30 +106,164 @@ class LocalObjectStorage(ObjectStorage):
         self.base_url = base_url
         self.router = router
         self.logger = logger
+        self.io_executor = io_executor or _io_executor
         os.makedirs(base_dir, exist_ok=True)
+        self._index = MetadataIndex(os.path.join(base_dir, INDEX_FILE_NAME))
+        self._migrate_flat_layout()
         self.logger.info(
             f"Initialized LocalObjectStorage with base directory: {base_dir}"
         )
 
         # Add route to serve files - use the correct path that matches the URL pattern
         @router.get("/local-object-storage/{file_path:path}")
-        async def serve_file(file_path: str):
-            logger.info(f"Serving file: {file_path}")
+        async def serve_file(file_path: str, request: Request):
+            logger.debug(f"Serving file: {file_path}")
+            info = await self._run_io(self._index.get, file_path)
             full_path = self._get_full_path(file_path)
-            logger.info(f"Full path: {full_path}")
-            if not os.path.exists(full_path):
-                logger.error(f"File not found: {full_path}")
+            # Stat the file itself, so the length sent matches what is read
+            stat_result = info and await self._run_io(self._stat_object, full_path)
+            if stat_result is None:
+                logger.error(f"File not found: {file_path}")
                 raise HTTPException(status_code=404, detail="File not found")
-            logger.info(f"File found: {full_path}")
-            return FileResponse(full_path)
+
+            # FileResponse answers Range/If-Range with 206 and sets ETag and
+            # Last-Modified; it hands the path to servers that can sendfile it
+            response = FileResponse(
+                full_path,
+                stat_result=stat_result,
+                media_type=info.content_type,
+                headers={"cache-control": SERVE_CACHE_CONTROL},
+            )
+            response.chunk_size = SERVE_CHUNK_SIZE
+
+            if _is_not_modified(request.headers, response.headers):
+                return Response(
+                    status_code=304,
+                    headers={
+                        name: response.headers[name]
+                        for name in ("etag", "last-modified", "cache-control")
+                    },
+                )
+            return response
+
+    def _stat_object(self, full_path: str) -> Optional[os.stat_result]:
+        """Stat a stored file, or None if it was removed since it was looked up."""
+        try:
+            stat_result = os.stat(full_path)
+        except FileNotFoundError:
+            return None
+        return stat_result if stat.S_ISREG(stat_result.st_mode) else None
 
     def _get_full_path(self, object_name: str) -> str:
-        """Get the full filesystem path for an object."""
-        full_path = os.path.join(self.base_dir, object_name)
-        self.logger.debug(f"Generated full path: {full_path} for object: {object_name}")
-        return full_path
+        """
+        Get the full filesystem path for an object: a file named by the digest of the
+        object name, two directory levels deep, keeping the name's extension so tools
+        that go by extension still recognize it.
+        """
+        digest = hashlib.sha256(object_name.encode()).hexdigest()
+        extension = os.path.splitext(object_name)[1]
+        if not _EXTENSION.match(extension):
+            extension = ""
+        return os.path.join(
+            self.base_dir, digest[:2], digest[2:4], f"{digest}{extension}"
+        )
 
-    def upload(
+    def _migrate_flat_layout(self):
+        """
+        Move objects stored under their names by earlier versions into the sharded
+        layout and index them. Their checksums are left unknown rather than
+        reading every file at startup. Runs once per directory.
+        """
+        if self._index.get_property(_LAYOUT_PROPERTY) == _SHARDED_LAYOUT:
+            return
+        migrated = 0
+        for entry in os.scandir(self.base_dir):
+            if entry.name.startswith(INDEX_FILE_NAME) or (
+                entry.is_dir() and _SHARD.match(entry.name)
+            ):
+                continue
+            if entry.is_file():
+                paths = [entry.path]
+            else:
+                paths = [
+                    os.path.join(dir_path, file_name)
+                    for dir_path, _, file_names in os.walk(entry.path)
+                    for file_name in file_names
+                ]
+            for path in paths:
+                object_name = os.path.relpath(path, self.base_dir).replace(os.sep, "/")
+                full_path = self._get_full_path(object_name)
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                try:
+                    os.replace(path, full_path)
+                except FileNotFoundError:
+                    # Another process sharing the directory migrated it first
+                    continue
+                stat_result = os.stat(full_path)
+                self._index.put(
+                    ObjectInfo(
+                        name=object_name,
+                        size=stat_result.st_size,
+                        mtime=stat_result.st_mtime,
+                        content_type=mimetypes.guess_type(object_name)[0],
+                    )
+                )
+                migrated += 1
+            if entry.is_dir():
+                for dir_path, _, _ in os.walk(entry.path, topdown=False):
+                    try:
+                        os.rmdir(dir_path)
+                    except OSError:
+                        pass
+        self._index.set_property(_LAYOUT_PROPERTY, _SHARDED_LAYOUT)
+        if migrated:
+            self.logger.info(f"Migrated {migrated} objects to the sharded layout")
+
+    def _write(self, full_path: str, data: Union[bytes, BinaryIO, str]) -> ObjectInfo:
+        """
+        Write data to a temporary file next to full_path and rename it into place,
+        so readers see either the old content or the new, never part of it.
+
+        Returns:
+            ObjectInfo: Size, checksum and modification time of what was written
+        """
+        if isinstance(data, bytes):
+            source = contextlib.nullcontext(io.BytesIO(data))
+        elif isinstance(data, str) and os.path.isfile(data):
+            source = open(data, "rb")
+        elif hasattr(data, "read"):
+            source = contextlib.nullcontext(data)
+        else:
+            self.logger.error(f"Invalid data type for upload: {type(data)}")
+            raise ValueError("Data must be bytes, file path, or file-like object")
+
+        shard_dir = os.path.dirname(full_path)
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=shard_dir, prefix=".", suffix=".tmp")
+        except FileNotFoundError:
+            # Shard directories are made on first use
+            os.makedirs(shard_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=shard_dir, prefix=".", suffix=".tmp")
+        try:
+            digest = hashlib.sha256()
+            with source as reader, os.fdopen(fd, "wb") as f:
+                while chunk := reader.read(COPY_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                stat_result = os.fstat(f.fileno())
+            os.replace(temp_path, full_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return ObjectInfo(
+            name="",
+            size=stat_result.st_size,
+            mtime=stat_result.st_mtime,
+            sha256=digest.hexdigest(),
+        )
+
+    def _upload(
         self,
         object_name: str,
         data: Union[bytes, BinaryIO, str],
@@ -76,8 +276,8 @@ class LocalObjectStorage(ObjectStorage):
         Args:
             object_name (str): Name/path for the object in storage
             data (Union[bytes, BinaryIO, str]): The data to upload, can be bytes, file-like object, or path to file
-            content_type (Optional[str]): MIME type of the object (ignored in local implementation)
-            metadata (Optional[dict]): Additional metadata for the object (ignored in local implementation)
+            content_type (Optional[str]): MIME type of the object, served with it
+            metadata (Optional[dict]): Additional metadata for the object, kept in the index
 
         Returns:
             str: Path to the uploaded file
@@ -85,29 +285,16 @@ class LocalObjectStorage(ObjectStorage):
         self.logger.info(f"Uploading object: {object_name}")
         full_path = self._get_full_path(object_name)
 
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        self.logger.debug(f"Created directory structure for: {full_path}")
-
-        if isinstance(data, bytes):
-            self.logger.debug(f"Uploading bytes data to {full_path}")
-            with open(full_path, "wb") as f:
-                f.write(data)
-        elif isinstance(data, str) and os.path.isfile(data):
-            self.logger.debug(f"Copying file from {data} to {full_path}")
-            shutil.copy2(data, full_path)
-        elif hasattr(data, "read"):
-            self.logger.debug(f"Uploading file-like object to {full_path}")
-            with open(full_path, "wb") as f:
-                shutil.copyfileobj(data, f)
-        else:
-            self.logger.error(f"Invalid data type for upload: {type(data)}")
-            raise ValueError("Data must be bytes, file path, or file-like object")
+        info = self._write(full_path, data)
+        info.name = object_name
+        info.content_type = content_type
+        info.metadata = {str(k): str(v) for k, v in (metadata or {}).items()}
+        self._index.put(info)
 
         self.logger.info(f"Successfully uploaded object: {object_name} to {full_path}")
         return full_path
 
-    def download(
+    def _download(
         self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
     ) -> Union[bytes, str]:
         """
@@ -125,8 +312,8 @@ class LocalObjectStorage(ObjectStorage):
         self.logger.info(f"Downloading object: {object_name}")
         full_path = self._get_full_path(object_name)
 
-        if not os.path.exists(full_path):
-            self.logger.error(f"Object not found: {object_name} at {full_path}")
+        if not self._index.contains(object_name):
+            self.logger.error(f"Object not found: {object_name}")
             raise FileNotFoundError(f"Object {object_name} does not exist")
 
         if destination is None:
@@ -152,9 +339,10 @@ class LocalObjectStorage(ObjectStorage):
             )
             return destination
 
-    def delete(self, object_name: str) -> bool:
+    def _delete(self, object_name: str) -> bool:
         """
-        Delete an object from local storage.
+        Delete an object from local storage. The file is removed before the index
+        entry, so a file that cannot be removed stays listed rather than orphaned.
 
         Args:
             object_name (str): Name/path of the object to delete
@@ -163,23 +351,25 @@ class LocalObjectStorage(ObjectStorage):
             bool: True if deletion was successful, False otherwise
         """
         self.logger.info(f"Deleting object: {object_name}")
-        full_path = self._get_full_path(object_name)
-
-        if not os.path.exists(full_path):
-            self.logger.warning(f"Cannot delete non-existent object: {object_name}")
-            return False
 
         try:
-            os.remove(full_path)
-            self.logger.info(f"Successfully deleted object: {object_name}")
-            return True
+            os.remove(self._get_full_path(object_name))
+            removed_file = True
+        except FileNotFoundError:
+            removed_file = False
         except Exception as e:
             self.logger.error(f"Failed to delete object {object_name}: {str(e)}")
             return False
 
-    def exists(self, object_name: str) -> bool:
+        if not self._index.delete(object_name) and not removed_file:
+            self.logger.warning(f"Cannot delete non-existent object: {object_name}")
+            return False
+        self.logger.info(f"Successfully deleted object: {object_name}")
+        return True
+
+    def _exists(self, object_name: str) -> bool:
         """
-        Check if an object exists in local storage.
+        Check if an object exists in local storage, from the index alone.
 
         Args:
             object_name (str): Name/path of the object to check
@@ -187,13 +377,165 @@ class LocalObjectStorage(ObjectStorage):
         Returns:
             bool: True if the object exists, False otherwise
         """
-        full_path = self._get_full_path(object_name)
-        exists = os.path.exists(full_path)
+        exists = self._index.contains(object_name)
         self.logger.debug(
             f"Checking if object exists: {object_name} - {'Found' if exists else 'Not found'}"
         )
         return exists
 
+    def _rename(self, source_object_name: str, destination_object_name: str) -> str:
+        """
+        Rename an object in local storage, keeping its content type and metadata.
+        The file is moved atomically; its index entry follows in one transaction.
+
+        Args:
+            source_object_name (str): Name/path of the object to rename
+            destination_object_name (str): New name/path for the object
+
+        Returns:
+            str: Path to the renamed file
+        """
+        self.logger.info(
+            f"Renaming object: {source_object_name} to {destination_object_name}"
+        )
+        source_path = self._get_full_path(source_object_name)
+        destination_path = self._get_full_path(destination_object_name)
+
+        if not self._index.contains(source_object_name):
+            self.logger.error(
+                f"Cannot rename non-existent object: {source_object_name}"
+            )
+            raise FileNotFoundError(f"Object {source_object_name} does not exist")
+
+        if source_path != destination_path:
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            os.replace(source_path, destination_path)
+            self._index.rename(source_object_name, destination_object_name)
+        return destination_path
+
+    def stat(self, object_name: str) -> Optional[ObjectInfo]:
+        """
+        Get an object's size, content type, checksum, modification time and metadata
+        from the index.
+
+        Args:
+            object_name (str): Name/path of the object
+
+        Returns:
+            Optional[ObjectInfo]: The object's entry, or None if it does not exist
+        """
+        return self._index.get(object_name)
+
+    def list_objects(
+        self, prefix: str = "", limit: Optional[int] = None
+    ) -> List[ObjectInfo]:
+        """
+        List objects from the index.
+
+        Args:
+            prefix (str): Only objects whose names start with this
+            limit (Optional[int]): Most objects to return
+
+        Returns:
+            List[ObjectInfo]: Matching objects, in name order
+        """
+        return self._index.list(prefix, limit)
+
+    def close(self):
+        """Close the index's connections."""
+        self._index.close()
+
+    def upload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        return self._upload(object_name, data, content_type, metadata)
+
+    def download(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        return self._download(object_name, destination)
+
+    def delete(self, object_name: str) -> bool:
+        return self._delete(object_name)
+
+    def exists(self, object_name: str) -> bool:
+        return self._exists(object_name)
+
+    def rename(self, source_object_name: str, destination_object_name: str) -> str:
+        return self._rename(source_object_name, destination_object_name)
+
+    async def _run_io(self, fn, *args):
+        """Run a blocking filesystem call on the I/O thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_executor, functools.partial(fn, *args)
+        )
+
+    async def aupload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        return await self._run_io(
+            self._upload, object_name, data, content_type, metadata
+        )
+
+    async def adownload(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        return await self._run_io(self._download, object_name, destination)
+
+    async def adelete(self, object_name: str) -> bool:
+        return await self._run_io(self._delete, object_name)
+
+    async def aexists(self, object_name: str) -> bool:
+        return await self._run_io(self._exists, object_name)
+
+    async def arename(
+        self, source_object_name: str, destination_object_name: str
+    ) -> str:
+        return await self._run_io(
+            self._rename, source_object_name, destination_object_name
+        )
+
+    async def astat(self, object_name: str) -> Optional[ObjectInfo]:
+        return await self._run_io(self.stat, object_name)
+
+    async def alist_objects(
+        self, prefix: str = "", limit: Optional[int] = None
+    ) -> List[ObjectInfo]:
+        return await self._run_io(self.list_objects, prefix, limit)
+
+    @contextmanager
+    def local_path(self, object_name: str) -> Iterator[str]:
+        """
+        Get the path of the object itself; no data is copied.
+
+        Args:
+            object_name (str): Name/path of the object
+
+        Yields:
+            str: Path to the stored object
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        if not self._index.contains(object_name):
+            raise FileNotFoundError(f"Object {object_name} does not exist")
+        yield self._get_full_path(object_name)
+
+    @asynccontextmanager
+    async def alocal_path(self, object_name: str) -> AsyncIterator[str]:
+        if not await self._run_io(self._index.contains, object_name):
+            raise FileNotFoundError(f"Object {object_name} does not exist")
+        yield self._get_full_path(object_name)
+
     def get_url(self, object_name: str, expires: Optional[int] = None) -> str:
         """
         Get a URL for accessing the object.
@@ -207,7 +549,6 @@ class LocalObjectStorage(ObjectStorage):
             str: URL for accessing the object
         """
 
-        full_path = self._get_full_path(object_name)
-        url = f"{self.base_url}{self.router.prefix}/local-object-storage/{full_path}"
+        url = f"{self.base_url}{self.router.prefix}/local-object-storage/{object_name}"
         self.logger.debug(f"Generated URL for object {object_name}: {url}")
         return url
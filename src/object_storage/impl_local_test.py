@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import os
+import pytest
+from fastapi import APIRouter
+from src.object_storage.impl_local import INDEX_FILE_NAME, LocalObjectStorage
+
+pytestmark = pytest.mark.anyio
+
+
+class Fixture:
+    def __init__(self, tmp_path):
+        self.base_dir = str(tmp_path / "storage")
+        self.storage = self.open()
+        self.data = os.urandom(64 * 1024 + 3)
+
+    def open(self) -> LocalObjectStorage:
+        return LocalObjectStorage(
+            self.base_dir,
+            "http://testserver",
+            APIRouter(),
+            logging.getLogger(__name__),
+        )
+
+    def sharded_path(self, object_name: str, extension: str = "") -> str:
+        digest = hashlib.sha256(object_name.encode()).hexdigest()
+        return os.path.join(
+            self.base_dir, digest[:2], digest[2:4], f"{digest}{extension}"
+        )
+
+
+async def test_metadata_round_trip(tmp_path):
+    """Test content type, metadata, size and checksum are indexed and follow renames"""
+    f = Fixture(tmp_path)
+    await f.storage.aupload(
+        "incoming/upload", f.data, content_type="audio/wav", metadata={"take": 3}
+    )
+
+    info = await f.storage.astat("incoming/upload")
+    assert info.size == len(f.data)
+    assert info.sha256 == hashlib.sha256(f.data).hexdigest()
+    assert info.content_type == "audio/wav"
+    assert info.metadata == {"take": "3"}
+
+    await f.storage.arename("incoming/upload", "demos/upload.wav")
+    assert await f.storage.astat("incoming/upload") is None
+    renamed = await f.storage.astat("demos/upload.wav")
+    assert renamed.name == "demos/upload.wav"
+    assert (renamed.size, renamed.sha256) == (info.size, info.sha256)
+    assert renamed.metadata == info.metadata
+
+    assert await f.storage.adelete("demos/upload.wav")
+    assert await f.storage.astat("demos/upload.wav") is None
+
+
+async def test_sharded_layout(tmp_path):
+    """Test files are stored by the digest of their name, keeping the extension"""
+    f = Fixture(tmp_path)
+    path = f.storage.upload("demos/some name.wav", f.data)
+
+    assert path == f.sharded_path("demos/some name.wav", ".wav")
+    with open(path, "rb") as file:
+        assert file.read() == f.data
+    assert not os.path.exists(os.path.join(f.base_dir, "demos"))
+
+    # Extensions that are not plain file extensions stay out of the path
+    assert f.storage.upload("demos/odd.w a/v", b"x") == f.sharded_path(
+        "demos/odd.w a/v"
+    )
+
+
+async def test_list_objects(tmp_path):
+    """Test listing by prefix, in name order, with a limit"""
+    f = Fixture(tmp_path)
+    for name in ["demos/b.wav", "demos/a.wav", "demosaic.png", "stems/a/vocals.mp3"]:
+        await f.storage.aupload(name, name.encode())
+
+    listed = await f.storage.alist_objects("demos/")
+    assert [info.name for info in listed] == ["demos/a.wav", "demos/b.wav"]
+    assert [info.size for info in listed] == [len("demos/a.wav"), len("demos/b.wav")]
+
+    assert [info.name for info in f.storage.list_objects("demos", limit=2)] == [
+        "demos/a.wav",
+        "demos/b.wav",
+    ]
+    assert len(f.storage.list_objects()) == 4
+    assert f.storage.list_objects("nothing/") == []
+
+
+async def test_failed_upload_keeps_previous_content(tmp_path):
+    """Test an upload that fails part way leaves the stored object and directory as they were"""
+    f = Fixture(tmp_path)
+    await f.storage.aupload("demos/a.wav", f.data)
+
+    class Failing:
+        def __init__(self):
+            self.reads = 0
+
+        def read(self, size):
+            self.reads += 1
+            if self.reads > 1:
+                raise IOError("client went away")
+            return b"partial"
+
+    with pytest.raises(IOError):
+        await f.storage.aupload("demos/a.wav", Failing())
+
+    assert await f.storage.adownload("demos/a.wav") == f.data
+    assert (await f.storage.astat("demos/a.wav")).size == len(f.data)
+    # No temporary file is left behind
+    path = f.sharded_path("demos/a.wav", ".wav")
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+
+async def test_index_is_shared(tmp_path):
+    """Test storages opened on the same directory see each other's objects"""
+    f = Fixture(tmp_path)
+    other = f.open()
+
+    await f.storage.aupload("demos/a.wav", f.data, content_type="audio/wav")
+    assert await other.aexists("demos/a.wav")
+    assert (await other.astat("demos/a.wav")).content_type == "audio/wav"
+
+    await other.adelete("demos/a.wav")
+    assert not await f.storage.aexists("demos/a.wav")
+    other.close()
+    f.storage.close()
+
+
+async def test_flat_layout_is_migrated(tmp_path):
+    """Test objects stored under their names by earlier versions are moved and indexed"""
+    base_dir = tmp_path / "storage"
+    (base_dir / "demos").mkdir(parents=True)
+    (base_dir / "stems" / "abc").mkdir(parents=True)
+    (base_dir / "demos" / "a.wav").write_bytes(b"demo")
+    (base_dir / "stems" / "abc" / "vocals.mp3").write_bytes(b"vocals")
+
+    f = Fixture(tmp_path)
+
+    assert await f.storage.adownload("demos/a.wav") == b"demo"
+    info = await f.storage.astat("stems/abc/vocals.mp3")
+    assert info.size == len(b"vocals")
+    assert info.content_type == "audio/mpeg"
+    assert [info.name for info in f.storage.list_objects()] == [
+        "demos/a.wav",
+        "stems/abc/vocals.mp3",
+    ]
+    assert not (base_dir / "demos").exists()
+    assert not (base_dir / "stems").exists()
+    assert any(name.startswith(INDEX_FILE_NAME) for name in os.listdir(base_dir))
+
+    # Opening again finds nothing left to migrate
+    assert len(f.open().list_objects()) == 2
+
+
+async def test_flat_layout_is_migrated_once(tmp_path):
+    """Test the directory is not walked again once it has been migrated"""
+    f = Fixture(tmp_path)
+    (tmp_path / "storage" / "demos").mkdir()
+    (tmp_path / "storage" / "demos" / "late.wav").write_bytes(b"demo")
+
+    assert f.open().list_objects() == []
+    assert (tmp_path / "storage" / "demos" / "late.wav").exists()
+
+
+async def test_failed_delete_keeps_object_listed(tmp_path, monkeypatch):
+    """Test a file that cannot be removed stays indexed rather than orphaned"""
+    f = Fixture(tmp_path)
+    await f.storage.aupload("demos/a.wav", f.data)
+
+    def fail(path):
+        raise PermissionError(path)
+
+    with monkeypatch.context() as patched:
+        patched.setattr(os, "remove", fail)
+        assert not await f.storage.adelete("demos/a.wav")
+    assert await f.storage.aexists("demos/a.wav")
+    assert await f.storage.adownload("demos/a.wav") == f.data
+
+    assert await f.storage.adelete("demos/a.wav")
+    assert not await f.storage.aexists("demos/a.wav")
+    assert not os.path.exists(f.sharded_path("demos/a.wav", ".wav"))
+    assert not await f.storage.adelete("demos/a.wav")
@@ -0,0 +1,576 @@
+import asyncio
+import functools
+import io
+import logging
+import os
+import time
+import urllib.parse
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterator, Optional, Set, Union
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src.object_storage import sigv4
+from src.object_storage.inter import ObjectStorage
+
+# Read size of streamed downloads
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Longest a presigned URL's signing time is rounded down by
+URL_SIGNING_STEP_SECONDS = 15 * 60
+# Attempts at one multipart part; parts are held in memory, so resending is safe
+PART_ATTEMPTS = 3
+
+# Shared by every S3ObjectStorage that is not given its own executor, so the async
+# methods never block the event loop or compete with the default executor
+_io_executor = ThreadPoolExecutor(
+    max_workers=16, thread_name_prefix="s3-object-storage-io"
+)
+
+
+def _local_name(tag: str) -> str:
+    """An XML tag without its namespace, which S3 and compatible servers differ on."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find_text(document: ElementTree.Element, name: str) -> Optional[str]:
+    for element in document.iter():
+        if _local_name(element.tag) == name:
+            return element.text
+    return None
+
+
+class S3ObjectStorage(ObjectStorage):
+    """
+    ObjectStorage on an S3-compatible service, such as AWS S3, MinIO or R2.
+    Requests go through one pooled HTTP session. Objects past multipart_threshold
+    are uploaded as parts in parallel, and downloaded to files as parallel ranges.
+    URLs are presigned, so the bucket can stay private.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str,
+        logger: logging.Logger,
+        region: str = "us-east-1",
+        access_key_id: str = "",
+        secret_access_key: str = "",
+        session_token: Optional[str] = None,
+        addressing_style: str = "path",
+        url_expires_seconds: int = 60 * 60,
+        multipart_threshold: int = 16 * 1024 * 1024,
+        multipart_part_size: int = 8 * 1024 * 1024,
+        max_concurrency: int = 8,
+        pool_size: int = 32,
+        timeout_seconds: float = 60.0,
+        io_executor: Optional[Executor] = None,
+    ):
+        """
+        Initialize the storage. No request is made until the first operation.
+
+        Args:
+            bucket (str): Bucket the objects are stored in; it must exist
+            endpoint_url (str): Service URL, e.g. https://s3.eu-west-1.amazonaws.com
+            logger (logging.Logger): Logger for storage operations
+            region (str): Region requests are signed for
+            access_key_id (str): Access key
+            secret_access_key (str): Secret of the access key
+            session_token (Optional[str]): Token of temporary credentials
+            addressing_style (str): "path" puts the bucket in the path, as MinIO and
+                                    most compatible services expect; "virtual" in
+                                    the host name, as AWS prefers
+            url_expires_seconds (int): Lifetime of URLs from `get_url` when the caller
+                                       gives none
+            multipart_threshold (int): Size from which uploads are split into parts
+                                       and downloads into ranges
+            multipart_part_size (int): Size of each part and range; S3 requires
+                                       at least 5 MiB for every part but the last
+            max_concurrency (int): Parts or ranges of one transfer in flight at once
+            pool_size (int): Connections kept open to the service
+            timeout_seconds (float): Connect and read timeout of each request
+            io_executor (Optional[Executor]): Thread pool for the async methods,
+                                              defaults to a pool shared by all S3 storages
+        """
+        if addressing_style not in ("path", "virtual"):
+            raise ValueError(f"Unsupported addressing style: {addressing_style}")
+        if multipart_part_size > multipart_threshold:
+            raise ValueError("multipart_part_size must not exceed multipart_threshold")
+
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.logger = logger.getChild(S3ObjectStorage.__name__)
+        self.region = region
+        self.credentials = sigv4.Credentials(
+            access_key_id, secret_access_key, session_token
+        )
+        self.addressing_style = addressing_style
+        self.url_expires_seconds = url_expires_seconds
+        self.multipart_threshold = multipart_threshold
+        self.multipart_part_size = multipart_part_size
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.io_executor = io_executor or _io_executor
+        # Parts and ranges run here, not on io_executor, whose threads wait for them
+        self._transfer_executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="s3-object-storage-transfer"
+        )
+
+        self._session = requests.Session()
+        # Only failed connections are retried; a request that reached the service
+        # may have had effects, and a streamed body cannot be sent again
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.1),
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self.logger.info(
+            f"Initialized S3ObjectStorage for bucket {bucket} at {self.endpoint_url}"
+        )
+
+    def _object_url(self, object_name: str) -> str:
+        """Unsigned URL of an object, its key encoded as SigV4 canonicalizes it."""
+        key = sigv4.quote_path(object_name)
+        if self.addressing_style == "virtual":
+            parts = urllib.parse.urlsplit(self.endpoint_url)
+            return f"{parts.scheme}://{self.bucket}.{parts.netloc}/{key}"
+        return f"{self.endpoint_url}/{self.bucket}/{key}"
+
+    def _request(
+        self,
+        method: str,
+        object_name: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        data=None,
+        stream: bool = False,
+    ) -> requests.Response:
+        url = self._object_url(object_name)
+        if params:
+            url += "?" + "&".join(
+                f"{sigv4.quote(name)}={sigv4.quote(value)}"
+                for name, value in sorted(params.items())
+            )
+        signed = sigv4.sign_headers(
+            method,
+            url,
+            headers or {},
+            self.credentials,
+            self.region,
+            datetime.now(timezone.utc),
+        )
+        return self._session.request(
+            method,
+            url,
+            headers=signed,
+            data=data,
+            stream=stream,
+            timeout=self.timeout_seconds,
+        )
+
+    def _raise_for_status(self, response: requests.Response, object_name: str):
+        """Raise FileNotFoundError for a missing object, HTTPError for other failures."""
+        if response.status_code == 404:
+            raise FileNotFoundError(f"Object {object_name} does not exist")
+        # Copies and completed uploads can fail after S3 answered 200
+        failed_late = response.status_code == 200 and (
+            response.request.method == "POST"
+            or "x-amz-copy-source" in response.request.headers
+        )
+        if response.status_code >= 300 or (
+            failed_late and b"<Error>" in response.content
+        ):
+            raise requests.HTTPError(
+                f"S3 {response.request.method} of {object_name} failed with "
+                f"{response.status_code}: {response.text[:500]}",
+                response=response,
+            )
+
+    def _object_headers(
+        self, content_type: Optional[str], metadata: Optional[dict]
+    ) -> Dict[str, str]:
+        headers = {
+            f"x-amz-meta-{k.lower()}": str(v) for k, v in (metadata or {}).items()
+        }
+        if content_type:
+            headers["content-type"] = content_type
+        return headers
+
+    def _upload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        """
+        Upload an object, in parallel parts if it reaches multipart_threshold.
+
+        Args:
+            object_name (str): Name/path for the object in storage
+            data (Union[bytes, BinaryIO, str]): The data to upload, can be bytes, file-like object, or path to file
+            content_type (Optional[str]): MIME type of the object
+            metadata (Optional[dict]): Additional metadata for the object
+
+        Returns:
+            str: Unsigned URL of the object
+        """
+        self.logger.info(f"Uploading object: {object_name}")
+        headers = self._object_headers(content_type, metadata)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            self._upload_stream(object_name, io.BytesIO(data), headers)
+        elif isinstance(data, str) and os.path.isfile(data):
+            with open(data, "rb") as f:
+                self._upload_stream(object_name, f, headers)
+        elif hasattr(data, "read"):
+            self._upload_stream(object_name, data, headers)
+        else:
+            self.logger.error(f"Invalid data type for upload: {type(data)}")
+            raise ValueError("Data must be bytes, file path, or file-like object")
+
+        self.logger.info(f"Successfully uploaded object: {object_name}")
+        return self._object_url(object_name)
+
+    def _upload_stream(self, object_name: str, stream: BinaryIO, headers: dict):
+        # Reading up to the threshold tells small objects apart without knowing sizes
+        head = stream.read(self.multipart_threshold)
+        if len(head) < self.multipart_threshold:
+            response = self._request("PUT", object_name, headers=headers, data=head)
+            self._raise_for_status(response, object_name)
+            return
+
+        part_size = self.multipart_part_size
+        head_parts = (head[i : i + part_size] for i in range(0, len(head), part_size))
+        rest = iter(lambda: stream.read(part_size), b"")
+        self._upload_multipart(object_name, head_parts, rest, headers=headers)
+
+    def _upload_multipart(
+        self,
+        object_name: str,
+        *part_sources: Iterator[bytes],
+        headers: Optional[dict] = None,
+    ):
+        """Upload parts with up to max_concurrency in flight, aborting on failure."""
+        response = self._request(
+            "POST", object_name, params={"uploads": ""}, headers=headers
+        )
+        self._raise_for_status(response, object_name)
+        upload_id = _find_text(ElementTree.fromstring(response.content), "UploadId")
+
+        in_flight: Set[Future] = set()
+        etags: Dict[int, Future] = {}
+        try:
+            number = 0
+            for source in part_sources:
+                for part in source:
+                    number += 1
+                    if len(in_flight) >= self.max_concurrency:
+                        # Bounds memory to max_concurrency parts
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    future = self._transfer_executor.submit(
+                        self._upload_part, object_name, upload_id, number, part
+                    )
+                    in_flight.add(future)
+                    etags[number] = future
+
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber>"
+                f"<ETag>{future.result()}</ETag></Part>"
+                for number, future in sorted(etags.items())
+            )
+            response = self._request(
+                "POST",
+                object_name,
+                params={"uploadId": upload_id},
+                data=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>",
+            )
+            self._raise_for_status(response, object_name)
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            wait(in_flight)
+            self._request("DELETE", object_name, params={"uploadId": upload_id})
+            raise
+        self.logger.debug(f"Uploaded {object_name} in {len(etags)} parts")
+
+    def _upload_part(
+        self, object_name: str, upload_id: str, number: int, part: bytes
+    ) -> str:
+        for attempt in range(1, PART_ATTEMPTS + 1):
+            try:
+                response = self._request(
+                    "PUT",
+                    object_name,
+                    params={"partNumber": str(number), "uploadId": upload_id},
+                    data=part,
+                )
+                if response.status_code < 500 or attempt == PART_ATTEMPTS:
+                    self._raise_for_status(response, object_name)
+                    return response.headers["etag"]
+            except requests.ConnectionError:
+                if attempt == PART_ATTEMPTS:
+                    raise
+            self.logger.warning(f"Retrying part {number} of {object_name}")
+            time.sleep(0.1 * 2**attempt)
+
+    def _download(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        """
+        Download an object, streamed into the destination. Objects reaching
+        multipart_threshold are downloaded to paths as parallel ranges.
+
+        Args:
+            object_name (str): Name/path of the object to download
+            destination (Optional[Union[str, BinaryIO]]): Path or file-like object to save to.
+                                                         If None, returns the data as bytes.
+
+        Returns:
+            Union[bytes, str]: Object data as bytes if no destination provided,
+                              or path where the file was saved
+        """
+        self.logger.info(f"Downloading object: {object_name}")
+        if destination is None:
+            response = self._request("GET", object_name)
+            self._raise_for_status(response, object_name)
+            return response.content
+
+        if isinstance(destination, str):
+            os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+            with self._request("GET", object_name, stream=True) as response:
+                self._raise_for_status(response, object_name)
+                size = int(response.headers.get("content-length", "0"))
+                if size < self.multipart_threshold:
+                    with open(destination, "wb") as f:
+                        self._write_body(response, f)
+                    return destination
+            # Dropping the started body costs a connection, against parallel ranges
+            self._download_ranges(object_name, size, destination)
+            return destination
+
+        with self._request("GET", object_name, stream=True) as response:
+            self._raise_for_status(response, object_name)
+            self._write_body(response, destination)
+        return destination
+
+    def _write_body(self, response: requests.Response, destination: BinaryIO):
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            destination.write(chunk)
+
+    def _download_ranges(self, object_name: str, size: int, path: str):
+        part_size = self.multipart_part_size
+        with open(path, "wb") as f:
+            f.truncate(size)
+            fd = f.fileno()
+
+            def fetch(start: int):
+                end = min(start + part_size, size) - 1
+                with self._request(
+                    "GET",
+                    object_name,
+                    headers={"range": f"bytes={start}-{end}"},
+                    stream=True,
+                ) as response:
+                    self._raise_for_status(response, object_name)
+                    offset = start
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        os.pwrite(fd, chunk, offset)
+                        offset += len(chunk)
+                    if offset != end + 1:
+                        raise IOError(f"Short read of {object_name} at {start}")
+
+            # map submits every range but runs max_concurrency of them at once
+            list(self._transfer_executor.map(fetch, range(0, size, part_size)))
+
+    def download_range(
+        self, object_name: str, start: int, end: Optional[int] = None
+    ) -> bytes:
+        """
+        Download part of an object.
+
+        Args:
+            object_name (str): Name/path of the object
+            start (int): Offset of the first byte
+            end (Optional[int]): Offset of the last byte, inclusive; None for the end
+
+        Returns:
+            bytes: The bytes in the range, fewer if the object ends first
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = self._request("GET", object_name, headers={"range": byte_range})
+        if response.status_code == 416:
+            return b""
+        self._raise_for_status(response, object_name)
+        if response.status_code == 200:
+            # The server ignored the range
+            return response.content[start : None if end is None else end + 1]
+        return response.content
+
+    def _delete(self, object_name: str) -> bool:
+        """
+        Delete an object. S3 deletes missing objects without complaint, so they
+        are looked up first to report them.
+
+        Args:
+            object_name (str): Name/path of the object to delete
+
+        Returns:
+            bool: True if deletion was successful, False otherwise
+        """
+        self.logger.info(f"Deleting object: {object_name}")
+        try:
+            if not self._exists(object_name):
+                self.logger.warning(f"Cannot delete non-existent object: {object_name}")
+                return False
+            response = self._request("DELETE", object_name)
+            self._raise_for_status(response, object_name)
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to delete object {object_name}: {str(e)}")
+            return False
+
+    def _exists(self, object_name: str) -> bool:
+        response = self._request("HEAD", object_name)
+        if response.status_code == 404:
+            return False
+        self._raise_for_status(response, object_name)
+        return True
+
+    def _rename(self, source_object_name: str, destination_object_name: str) -> str:
+        """
+        Copy an object on the service, then delete the source.
+        Not atomic: both names exist for a moment.
+
+        Args:
+            source_object_name (str): Name/path of the object to rename
+            destination_object_name (str): New name/path for the object
+
+        Returns:
+            str: Unsigned URL of the renamed object
+        """
+        self.logger.info(
+            f"Renaming object: {source_object_name} to {destination_object_name}"
+        )
+        response = self._request(
+            "PUT",
+            destination_object_name,
+            headers={
+                "x-amz-copy-source": sigv4.quote_path(
+                    f"/{self.bucket}/{source_object_name}"
+                )
+            },
+        )
+        self._raise_for_status(response, source_object_name)
+        response = self._request("DELETE", source_object_name)
+        self._raise_for_status(response, source_object_name)
+        return self._object_url(destination_object_name)
+
+    def upload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        return self._upload(object_name, data, content_type, metadata)
+
+    def download(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        return self._download(object_name, destination)
+
+    def delete(self, object_name: str) -> bool:
+        return self._delete(object_name)
+
+    def exists(self, object_name: str) -> bool:
+        return self._exists(object_name)
+
+    def rename(self, source_object_name: str, destination_object_name: str) -> str:
+        return self._rename(source_object_name, destination_object_name)
+
+    async def _run_io(self, fn, *args):
+        """Run a blocking request on the I/O thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_executor, functools.partial(fn, *args)
+        )
+
+    async def aupload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        return await self._run_io(
+            self._upload, object_name, data, content_type, metadata
+        )
+
+    async def adownload(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        return await self._run_io(self._download, object_name, destination)
+
+    async def adownload_range(
+        self, object_name: str, start: int, end: Optional[int] = None
+    ) -> bytes:
+        """See `download_range`."""
+        return await self._run_io(self.download_range, object_name, start, end)
+
+    async def adelete(self, object_name: str) -> bool:
+        return await self._run_io(self._delete, object_name)
+
+    async def aexists(self, object_name: str) -> bool:
+        return await self._run_io(self._exists, object_name)
+
+    async def arename(
+        self, source_object_name: str, destination_object_name: str
+    ) -> str:
+        return await self._run_io(
+            self._rename, source_object_name, destination_object_name
+        )
+
+    def get_url(self, object_name: str, expires: Optional[int] = None) -> str:
+        """
+        Get a presigned URL for downloading the object.
+        The signing time is rounded down to a quarter of the lifetime, so pages
+        listing objects stay byte-identical, and cacheable, for that long.
+
+        Args:
+            object_name (str): Name/path of the object
+            expires (Optional[int]): Least lifetime of the URL in seconds, under
+                                     7 days; defaults to url_expires_seconds
+
+        Returns:
+            str: URL for accessing the object
+        """
+        expires = expires or self.url_expires_seconds
+        step = max(1, min(expires // 4, URL_SIGNING_STEP_SECONDS))
+        now = time.time()
+        return sigv4.presign_url(
+            "GET",
+            self._object_url(object_name),
+            self.credentials,
+            self.region,
+            datetime.fromtimestamp(now - now % step, timezone.utc),
+            min(expires + step, sigv4.MAX_PRESIGN_SECONDS),
+        )
+
+    def close(self):
+        """Close the pooled connections."""
+        self._transfer_executor.shutdown(wait=True)
+        self._session.close()
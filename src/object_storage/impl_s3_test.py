@@ -0,0 +1,112 @@
+import logging
+import os
+import time
+import pytest
+import requests
+from src.object_storage.impl_s3 import S3ObjectStorage
+from src.object_storage.s3_standin import STANDIN_CREDENTIALS, S3StandIn
+
+pytestmark = pytest.mark.anyio
+
+
+class Fixture:
+    def __init__(self, tmp_path, **kwargs):
+        self.standin = S3StandIn(str(tmp_path / "s3")).start()
+        options = dict(
+            access_key_id=STANDIN_CREDENTIALS.access_key_id,
+            secret_access_key=STANDIN_CREDENTIALS.secret_access_key,
+            multipart_threshold=64 * 1024,
+            multipart_part_size=16 * 1024,
+            max_concurrency=4,
+        )
+        options.update(kwargs)
+        self.storage = S3ObjectStorage(
+            "bucket", self.standin.endpoint_url, logging.getLogger(__name__), **options
+        )
+        self.data = os.urandom(200 * 1024 + 5)
+
+    def close(self):
+        self.storage.close()
+        self.standin.stop()
+
+
+async def test_multipart_upload(tmp_path):
+    """Test large uploads go up in parts and small ones in a single request"""
+    f = Fixture(tmp_path)
+    await f.storage.aupload("small.bin", f.data[:1024])
+    assert f.standin.multipart_uploads_completed == 0
+
+    await f.storage.aupload("large.bin", f.data, content_type="audio/wav")
+    assert f.standin.multipart_uploads_completed == 1
+    assert await f.storage.adownload("large.bin") == f.data
+    response = requests.get(f.storage.get_url("large.bin"))
+    assert response.headers["content-type"] == "audio/wav"
+    f.close()
+
+
+async def test_failed_multipart_upload_is_aborted(tmp_path):
+    """Test a multipart upload that fails part way leaves no object or upload behind"""
+    f = Fixture(tmp_path)
+
+    def chunks():
+        yield f.data[: 100 * 1024]
+        raise IOError("disk went away")
+
+    class Failing:
+        def __init__(self):
+            self.reads = chunks()
+
+        def read(self, size):
+            return next(self.reads)
+
+    with pytest.raises(IOError):
+        await f.storage.aupload("large.bin", Failing())
+    assert not await f.storage.aexists("large.bin")
+    assert os.listdir(os.path.join(f.standin.base_dir, ".uploads")) == []
+    f.close()
+
+
+async def test_download_range(tmp_path):
+    """Test downloading parts of an object"""
+    f = Fixture(tmp_path)
+    await f.storage.aupload("object.bin", f.data)
+
+    assert await f.storage.adownload_range("object.bin", 10, 19) == f.data[10:20]
+    assert await f.storage.adownload_range("object.bin", len(f.data) - 3) == (
+        f.data[-3:]
+    )
+    assert await f.storage.adownload_range("object.bin", len(f.data)) == b""
+    with pytest.raises(FileNotFoundError):
+        await f.storage.adownload_range("missing.bin", 0, 9)
+    f.close()
+
+
+async def test_presigned_url_expires(tmp_path):
+    """Test presigned URLs serve the object, with ranges, until they expire"""
+    f = Fixture(tmp_path)
+    await f.storage.aupload("demos/a song.wav", f.data)
+
+    url = f.storage.get_url("demos/a song.wav", expires=1)
+    response = requests.get(url, headers={"range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.content == f.data[:100]
+
+    time.sleep(2.5)
+    assert requests.get(url).status_code == 403
+    # Unsigned requests are refused too
+    assert requests.get(url.partition("?")[0]).status_code == 403
+    # Pages listing the object do not change on every request
+    assert f.storage.get_url("demos/a song.wav") == f.storage.get_url(
+        "demos/a song.wav"
+    )
+    f.close()
+
+
+async def test_wrong_credentials(tmp_path):
+    """Test requests the service refuses raise HTTPError rather than pass as missing"""
+    f = Fixture(tmp_path, secret_access_key="wrong")
+    with pytest.raises(requests.HTTPError):
+        await f.storage.aexists("object.bin")
+    with pytest.raises(requests.HTTPError):
+        await f.storage.aupload("object.bin", b"data")
+    f.close()
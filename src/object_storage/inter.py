@@ -1,5 +1,9 @@
+import mmap
+import os
+import tempfile
 from abc import ABC, abstractmethod
-from typing import BinaryIO, Optional, Union
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, BinaryIO, Iterator, Optional, Union
 
 
 class ObjectStorage(ABC):
@@ -74,6 +78,23 @@ class ObjectStorage(ABC):
         """
         pass
 
+    @abstractmethod
+    def rename(self, source_object_name: str, destination_object_name: str) -> str:
+        """
+        Rename an object, replacing any object already at the destination.
+
+        Args:
+            source_object_name (str): Name/path of the object to rename
+            destination_object_name (str): New name/path for the object
+
+        Returns:
+            str: URL or identifier for the renamed object
+
+        Raises:
+            FileNotFoundError: If the source object does not exist
+        """
+        pass
+
     @abstractmethod
     def get_url(self, object_name: str, expires: Optional[int] = None) -> str:
         """
@@ -87,3 +108,172 @@ class ObjectStorage(ABC):
             str: URL for accessing the object
         """
         pass
+
+    @abstractmethod
+    async def aupload(
+        self,
+        object_name: str,
+        data: Union[bytes, BinaryIO, str],
+        content_type: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> str:
+        """
+        Upload an object to storage without blocking the event loop.
+
+        Args:
+            object_name (str): Name/path for the object in storage
+            data (Union[bytes, BinaryIO, str]): The data to upload, can be bytes, file-like object, or path to file
+            content_type (Optional[str]): MIME type of the object
+            metadata (Optional[dict]): Additional metadata for the object
+
+        Returns:
+            str: URL or identifier for the uploaded object
+        """
+        pass
+
+    @abstractmethod
+    async def adownload(
+        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
+    ) -> Union[bytes, str]:
+        """
+        Download an object from storage without blocking the event loop.
+
+        Args:
+            object_name (str): Name/path of the object to download
+            destination (Optional[Union[str, BinaryIO]]): Path or file-like object to save to.
+                                                         If None, returns the data as bytes.
+
+        Returns:
+            Union[bytes, str]: Object data as bytes if no destination provided,
+                              or path where the file was saved
+        """
+        pass
+
+    @abstractmethod
+    async def adelete(self, object_name: str) -> bool:
+        """
+        Delete an object from storage without blocking the event loop.
+
+        Args:
+            object_name (str): Name/path of the object to delete
+
+        Returns:
+            bool: True if deletion was successful, False otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def aexists(self, object_name: str) -> bool:
+        """
+        Check if an object exists in storage without blocking the event loop.
+
+        Args:
+            object_name (str): Name/path of the object to check
+
+        Returns:
+            bool: True if the object exists, False otherwise
+        """
+        pass
+
+    @abstractmethod
+    async def arename(
+        self, source_object_name: str, destination_object_name: str
+    ) -> str:
+        """
+        Rename an object without blocking the event loop.
+
+        Args:
+            source_object_name (str): Name/path of the object to rename
+            destination_object_name (str): New name/path for the object
+
+        Returns:
+            str: URL or identifier for the renamed object
+
+        Raises:
+            FileNotFoundError: If the source object does not exist
+        """
+        pass
+
+    @contextmanager
+    def local_path(self, object_name: str) -> Iterator[str]:
+        """
+        Get a path on the local filesystem holding the object's content.
+        The path is only valid inside the context and must not be written to.
+        By default the object is streamed into a temporary file that is removed on exit;
+        implementations backed by the local filesystem should yield the object itself.
+
+        Args:
+            object_name (str): Name/path of the object
+
+        Yields:
+            str: Local path to the object's content
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(object_name)[1])
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self.download(object_name, f)
+            yield path
+        finally:
+            os.remove(path)
+
+    @asynccontextmanager
+    async def alocal_path(self, object_name: str) -> AsyncIterator[str]:
+        """
+        Get a path on the local filesystem holding the object's content without blocking the event loop.
+        See `local_path`.
+
+        Args:
+            object_name (str): Name/path of the object
+
+        Yields:
+            str: Local path to the object's content
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(object_name)[1])
+        os.close(fd)
+        try:
+            await self.adownload(object_name, path)
+            yield path
+        finally:
+            os.remove(path)
+
+    @contextmanager
+    def open_local(self, object_name: str) -> Iterator[BinaryIO]:
+        """
+        Open the object's content for reading from the local filesystem.
+
+        Args:
+            object_name (str): Name/path of the object
+
+        Yields:
+            BinaryIO: File opened for binary reading
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        with self.local_path(object_name) as path, open(path, "rb") as f:
+            yield f
+
+    @contextmanager
+    def mmap_local(self, object_name: str) -> Iterator[mmap.mmap]:
+        """
+        Memory-map the object's content read-only.
+
+        Args:
+            object_name (str): Name/path of the object
+
+        Yields:
+            mmap.mmap: Read-only memory map of the object
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+            ValueError: If the object is empty
+        """
+        with self.open_local(object_name) as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
@@ -1,89 +1,278 @@
-from abc import ABC, abstractmethod
-from typing import BinaryIO, Optional, Union
+import io
+import logging
+import os
+import uuid
+import pytest
+from fastapi import APIRouter
+from src.object_storage.factory import ObjectStorageFactory
+from src.object_storage.inter import ObjectStorage
+from src.object_storage.s3_standin import STANDIN_CREDENTIALS, S3StandIn
 
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.parametrize("mode", ["sync", "async"]),
+    pytest.mark.parametrize("impl", ["local", "s3"]),
+]
 
-class ObjectStorage(ABC):
+
+def storage_options(impl: str, tmp_path) -> dict:
+    """Constructor arguments of each implementation; S3 runs against a local stand-in."""
+    if impl == "s3":
+        return {
+            # A bucket per test keeps the shared stand-in's tests apart
+            "bucket": f"test-{uuid.uuid4().hex[:12]}",
+            "endpoint_url": S3StandIn.shared().endpoint_url,
+            "logger": logging.getLogger(__name__),
+            "access_key_id": STANDIN_CREDENTIALS.access_key_id,
+            "secret_access_key": STANDIN_CREDENTIALS.secret_access_key,
+            # Small enough that the larger test objects go through multipart
+            "multipart_threshold": 64 * 1024,
+            "multipart_part_size": 16 * 1024,
+        }
+    return {
+        "base_dir": str(tmp_path / "storage"),
+        "base_url": "http://testserver",
+        "router": APIRouter(),
+        "logger": logging.getLogger(__name__),
+    }
+
+
+class Fixture:
     """
-    Interface for object storage operations.
-    Provides methods for uploading, downloading, and managing objects in storage.
+    Runs every storage operation either through the sync methods
+    or through their async variants, so both modes share one contract.
     """
 
-    @abstractmethod
-    def upload(
-        self,
-        object_name: str,
-        data: Union[bytes, BinaryIO, str],
-        content_type: Optional[str] = None,
-        metadata: Optional[dict] = None,
-    ) -> str:
-        """
-        Upload an object to storage.
-
-        Args:
-            object_name (str): Name/path for the object in storage
-            data (Union[bytes, BinaryIO, str]): The data to upload, can be bytes, file-like object, or path to file
-            content_type (Optional[str]): MIME type of the object
-            metadata (Optional[dict]): Additional metadata for the object
-
-        Returns:
-            str: URL or identifier for the uploaded object
-        """
-        pass
-
-    @abstractmethod
-    def download(
-        self, object_name: str, destination: Optional[Union[str, BinaryIO]] = None
-    ) -> Union[bytes, str]:
-        """
-        Download an object from storage.
-
-        Args:
-            object_name (str): Name/path of the object to download
-            destination (Optional[Union[str, BinaryIO]]): Path or file-like object to save to.
-                                                         If None, returns the data as bytes.
-
-        Returns:
-            Union[bytes, str]: Object data as bytes if no destination provided,
-                              or path where the file was saved
-        """
-        pass
-
-    @abstractmethod
-    def delete(self, object_name: str) -> bool:
-        """
-        Delete an object from storage.
-
-        Args:
-            object_name (str): Name/path of the object to delete
-
-        Returns:
-            bool: True if deletion was successful, False otherwise
-        """
-        pass
-
-    @abstractmethod
-    def exists(self, object_name: str) -> bool:
-        """
-        Check if an object exists in storage.
-
-        Args:
-            object_name (str): Name/path of the object to check
-
-        Returns:
-            bool: True if the object exists, False otherwise
-        """
-        pass
-
-    @abstractmethod
-    def get_url(self, object_name: str, expires: Optional[int] = None) -> str:
-        """
-        Get a URL for accessing the object.
-
-        Args:
-            object_name (str): Name/path of the object
-            expires (Optional[int]): Expiration time in seconds for the URL
-
-        Returns:
-            str: URL for accessing the object
-        """
-        pass
+    def __init__(self, tmp_path, mode: str, impl: str):
+        self.tmp_path = tmp_path
+        self.mode = mode
+        self.storage = ObjectStorageFactory.create(
+            impl=impl, **storage_options(impl, tmp_path)
+        )
+
+        self.test_object_name = "demos/test_object.bin"
+        self.test_data = b"test data" * 1024
+
+    async def upload(self, *args, **kwargs):
+        if self.mode == "async":
+            return await self.storage.aupload(*args, **kwargs)
+        return self.storage.upload(*args, **kwargs)
+
+    async def download(self, *args, **kwargs):
+        if self.mode == "async":
+            return await self.storage.adownload(*args, **kwargs)
+        return self.storage.download(*args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        if self.mode == "async":
+            return await self.storage.adelete(*args, **kwargs)
+        return self.storage.delete(*args, **kwargs)
+
+    async def rename(self, *args, **kwargs):
+        if self.mode == "async":
+            return await self.storage.arename(*args, **kwargs)
+        return self.storage.rename(*args, **kwargs)
+
+    async def exists(self, *args, **kwargs):
+        if self.mode == "async":
+            return await self.storage.aexists(*args, **kwargs)
+        return self.storage.exists(*args, **kwargs)
+
+
+async def test_upload_download_bytes(tmp_path, mode, impl):
+    """Test uploading bytes and downloading them back"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+
+    data = await f.download(f.test_object_name)
+    assert data == f.test_data
+
+
+async def test_upload_file_like(tmp_path, mode, impl):
+    """Test uploading a file-like object"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, io.BytesIO(f.test_data))
+
+    data = await f.download(f.test_object_name)
+    assert data == f.test_data
+
+
+async def test_upload_file_path(tmp_path, mode, impl):
+    """Test uploading from a path on disk"""
+    f = Fixture(tmp_path, mode, impl)
+    source = tmp_path / "source.bin"
+    source.write_bytes(f.test_data)
+
+    await f.upload(f.test_object_name, str(source))
+
+    data = await f.download(f.test_object_name)
+    assert data == f.test_data
+
+
+async def test_upload_invalid_data(tmp_path, mode, impl):
+    """Test uploading something that is not bytes, a path or a file-like object"""
+    f = Fixture(tmp_path, mode, impl)
+    with pytest.raises(ValueError):
+        await f.upload(f.test_object_name, 42)
+
+
+async def test_download_to_path(tmp_path, mode, impl):
+    """Test downloading into a destination path"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+
+    destination = str(tmp_path / "out" / "downloaded.bin")
+    result = await f.download(f.test_object_name, destination)
+    assert result == destination
+    with open(destination, "rb") as file:
+        assert file.read() == f.test_data
+
+
+async def test_download_to_file_like(tmp_path, mode, impl):
+    """Test downloading into a file-like destination"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+
+    destination = io.BytesIO()
+    await f.download(f.test_object_name, destination)
+    assert destination.getvalue() == f.test_data
+
+
+async def test_download_nonexistent(tmp_path, mode, impl):
+    """Test downloading a nonexistent object raises FileNotFoundError"""
+    f = Fixture(tmp_path, mode, impl)
+    with pytest.raises(FileNotFoundError):
+        await f.download("nonexistent_object")
+
+
+async def test_exists(tmp_path, mode, impl):
+    """Test exists before and after an upload"""
+    f = Fixture(tmp_path, mode, impl)
+    assert await f.exists(f.test_object_name) is False
+
+    await f.upload(f.test_object_name, f.test_data)
+    assert await f.exists(f.test_object_name) is True
+
+
+async def test_delete(tmp_path, mode, impl):
+    """Test delete operation"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+
+    success = await f.delete(f.test_object_name)
+    assert success is True
+    assert await f.exists(f.test_object_name) is False
+
+
+async def test_delete_nonexistent(tmp_path, mode, impl):
+    """Test deleting a nonexistent object returns False"""
+    f = Fixture(tmp_path, mode, impl)
+    success = await f.delete("nonexistent_object")
+    assert success is False
+
+
+async def test_upload_overwrite(tmp_path, mode, impl):
+    """Test uploading to an existing object name replaces it"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+    await f.upload(f.test_object_name, b"new data")
+
+    data = await f.download(f.test_object_name)
+    assert data == b"new data"
+
+
+async def test_rename(tmp_path, mode, impl):
+    """Test renaming an object over an existing one"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+    await f.upload("other/object.bin", b"old data")
+
+    await f.rename(f.test_object_name, "other/object.bin")
+    assert await f.exists(f.test_object_name) is False
+    assert await f.download("other/object.bin") == f.test_data
+
+
+async def test_rename_nonexistent(tmp_path, mode, impl):
+    """Test renaming a nonexistent object raises FileNotFoundError"""
+    f = Fixture(tmp_path, mode, impl)
+    with pytest.raises(FileNotFoundError):
+        await f.rename("nonexistent_object", "other/object.bin")
+
+
+async def test_local_path(tmp_path, mode, impl):
+    """Test reading an object through a local path, file and mmap"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+
+    if mode == "async":
+        async with f.storage.alocal_path(f.test_object_name) as path:
+            with open(path, "rb") as file:
+                assert file.read() == f.test_data
+    else:
+        with f.storage.local_path(f.test_object_name) as path:
+            with open(path, "rb") as file:
+                assert file.read() == f.test_data
+
+    with f.storage.open_local(f.test_object_name) as file:
+        assert file.read() == f.test_data
+
+    with f.storage.mmap_local(f.test_object_name) as mapped:
+        assert mapped[:] == f.test_data
+
+
+async def test_local_path_fallback(tmp_path, mode, impl):
+    """Test the download-to-temp-file fallback used by remote implementations"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload(f.test_object_name, f.test_data)
+
+    if mode == "async":
+        async with ObjectStorage.alocal_path(f.storage, f.test_object_name) as path:
+            with open(path, "rb") as file:
+                assert file.read() == f.test_data
+    else:
+        with ObjectStorage.local_path(f.storage, f.test_object_name) as path:
+            with open(path, "rb") as file:
+                assert file.read() == f.test_data
+    assert not os.path.exists(path)
+
+
+async def test_local_path_nonexistent(tmp_path, mode, impl):
+    """Test a local path for a nonexistent object raises FileNotFoundError"""
+    f = Fixture(tmp_path, mode, impl)
+    with pytest.raises(FileNotFoundError):
+        if mode == "async":
+            async with f.storage.alocal_path("nonexistent_object"):
+                pass
+        else:
+            with f.storage.local_path("nonexistent_object"):
+                pass
+
+
+async def test_large_object(tmp_path, mode, impl):
+    """Test an object larger than a multipart upload's parts round-trips intact"""
+    f = Fixture(tmp_path, mode, impl)
+    data = os.urandom(300 * 1024)
+    source = tmp_path / "large.bin"
+    source.write_bytes(data)
+
+    await f.upload("large/from_path.bin", str(source))
+    await f.upload("large/from_file.bin", io.BytesIO(data))
+
+    destination = str(tmp_path / "out" / "large.bin")
+    await f.download("large/from_path.bin", destination)
+    with open(destination, "rb") as file:
+        assert file.read() == data
+    assert await f.download("large/from_file.bin") == data
+
+
+async def test_get_url(tmp_path, mode, impl):
+    """Test URLs with and without an expiry name the object"""
+    f = Fixture(tmp_path, mode, impl)
+    await f.upload("demos/some name.wav", f.test_data)
+
+    for url in (
+        f.storage.get_url("demos/some name.wav"),
+        f.storage.get_url("demos/some name.wav", expires=60),
+    ):
+        assert url.startswith("http")
+        assert "some" in url
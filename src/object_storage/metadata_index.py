@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class ObjectInfo:
+    """What the index knows of a stored object."""
+
+    name: str
+    size: int
+    # Modification time, in seconds since the epoch
+    mtime: float
+    content_type: Optional[str] = None
+    # Hex SHA-256 of the content; None for objects indexed from existing files
+    sha256: Optional[str] = None
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+
+class MetadataIndex:
+    """
+    SQLite table of stored objects, so lookups and listings need no filesystem calls.
+    Each thread gets its own connection; with WAL, readers in any process run
+    alongside the single writer.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the index, creating it if it does not exist.
+
+        Args:
+            path (str): Path of the database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS objects ("
+                "name TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, "
+                "mtime REAL NOT NULL, "
+                "content_type TEXT, "
+                "sha256 TEXT, "
+                "metadata TEXT NOT NULL) "
+                "WITHOUT ROWID"
+            )
+            # Facts about the directory as a whole, e.g. finished migrations
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS properties ("
+                "name TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL) "
+                "WITHOUT ROWID"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=30.0, cached_statements=64, check_same_thread=False
+            )
+            # Durable at each WAL checkpoint rather than each commit
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @staticmethod
+    def _info(row) -> ObjectInfo:
+        name, size, mtime, content_type, sha256, metadata = row
+        return ObjectInfo(
+            name=name,
+            size=size,
+            mtime=mtime,
+            content_type=content_type,
+            sha256=sha256,
+            metadata=json.loads(metadata),
+        )
+
+    @staticmethod
+    def _row(info: ObjectInfo) -> tuple:
+        return (
+            info.name,
+            info.size,
+            info.mtime,
+            info.content_type,
+            info.sha256,
+            json.dumps(info.metadata),
+        )
+
+    def get(self, name: str) -> Optional[ObjectInfo]:
+        row = (
+            self._connection()
+            .execute(
+                "SELECT name, size, mtime, content_type, sha256, metadata "
+                "FROM objects WHERE name = ?",
+                (name,),
+            )
+            .fetchone()
+        )
+        return self._info(row) if row else None
+
+    def contains(self, name: str) -> bool:
+        cursor = self._connection().execute(
+            "SELECT 1 FROM objects WHERE name = ?", (name,)
+        )
+        return cursor.fetchone() is not None
+
+    def put(self, info: ObjectInfo):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(info),
+            )
+
+    def delete(self, name: str) -> bool:
+        with self._connection() as connection:
+            cursor = connection.execute("DELETE FROM objects WHERE name = ?", (name,))
+        return cursor.rowcount > 0
+
+    def rename(self, source: str, destination: str) -> bool:
+        """Move an entry to a new name, replacing any entry there, in one transaction."""
+        with self._connection() as connection:
+            connection.execute("DELETE FROM objects WHERE name = ?", (destination,))
+            cursor = connection.execute(
+                "UPDATE objects SET name = ? WHERE name = ?", (destination, source)
+            )
+        return cursor.rowcount > 0
+
+    def list(self, prefix: str = "", limit: Optional[int] = None) -> List[ObjectInfo]:
+        """Entries whose names start with prefix, in name order."""
+        query = "SELECT name, size, mtime, content_type, sha256, metadata FROM objects"
+        params: list = []
+        if prefix:
+            # A range on the primary key, so the listing is an index scan
+            query += " WHERE name >= ? AND name < ?"
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        query += " ORDER BY name"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [self._info(row) for row in self._connection().execute(query, params)]
+
+    def get_property(self, name: str) -> Optional[str]:
+        row = (
+            self._connection()
+            .execute("SELECT value FROM properties WHERE name = ?", (name,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def set_property(self, name: str, value: str):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO properties VALUES (?, ?)", (name, value)
+            )
+
+    def close(self):
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,396 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import urllib.parse
+import uuid
+import xml.etree.ElementTree as ElementTree
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from src.object_storage import sigv4
+
+STANDIN_CREDENTIALS = sigv4.Credentials("standin-access-key", "standin-secret-key")
+_COPY_CHUNK_SIZE = 1024 * 1024
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class S3StandIn:
+    """
+    Minimal S3-compatible server for tests and benchmarks, on a local port.
+    Speaks the path-style object API S3ObjectStorage uses: PUT (plain, copy and
+    multipart parts), GET with Range, HEAD, DELETE and multipart uploads.
+    Checks SigV4 signatures, headers and presigned, against one key pair.
+    Buckets are created on first use; objects are kept as files under base_dir.
+    """
+
+    _shared: Optional["S3StandIn"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        base_dir: Optional[str] = None,
+        credentials: sigv4.Credentials = STANDIN_CREDENTIALS,
+        region: str = "us-east-1",
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Initialize the server; `start` it to serve.
+
+        Args:
+            base_dir (Optional[str]): Where objects are kept, a new temporary
+                                      directory removed on `stop` if None
+            credentials (sigv4.Credentials): The only key pair accepted
+            region (str): Region requests must be signed for
+            host (str): Address to listen on
+            port (int): Port to listen on, 0 for any free one
+        """
+        self._owns_base_dir = base_dir is None
+        self.base_dir = base_dir or tempfile.mkdtemp(prefix="s3-standin-")
+        self.credentials = credentials
+        self.region = region
+        self._server = _Server((host, port), _Handler)
+        self._server.standin = self
+        self._thread: Optional[threading.Thread] = None
+        # Writes of one object, or one upload's parts, go through temp files and
+        # renames; the lock only guards completing uploads
+        self._lock = threading.Lock()
+        self.multipart_uploads_completed = 0
+
+    @classmethod
+    def shared(cls) -> "S3StandIn":
+        """A server for the whole process, started on first use."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls().start()
+            return cls._shared
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "S3StandIn":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="s3-standin", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._owns_base_dir:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def __enter__(self) -> "S3StandIn":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _object_path(self, bucket: str, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.base_dir, bucket, "objects", digest)
+
+    def _upload_dir(self, upload_id: str) -> str:
+        return os.path.join(self.base_dir, ".uploads", upload_id)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop connections mid-body, e.g. to switch to ranged downloads
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def _error_xml(code: str, message: str) -> bytes:
+    return (
+        f"<?xml version='1.0' encoding='UTF-8'?>"
+        f"<Error><Code>{code}</Code><Message>{message}</Message></Error>"
+    ).encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "S3StandIn"
+
+    @property
+    def standin(self) -> S3StandIn:
+        return self.server.standin
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        headers = dict(headers or {})
+        if body and "content-type" not in headers:
+            headers["content-type"] = "application/xml"
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if "content-length" not in headers:
+            self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _fail(
+        self, status: int, code: str, message: str, headers: Optional[dict] = None
+    ):
+        self._reply(
+            status,
+            b"" if self.command == "HEAD" else _error_xml(code, message),
+            headers,
+        )
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("content-length", "0")))
+
+    def _handle(self):
+        raw_path, _, query = self.path.partition("?")
+        headers = {name.lower(): value for name, value in self.headers.items()}
+        reason = sigv4.verify(
+            self.command,
+            raw_path,
+            query,
+            headers,
+            self.standin.credentials,
+            datetime.now(timezone.utc),
+        )
+        if reason is not None:
+            # The body is unread, so the connection cannot be reused; saying so
+            # keeps the client from sending its next request down a closed socket
+            self._fail(403, "AccessDenied", reason, {"connection": "close"})
+            return
+
+        bucket, _, key = urllib.parse.unquote(raw_path).lstrip("/").partition("/")
+        if not bucket or not key:
+            self._read_body()
+            self._fail(400, "InvalidRequest", "Only object requests are supported")
+            return
+        params = dict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+        handler = getattr(self, f"_{self.command.lower()}")
+        handler(bucket, key, params, headers)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _handle
+
+    def _write_object(
+        self, bucket: str, key: str, source, headers: dict, etag: Optional[str] = None
+    ):
+        """Store an object from a readable source, with its content type and metadata."""
+        path = self.standin._object_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = hashlib.md5()
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            for chunk in source:
+                digest.update(chunk)
+                f.write(chunk)
+        meta = {
+            "key": key,
+            "etag": etag or f'"{digest.hexdigest()}"',
+            "content_type": headers.get("content-type", "binary/octet-stream"),
+            "metadata": {
+                name: value
+                for name, value in headers.items()
+                if name.startswith("x-amz-meta-")
+            },
+            "last_modified": formatdate(usegmt=True),
+        }
+        with open(temp_path + ".json", "w") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, path)
+        os.replace(temp_path + ".json", path + ".json")
+        return meta
+
+    def _read_meta(self, bucket: str, key: str) -> Optional[dict]:
+        try:
+            with open(self.standin._object_path(bucket, key) + ".json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _put(self, bucket: str, key: str, params: dict, headers: dict):
+        if "uploadId" in params:
+            upload_dir = self.standin._upload_dir(params["uploadId"])
+            body = self._read_body()
+            if not os.path.isdir(upload_dir):
+                self._fail(404, "NoSuchUpload", "No such upload")
+                return
+            part_path = os.path.join(upload_dir, f"{int(params['partNumber']):05d}")
+            with open(part_path + ".tmp", "wb") as f:
+                f.write(body)
+            os.replace(part_path + ".tmp", part_path)
+            self._reply(200, headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'})
+            return
+
+        copy_source = headers.get("x-amz-copy-source")
+        if copy_source is not None:
+            source_bucket, _, source_key = (
+                urllib.parse.unquote(copy_source).lstrip("/").partition("/")
+            )
+            meta = self._read_meta(source_bucket, source_key)
+            if meta is None:
+                self._fail(404, "NoSuchKey", "The source key does not exist")
+                return
+            with open(self.standin._object_path(source_bucket, source_key), "rb") as f:
+                chunks = iter(lambda: f.read(_COPY_CHUNK_SIZE), b"")
+                copied = self._write_object(
+                    bucket,
+                    key,
+                    chunks,
+                    {
+                        "content-type": meta["content_type"],
+                        **meta["metadata"],
+                    },
+                    etag=meta["etag"],
+                )
+            body = (
+                f"<CopyObjectResult><ETag>{copied['etag']}</ETag>"
+                f"<LastModified>{copied['last_modified']}</LastModified>"
+                f"</CopyObjectResult>"
+            ).encode()
+            self._reply(200, body)
+            return
+
+        meta = self._write_object(bucket, key, [self._read_body()], headers)
+        self._reply(200, headers={"etag": meta["etag"]})
+
+    def _post(self, bucket: str, key: str, params: dict, headers: dict):
+        body = self._read_body()
+        if "uploads" in params:
+            upload_id = uuid.uuid4().hex
+            upload_dir = self.standin._upload_dir(upload_id)
+            os.makedirs(upload_dir)
+            with open(os.path.join(upload_dir, "headers.json"), "w") as f:
+                json.dump(headers, f)
+            self._reply(
+                200,
+                (
+                    f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket>"
+                    f"<Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                    f"</InitiateMultipartUploadResult>"
+                ).encode(),
+            )
+            return
+
+        if "uploadId" not in params:
+            self._fail(400, "InvalidRequest", "Unsupported POST")
+            return
+        upload_dir = self.standin._upload_dir(params["uploadId"])
+        if not os.path.isdir(upload_dir):
+            self._fail(404, "NoSuchUpload", "No such upload")
+            return
+        numbers = [
+            int(part.findtext("PartNumber"))
+            for part in ElementTree.fromstring(body).iter("Part")
+        ]
+        if numbers != sorted(numbers):
+            self._fail(400, "InvalidPartOrder", "Parts must be in ascending order")
+            return
+        part_paths = [os.path.join(upload_dir, f"{number:05d}") for number in numbers]
+        if not all(os.path.exists(path) for path in part_paths):
+            self._fail(400, "InvalidPart", "A listed part was not uploaded")
+            return
+        with open(os.path.join(upload_dir, "headers.json")) as f:
+            upload_headers = json.load(f)
+
+        def chunks():
+            for path in part_paths:
+                with open(path, "rb") as f:
+                    yield from iter(lambda: f.read(_COPY_CHUNK_SIZE), b"")
+
+        meta = self._write_object(
+            bucket,
+            key,
+            chunks(),
+            upload_headers,
+            etag=f'"{uuid.uuid4().hex}-{len(part_paths)}"',
+        )
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        with self.standin._lock:
+            self.standin.multipart_uploads_completed += 1
+        self._reply(
+            200,
+            (
+                f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket>"
+                f"<Key>{key}</Key><ETag>{meta['etag']}</ETag>"
+                f"</CompleteMultipartUploadResult>"
+            ).encode(),
+        )
+
+    def _delete(self, bucket: str, key: str, params: dict, headers: dict):
+        self._read_body()
+        if "uploadId" in params:
+            shutil.rmtree(
+                self.standin._upload_dir(params["uploadId"]), ignore_errors=True
+            )
+        else:
+            path = self.standin._object_path(bucket, key)
+            for suffix in (".json", ""):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+        # Like S3, deleting a missing object succeeds
+        self._reply(204)
+
+    def _head(self, bucket: str, key: str, params: dict, headers: dict):
+        self._get(bucket, key, params, headers)
+
+    def _get(self, bucket: str, key: str, params: dict, headers: dict):
+        meta = self._read_meta(bucket, key)
+        path = self.standin._object_path(bucket, key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            meta = None
+        if meta is None:
+            self._fail(404, "NoSuchKey", "The specified key does not exist")
+            return
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            start, end, status = 0, size - 1, 200
+            match = _RANGE.match(headers.get("range", ""))
+            if match and any(match.groups()):
+                first, last = match.groups()
+                if first:
+                    start, end = int(first), min(int(last or size - 1), size - 1)
+                else:
+                    start, end = max(0, size - int(last)), size - 1
+                if start >= size or start > end:
+                    self._fail(416, "InvalidRange", "The range is not satisfiable")
+                    return
+                status = 206
+
+            response_headers = {
+                "content-type": meta["content_type"],
+                "content-length": str(end - start + 1),
+                "etag": meta["etag"],
+                "last-modified": meta["last_modified"],
+                "accept-ranges": "bytes",
+                **meta["metadata"],
+            }
+            if status == 206:
+                response_headers["content-range"] = f"bytes {start}-{end}/{size}"
+            self._reply(status, headers=response_headers)
+            if self.command == "HEAD":
+                return
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(_COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
@@ -0,0 +1,292 @@
+"""
+AWS Signature Version 4 for S3 requests: signed headers for API calls and
+presigned URLs for handing objects to browsers.
+See https://docs.aws.amazon.com/AmazonS3/latest/API/sig-v4-authenticating-requests.html
+"""
+
+import hashlib
+import hmac
+import urllib.parse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+# Sent instead of the body's SHA-256, so streamed bodies are read once
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+EMPTY_PAYLOAD = hashlib.sha256(b"").hexdigest()
+# Longest lifetime S3 accepts for a presigned URL
+MAX_PRESIGN_SECONDS = 7 * 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class Credentials:
+    access_key_id: str
+    secret_access_key: str
+    # Set for temporary credentials, e.g. from an instance role
+    session_token: Optional[str] = None
+
+
+def quote(value: str, safe: str = "~") -> str:
+    """URI-encode as SigV4 requires: everything but unreserved characters and safe."""
+    return urllib.parse.quote(value, safe=safe)
+
+
+def quote_path(path: str) -> str:
+    """Encode an object's URL path the way S3 canonicalizes it: each segment once."""
+    return quote(path, safe="/~")
+
+
+def amz_date(now: datetime) -> str:
+    return now.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _canonical_query(params: List[Tuple[str, str]]) -> str:
+    return "&".join(f"{quote(name)}={quote(value)}" for name, value in sorted(params))
+
+
+def _canonical_request(
+    method: str,
+    path: str,
+    params: List[Tuple[str, str]],
+    headers: Dict[str, str],
+    signed_headers: List[str],
+    payload_hash: str,
+) -> str:
+    canonical_headers = "".join(
+        f"{name}:{' '.join(headers[name].split())}\n" for name in signed_headers
+    )
+    return "\n".join(
+        [
+            method,
+            path,
+            _canonical_query(params),
+            canonical_headers,
+            ";".join(signed_headers),
+            payload_hash,
+        ]
+    )
+
+
+def _signature(
+    credentials: Credentials,
+    timestamp: str,
+    scope: str,
+    canonical_request: str,
+) -> str:
+    string_to_sign = "\n".join(
+        [
+            ALGORITHM,
+            timestamp,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ]
+    )
+    key = f"AWS4{credentials.secret_access_key}".encode()
+    for part in scope.split("/"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+def _scope(timestamp: str, region: str, service: str) -> str:
+    return f"{timestamp[:8]}/{region}/{service}/aws4_request"
+
+
+def sign_headers(
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    credentials: Credentials,
+    region: str,
+    now: datetime,
+    payload_hash: str = UNSIGNED_PAYLOAD,
+    service: str = "s3",
+) -> Dict[str, str]:
+    """
+    Sign a request in its Authorization header.
+
+    Args:
+        method (str): HTTP method
+        url (str): Full URL, with any query string; the path encoded by `quote_path`
+        headers (Dict[str, str]): Headers to sign, besides the ones added here
+        credentials (Credentials): Who signs
+        region (str): Region of the bucket
+        now (datetime): Signing time; S3 rejects requests signed 15 minutes off
+        payload_hash (str): Hex SHA-256 of the body, or UNSIGNED_PAYLOAD
+        service (str): Service the credentials are scoped to
+
+    Returns:
+        Dict[str, str]: The headers to send, including host, x-amz-date,
+                        x-amz-content-sha256 and authorization
+    """
+    parts = urllib.parse.urlsplit(url)
+    timestamp = amz_date(now)
+    signed = {name.lower(): str(value) for name, value in headers.items()}
+    signed["host"] = parts.netloc
+    signed["x-amz-date"] = timestamp
+    signed["x-amz-content-sha256"] = payload_hash
+    if credentials.session_token:
+        signed["x-amz-security-token"] = credentials.session_token
+
+    signed_headers = sorted(signed)
+    scope = _scope(timestamp, region, service)
+    canonical_request = _canonical_request(
+        method,
+        parts.path or "/",
+        urllib.parse.parse_qsl(parts.query, keep_blank_values=True),
+        signed,
+        signed_headers,
+        payload_hash,
+    )
+    signed["authorization"] = (
+        f"{ALGORITHM} Credential={credentials.access_key_id}/{scope}, "
+        f"SignedHeaders={';'.join(signed_headers)}, "
+        f"Signature={_signature(credentials, timestamp, scope, canonical_request)}"
+    )
+    return signed
+
+
+def presign_url(
+    method: str,
+    url: str,
+    credentials: Credentials,
+    region: str,
+    now: datetime,
+    expires_seconds: int,
+    service: str = "s3",
+) -> str:
+    """
+    Sign a URL in its query string, so anyone holding it can make the request
+    until it expires.
+
+    Args:
+        method (str): HTTP method the URL is for
+        url (str): Full URL; the path encoded by `quote_path`
+        credentials (Credentials): Who signs
+        region (str): Region of the bucket
+        now (datetime): Signing time, from which the URL is valid
+        expires_seconds (int): Lifetime, at most MAX_PRESIGN_SECONDS
+        service (str): Service the credentials are scoped to
+
+    Returns:
+        str: The presigned URL
+
+    Raises:
+        ValueError: If expires_seconds is out of range
+    """
+    if not 1 <= expires_seconds <= MAX_PRESIGN_SECONDS:
+        raise ValueError(
+            f"Presigned URLs last 1 to {MAX_PRESIGN_SECONDS}s, not {expires_seconds}"
+        )
+    parts = urllib.parse.urlsplit(url)
+    timestamp = amz_date(now)
+    scope = _scope(timestamp, region, service)
+    params = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    params += [
+        ("X-Amz-Algorithm", ALGORITHM),
+        ("X-Amz-Credential", f"{credentials.access_key_id}/{scope}"),
+        ("X-Amz-Date", timestamp),
+        ("X-Amz-Expires", str(expires_seconds)),
+        ("X-Amz-SignedHeaders", "host"),
+    ]
+    if credentials.session_token:
+        params.append(("X-Amz-Security-Token", credentials.session_token))
+
+    canonical_request = _canonical_request(
+        method,
+        parts.path or "/",
+        params,
+        {"host": parts.netloc},
+        ["host"],
+        UNSIGNED_PAYLOAD,
+    )
+    params.append(
+        (
+            "X-Amz-Signature",
+            _signature(credentials, timestamp, scope, canonical_request),
+        )
+    )
+    return urllib.parse.urlunsplit(
+        (
+            parts.scheme,
+            parts.netloc,
+            parts.path or "/",
+            _canonical_query(params),
+            "",
+        )
+    )
+
+
+def verify(
+    method: str,
+    path: str,
+    query: str,
+    headers: Dict[str, str],
+    credentials: Credentials,
+    now: datetime,
+    max_skew_seconds: int = 15 * 60,
+) -> Optional[str]:
+    """
+    Check a request's signature, in its headers or its query string, as a server does.
+
+    Args:
+        method (str): HTTP method
+        path (str): Request path as sent, still encoded
+        query (str): Raw query string
+        headers (Dict[str, str]): Request headers, names in lower case
+        credentials (Credentials): The credentials the request must be signed with
+        now (datetime): Current time, for expiry and clock skew
+        max_skew_seconds (int): How far header-signed requests may be from now
+
+    Returns:
+        Optional[str]: None if the signature is valid, otherwise why it is not
+    """
+    params = urllib.parse.parse_qsl(query, keep_blank_values=True)
+    query_auth = dict(params)
+    if "X-Amz-Signature" in query_auth:
+        timestamp = query_auth.get("X-Amz-Date", "")
+        credential = query_auth.get("X-Amz-Credential", "")
+        signed_headers = query_auth.get("X-Amz-SignedHeaders", "").split(";")
+        signature = query_auth["X-Amz-Signature"]
+        params = [(k, v) for k, v in params if k != "X-Amz-Signature"]
+        payload_hash = UNSIGNED_PAYLOAD
+        lifetime = int(query_auth.get("X-Amz-Expires", "0"))
+    else:
+        authorization = headers.get("authorization", "")
+        if not authorization.startswith(ALGORITHM + " "):
+            return "Missing signature"
+        fields = dict(
+            field.strip().split("=", 1)
+            for field in authorization[len(ALGORITHM) + 1 :].split(",")
+        )
+        timestamp = headers.get("x-amz-date", "")
+        credential = fields.get("Credential", "")
+        signed_headers = fields.get("SignedHeaders", "").split(";")
+        signature = fields.get("Signature", "")
+        payload_hash = headers.get("x-amz-content-sha256", "")
+        lifetime = max_skew_seconds
+
+    try:
+        signed_at = datetime.strptime(timestamp, "%Y%m%dT%H%M%SZ").replace(
+            tzinfo=timezone.utc
+        )
+    except ValueError:
+        return "Malformed date"
+    age = (now - signed_at).total_seconds()
+    if age > lifetime:
+        return "Request has expired"
+    if age < -max_skew_seconds:
+        return "Request is signed in the future"
+
+    access_key_id, _, scope = credential.partition("/")
+    if access_key_id != credentials.access_key_id:
+        return "Unknown access key"
+    if any(name not in headers for name in signed_headers):
+        return "Signed header is missing"
+    canonical_request = _canonical_request(
+        method, path, params, headers, signed_headers, payload_hash
+    )
+    expected = _signature(credentials, timestamp, scope, canonical_request)
+    if not hmac.compare_digest(expected, signature):
+        return "Signature does not match"
+    return None
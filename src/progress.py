@@ -0,0 +1,227 @@
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set
+
+# Stages of a separation job in order, and the share of the overall progress each ends at
+STAGES = {
+    "queued": 0.0,
+    "decode": 5.0,
+    "separate": 85.0,
+    "encode": 95.0,
+    "store": 100.0,
+}
+TERMINAL_STAGES = ("done", "failed")
+
+
+@dataclass
+class ProgressEvent:
+    job_id: str
+    # One of STAGES, or "done" or "failed" once the job is over
+    stage: str
+    # Overall progress of the job, 0 to 100
+    percent: float
+    # Set on the event published right after a stem is stored
+    stem_object_name: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.stage in TERMINAL_STAGES
+
+
+def overall_percent(stage: str, fraction: float = 0.0) -> float:
+    """
+    Map progress within a stage to progress of the whole job.
+
+    Args:
+        stage (str): One of STAGES
+        fraction (float): Share of the stage done, 0 to 1
+
+    Returns:
+        float: Overall percent done
+    """
+    stages = list(STAGES)
+    start = STAGES[stages[stages.index(stage) - 1]] if stage != stages[0] else 0.0
+    fraction = min(max(fraction, 0.0), 1.0)
+    return round(start + (STAGES[stage] - start) * fraction, 1)
+
+
+@dataclass
+class _JobState:
+    last: ProgressEvent
+    stem_object_names: List[str] = field(default_factory=list)
+    subscribers: Set["Subscription"] = field(default_factory=set)
+
+
+class Subscription:
+    """
+    Events of one job for one subscriber, in a bounded buffer.
+    A subscriber that falls behind loses its oldest events rather than slowing down
+    the publisher; progress is cumulative, so the newest events carry the state.
+    """
+
+    def __init__(self, job_id: str, max_events: int):
+        self.job_id = job_id
+        self._events: asyncio.Queue = asyncio.Queue(maxsize=max_events)
+        self.dropped = 0
+
+    def _offer(self, event: ProgressEvent):
+        if self._events.full():
+            self._events.get_nowait()
+            self.dropped += 1
+        self._events.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[ProgressEvent]:
+        """
+        Wait for the next event.
+
+        Args:
+            timeout (Optional[float]): Most seconds to wait, None for no limit
+
+        Returns:
+            Optional[ProgressEvent]: The event, or None if the timeout passed first
+        """
+        try:
+            return await asyncio.wait_for(self._events.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ProgressBroker:
+    """
+    In-process publish/subscribe of separation job progress.
+    Runs on the event loop: publishing is a non-blocking put per subscriber, so one
+    job can have many subscribers. Other threads publish with `call_soon_threadsafe`.
+    """
+
+    def __init__(self, logger: logging.Logger, max_events_per_subscriber: int = 64):
+        """
+        Initialize the broker.
+
+        Args:
+            logger (logging.Logger): Logger for subscribers that fall behind
+            max_events_per_subscriber (int): Events buffered for a subscriber that
+                                             reads slower than they are published
+        """
+        self.logger = logger.getChild(ProgressBroker.__name__)
+        self.max_events_per_subscriber = max_events_per_subscriber
+        self._jobs: Dict[str, _JobState] = {}
+
+    def publish(self, event: ProgressEvent):
+        """
+        Publish an event to every subscriber of its job. Must be called on the event loop.
+
+        Args:
+            event (ProgressEvent): The event
+        """
+        state = self._jobs.get(event.job_id)
+        if state is None:
+            state = _JobState(last=event)
+            self._jobs[event.job_id] = state
+        state.last = event
+        if event.stem_object_name:
+            state.stem_object_names.append(event.stem_object_name)
+        for subscription in state.subscribers:
+            subscription._offer(event)
+        if event.is_terminal:
+            # Later subscribers read the outcome from the job's record
+            del self._jobs[event.job_id]
+
+    def snapshot(self, job_id: str) -> Optional[ProgressEvent]:
+        """
+        Get the latest event of a job that is still running.
+
+        Args:
+            job_id (str): ID of the job
+
+        Returns:
+            Optional[ProgressEvent]: The latest event, or None if none was published
+                                     or the job is over
+        """
+        state = self._jobs.get(job_id)
+        return state.last if state else None
+
+    def stem_object_names(self, job_id: str) -> List[str]:
+        """
+        Get the stems a running job has stored so far.
+
+        Args:
+            job_id (str): ID of the job
+
+        Returns:
+            List[str]: Object names of the stored stems
+        """
+        state = self._jobs.get(job_id)
+        return list(state.stem_object_names) if state else []
+
+    @contextlib.contextmanager
+    def subscribe(self, job_id: str) -> Iterator[Subscription]:
+        """
+        Receive a job's events while the context is open.
+        Only events published after subscribing are received; see `snapshot` for the
+        state before.
+
+        Args:
+            job_id (str): ID of the job
+
+        Yields:
+            Subscription: Where the events arrive
+        """
+        subscription = self.open(job_id)
+        try:
+            yield subscription
+        finally:
+            self.close(subscription)
+
+    def open(self, job_id: str) -> Subscription:
+        """
+        Start buffering a job's events for a new subscriber.
+
+        Args:
+            job_id (str): ID of the job
+
+        Returns:
+            Subscription: Where the events arrive; pass it to `close` when done
+        """
+        state = self._jobs.get(job_id)
+        if state is None:
+            state = _JobState(last=ProgressEvent(job_id, "queued", 0.0))
+            self._jobs[job_id] = state
+        subscription = Subscription(job_id, self.max_events_per_subscriber)
+        state.subscribers.add(subscription)
+        return subscription
+
+    def close(self, subscription: Subscription):
+        """
+        Stop delivering events to a subscriber.
+
+        Args:
+            subscription (Subscription): Returned by `open`
+        """
+        if subscription.dropped:
+            self.logger.debug(
+                f"A subscriber of job {subscription.job_id} fell behind and "
+                f"missed {subscription.dropped} events"
+            )
+        state = self._jobs.get(subscription.job_id)
+        if state is None:
+            return
+        state.subscribers.discard(subscription)
+        if not state.subscribers and state.last.stage == "queued":
+            # Opened for a job that never published, e.g. a finished or unknown one
+            del self._jobs[subscription.job_id]
+
+    def subscriber_count(self, job_id: str) -> int:
+        """
+        Count the subscribers of a job.
+
+        Args:
+            job_id (str): ID of the job
+
+        Returns:
+            int: Number of open subscriptions
+        """
+        state = self._jobs.get(job_id)
+        return len(state.subscribers) if state else 0
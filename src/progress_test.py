@@ -0,0 +1,80 @@
+import logging
+import pytest
+from src.progress import ProgressBroker, ProgressEvent, overall_percent
+
+pytestmark = pytest.mark.anyio
+
+
+class Fixture:
+    def __init__(self, **kwargs):
+        self.broker = ProgressBroker(logging.getLogger(__name__), **kwargs)
+
+
+def test_overall_percent():
+    """Test progress within each stage maps into that stage's share of the job"""
+    assert overall_percent("decode") == 0.0
+    assert overall_percent("decode", 1.0) == 5.0
+    assert overall_percent("separate", 0.5) == 45.0
+    assert overall_percent("store", 1.0) == 100.0
+    assert overall_percent("separate", 2.0) == 85.0
+
+
+async def test_every_subscriber_gets_every_event():
+    """Test events fan out to all subscribers of a job and no other"""
+    f = Fixture()
+    first = f.broker.open("a")
+    second = f.broker.open("a")
+    other = f.broker.open("b")
+    assert f.broker.subscriber_count("a") == 2
+
+    events = [
+        ProgressEvent("a", "separate", 20.0),
+        ProgressEvent("a", "store", 97.5, stem_object_name="stems/k/drums.mp3"),
+        ProgressEvent("a", "done", 100.0),
+    ]
+    for event in events:
+        f.broker.publish(event)
+
+    for subscription in (first, second):
+        assert [await subscription.get() for _ in events] == events
+    assert await other.get(timeout=0.01) is None
+    f.broker.close(other)
+
+    # A finished job's subscribers are released with it
+    assert f.broker.subscriber_count("a") == 0
+    assert f.broker.subscriber_count("b") == 0
+
+
+async def test_snapshot_of_running_job():
+    """Test late subscribers can read the latest state, until the job is over"""
+    f = Fixture()
+    f.broker.publish(ProgressEvent("a", "store", 97.5, stem_object_name="stems/k/a"))
+    f.broker.publish(ProgressEvent("a", "store", 100.0, stem_object_name="stems/k/b"))
+
+    assert f.broker.snapshot("a").percent == 100.0
+    assert f.broker.stem_object_names("a") == ["stems/k/a", "stems/k/b"]
+
+    f.broker.publish(ProgressEvent("a", "failed", 0.0, error="boom"))
+    assert f.broker.snapshot("a") is None
+    assert f.broker.stem_object_names("a") == []
+
+
+async def test_slow_subscriber_keeps_newest_events():
+    """Test a subscriber that falls behind drops its oldest events, not the publisher"""
+    f = Fixture(max_events_per_subscriber=4)
+    with f.broker.subscribe("a") as subscription:
+        for percent in range(10):
+            f.broker.publish(ProgressEvent("a", "separate", float(percent)))
+        f.broker.publish(ProgressEvent("a", "done", 100.0))
+
+        received = [await subscription.get() for _ in range(4)]
+        assert [event.percent for event in received] == [7.0, 8.0, 9.0, 100.0]
+        assert subscription.dropped == 7
+
+
+async def test_unpublished_subscriptions_are_forgotten():
+    """Test subscribing to a job that never publishes leaves nothing behind"""
+    f = Fixture()
+    with f.broker.subscribe("finished"):
+        assert f.broker.snapshot("finished").stage == "queued"
+    assert f.broker.snapshot("finished") is None
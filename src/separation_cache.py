@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+from typing import List, Optional
+from src.kv.inter import Kv
+from src.object_storage.inter import ObjectStorage
+
+
+class SeparationCache:
+    """
+    Remembers which stored stems a separation produced, keyed by the input's content hash,
+    the separator implementation and its options, so repeated inputs skip separation.
+    """
+
+    def __init__(self, kv: Kv, storage: ObjectStorage, logger: logging.Logger):
+        """
+        Initialize the cache.
+
+        Args:
+            kv (Kv): Where cache entries are kept
+            storage (ObjectStorage): Where the cached stems are stored
+            logger (logging.Logger): Logger for hits and misses
+        """
+        self.kv = kv
+        self.storage = storage
+        self.logger = logger.getChild(SeparationCache.__name__)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content_hash: str, separator_impl: str, options: dict) -> str:
+        """
+        Build the cache key for a separation.
+
+        Args:
+            content_hash (str): Digest of the input audio
+            separator_impl (str): Name the separator is registered under in the factory
+            options (dict): The separator's output-affecting options
+
+        Returns:
+            str: The cache key
+        """
+        identity = json.dumps(
+            [content_hash, separator_impl, options],
+            sort_keys=True,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def _kv_key(self, key: str) -> str:
+        return f"separation_cache:{key}"
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        """
+        Look up the stems of a cached separation.
+        An entry whose stems are no longer all in storage counts as a miss.
+
+        Args:
+            key (str): The cache key
+
+        Returns:
+            Optional[List[str]]: Object names of the stems if cached, None otherwise
+        """
+        stem_object_names = await self.kv.get(self._kv_key(key))
+        if stem_object_names is not None:
+            for object_name in stem_object_names:
+                if not await self.storage.aexists(object_name):
+                    self.logger.warning(f"Cached stem {object_name} is gone")
+                    stem_object_names = None
+                    break
+
+        if stem_object_names is None:
+            self.misses += 1
+            self.logger.info(f"Separation cache miss for {key}")
+            return None
+
+        self.hits += 1
+        self.logger.info(f"Separation cache hit for {key}")
+        return list(stem_object_names)
+
+    async def put(self, key: str, stem_object_names: List[str]) -> bool:
+        """
+        Remember the stems of a finished separation.
+
+        Args:
+            key (str): The cache key
+            stem_object_names (List[str]): Object names of the stored stems
+
+        Returns:
+            bool: True if the entry was stored, False otherwise
+        """
+        return await self.kv.put(self._kv_key(key), list(stem_object_names))
+
+    def stats(self) -> dict:
+        """
+        Get hit and miss counts since the cache was created.
+
+        Returns:
+            dict: hits, misses and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
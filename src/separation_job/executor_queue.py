@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+from src.admission import AdmissionController, Ticket
+from src.decoded_audio import DecodedAudioCache
+from src.metrics import MetricsRegistry
+from src.object_storage.inter import ObjectStorage
+from src.progress import ProgressBroker, ProgressEvent, overall_percent
+from src.separation_cache import SeparationCache
+from src.separation_job.inter import SeparationJobQueue
+from src.separation_job.separation_job import SeparationJob
+from src.stem_encoding import StemEncoder, list_wav_files
+from src.upload_record.upload_record_db.inter import UploadRecordRepository
+from src.waveform_peaks import WaveformPeaks
+
+
+class ExecutorSeparationJobQueue(SeparationJobQueue):
+    """
+    Base for queues that run separations on a bounded concurrent.futures executor.
+    Tracks job state in the repository and stores the stems once a separation is done.
+    """
+
+    def __init__(
+        self,
+        repository: UploadRecordRepository,
+        storage: ObjectStorage,
+        logger: logging.Logger,
+        executor: Executor,
+        separate: Callable[[str, str, bool, str], float],
+        max_workers: int,
+        separation_cache: Optional[SeparationCache] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        decoded_audio_cache: Optional[DecodedAudioCache] = None,
+        waveform_peaks: Optional[WaveformPeaks] = None,
+        stem_encoder: Optional[StemEncoder] = None,
+        progress: Optional[ProgressBroker] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            repository (UploadRecordRepository): Where job state is recorded
+            storage (ObjectStorage): Where inputs are read from and stems are stored
+            logger (logging.Logger): Logger for job lifecycle events
+            executor (Executor): Runs the separations
+            separate (Callable[[str, str, bool, str], float]): Run on the executor with the
+                input path, the output directory, whether the input is decoded PCM and
+                the job ID; returns the seconds the separation took. Implementations
+                relay the separator's progress to `_report_separation`
+            max_workers (int): Number of separations run at once
+            separation_cache (Optional[SeparationCache]): Where finished jobs with a cache key
+                                                          record their stems
+            metrics (Optional[MetricsRegistry]): Where job timings and queue depth are recorded
+            decoded_audio_cache (Optional[DecodedAudioCache]): If set, inputs are separated
+                from their cached decoded PCM instead of the compressed file
+            waveform_peaks (Optional[WaveformPeaks]): If set, the peaks of the input and
+                                                      every stem are stored with the stems
+            stem_encoder (Optional[StemEncoder]): If set, stems are encoded before they are
+                                                  stored, e.g. to MP3
+            progress (Optional[ProgressBroker]): If set, each job's stage and percent done
+                                                 are published to it
+            admission (Optional[AdmissionController]): Decides when queued jobs get a
+                worker; defaults to one with max_workers slots and an unbounded queue
+        """
+        self.repository = repository
+        self.storage = storage
+        self.separation_cache = separation_cache
+        self.decoded_audio_cache = decoded_audio_cache
+        self.waveform_peaks = waveform_peaks
+        self.stem_encoder = stem_encoder
+        self.progress = progress
+        self.logger = logger
+        self.max_workers = max_workers
+        self._executor = executor
+        self._separate = separate
+        # Lets a job be marked running only once a worker is actually free
+        self.admission = admission or AdmissionController(
+            max_workers, logger, metrics=metrics
+        )
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        metrics = metrics or MetricsRegistry()
+        self.active = metrics.gauge(
+            "separations_active", "Separation jobs running on a worker"
+        )
+        self.stage_seconds = metrics.histogram(
+            "separation_stage_seconds",
+            "Time spent in each stage of a separation job",
+            ["stage"],
+        )
+        self.job_seconds = metrics.histogram(
+            "separation_job_seconds",
+            "Time from a separation job starting to finishing",
+            ["status"],
+        )
+
+    async def enqueue(self, job: SeparationJob, ticket: Optional[Ticket] = None) -> str:
+        self._loop = asyncio.get_running_loop()
+        ticket = ticket or self.admission.reserve(job.client_id, bounded=False)
+        task = asyncio.create_task(self.run(job, ticket))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.logger.info(f"Enqueued separation job {job.id}")
+        return job.id
+
+    async def run(
+        self, job: SeparationJob, ticket: Optional[Ticket] = None
+    ) -> Optional[str]:
+        """
+        Run a job once it gets a worker, and wait for it to finish.
+        `enqueue` runs jobs with this in the background; workers of a shared
+        JobStore call it directly for the jobs they claim.
+
+        Args:
+            job (SeparationJob): The job to run
+            ticket (Optional[Ticket]): The job's place in the admission queue; without
+                                       one it waits its turn past the queue's bounds
+
+        Returns:
+            Optional[str]: The job's final status, "done" or "failed", or None if it
+                           has no upload record
+        """
+        self._loop = asyncio.get_running_loop()
+        ticket = ticket or self.admission.reserve(job.client_id, bounded=False)
+        async with self.admission.slot(ticket):
+            record = await self.repository.get(job.id)
+            if record is None:
+                self.logger.error(f"No upload record for separation job {job.id}")
+                return None
+
+            record.status = "running"
+            record.started_at = datetime.now()
+            await self.repository.put(record)
+            self.logger.info(f"Running separation job {job.id}")
+
+            self.active.inc()
+            started = time.perf_counter()
+            try:
+                with tempfile.TemporaryDirectory(
+                    prefix=f"separation-{job.id}-"
+                ) as output_dir:
+                    self._publish(job.id, "decode")
+                    async with self._local_input(job) as (input_file, decoded):
+                        self._publish(job.id, "separate")
+                        loop = asyncio.get_running_loop()
+                        with self.stage_seconds.time(stage="separate"):
+                            record.separation_seconds = await loop.run_in_executor(
+                                self._executor,
+                                self._separate,
+                                input_file,
+                                output_dir,
+                                decoded,
+                                job.id,
+                            )
+                    self._publish(job.id, "encode")
+                    if self.waveform_peaks is not None:
+                        # From the separator's WAVs, before they are encoded
+                        with self.stage_seconds.time(stage="peaks"):
+                            await self._store_peaks(job, output_dir)
+                    content_types = {}
+                    if self.stem_encoder is not None:
+                        with self.stage_seconds.time(stage="encode_stems"):
+                            content_types = await self.stem_encoder.encode_dir(
+                                output_dir
+                            )
+                    self._publish(job.id, "store")
+                    with self.stage_seconds.time(stage="store_stems"):
+                        record.stem_object_names = await self._store_stems(
+                            job, output_dir, content_types
+                        )
+                if job.cache_key and self.separation_cache:
+                    await self.separation_cache.put(
+                        job.cache_key, record.stem_object_names
+                    )
+                record.status = "done"
+                self.logger.info(
+                    f"Separation job {job.id} done in {record.separation_seconds:.2f}s"
+                )
+            except Exception as e:
+                record.status = "failed"
+                record.error = str(e)
+                self.logger.error(f"Separation job {job.id} failed: {str(e)}")
+            finally:
+                self.active.dec()
+            self.job_seconds.observe(
+                time.perf_counter() - started, status=record.status
+            )
+
+            record.finished_at = datetime.now()
+            await self.repository.put(record)
+            if self.progress is not None:
+                # Published once the record is final, so subscribers can read it back
+                self.progress.publish(
+                    ProgressEvent(
+                        job.id,
+                        record.status,
+                        100.0 if record.status == "done" else 0.0,
+                        error=record.error,
+                    )
+                )
+            return record.status
+
+    def _publish(self, job_id: str, stage: str, fraction: float = 0.0, **kwargs):
+        """Publish progress within a stage. Must be called on the event loop."""
+        if self.progress is not None:
+            self.progress.publish(
+                ProgressEvent(job_id, stage, overall_percent(stage, fraction), **kwargs)
+            )
+
+    def _report_separation(self, job_id: str, fraction: float):
+        """
+        Publish the separator's progress; safe to call from any thread, so executor
+        workers and the threads relaying worker processes' progress can call it.
+        """
+        if self.progress is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._publish, job_id, "separate", fraction)
+
+    @asynccontextmanager
+    async def _local_input(self, job: SeparationJob) -> AsyncIterator[Tuple[str, bool]]:
+        """Local path to the job's input, and whether it is decoded PCM rather than the upload."""
+        started = time.perf_counter()
+        if self.decoded_audio_cache is not None:
+            async with self.decoded_audio_cache.alocal_path(
+                job.input_object_name
+            ) as decoded_file:
+                self.stage_seconds.observe(
+                    time.perf_counter() - started, stage="decode"
+                )
+                yield decoded_file, True
+            return
+
+        # The input is read in place when storage is local
+        async with self.storage.alocal_path(job.input_object_name) as input_file:
+            self.stage_seconds.observe(
+                time.perf_counter() - started, stage="fetch_input"
+            )
+            yield input_file, False
+
+    async def _store_stems(
+        self, job: SeparationJob, output_dir: str, content_types: Dict[str, str]
+    ) -> List[str]:
+        paths = sorted(
+            os.path.join(dir_path, file_name)
+            for dir_path, _, file_names in os.walk(output_dir)
+            for file_name in file_names
+        )
+        object_names = []
+        for index, path in enumerate(paths):
+            relative = os.path.relpath(path, output_dir).replace(os.sep, "/")
+            object_name = f"{job.output_prefix}/{relative}"
+            await self.storage.aupload(
+                object_name,
+                path,
+                content_type=content_types.get(path) or mimetypes.guess_type(path)[0],
+            )
+            object_names.append(object_name)
+            # Each stem can be linked as soon as it is stored
+            self._publish(
+                job.id,
+                "store",
+                (index + 1) / len(paths),
+                stem_object_name=object_name,
+            )
+        return sorted(object_names)
+
+    async def _store_peaks(self, job: SeparationJob, output_dir: str):
+        """Compute waveform peaks; a failure only costs the waveform, not the job."""
+        names = [job.input_object_name]
+        peaks = [self.waveform_peaks.ensure(job.input_object_name)]
+        for path in list_wav_files(output_dir):
+            relative = os.path.relpath(path, output_dir).replace(os.sep, "/")
+            stored = [relative]
+            if self.stem_encoder is not None:
+                stored = self.stem_encoder.output_names(relative)
+            names.append(relative)
+            peaks.append(
+                self.waveform_peaks.compute_file(
+                    path, [f"{job.output_prefix}/{name}" for name in stored]
+                )
+            )
+        results = await asyncio.gather(*peaks, return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                self.logger.warning(f"No waveform peaks for {name}: {str(result)}")
+
+    async def shutdown(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown(wait=True)
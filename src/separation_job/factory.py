@@ -0,0 +1,40 @@
+from typing import Dict, Type, Literal
+from src.separation_job.inter import SeparationJobQueue
+from src.separation_job.impl_process_pool import ProcessPoolSeparationJobQueue
+from src.separation_job.impl_thread_pool import ThreadPoolSeparationJobQueue
+
+
+class SeparationJobQueueFactory:
+    """
+    Factory class for creating SeparationJobQueue instances.
+    """
+
+    _queue_types: Dict[str, Type[SeparationJobQueue]] = {
+        "process_pool": ProcessPoolSeparationJobQueue,
+        "thread_pool": ThreadPoolSeparationJobQueue,
+    }
+
+    @classmethod
+    def create(
+        cls, impl: Literal["process_pool", "thread_pool"], **kwargs
+    ) -> SeparationJobQueue:
+        """
+        Create an instance of the specified separation job queue.
+
+        Args:
+            impl (Literal["process_pool", "thread_pool"]): The type of queue to create
+            **kwargs: Arguments to pass to the queue constructor
+
+        Returns:
+            SeparationJobQueue: An instance of the requested queue
+
+        Raises:
+            ValueError: If the queue type is not supported
+        """
+        if impl not in cls._queue_types:
+            raise ValueError(
+                f"Unsupported queue type: {impl}. "
+                f"Supported types are: {', '.join(cls._queue_types.keys())}"
+            )
+
+        return cls._queue_types[impl](**kwargs)
@@ -0,0 +1,98 @@
+import logging
+import math
+from typing import Optional
+from src.admission import AdmissionController, AdmissionRejected, Ticket
+from src.job_store.inter import JobStore
+from src.separation_job.inter import SeparationJobQueue
+from src.separation_job.separation_job import SeparationJob
+
+
+class DistributedSeparationJobQueue(SeparationJobQueue):
+    """
+    Adds jobs to a JobStore shared by every node, where any node's SeparationWorker
+    can claim them. Jobs survive restarts of the node that accepted them.
+    A job's admission ticket is released once it is in the store, so the store's
+    backlog is bounded separately, by `check_capacity`.
+    """
+
+    # How far back finished jobs are counted to estimate Retry-After
+    COMPLETION_RATE_WINDOW_SECONDS = 10 * 60
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        logger: logging.Logger,
+        admission: Optional[AdmissionController] = None,
+        local_queue: Optional[SeparationJobQueue] = None,
+        max_backlog: Optional[int] = None,
+    ):
+        """
+        Initialize the queue.
+
+        Args:
+            job_store (JobStore): Where jobs are added
+            logger (logging.Logger): Logger for enqueued jobs
+            admission (Optional[AdmissionController]): Releases the tickets of enqueued
+                jobs, which no longer wait on this node
+            local_queue (Optional[SeparationJobQueue]): The queue this node's worker
+                                                        runs claimed jobs on, if any;
+                                                        shut down with this queue
+            max_backlog (Optional[int]): Jobs waiting in the store, on every node,
+                                         before new ones are rejected; None for no limit
+        """
+        self.job_store = job_store
+        self.admission = admission
+        self.local_queue = local_queue
+        self.max_backlog = max_backlog
+        self.logger = logger.getChild(DistributedSeparationJobQueue.__name__)
+
+    async def retry_after_seconds(self, excess: int = 1) -> int:
+        """
+        Estimate when the backlog will have room, from how fast jobs are finishing
+        across every node.
+
+        Args:
+            excess (int): Jobs that must finish first
+
+        Returns:
+            int: Seconds, at least 1
+        """
+        rate = await self.job_store.completion_rate(self.COMPLETION_RATE_WINDOW_SECONDS)
+        if rate > 0:
+            return max(1, math.ceil(excess / rate))
+        # Nothing finished lately; fall back on this node's job durations
+        if self.admission is not None:
+            return self.admission.retry_after_seconds() * excess
+        return self.COMPLETION_RATE_WINDOW_SECONDS
+
+    async def check_capacity(self) -> None:
+        if self.max_backlog is None:
+            return
+        stats = await self.job_store.stats()
+        # Expired leases are claimed again, so their jobs are still waiting
+        backlog = stats["pending"] + stats["expired"]
+        if backlog < self.max_backlog:
+            return
+        retry_after = await self.retry_after_seconds(backlog - self.max_backlog + 1)
+        if self.admission is not None:
+            self.admission.rejections.inc(reason="backlog_full")
+        self.logger.warning(
+            f"Rejected a separation, {backlog} waiting in the job store; "
+            f"retry after {retry_after}s"
+        )
+        raise AdmissionRejected("backlog_full", retry_after)
+
+    async def enqueue(self, job: SeparationJob, ticket: Optional[Ticket] = None) -> str:
+        try:
+            if not await self.job_store.put(job):
+                self.logger.warning(f"Separation job {job.id} was already enqueued")
+        finally:
+            if ticket is not None and self.admission is not None:
+                self.admission.release(ticket)
+        self.logger.info(f"Enqueued separation job {job.id}")
+        return job.id
+
+    async def shutdown(self) -> None:
+        if self.local_queue is not None:
+            await self.local_queue.shutdown()
+        self.job_store.close()
@@ -0,0 +1,144 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+from src.admission import AdmissionController
+from src.audio_source_separator.inter import AudioSourceSeparator
+from src.decoded_audio import DecodedAudioCache
+from src.metrics import MetricsRegistry
+from src.object_storage.inter import ObjectStorage
+from src.progress import ProgressBroker
+from src.separation_cache import SeparationCache
+from src.separation_job.executor_queue import ExecutorSeparationJobQueue
+from src.stem_encoding import StemEncoder
+from src.upload_record.upload_record_db.inter import UploadRecordRepository
+from src.waveform_peaks import WaveformPeaks
+
+# Separator owned by the current worker process, created once by _init_worker
+_worker_separator: Optional[AudioSourceSeparator] = None
+# Where the current worker process sends (job ID, fraction) progress to the parent
+_worker_progress: Optional[multiprocessing.Queue] = None
+
+
+def _init_worker(
+    separator_factory: Callable[[], AudioSourceSeparator],
+    progress_queue: Optional[multiprocessing.Queue] = None,
+):
+    global _worker_separator, _worker_progress
+    _worker_separator = separator_factory()
+    _worker_progress = progress_queue
+
+
+def _separate(input_file: str, output_dir: str, decoded: bool, job_id: str) -> float:
+    started = time.perf_counter()
+    progress = None
+    if _worker_progress is not None:
+
+        def progress(fraction: float):
+            _worker_progress.put((job_id, fraction))
+
+    if decoded:
+        _worker_separator.separate_decoded(
+            decoded_file=input_file, output_dir=output_dir, progress=progress
+        )
+    else:
+        _worker_separator.separate(
+            input_file=input_file, output_dir=output_dir, progress=progress
+        )
+    return time.perf_counter() - started
+
+
+class ProcessPoolSeparationJobQueue(ExecutorSeparationJobQueue):
+    """
+    Runs separation jobs on a bounded pool of worker processes.
+    Each worker builds its separator once, so in-process engines stay warm across jobs.
+    """
+
+    def __init__(
+        self,
+        repository: UploadRecordRepository,
+        storage: ObjectStorage,
+        separator_factory: Callable[[], AudioSourceSeparator],
+        logger: logging.Logger,
+        max_workers: int = 1,
+        separation_cache: Optional[SeparationCache] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        decoded_audio_cache: Optional[DecodedAudioCache] = None,
+        waveform_peaks: Optional[WaveformPeaks] = None,
+        stem_encoder: Optional[StemEncoder] = None,
+        progress: Optional[ProgressBroker] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        """
+        Initialize the queue. Worker processes are started on the first job.
+
+        Args:
+            repository (UploadRecordRepository): Where job state is recorded
+            storage (ObjectStorage): Where inputs are read from and stems are stored
+            separator_factory (Callable[[], AudioSourceSeparator]): Picklable callable
+                that builds the separator inside each worker process
+            logger (logging.Logger): Logger for job lifecycle events
+            max_workers (int): Number of worker processes, i.e. concurrent separations
+            separation_cache (Optional[SeparationCache]): Where finished jobs with a cache key
+                                                          record their stems
+            metrics (Optional[MetricsRegistry]): Where job timings and queue depth are recorded
+            decoded_audio_cache (Optional[DecodedAudioCache]): If set, inputs are separated
+                from their cached decoded PCM instead of the compressed file
+            waveform_peaks (Optional[WaveformPeaks]): If set, the peaks of the input and
+                                                      every stem are stored with the stems
+            stem_encoder (Optional[StemEncoder]): If set, stems are encoded before they are
+                                                  stored, e.g. to MP3
+            progress (Optional[ProgressBroker]): If set, each job's stage and percent done
+                                                 are published to it, including the
+                                                 separators' progress from the workers
+            admission (Optional[AdmissionController]): Decides when queued jobs get a
+                worker; defaults to one with max_workers slots and an unbounded queue
+        """
+        context = multiprocessing.get_context("spawn")
+        self._progress_queue = context.Queue() if progress is not None else None
+        super().__init__(
+            repository=repository,
+            storage=storage,
+            logger=logger.getChild(ProcessPoolSeparationJobQueue.__name__),
+            # Spawn rather than fork: the parent runs an event loop and torch threads
+            executor=ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(separator_factory, self._progress_queue),
+            ),
+            separate=_separate,
+            max_workers=max_workers,
+            separation_cache=separation_cache,
+            metrics=metrics,
+            decoded_audio_cache=decoded_audio_cache,
+            waveform_peaks=waveform_peaks,
+            stem_encoder=stem_encoder,
+            progress=progress,
+            admission=admission,
+        )
+
+        self._progress_relay: Optional[threading.Thread] = None
+        if self._progress_queue is not None:
+            self._progress_relay = threading.Thread(
+                target=self._relay_progress, name="separation-progress", daemon=True
+            )
+            self._progress_relay.start()
+
+    def _relay_progress(self):
+        """Hand the workers' progress to the event loop until shutdown sends None."""
+        while True:
+            message = self._progress_queue.get()
+            if message is None:
+                return
+            self._report_separation(*message)
+
+    async def shutdown(self) -> None:
+        await super().shutdown()
+        if self._progress_relay is not None:
+            self._progress_queue.put(None)
+            self._progress_relay.join()
+            self._progress_relay = None
+            self._progress_queue.close()
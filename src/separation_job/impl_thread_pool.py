@@ -0,0 +1,102 @@
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from src.admission import AdmissionController
+from src.audio_source_separator.inter import AudioSourceSeparator
+from src.decoded_audio import DecodedAudioCache
+from src.metrics import MetricsRegistry
+from src.object_storage.inter import ObjectStorage
+from src.progress import ProgressBroker
+from src.separation_cache import SeparationCache
+from src.separation_job.executor_queue import ExecutorSeparationJobQueue
+from src.stem_encoding import StemEncoder
+from src.upload_record.upload_record_db.inter import UploadRecordRepository
+from src.waveform_peaks import WaveformPeaks
+
+
+class ThreadPoolSeparationJobQueue(ExecutorSeparationJobQueue):
+    """
+    Runs separation jobs on a pool of threads that share one separator.
+    Suited to separators that release the GIL and gain from seeing concurrent calls,
+    such as the batching Demucs separator.
+    """
+
+    def __init__(
+        self,
+        repository: UploadRecordRepository,
+        storage: ObjectStorage,
+        separator_factory: Callable[[], AudioSourceSeparator],
+        logger: logging.Logger,
+        max_workers: int = 1,
+        separation_cache: Optional[SeparationCache] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        decoded_audio_cache: Optional[DecodedAudioCache] = None,
+        waveform_peaks: Optional[WaveformPeaks] = None,
+        stem_encoder: Optional[StemEncoder] = None,
+        progress: Optional[ProgressBroker] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        """
+        Initialize the queue and build the shared separator.
+
+        Args:
+            repository (UploadRecordRepository): Where job state is recorded
+            storage (ObjectStorage): Where inputs are read from and stems are stored
+            separator_factory (Callable[[], AudioSourceSeparator]): Builds the shared separator
+            logger (logging.Logger): Logger for job lifecycle events
+            max_workers (int): Number of threads, i.e. concurrent separate calls
+            separation_cache (Optional[SeparationCache]): Where finished jobs with a cache key
+                                                          record their stems
+            metrics (Optional[MetricsRegistry]): Where job timings and queue depth are recorded
+            decoded_audio_cache (Optional[DecodedAudioCache]): If set, inputs are separated
+                from their cached decoded PCM instead of the compressed file
+            waveform_peaks (Optional[WaveformPeaks]): If set, the peaks of the input and
+                                                      every stem are stored with the stems
+            stem_encoder (Optional[StemEncoder]): If set, stems are encoded before they are
+                                                  stored, e.g. to MP3
+            progress (Optional[ProgressBroker]): If set, each job's stage and percent done
+                                                 are published to it
+            admission (Optional[AdmissionController]): Decides when queued jobs get a
+                worker; defaults to one with max_workers slots and an unbounded queue
+        """
+        self.separator = separator_factory()
+        super().__init__(
+            repository=repository,
+            storage=storage,
+            logger=logger.getChild(ThreadPoolSeparationJobQueue.__name__),
+            executor=ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="separation-job"
+            ),
+            separate=self._separate_shared,
+            max_workers=max_workers,
+            separation_cache=separation_cache,
+            metrics=metrics,
+            decoded_audio_cache=decoded_audio_cache,
+            waveform_peaks=waveform_peaks,
+            stem_encoder=stem_encoder,
+            progress=progress,
+            admission=admission,
+        )
+
+    async def shutdown(self) -> None:
+        await super().shutdown()
+        close = getattr(self.separator, "close", None)
+        if close is not None:
+            close()
+
+    def _separate_shared(
+        self, input_file: str, output_dir: str, decoded: bool, job_id: str
+    ) -> float:
+        started = time.perf_counter()
+        progress = functools.partial(self._report_separation, job_id)
+        if decoded:
+            self.separator.separate_decoded(
+                decoded_file=input_file, output_dir=output_dir, progress=progress
+            )
+        else:
+            self.separator.separate(
+                input_file=input_file, output_dir=output_dir, progress=progress
+            )
+        return time.perf_counter() - started
@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+from src.admission import Ticket
+from src.separation_job.separation_job import SeparationJob
+
+
+class SeparationJobQueue(ABC):
+    """
+    Interface for running audio source separation jobs in the background.
+    The state of each job is kept in the UploadRecord with the same ID.
+    """
+
+    @abstractmethod
+    async def enqueue(self, job: SeparationJob, ticket: Optional[Ticket] = None) -> str:
+        """
+        Enqueue a separation job and return without waiting for it to run.
+
+        Args:
+            job (SeparationJob): The job to run
+            ticket (Optional[Ticket]): The job's place in the admission queue, reserved
+                before the upload was read; without one the job waits its turn past
+                the queue's bounds
+
+        Returns:
+            str: The ID of the enqueued job
+        """
+        pass
+
+    async def check_capacity(self) -> None:
+        """
+        Turn a new job away before its upload is read if the queue's backlog is full.
+        Queues whose jobs wait on this node are bounded by their admission tickets,
+        so by default nothing is checked.
+
+        Raises:
+            AdmissionRejected: If the backlog is full
+        """
+
+    @abstractmethod
+    async def shutdown(self) -> None:
+        """
+        Stop accepting jobs and wait for the running ones to finish.
+        """
+        pass
@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class SeparationJob:
+    id: str
+    input_object_name: str
+    # Object name prefix the separated stems are stored under
+    output_prefix: str
+    # SeparationCache key the stems are recorded under once the job is done
+    cache_key: Optional[str] = None
+    # Who the job is for, e.g. the client address; jobs are admitted fairly across clients
+    client_id: str = "anonymous"
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Optional, Set
+from src.job_store.inter import JobStore, Lease
+from src.progress import TERMINAL_STAGES
+from src.separation_job.executor_queue import ExecutorSeparationJobQueue
+
+
+class SeparationWorker:
+    """
+    Runs the jobs of a shared JobStore on a local queue's executor.
+    Claims a job only when the queue has a free worker, so jobs are not held by a
+    busy node, and renews each lease while its job runs. If this process dies its
+    leases run out and workers on other nodes claim the jobs again.
+    """
+
+    def __init__(
+        self,
+        job_store: JobStore,
+        queue: ExecutorSeparationJobQueue,
+        logger: logging.Logger,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 60.0,
+        poll_seconds: float = 1.0,
+        max_attempts: int = 3,
+    ):
+        """
+        Initialize the worker.
+
+        Args:
+            job_store (JobStore): Where jobs are claimed from
+            queue (ExecutorSeparationJobQueue): Runs the claimed jobs; its max_workers
+                                                bounds the jobs claimed at once
+            logger (logging.Logger): Logger for claims and lost leases
+            worker_id (Optional[str]): Name of this worker in the store, defaults to
+                                       the host, process ID and a random suffix
+            lease_seconds (float): How long a lease lasts; renewed every third of it
+            poll_seconds (float): How long to wait before claiming again when the
+                                  store has no jobs
+            max_attempts (int): Claims of a job before it is marked failed, so a job
+                                that kills its workers is not retried forever
+        """
+        self.job_store = job_store
+        self.queue = queue
+        self.logger = logger.getChild(SeparationWorker.__name__)
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        )
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._jobs: Set[asyncio.Task] = set()
+
+    def start(self):
+        """Start claiming jobs in the background. Must be called on the event loop."""
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self):
+        """Claim and run jobs until `stop` is called."""
+        slots = asyncio.Semaphore(self.queue.max_workers)
+        self.logger.info(
+            f"Worker {self.worker_id} running up to {self.queue.max_workers} job(s)"
+        )
+        while not self._stopping.is_set():
+            await slots.acquire()
+            lease = None
+            try:
+                lease = await self.job_store.claim(self.worker_id, self.lease_seconds)
+            except Exception as e:
+                self.logger.error(f"Could not claim a separation job: {str(e)}")
+            if lease is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._process(lease))
+            self._jobs.add(task)
+            task.add_done_callback(self._jobs.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _process(self, lease: Lease):
+        job = lease.job
+        self.logger.info(f"Claimed separation job {job.id}, attempt {lease.attempt}")
+        heartbeat = asyncio.create_task(self._heartbeat(lease))
+        try:
+            record = await self.queue.repository.get(job.id)
+            if record is not None and record.status in TERMINAL_STAGES:
+                # A worker finished it, then died before completing the lease
+                error = record.error if record.status == "failed" else None
+            elif record is not None and lease.attempt > self.max_attempts:
+                record.status = "failed"
+                record.error = f"Gave up after {lease.attempt - 1} attempts"
+                record.finished_at = datetime.now()
+                await self.queue.repository.put(record)
+                error = record.error
+            else:
+                status = await self.queue.run(job)
+                error = None
+                if status != "done":
+                    error = f"Separation job {job.id} {status or 'has no record'}"
+        except Exception as e:
+            # Left leased, so the job is retried once the lease runs out
+            self.logger.error(f"Separation job {job.id} interrupted: {str(e)}")
+            return
+        finally:
+            heartbeat.cancel()
+
+        if not await self.job_store.complete(lease, error):
+            self.logger.warning(
+                f"Separation job {job.id} finished after its lease was lost"
+            )
+
+    async def _heartbeat(self, lease: Lease):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.job_store.renew(lease, self.lease_seconds)
+            except Exception as e:
+                self.logger.warning(f"Could not renew lease of {lease.job.id}: {e}")
+                continue
+            if not renewed:
+                # The job runs to the end; only the first completion counts
+                self.logger.warning(
+                    f"Lost lease of separation job {lease.job.id} to another worker"
+                )
+                return
+
+    async def stop(self):
+        """Stop claiming jobs and wait for the claimed ones to finish."""
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+        if self._jobs:
+            await asyncio.gather(*self._jobs, return_exceptions=True)
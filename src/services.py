@@ -0,0 +1,361 @@
+import functools
+import json
+import logging
+import shutil
+from dataclasses import dataclass
+from typing import Callable, Optional
+from fastapi import APIRouter, Request
+from src.admission import (
+    AdmissionController,
+    default_concurrency,
+    segmented_concurrency,
+)
+from src.audio_encoder.factory import AudioEncoderFactory
+from src.audio_source_separator.factory import AudioSourceSeparatorFactory
+from src.audio_source_separator.inter import AudioSourceSeparator
+from src.decoded_audio import DecodedAudioCache
+from src.job_store.factory import JobStoreFactory
+from src.job_store.inter import JobStore
+from src.kv.factory import KvFactory
+from src.kv.impl_instrumented import InstrumentedKv
+from src.kv.inter import Kv
+from src.metrics import MetricsRegistry
+from src.object_storage.factory import ObjectStorageFactory
+from src.object_storage.impl_instrumented import InstrumentedObjectStorage
+from src.object_storage.inter import ObjectStorage
+from src.progress import ProgressBroker
+from src.separation_cache import SeparationCache
+from src.separation_job.factory import SeparationJobQueueFactory
+from src.separation_job.impl_distributed import DistributedSeparationJobQueue
+from src.separation_job.inter import SeparationJobQueue
+from src.separation_job.worker import SeparationWorker
+from src.settings import Settings
+from src.stem_encoding import StemEncoder
+from src.upload_ingest import UploadIngestor
+from src.upload_record.upload_record_db.impl_kv import UploadRecordRepositoryKv
+from src.upload_record.upload_record_db.inter import UploadRecordRepository
+from src.waveform_peaks import WaveformPeaks
+
+# Separators that run segments in processes of their own when segmenting
+SEGMENT_POOL_SEPARATORS = {"demucs_inprocess"}
+
+
+@dataclass
+class Services:
+    """
+    Long-lived services shared by every request.
+    Built once when the app starts and closed when it shuts down.
+    """
+
+    settings: Settings
+    metrics: MetricsRegistry
+    storage: ObjectStorage
+    kv: Kv
+    # Holds the separation and decoded-audio caches; kv itself unless those are bounded
+    cache_kv: Kv
+    upload_record_repository: UploadRecordRepository
+    # Builds the separator the job workers run, which stays loaded
+    separator_factory: Callable[[], AudioSourceSeparator]
+    # Not used to separate; describes the workers' separator, e.g. for cache keys
+    audio_source_separator: AudioSourceSeparator
+    separation_cache: SeparationCache
+    # None when the separator only takes files, or decoding is disabled
+    decoded_audio_cache: Optional[DecodedAudioCache]
+    waveform_peaks: WaveformPeaks
+    stem_encoder: StemEncoder
+    # Stage and percent done of running separation jobs, for the result pages
+    progress: ProgressBroker
+    # Bounds how many separations run and wait, so overload is rejected early
+    admission: AdmissionController
+    separation_job_queue: SeparationJobQueue
+    ingestor: UploadIngestor
+    # Shared queue of separation jobs, None when jobs run in the process that took them
+    job_store: Optional[JobStore] = None
+    # Runs jobs claimed from job_store; None when this process only enqueues them
+    separation_worker: Optional[SeparationWorker] = None
+
+    def separation_cache_key(self, content_hash: str) -> str:
+        """
+        Key the stems of some content are cached under. Covers the separator and
+        the stem format, since both change the stored stems.
+
+        Args:
+            content_hash (str): Digest of the input audio
+
+        Returns:
+            str: The cache key
+        """
+        return SeparationCache.key(
+            content_hash,
+            self.settings.separator_impl,
+            {
+                **self.audio_source_separator.options(),
+                "stems": self.stem_encoder.options(),
+            },
+        )
+
+
+def build_services(
+    settings: Settings, router: APIRouter, logger: logging.Logger
+) -> Services:
+    """
+    Build the services for the app.
+
+    Args:
+        settings (Settings): Application settings
+        router (APIRouter): Router that storage adds its routes to
+        logger (logging.Logger): Parent logger for every service
+
+    Returns:
+        Services: The built services
+
+    Raises:
+        ValueError: If the settings cannot work together, e.g. a shared job store
+                    with a Kv only this process can see
+    """
+    if settings.separation_job_store and settings.kv_impl == "dict":
+        # Workers elsewhere would claim jobs whose upload records they cannot read
+        raise ValueError(
+            "separation_job_store needs a Kv shared by every process; "
+            "set kv_impl to sqlite"
+        )
+
+    metrics = MetricsRegistry()
+
+    if settings.storage_impl == "s3":
+        storage = ObjectStorageFactory.create(
+            impl="s3",
+            bucket=settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url,
+            logger=logger,
+            region=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key,
+            addressing_style=settings.s3_addressing_style,
+            url_expires_seconds=settings.s3_url_expires_seconds,
+        )
+    else:
+        storage = ObjectStorageFactory.create(
+            impl=settings.storage_impl,
+            base_dir=f"{settings.base_dir}/demos",
+            base_url="",
+            router=router,
+            logger=logger,
+        )
+
+    kv_options = {}
+    if settings.kv_impl == "sqlite":
+        kv_options["path"] = f"{settings.base_dir}/kv.sqlite3"
+
+    kv = KvFactory.create(impl=settings.kv_impl, **kv_options)
+    if kv is None:
+        raise ValueError(f"Unsupported kv type: {settings.kv_impl}")
+
+    storage = InstrumentedObjectStorage(storage, metrics)
+    kv = InstrumentedKv(kv, metrics)
+
+    # Upload records and their indexes must never be evicted, so only the caches,
+    # which can be rebuilt, go in a bounded store
+    cache_kv = kv
+    if settings.kv_impl == "dict" and (
+        settings.cache_kv_max_entries or settings.cache_kv_max_bytes
+    ):
+        cache_kv = InstrumentedKv(
+            KvFactory.create(
+                impl="dict",
+                max_entries=settings.cache_kv_max_entries or None,
+                max_bytes=settings.cache_kv_max_bytes or None,
+            ),
+            metrics,
+        )
+
+    upload_record_repository = UploadRecordRepositoryKv(kv)
+
+    separator_options = json.loads(settings.separator_options or "{}")
+    separation_workers = settings.separation_workers
+    if settings.separation_segment_seconds:
+        separator_options["segment_seconds"] = settings.separation_segment_seconds
+    if (
+        settings.separation_segment_seconds
+        and settings.separator_impl in SEGMENT_POOL_SEPARATORS
+    ):
+        # Every separator starts its own pool of segment processes, each loading the
+        # model, unless the workers are threads sharing one separator
+        sizing = segmented_concurrency(
+            separation_workers,
+            settings.separation_memory_bytes,
+            settings.separation_segment_memory_bytes,
+            segment_workers=separator_options.get("segment_workers")
+            or settings.separation_segment_workers,
+            shared_pool=settings.separation_job_queue_impl == "thread_pool",
+        )
+        separation_workers = sizing.separation_workers
+        separator_options["segment_workers"] = sizing.segment_workers
+        separator_options.setdefault("num_threads", sizing.threads_per_separation)
+        logger.info(
+            f"Segmenting with {sizing.segment_workers} process(es) per separator "
+            f"and {separator_options['num_threads']} thread(s) per separation"
+        )
+    if settings.separator_impl == "demucs_batching":
+        separator_options["max_batch_size"] = settings.separation_batch_size
+        separator_options["max_wait_ms"] = settings.separation_batch_wait_ms
+
+    separator_factory = functools.partial(
+        AudioSourceSeparatorFactory.create,
+        impl=settings.separator_impl,
+        logger=logger,
+        **separator_options,
+    )
+
+    separation_cache = SeparationCache(cache_kv, storage, logger)
+    audio_source_separator = separator_factory()
+
+    decoded_audio_cache = None
+    decoded_format = audio_source_separator.decoded_format()
+    if decoded_format and settings.decoded_audio_cache_bytes:
+        if shutil.which("ffmpeg"):
+            sample_rate, channels = decoded_format
+            decoded_audio_cache = DecodedAudioCache(
+                storage,
+                cache_kv,
+                logger,
+                sample_rate=sample_rate,
+                channels=channels,
+                max_bytes=settings.decoded_audio_cache_bytes,
+                metrics=metrics,
+            )
+        else:
+            logger.warning("ffmpeg not found; separators will decode their own input")
+
+    waveform_peaks = WaveformPeaks(
+        storage, logger, decoded_audio_cache=decoded_audio_cache, metrics=metrics
+    )
+
+    encoder_options = {}
+    if settings.stem_bitrate_kbps and settings.stem_format != "wav":
+        encoder_options["bitrate_kbps"] = settings.stem_bitrate_kbps
+    try:
+        encoder = AudioEncoderFactory.create(
+            settings.stem_format, logger, **encoder_options
+        )
+    except RuntimeError as e:
+        logger.warning(f"{str(e)}; storing stems as mp3 instead")
+        encoder = AudioEncoderFactory.create("mp3", logger, **encoder_options)
+    stem_encoder = StemEncoder(
+        encoder, logger, keep_wav=settings.keep_wav_stems, metrics=metrics
+    )
+
+    progress = ProgressBroker(logger)
+
+    separation_workers = separation_workers or default_concurrency(
+        settings.separation_memory_bytes
+    )
+    admission = AdmissionController(
+        separation_workers,
+        logger,
+        max_queued=settings.separation_queue_max or None,
+        max_queued_per_client=settings.separation_queue_max_per_client or None,
+        metrics=metrics,
+    )
+
+    job_store = None
+    separation_worker = None
+    local_queue = None
+    if not settings.separation_job_store or settings.run_separation_worker:
+        local_queue = SeparationJobQueueFactory.create(
+            impl=settings.separation_job_queue_impl,
+            repository=upload_record_repository,
+            storage=storage,
+            separator_factory=separator_factory,
+            logger=logger,
+            max_workers=separation_workers,
+            separation_cache=separation_cache,
+            metrics=metrics,
+            decoded_audio_cache=decoded_audio_cache,
+            waveform_peaks=waveform_peaks,
+            stem_encoder=stem_encoder,
+            progress=progress,
+            admission=admission,
+        )
+    separation_job_queue = local_queue
+    if settings.separation_job_store:
+        job_store_options = {}
+        if settings.separation_job_store == "sqlite":
+            job_store_options["path"] = f"{settings.base_dir}/jobs.sqlite3"
+        job_store = JobStoreFactory.create(
+            settings.separation_job_store, **job_store_options
+        )
+        separation_job_queue = DistributedSeparationJobQueue(
+            job_store,
+            logger,
+            admission=admission,
+            local_queue=local_queue,
+            max_backlog=settings.separation_queue_max or None,
+        )
+        if local_queue is not None:
+            separation_worker = SeparationWorker(
+                job_store,
+                local_queue,
+                logger,
+                lease_seconds=settings.separation_job_lease_seconds,
+                max_attempts=settings.separation_job_max_attempts,
+            )
+
+    ingestor = UploadIngestor(
+        storage,
+        logger,
+        chunk_size=settings.ingest_chunk_size,
+        max_bytes=settings.ingest_max_bytes,
+    )
+
+    logger.info(
+        f"Built services with {separation_workers} "
+        f"{settings.separator_impl} separation worker(s)"
+    )
+
+    return Services(
+        settings=settings,
+        metrics=metrics,
+        storage=storage,
+        kv=kv,
+        cache_kv=cache_kv,
+        upload_record_repository=upload_record_repository,
+        separator_factory=separator_factory,
+        audio_source_separator=audio_source_separator,
+        separation_cache=separation_cache,
+        decoded_audio_cache=decoded_audio_cache,
+        waveform_peaks=waveform_peaks,
+        stem_encoder=stem_encoder,
+        progress=progress,
+        admission=admission,
+        separation_job_queue=separation_job_queue,
+        ingestor=ingestor,
+        job_store=job_store,
+        separation_worker=separation_worker,
+    )
+
+
+async def close_services(services: Services) -> None:
+    """
+    Wait for running jobs and release the services' resources.
+
+    Args:
+        services (Services): The services to close
+    """
+    if services.separation_worker is not None:
+        # Finishes the claimed jobs, so their leases are completed before the queue goes
+        await services.separation_worker.stop()
+    await services.separation_job_queue.shutdown()
+    services.stem_encoder.close()
+    resources = [services.kv, services.storage]
+    if services.cache_kv is not services.kv:
+        resources.append(services.cache_kv)
+    for resource in resources:
+        close = getattr(resource, "close", None)
+        if close is not None:
+            close()
+
+
+def get_services(request: Request) -> Services:
+    """FastAPI dependency returning the app's services."""
+    return request.app.state.services
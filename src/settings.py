@@ -0,0 +1,102 @@
+import dataclasses
+import os
+from dataclasses import dataclass
+
+
+@dataclass
+class Settings:
+    """
+    Application settings. Every field can be overridden with an environment
+    variable named DEMO_POLISHER_<FIELD>, e.g. DEMO_POLISHER_SEPARATION_WORKERS=2.
+    """
+
+    base_dir: str = "files"
+    # "local" keeps objects in base_dir/demos and serves them itself; "s3" keeps them
+    # in s3_bucket and links to them with presigned URLs, so nodes share no disk
+    storage_impl: str = "local"
+    s3_endpoint_url: str = "https://s3.amazonaws.com"
+    s3_bucket: str = ""
+    s3_region: str = "us-east-1"
+    s3_access_key_id: str = ""
+    s3_secret_access_key: str = ""
+    # "path" for MinIO and most S3-compatible services, "virtual" for AWS
+    s3_addressing_style: str = "path"
+    # Lifetime of the presigned links to uploads and stems
+    s3_url_expires_seconds: int = 60 * 60
+    # "sqlite" keeps state in base_dir/kv.sqlite3, shared by every worker process
+    kv_impl: str = "dict"
+    # With the "dict" kv, bounds of a separate store for the separation and decoded-audio
+    # caches, 0 for none; beyond them the least recently used pairs go. Upload records
+    # are never bounded.
+    cache_kv_max_entries: int = 0
+    cache_kv_max_bytes: int = 0
+    separator_impl: str = "demucs_inprocess"
+    # JSON object of extra separator arguments, e.g. {"seconds_per_audio_second": 0.1}
+    separator_options: str = ""
+    # 0 sizes it from the usable cores and available memory, see separation_memory_bytes
+    separation_workers: int = 1
+    # Peak memory of one separation, for sizing the workers; htdemucs on a few minutes of audio
+    separation_memory_bytes: int = 3 * 1024 * 1024 * 1024
+    # Separations waiting for a worker before uploads are rejected with 429, 0 for no limit;
+    # with separation_job_store, this bounds the jobs waiting in the store as well
+    separation_queue_max: int = 32
+    # Separations one client may have waiting, so no client fills the queue; 0 for no limit
+    separation_queue_max_per_client: int = 4
+    # "process_pool" gives each worker its own separator; "thread_pool" shares one,
+    # which lets the demucs_batching separator batch concurrent jobs together
+    separation_job_queue_impl: str = "process_pool"
+    # "" runs jobs in this process; "sqlite" queues them in base_dir/jobs.sqlite3, where
+    # the separation workers of every process on this host claim them. Needs kv_impl
+    # "sqlite"; SQLite is single-host, so several nodes need a networked store.
+    separation_job_store: str = ""
+    # How long a worker's claim on a job lasts without a heartbeat, before other
+    # workers may take the job over
+    separation_job_lease_seconds: float = 60.0
+    # Claims of a job before it is marked failed
+    separation_job_max_attempts: int = 3
+    # Whether this process runs the jobs of separation_job_store, or only enqueues them
+    run_separation_worker: bool = True
+    separation_batch_size: int = 4
+    separation_batch_wait_ms: float = 50.0
+    # 0 separates each file in one pass; otherwise the in-process separator's window length
+    separation_segment_seconds: float = 0.0
+    # Segment processes per separation, 0 to split the usable cores between separations
+    separation_segment_workers: int = 0
+    # Peak memory of one segment process, which holds a model and one window
+    separation_segment_memory_bytes: int = 1024 * 1024 * 1024
+    # Bound of the decoded-PCM cache, 0 to disable it; only used by separators that take
+    # decoded PCM, and only where ffmpeg is installed
+    decoded_audio_cache_bytes: int = 2 * 1024 * 1024 * 1024
+    # Format stems are stored in: "mp3", "opus" (needs ffmpeg with libopus) or "wav"
+    stem_format: str = "mp3"
+    # 0 keeps the encoder's default bitrate
+    stem_bitrate_kbps: int = 0
+    # Store the separator's WAV stems alongside the encoded ones
+    keep_wav_stems: bool = False
+    ingest_chunk_size: int = 1024 * 1024
+    ingest_max_bytes: int = 500 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """
+        Create settings from the environment, falling back to the defaults.
+
+        Returns:
+            Settings: The resolved settings
+        """
+        overrides = {}
+        for field in dataclasses.fields(cls):
+            value = os.environ.get(f"DEMO_POLISHER_{field.name.upper()}")
+            if value is not None:
+                overrides[field.name] = _parse(field.type, value)
+        return cls(**overrides)
+
+
+def _parse(field_type, value: str):
+    if field_type in (bool, "bool"):
+        return value.lower() in ("1", "true", "yes", "on")
+    if field_type in (int, "int"):
+        return int(value)
+    if field_type in (float, "float"):
+        return float(value)
+    return value
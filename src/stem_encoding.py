@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src.audio_encoder.inter import AudioEncoder
+from src.metrics import MetricsRegistry
+
+
+def list_wav_files(directory: str) -> List[str]:
+    """
+    Find the WAV files under a directory.
+
+    Args:
+        directory (str): Directory to search, recursively
+
+    Returns:
+        List[str]: Paths of the WAV files
+    """
+    return [
+        os.path.join(dir_path, file_name)
+        for dir_path, _, file_names in os.walk(directory)
+        for file_name in file_names
+        if file_name.lower().endswith(".wav")
+    ]
+
+
+class StemEncoder:
+    """
+    Output stage that encodes the WAV stems a separator wrote, all stems in parallel,
+    so compressed audio rather than PCM is stored and served.
+    """
+
+    def __init__(
+        self,
+        encoder: AudioEncoder,
+        logger: logging.Logger,
+        keep_wav: bool = False,
+        max_workers: Optional[int] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        """
+        Initialize the stage.
+
+        Args:
+            encoder (AudioEncoder): Encodes each stem
+            logger (logging.Logger): Logger for sizes and timings
+            keep_wav (bool): Store the WAV stems as well as the encoded ones
+            max_workers (Optional[int]): Stems encoded at once, defaults to the CPU count
+            metrics (Optional[MetricsRegistry]): Where encode times and sizes are recorded
+        """
+        self.encoder = encoder
+        self.logger = logger.getChild(StemEncoder.__name__)
+        self.keep_wav = keep_wav
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count() or 1,
+            thread_name_prefix="stem-encode",
+        )
+
+        metrics = metrics or MetricsRegistry()
+        self.encode_seconds = metrics.histogram(
+            "stem_encode_seconds", "Time to encode one stem", ["format"]
+        )
+        self.bytes_total = metrics.counter(
+            "stem_bytes_total", "Bytes of stems before and after encoding", ["format"]
+        )
+
+    @property
+    def format(self) -> str:
+        return self.encoder.extension.lstrip(".")
+
+    def options(self) -> dict:
+        """
+        Options that change the stored stems, to be part of separation cache keys.
+
+        Returns:
+            dict: The encoder's options and whether WAV stems are kept
+        """
+        return {**self.encoder.options(), "keep_wav": self.keep_wav}
+
+    def output_names(self, wav_name: str) -> List[str]:
+        """
+        Names of the files `encode_dir` leaves in place of a WAV stem.
+
+        Args:
+            wav_name (str): Name/path of the WAV stem
+
+        Returns:
+            List[str]: The encoded name, and the WAV name if WAV stems are kept
+        """
+        encoded_name = os.path.splitext(wav_name)[0] + self.encoder.extension
+        if encoded_name == wav_name:
+            return [wav_name]
+        return [encoded_name] + ([wav_name] if self.keep_wav else [])
+
+    def _encode(self, wav_file: str) -> str:
+        output_file = os.path.splitext(wav_file)[0] + self.encoder.extension
+        started = time.perf_counter()
+        self.encoder.encode(wav_file, output_file)
+        seconds = time.perf_counter() - started
+
+        wav_bytes = os.path.getsize(wav_file)
+        encoded_bytes = os.path.getsize(output_file)
+        self.encode_seconds.observe(seconds, format=self.format)
+        self.bytes_total.inc(wav_bytes, format="wav")
+        self.bytes_total.inc(encoded_bytes, format=self.format)
+        self.logger.info(
+            f"Encoded {os.path.basename(wav_file)} to {self.format} in {seconds:.2f}s, "
+            f"{wav_bytes} -> {encoded_bytes} bytes"
+        )
+        if not self.keep_wav:
+            os.remove(wav_file)
+        return output_file
+
+    async def encode_dir(self, output_dir: str) -> Dict[str, str]:
+        """
+        Encode every WAV file under a directory in place.
+
+        Args:
+            output_dir (str): Directory the separator wrote the stems to
+
+        Returns:
+            Dict[str, str]: Content type of each file left in the directory by path
+
+        Raises:
+            ValueError: If a stem cannot be encoded
+        """
+        wav_files = list_wav_files(output_dir)
+        if self.encoder.extension == ".wav":
+            return {path: "audio/wav" for path in wav_files}
+        content_types = {path: "audio/wav" for path in wav_files if self.keep_wav}
+
+        loop = asyncio.get_running_loop()
+        encoded_files = await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, self._encode, path)
+                for path in wav_files
+            )
+        )
+        content_types.update(
+            (path, self.encoder.content_type) for path in encoded_files
+        )
+        return content_types
+
+    def close(self):
+        """Wait for running encodes and stop the worker threads."""
+        self._executor.shutdown(wait=True)
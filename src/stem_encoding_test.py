@@ -0,0 +1,78 @@
+import logging
+import os
+import pytest
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+from src.audio_encoder.factory import AudioEncoderFactory
+from src.metrics import MetricsRegistry
+from src.stem_encoding import StemEncoder
+
+pytestmark = pytest.mark.anyio
+
+
+class Fixture:
+    def __init__(self, tmp_path, impl: str = "mp3", **kwargs):
+        self.metrics = MetricsRegistry()
+        logger = logging.getLogger(__name__)
+        self.stem_encoder = StemEncoder(
+            AudioEncoderFactory.create(impl, logger),
+            logger,
+            metrics=self.metrics,
+            **kwargs,
+        )
+        self.output_dir = tmp_path / "stems"
+        self.output_dir.mkdir(parents=True)
+        for seed, name in enumerate(("drums", "no_drums")):
+            (self.output_dir / f"{name}.wav").write_bytes(
+                to_wav_bytes(synthesize(2.0, seed=seed))
+            )
+
+    def files(self):
+        return sorted(os.listdir(self.output_dir))
+
+
+@pytest.mark.parametrize("keep_wav", [False, True])
+async def test_encode_dir(tmp_path, keep_wav):
+    """Test every stem is encoded, with WAVs kept only when asked"""
+    f = Fixture(tmp_path, keep_wav=keep_wav)
+
+    content_types = await f.stem_encoder.encode_dir(str(f.output_dir))
+
+    expected = ["drums.mp3", "no_drums.mp3"]
+    if keep_wav:
+        expected = ["drums.mp3", "drums.wav", "no_drums.mp3", "no_drums.wav"]
+    assert f.files() == expected
+    assert {
+        os.path.basename(path): content_type
+        for path, content_type in content_types.items()
+    } == {
+        name: "audio/mpeg" if name.endswith(".mp3") else "audio/wav"
+        for name in expected
+    }
+    assert f.stem_encoder.output_names("drums.wav") == expected[: 1 + keep_wav]
+    assert f.stem_encoder.encode_seconds.count(format="mp3") == 2
+    assert f.stem_encoder.bytes_total.value(
+        format="mp3"
+    ) < f.stem_encoder.bytes_total.value(format="wav")
+    f.stem_encoder.close()
+
+
+async def test_wav_format_leaves_stems(tmp_path):
+    """Test the wav format stores the separator's stems untouched"""
+    f = Fixture(tmp_path, impl="wav")
+
+    content_types = await f.stem_encoder.encode_dir(str(f.output_dir))
+
+    assert f.files() == ["drums.wav", "no_drums.wav"]
+    assert set(content_types.values()) == {"audio/wav"}
+    assert f.stem_encoder.output_names("drums.wav") == ["drums.wav"]
+    f.stem_encoder.close()
+
+
+async def test_options_cover_output(tmp_path):
+    """Test options differ whenever the stored stems would"""
+    options = [
+        Fixture(tmp_path / "a", impl="mp3").stem_encoder.options(),
+        Fixture(tmp_path / "b", impl="mp3", keep_wav=True).stem_encoder.options(),
+        Fixture(tmp_path / "c", impl="wav").stem_encoder.options(),
+    ]
+    assert len({repr(sorted(o.items())) for o in options}) == 3
@@ -1,15 +1,117 @@
+import hashlib
+import html
+import json
 import logging
-from fastapi import File, UploadFile, APIRouter, Request
-import requests
-from starlette.datastructures import URL
-from fastapi.responses import RedirectResponse
-from src.kv.factory import KvFactory
-from src.audio_source_separator.factory import AudioSourceSeparatorFactory
-from src.object_storage.factory import ObjectStorageFactory
+import time
+import urllib.parse
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional, Tuple
+from fastapi import Depends, HTTPException, APIRouter, Query, Request
+from starlette.datastructures import UploadFile
+from fastapi.responses import (
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from src.admission import AdmissionRejected, Ticket
+from src.decoded_audio import PCM_SUFFIX
+from src.progress import TERMINAL_STAGES, ProgressEvent
+from src.separation_job.separation_job import SeparationJob
+from src.services import Services, get_services
+from src.upload_record.upload_record import UploadRecord
+from src.upload_ingest import UploadTooLarge
+from src.waveform_peaks import PEAKS_CONTENT_TYPE, PEAKS_SUFFIX
 import src.document as document
 
 router = APIRouter(prefix="/upload-demo")
 
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+# Uploads and stems are stored under content-addressed names, so their peaks never change
+PEAKS_OBJECT_PREFIXES = ("demos/", "stems/")
+PEAKS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Comment lines sent this often keep idle event streams open through proxies
+EVENTS_HEARTBEAT_SECONDS = 15.0
+# How often event streams re-read the job's record; jobs run by another node's worker
+# publish nothing here, so the record is how their streams learn the job is over
+EVENTS_POLL_SECONDS = 2.0
+
+# Draws every canvas.waveform from the peaks at its data-peaks URL, see src/waveform_peaks.py
+WAVEFORM_SCRIPT = """
+<script>
+async function drawWaveform(canvas) {
+    const response = await fetch(canvas.dataset.peaks);
+    if (!response.ok) return;
+    const view = new DataView(await response.arrayBuffer());
+    const numLevels = view.getUint16(10, true);
+    let offset = 12 + 8 * numLevels;
+    let level = null;
+    for (let i = 0; i < numLevels; i++) {
+        const count = view.getUint32(12 + 8 * i + 4, true);
+        // The coarsest level that still has a peak for every pixel
+        if (level === null || count >= canvas.width) level = {offset, count};
+        offset += 2 * count;
+    }
+    if (level === null || level.count === 0) return;
+    const context = canvas.getContext("2d");
+    const middle = canvas.height / 2;
+    context.fillStyle = getComputedStyle(canvas).color;
+    for (let x = 0; x < canvas.width; x++) {
+        const from = Math.floor(x * level.count / canvas.width);
+        const to = Math.max(from + 1, Math.floor((x + 1) * level.count / canvas.width));
+        let min = 127, max = -128;
+        for (let i = from; i < to; i++) {
+            min = Math.min(min, view.getInt8(level.offset + 2 * i));
+            max = Math.max(max, view.getInt8(level.offset + 2 * i + 1));
+        }
+        const top = middle - max / 128 * middle;
+        context.fillRect(x, top, 1, Math.max(1, (max - min) / 128 * middle));
+    }
+}
+document.querySelectorAll("canvas.waveform").forEach(drawWaveform);
+</script>
+"""
+
+# Follows a running job's events, see get_job_events; {events_url} is filled in
+PROGRESS_SCRIPT = """
+<script>
+const events = new EventSource("{events_url}");
+const progress = document.getElementById("progress");
+const stage = document.getElementById("stage");
+const stems = document.getElementById("stems");
+events.addEventListener("progress", (event) => {
+    const data = JSON.parse(event.data);
+    progress.value = data.percent;
+    stage.textContent = data.stage;
+});
+events.addEventListener("stem", (event) => {
+    const data = JSON.parse(event.data);
+    if (stems.querySelector(`li[data-object-name="${CSS.escape(data.name)}"]`)) return;
+    const item = document.createElement("li");
+    item.dataset.objectName = data.name;
+    const link = document.createElement("a");
+    link.href = data.url;
+    link.textContent = data.name;
+    const canvas = document.createElement("canvas");
+    canvas.className = "waveform";
+    canvas.width = 800;
+    canvas.height = 64;
+    canvas.dataset.peaks = data.peaks_url;
+    item.append(link, canvas);
+    stems.append(item);
+    drawWaveform(canvas);
+});
+for (const type of ["done", "failed"]) {
+    // The page is rendered again with the final record
+    events.addEventListener(type, () => { events.close(); location.reload(); });
+}
+</script>
+"""
+
 
 @router.get("/")
 async def get() -> str:
@@ -39,73 +141,418 @@ async def get() -> str:
     )
 
 
-BASE_DIR = "files"
+def _upload_stages(services: Services):
+    return services.metrics.histogram(
+        "upload_stage_seconds", "Time spent in each stage of an upload", ["stage"]
+    )
+
+
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"retry-after": str(e.retry_after_seconds)},
+    )
 
 
 @router.post("/")
-async def post(request: Request, audio_demo_file: UploadFile = File(...)):
+async def post(request: Request, services: Services = Depends(get_services)):
+    # Reserved before the upload is read, so an overloaded service rejects it cheaply
+    client_id = request.client.host if request.client else "unknown"
+    try:
+        ticket = services.admission.reserve(client_id)
+    except AdmissionRejected as e:
+        raise _rejected(e)
+
+    enqueued = False
+    try:
+        try:
+            # Jobs queued on other nodes count too, when the queue is shared
+            await services.separation_job_queue.check_capacity()
+        except AdmissionRejected as e:
+            raise _rejected(e)
+        enqueued, response = await _accept_upload(request, services, client_id, ticket)
+        return response
+    finally:
+        if not enqueued:
+            # Rejected, failed or a cache hit: the place goes to the next upload
+            services.admission.release(ticket)
+
+
+async def _accept_upload(
+    request: Request, services: Services, client_id: str, ticket: Ticket
+) -> Tuple[bool, Response]:
+    """Store an upload and enqueue its separation; returns whether it was enqueued."""
     logger = logging.getLogger(__name__)
-    logger.info(f"Processing upload for file: {audio_demo_file.filename}")
-    base_url = str(URL(scope=request.scope).replace(path="", query=""))
-    logger.info(f"Base URL from request: {base_url}")
-
-    storage = ObjectStorageFactory.create(
-        impl="local",
-        base_dir=f"{BASE_DIR}/demos",
-        base_url=f"{base_url}",
-        router=router,
-        logger=logger,
+    ingestor = services.ingestor
+    stages = _upload_stages(services)
+
+    # Parse the form ourselves so oversized bodies are rejected before they are read
+    try:
+        read_started = time.perf_counter()
+        async with ingestor.limit_request(request).form() as form:
+            stages.observe(time.perf_counter() - read_started, stage="read_upload")
+            audio_demo_file = form.get("audio_demo_file")
+            if not isinstance(audio_demo_file, UploadFile):
+                raise HTTPException(
+                    status_code=400, detail="audio_demo_file is required"
+                )
+
+            logger.info(f"Processing upload for file: {audio_demo_file.filename}")
+            filename = audio_demo_file.filename
+            with stages.time(stage="store_upload"):
+                ingested = await ingestor.ingest(audio_demo_file, "demos")
+    except UploadTooLarge as e:
+        logger.warning(f"Rejected upload: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
+
+    object_name = ingested.object_name
+    logger.info(f"Uploaded file to storage: {object_name}")
+    services.metrics.counter("upload_bytes_total", "Bytes of uploaded demos").inc(
+        ingested.size
     )
-    logger.info(f"Created local storage with base directory: {BASE_DIR}/demos")
 
-    kv = KvFactory.create(impl="dict")
+    cache_key = services.separation_cache_key(ingested.content_hash)
+    with stages.time(stage="cache_lookup"):
+        cached_stem_object_names = await services.separation_cache.get(cache_key)
+    cache_hit = cached_stem_object_names is not None
 
-    # upload_record_db = UploadRecordDbFactory.create()
+    job_id = uuid.uuid4().hex
+    record = UploadRecord(
+        id=job_id,
+        name=filename,
+        uploaded_file_url=services.storage.get_url(object_name),
+        separated_file_url="",
+        created_at=datetime.now(),
+        content_hash=ingested.content_hash,
+        cache_hit=cache_hit,
+        size_bytes=ingested.size,
+        ingest_seconds=ingested.seconds,
+        input_object_name=object_name,
+    )
+    if cache_hit:
+        record.status = "done"
+        record.stem_object_names = cached_stem_object_names
+        record.finished_at = record.created_at
+    with stages.time(stage="save_record"):
+        await services.upload_record_repository.put(record)
 
-    audio_source_separator = AudioSourceSeparatorFactory.create(
-        impl="demucs", logger=logger
+    if cache_hit:
+        logger.info(f"Reusing cached separation for: {filename} as job {job_id}")
+    else:
+        with stages.time(stage="enqueue"):
+            await services.separation_job_queue.enqueue(
+                SeparationJob(
+                    id=job_id,
+                    input_object_name=object_name,
+                    output_prefix=f"stems/{cache_key}",
+                    cache_key=cache_key,
+                    client_id=client_id,
+                ),
+                ticket,
+            )
+        logger.info(f"Enqueued audio source separation for: {filename} as job {job_id}")
+
+    logger.info(f"Redirecting to result page")
+    response = RedirectResponse(url=f"{router.prefix}/result/{job_id}", status_code=303)
+    response.headers["x-separation-cache"] = "hit" if cache_hit else "miss"
+    return not cache_hit, response
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, services: Services = Depends(get_services)):
+    record = await services.upload_record_repository.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": record.id,
+        "name": record.name,
+        "status": record.status,
+        "error": record.error,
+        "size_bytes": record.size_bytes,
+        "ingest_seconds": record.ingest_seconds,
+        "created_at": record.created_at,
+        "started_at": record.started_at,
+        "finished_at": record.finished_at,
+        "separation_seconds": record.separation_seconds,
+        "stem_object_names": record.stem_object_names,
+        "content_hash": record.content_hash,
+        "cache_hit": record.cache_hit,
+        "separation_cache": services.separation_cache.stats(),
+        "admission": services.admission.stats(),
+    }
+
+
+@router.get("/result/{job_id}")
+async def get_result(job_id: str, services: Services = Depends(get_services)):
+    record = await services.upload_record_repository.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    audio_object_names = record.stem_object_names
+    if record.input_object_name:
+        audio_object_names = [record.input_object_name] + audio_object_names
+    stems = "".join(
+        f"""
+        <li data-object-name="{html.escape(name)}">
+            <a href="{html.escape(services.storage.get_url(name))}">{html.escape(name)}</a>
+            <canvas class="waveform" width="800" height="64"
+                    data-peaks="{_peaks_url(name)}"></canvas>
+        </li>
+        """
+        for name in audio_object_names
     )
-    logger.info("Created Demucs audio source separator")
+    timings = ""
+    if record.cache_hit:
+        timings = "<p>Reused an earlier separation of the same audio</p>"
+    elif record.separation_seconds is not None:
+        timings = f"<p>Separated in {record.separation_seconds:.1f}s</p>"
+    error = f"<p>{html.escape(record.error)}</p>" if record.error else ""
 
-    file_content = await audio_demo_file.read()
-    filename = audio_demo_file.filename
-    object_name = f"demos/{filename}"
-    logger.info(f"Read file content, filename: {filename}, object_name: {object_name}")
+    running = record.status not in TERMINAL_STAGES
+    progress = ""
+    if running:
+        snapshot = services.progress.snapshot(job_id)
+        progress = f"""
+            <progress id="progress" value="{snapshot.percent if snapshot else 0}"
+                      max="100"></progress>
+            <p id="stage">{snapshot.stage if snapshot else record.status}</p>
+        """
 
-    storage.upload(object_name, file_content)
-    logger.info(f"Uploaded file to storage: {object_name}")
+    return document.response(
+        f"""
+        <main class="container">
+            <h1>Result</h1>
+            <p>{html.escape(record.name)}: <strong>{record.status}</strong></p>
+            {progress}
+            {timings}
+            {error}
+            <ul id="stems">{stems}</ul>
+        </main>
+        {WAVEFORM_SCRIPT if audio_object_names or running else ""}
+        {PROGRESS_SCRIPT.replace("{events_url}", _events_url(job_id)) if running else ""}
+        """
+    )
 
-    logger.info(f"Starting audio source separation for: {filename}")
-    file_url = storage.get_url(object_name)
 
-    logger.info(f"Downloading file from storage: {file_url}")
+def _events_url(job_id: str) -> str:
+    return f"{router.prefix}/jobs/{job_id}/events"
 
-    # input_file = f"{BASE_DIR}/demos/{filename}"
-    # download_file(file_url, input_file)
 
-    # audio_source_separator.separate(
-    #     input_file=input_file,
-    #     output_dir=f"{BASE_DIR}/demos/separated",
-    # )
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    logger.info(f"Completed audio source separation for: {filename}")
 
-    logger.info(f"Redirecting to result page")
-    return RedirectResponse(url=f"{router.prefix}/result", status_code=303)
+def _stem_sse(services: Services, object_name: str) -> str:
+    return _sse(
+        "stem",
+        {
+            "name": object_name,
+            "url": services.storage.get_url(object_name),
+            "peaks_url": _peaks_url(object_name),
+        },
+    )
 
 
-def download_file(file_url: str, filename: str):
-    response = requests.get(file_url)
-    with open(filename, "wb") as f:
-        f.write(response.content)
+def _progress_sse(event: ProgressEvent) -> str:
+    return _sse("progress", {"stage": event.stage, "percent": event.percent})
 
 
-@router.get("/result")
-async def get_result():
-    return document.response(
+def _outcome_sse(services: Services, record: UploadRecord) -> str:
+    """A finished job's stems, then its "done" or "failed" event."""
+    stems = "".join(_stem_sse(services, name) for name in record.stem_object_names)
+    return stems + _sse(record.status, {"status": record.status, "error": record.error})
+
+
+async def _job_events(services: Services, job_id: str) -> AsyncIterator[str]:
+    """
+    Server-sent events of a job: its progress and each stem as it is stored,
+    ending with "done" or "failed".
+    """
+    with services.progress.subscribe(job_id) as subscription:
+        # Read after subscribing, so nothing published in between is missed
+        record = await services.upload_record_repository.get(job_id)
+        if record.status in TERMINAL_STAGES:
+            yield _outcome_sse(services, record)
+            return
+
+        # What was published before subscribing; stems may repeat, clients skip those
+        snapshot = services.progress.snapshot(job_id) or ProgressEvent(
+            job_id, record.status, 0.0
+        )
+        for name in services.progress.stem_object_names(job_id):
+            yield _stem_sse(services, name)
+        yield _progress_sse(snapshot)
+
+        percent = snapshot.percent
+        idle_seconds = 0.0
+        while True:
+            event = await subscription.get(timeout=EVENTS_POLL_SECONDS)
+            if event is None:
+                record = await services.upload_record_repository.get(job_id)
+                if record.status in TERMINAL_STAGES:
+                    yield _outcome_sse(services, record)
+                    return
+                idle_seconds += EVENTS_POLL_SECONDS
+                if idle_seconds >= EVENTS_HEARTBEAT_SECONDS:
+                    idle_seconds = 0.0
+                    yield ": heartbeat\n\n"
+                continue
+            idle_seconds = 0.0
+            if event.is_terminal:
+                yield _sse(event.stage, {"status": event.stage, "error": event.error})
+                return
+            else:
+                if event.stem_object_name:
+                    yield _stem_sse(services, event.stem_object_name)
+                # Events queued while the snapshot was taken can be behind it
+                if event.percent >= percent:
+                    percent = event.percent
+                    yield _progress_sse(event)
+
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, services: Services = Depends(get_services)):
+    if await services.upload_record_repository.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _job_events(services, job_id),
+        media_type="text/event-stream",
+        # Buffering proxies would hold events back until the stream ends
+        headers={"cache-control": "no-cache", "x-accel-buffering": "no"},
+    )
+
+
+def _peaks_url(object_name: str) -> str:
+    return f"{router.prefix}/peaks/{urllib.parse.quote(object_name)}"
+
+
+@router.get("/peaks/{object_name:path}")
+async def get_peaks(object_name: str, services: Services = Depends(get_services)):
+    if not object_name.startswith(PEAKS_OBJECT_PREFIXES) or object_name.endswith(
+        (PEAKS_SUFFIX, PCM_SUFFIX)
+    ):
+        raise HTTPException(status_code=404, detail="Not an audio object")
+    try:
+        # Computed here for objects stored before peaks were
+        peaks_object_name = await services.waveform_peaks.ensure(object_name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Object not found")
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    return Response(
+        await services.storage.adownload(peaks_object_name),
+        media_type=PEAKS_CONTENT_TYPE,
+        headers={"cache-control": PEAKS_CACHE_CONTROL},
+    )
+
+
+async def _history_page(services: Services, limit: int, cursor: Optional[str]) -> dict:
+    """One page of past uploads, with only the fields the history needs."""
+    page = await services.upload_record_repository.list_recent(
+        limit=limit, cursor=cursor
+    )
+    return {
+        "uploads": [
+            {
+                "id": record.id,
+                "name": record.name,
+                "status": record.status,
+                "created_at": record.created_at.isoformat(),
+                "cache_hit": record.cache_hit,
+                "result_url": f"{router.prefix}/result/{record.id}",
+                "stems": [
+                    {
+                        "name": name,
+                        "url": services.storage.get_url(name),
+                        "peaks_url": _peaks_url(name),
+                    }
+                    for name in record.stem_object_names
+                ],
+            }
+            for record in page.records
+        ],
+        "next_cursor": page.next_cursor,
+    }
+
+
+def _history_headers(payload: dict, variant: str) -> dict:
+    """Validators for a history page; the page changes whenever any upload on it does."""
+    digest = hashlib.sha256(
+        json.dumps([variant, payload], sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+    return {"etag": f'"{digest[:32]}"', "cache-control": "no-cache"}
+
+
+def _is_not_modified(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or headers["etag"] in tags
+
+
+@router.get("/history.json")
+async def get_history_json(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    services: Services = Depends(get_services),
+):
+    payload = await _history_page(services, limit, cursor)
+    headers = _history_headers(payload, "json")
+    if _is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
+
+
+@router.get("/history")
+async def get_history(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    services: Services = Depends(get_services),
+):
+    payload = await _history_page(services, limit, cursor)
+    headers = _history_headers(payload, "html")
+    if _is_not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    rows = "".join(
+        f"""
+        <tr>
+            <td><a href="{upload['result_url']}">{html.escape(upload['name'])}</a></td>
+            <td>{upload['status']}</td>
+            <td>{upload['created_at']}</td>
+            <td>{"".join(
+                f'<a href="{html.escape(stem["url"])}">{html.escape(stem["name"].rsplit("/", 1)[-1])}</a> '
+                for stem in upload["stems"]
+            )}</td>
+        </tr>
         """
+        for upload in payload["uploads"]
+    )
+    more = ""
+    if payload["next_cursor"] is not None:
+        query = urllib.parse.urlencode(
+            {"cursor": payload["next_cursor"], "limit": limit}
+        )
+        more = f'<a href="{router.prefix}/history?{query}">Older uploads</a>'
+
+    response = document.response(
+        f"""
         <main class="container">
-            <h1>Result</h1>
+            <h1>History</h1>
+            <table>
+                <thead>
+                    <tr><th>Demo</th><th>Status</th><th>Uploaded</th><th>Stems</th></tr>
+                </thead>
+                <tbody>{rows}</tbody>
+            </table>
+            {more}
         </main>
         """
     )
+    response.headers.update(headers)
+    return response
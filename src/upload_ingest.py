@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.types import Message
+from src.object_storage.inter import ObjectStorage
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class IngestResult:
+    object_name: str
+    size: int
+    seconds: float
+    content_hash: str
+    # True if an object with the same content was already stored
+    deduplicated: bool
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.size / 1_000_000 / self.seconds if self.seconds > 0 else 0.0
+
+
+class _ChunkedReader:
+    """
+    File-like wrapper that never returns more than chunk_size bytes per read,
+    fails as soon as more than max_bytes have been read and hashes what it reads.
+    """
+
+    def __init__(self, source: BinaryIO, chunk_size: int, max_bytes: int):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        chunk = self.source.read(size)
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        self.hash.update(chunk)
+        return chunk
+
+
+class UploadIngestor:
+    """
+    Moves uploaded files into object storage in fixed-size chunks,
+    so the memory held per upload is bounded by chunk_size rather than the file size.
+    """
+
+    def __init__(
+        self,
+        storage: ObjectStorage,
+        logger: logging.Logger,
+        chunk_size: int = 1024 * 1024,
+        max_bytes: int = 500 * 1024 * 1024,
+    ):
+        """
+        Initialize the ingestor.
+
+        Args:
+            storage (ObjectStorage): Storage the uploads are written to
+            logger (logging.Logger): Logger for ingest throughput
+            chunk_size (int): Largest chunk held in memory at once, in bytes
+            max_bytes (int): Largest accepted upload, in bytes
+        """
+        self.storage = storage
+        self.logger = logger.getChild(UploadIngestor.__name__)
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+
+    def limit_request(self, request: Request) -> Request:
+        """
+        Wrap a request so reading its body fails once it grows past max_bytes.
+        A declared Content-Length over the limit is rejected before anything is read.
+
+        Args:
+            request (Request): The incoming request
+
+        Returns:
+            Request: A request whose body reads are size-limited
+
+        Raises:
+            UploadTooLarge: If the declared Content-Length is over the limit
+        """
+        content_length = request.headers.get("content-length")
+        if content_length is not None and content_length.isdigit():
+            if int(content_length) > self.max_bytes:
+                raise UploadTooLarge(self.max_bytes)
+
+        received = 0
+
+        async def receive() -> Message:
+            nonlocal received
+            message = await request.receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        return Request(request.scope, receive)
+
+    async def ingest(self, upload_file: UploadFile, prefix: str) -> IngestResult:
+        """
+        Copy an uploaded file into storage chunk by chunk, hashing it on the way,
+        and store it under its content digest. Uploads whose content is already
+        stored are not stored again.
+
+        Args:
+            upload_file (UploadFile): The uploaded file
+            prefix (str): Object name prefix, the object is stored as {prefix}/{sha256}{ext}
+
+        Returns:
+            IngestResult: Where the object was stored, its size, digest and the time it took
+
+        Raises:
+            UploadTooLarge: If the file is larger than max_bytes
+            Exception: Whatever storage raised; the partial upload is removed first
+        """
+        await upload_file.seek(0)
+        reader = _ChunkedReader(upload_file.file, self.chunk_size, self.max_bytes)
+        # The digest is only known once the whole file has been read
+        incoming_object_name = f"incoming/{uuid.uuid4().hex}"
+
+        started = time.perf_counter()
+        try:
+            await self.storage.aupload(
+                incoming_object_name, reader, content_type=upload_file.content_type
+            )
+
+            content_hash = reader.hash.hexdigest()
+            extension = os.path.splitext(upload_file.filename or "")[1].lower()
+            object_name = f"{prefix}/{content_hash}{extension}"
+
+            deduplicated = await self.storage.aexists(object_name)
+            if deduplicated:
+                await self.storage.adelete(incoming_object_name)
+            else:
+                await self.storage.arename(incoming_object_name, object_name)
+        except BaseException:
+            # Too large, a storage error or the client going away; nothing else
+            # would ever remove the partial object
+            try:
+                await self.storage.adelete(incoming_object_name)
+            except Exception as e:
+                self.logger.warning(
+                    f"Could not remove {incoming_object_name}: {str(e)}"
+                )
+            raise
+
+        result = IngestResult(
+            object_name=object_name,
+            size=reader.size,
+            seconds=time.perf_counter() - started,
+            content_hash=content_hash,
+            deduplicated=deduplicated,
+        )
+
+        self.logger.info(
+            f"Ingested {result.size} bytes into {object_name} "
+            f"in {result.seconds:.3f}s ({result.mb_per_second:.1f} MB/s)"
+            f"{' (duplicate)' if deduplicated else ''}"
+        )
+        return result
@@ -1,5 +1,8 @@
-from dataclasses import dataclass
-import datetime
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Literal, Optional
+
+UploadStatus = Literal["queued", "running", "done", "failed"]
 
 
 @dataclass
@@ -9,3 +12,22 @@ class UploadRecord:
     uploaded_file_url: str
     separated_file_url: str
     created_at: datetime
+    status: UploadStatus = "queued"
+    stem_object_names: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    content_hash: Optional[str] = None
+    cache_hit: bool = False
+    size_bytes: Optional[int] = None
+    ingest_seconds: Optional[float] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    separation_seconds: Optional[float] = None
+    # Stored upload the stems were separated from
+    input_object_name: Optional[str] = None
+
+
+@dataclass
+class UploadRecordPage:
+    records: List[UploadRecord]
+    # Pass back to get the next page; None when there are no more records
+    next_cursor: Optional[str] = None
@@ -1,16 +1,149 @@
-from abc import ABC, abstractmethod
-from typing import List, Optional
+import dataclasses
+import json
 from datetime import datetime
-from src.upload_record.upload_record import UploadRecord
+from typing import Any, List, Optional
+from src.kv.inter import Kv, KvTransaction
+from src.upload_record.upload_record import UploadRecord, UploadRecordPage
+from src.upload_record.upload_record_db.inter import UploadRecordRepository
+from src.kv.paged_index import PagedIndex
 
+# Bumped when stored records can no longer be read positionally by the current fields
+_FORMAT_VERSION = 1
+_FIELDS = [field.name for field in dataclasses.fields(UploadRecord)]
+_DATETIME_FIELDS = {"created_at", "started_at", "finished_at"}
 
-class UploadRecordRepository(ABC):
+
+def encode_record(upload_record: UploadRecord) -> str:
+    """
+    Serialize a record as a compact JSON array of its field values, in field order.
+    Field names are not repeated in every record; new fields are appended to the dataclass.
+
+    Args:
+        upload_record (UploadRecord): The record to serialize
+
+    Returns:
+        str: The serialized record
+    """
+    values: List[Any] = [_FORMAT_VERSION]
+    for name in _FIELDS:
+        value = getattr(upload_record, name)
+        if name in _DATETIME_FIELDS and value is not None:
+            value = value.isoformat()
+        values.append(value)
+    return json.dumps(values, separators=(",", ":"))
+
+
+def decode_record(value: str) -> UploadRecord:
+    """
+    Deserialize a record written by encode_record.
+    Records written before a field was added leave it at its default.
+
+    Args:
+        value (str): The stored value
+
+    Returns:
+        UploadRecord: The record
+    """
+    version, *values = json.loads(value)
+    if version != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported upload record format: {version}")
+    kwargs = dict(zip(_FIELDS, values))
+    for name in _DATETIME_FIELDS:
+        if kwargs.get(name) is not None:
+            kwargs[name] = datetime.fromisoformat(kwargs[name])
+    return UploadRecord(**kwargs)
+
+
+def _sort_key(upload_record: UploadRecord) -> str:
+    """Key ordering records by creation time, with the ID breaking ties."""
+    micros = round(upload_record.created_at.timestamp() * 1_000_000)
+    return f"{micros:020d}:{upload_record.id}"
+
+
+def _id_from_sort_key(sort_key: str) -> str:
+    return sort_key.split(":", 1)[1]
+
+
+class UploadRecordRepositoryKv(UploadRecordRepository):
     """
-    Interface for upload record repository operations.
-    Provides methods for creating, retrieving, updating, and deleting upload records.
+    Implementation of the UploadRecordRepository interface on top of a Kv store.
+    Each record is stored under its own key. A paged index on created_at serves
+    the most recent records, and a list of IDs per content hash serves hash lookups,
+    so neither scans the records. A record and its index entries are written in one
+    Kv transaction, so repositories in several processes sharing the store keep the
+    indexes whole.
     """
 
-    @abstractmethod
+    def __init__(self, kv: Kv, index_page_size: int = 512):
+        """
+        Initialize the repository.
+
+        Args:
+            kv (Kv): Key-value store to keep the records in
+            index_page_size (int): Most entries per page of the created_at index
+        """
+        self.kv = kv
+        self.created_at_index = PagedIndex(
+            "upload_record_index:created_at", page_size=index_page_size
+        )
+
+    def _key(self, id: str) -> str:
+        return f"upload_record:{id}"
+
+    def _content_hash_key(self, content_hash: str) -> str:
+        return f"upload_record_by_content_hash:{content_hash}"
+
+    def _add_to_content_hash(
+        self, transaction: KvTransaction, content_hash: str, id: str
+    ):
+        ids = list(transaction.get(self._content_hash_key(content_hash)) or [])
+        if id not in ids:
+            ids.append(id)
+            transaction.put(self._content_hash_key(content_hash), ids)
+
+    def _remove_from_content_hash(
+        self, transaction: KvTransaction, content_hash: str, id: str
+    ):
+        ids = list(transaction.get(self._content_hash_key(content_hash)) or [])
+        if id not in ids:
+            return
+        ids.remove(id)
+        if ids:
+            transaction.put(self._content_hash_key(content_hash), ids)
+        else:
+            transaction.zap(self._content_hash_key(content_hash))
+
+    def _put(self, transaction: KvTransaction, upload_record: UploadRecord, value: str):
+        stored = transaction.get(self._key(upload_record.id))
+        previous = decode_record(stored) if stored is not None else None
+        transaction.put(self._key(upload_record.id), value)
+
+        if previous is None or _sort_key(previous) != _sort_key(upload_record):
+            if previous is not None:
+                self.created_at_index.remove(transaction, _sort_key(previous))
+            self.created_at_index.add(transaction, _sort_key(upload_record))
+
+        previous_hash = previous.content_hash if previous is not None else None
+        if previous_hash != upload_record.content_hash:
+            if previous_hash is not None:
+                self._remove_from_content_hash(
+                    transaction, previous_hash, upload_record.id
+                )
+            if upload_record.content_hash is not None:
+                self._add_to_content_hash(
+                    transaction, upload_record.content_hash, upload_record.id
+                )
+
+    def _zap(self, transaction: KvTransaction, id: str) -> bool:
+        stored = transaction.get(self._key(id))
+        if stored is None:
+            return False
+        previous = decode_record(stored)
+        self.created_at_index.remove(transaction, _sort_key(previous))
+        if previous.content_hash is not None:
+            self._remove_from_content_hash(transaction, previous.content_hash, id)
+        return transaction.zap(self._key(id))
+
     async def get(self, id: str) -> Optional[UploadRecord]:
         """
         Retrieve an upload record by its ID.
@@ -21,9 +154,11 @@ class UploadRecordRepository(ABC):
         Returns:
             Optional[UploadRecord]: The upload record if found, None otherwise
         """
-        pass
+        value = await self.kv.get(self._key(id))
+        if value is None:
+            return None
+        return decode_record(value)
 
-    @abstractmethod
     async def put(self, upload_record: UploadRecord) -> UploadRecord:
         """
         Create or update an upload record.
@@ -34,9 +169,13 @@ class UploadRecordRepository(ABC):
         Returns:
             UploadRecord: The created or updated upload record
         """
-        pass
+        # Serialized, so later mutations of the caller's record are not shared
+        value = encode_record(upload_record)
+        await self.kv.transaction(
+            lambda transaction: self._put(transaction, upload_record, value)
+        )
+        return upload_record
 
-    @abstractmethod
     async def zap(self, id: str) -> bool:
         """
         Delete an upload record by its ID.
@@ -47,4 +186,51 @@ class UploadRecordRepository(ABC):
         Returns:
             bool: True if deletion was successful, False otherwise
         """
-        pass
+        return await self.kv.transaction(lambda transaction: self._zap(transaction, id))
+
+    async def list_recent(
+        self, limit: int = 20, cursor: Optional[str] = None
+    ) -> UploadRecordPage:
+        """
+        List upload records from the most recently created.
+
+        Args:
+            limit (int): Most records returned
+            cursor (Optional[str]): next_cursor of the previous page, None for the first page
+
+        Returns:
+            UploadRecordPage: The records and the cursor of the next page
+        """
+        # One extra key tells whether another page follows
+        sort_keys = await self.kv.transaction(
+            lambda transaction: self.created_at_index.before(
+                transaction, cursor, limit + 1
+            ),
+            read_only=True,
+        )
+        page_keys = sort_keys[:limit]
+        values = await self.kv.get_many(
+            [self._key(_id_from_sort_key(sort_key)) for sort_key in page_keys]
+        )
+        records = [
+            decode_record(values[self._key(_id_from_sort_key(sort_key))])
+            for sort_key in page_keys
+            if self._key(_id_from_sort_key(sort_key)) in values
+        ]
+        next_cursor = page_keys[-1] if len(sort_keys) > limit else None
+        return UploadRecordPage(records=records, next_cursor=next_cursor)
+
+    async def find_by_content_hash(self, content_hash: str) -> List[UploadRecord]:
+        """
+        Find the upload records of an input's content.
+
+        Args:
+            content_hash (str): Digest of the uploaded content
+
+        Returns:
+            List[UploadRecord]: The matching records, most recently created first
+        """
+        ids = await self.kv.get(self._content_hash_key(content_hash)) or []
+        values = await self.kv.get_many([self._key(id) for id in ids])
+        records = [decode_record(value) for value in values.values()]
+        return sorted(records, key=_sort_key, reverse=True)
@@ -1,13 +1,14 @@
 from abc import ABC, abstractmethod
 from typing import List, Optional
 from datetime import datetime
-from src.upload_record.upload_record import UploadRecord
+from src.upload_record.upload_record import UploadRecord, UploadRecordPage
 
 
 class UploadRecordRepository(ABC):
     """
     Interface for upload record repository operations.
-    Provides methods for creating, retrieving, updating, and deleting upload records.
+    Provides methods for creating, retrieving, updating, and deleting upload records,
+    listing the most recent ones and finding them by content hash.
     """
 
     @abstractmethod
@@ -48,3 +49,32 @@ class UploadRecordRepository(ABC):
             bool: True if deletion was successful, False otherwise
         """
         pass
+
+    @abstractmethod
+    async def list_recent(
+        self, limit: int = 20, cursor: Optional[str] = None
+    ) -> UploadRecordPage:
+        """
+        List upload records from the most recently created.
+
+        Args:
+            limit (int): Most records returned
+            cursor (Optional[str]): next_cursor of the previous page, None for the first page
+
+        Returns:
+            UploadRecordPage: The records and the cursor of the next page
+        """
+        pass
+
+    @abstractmethod
+    async def find_by_content_hash(self, content_hash: str) -> List[UploadRecord]:
+        """
+        Find the upload records of an input's content.
+
+        Args:
+            content_hash (str): Digest of the uploaded content
+
+        Returns:
+            List[UploadRecord]: The matching records, most recently created first
+        """
+        pass
@@ -0,0 +1,122 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+import pytest
+from src.kv.factory import KvFactory
+from src.upload_record.upload_record import UploadRecord
+from src.upload_record.upload_record_db.impl_kv import UploadRecordRepositoryKv
+
+pytestmark = [pytest.mark.anyio, pytest.mark.parametrize("kv_impl", ["dict", "sqlite"])]
+
+
+class Fixture:
+    def __init__(self, kv_impl: str, tmp_path):
+        kwargs = {"path": str(tmp_path / "kv.sqlite3")} if kv_impl == "sqlite" else {}
+        # Small pages so a few dozen records already span several of them
+        self.repository = UploadRecordRepositoryKv(
+            KvFactory.create(kv_impl, **kwargs), index_page_size=4
+        )
+        self.started = datetime(2024, 1, 1, 12, 0, 0)
+
+    def record(self, index: int, content_hash: str = None) -> UploadRecord:
+        return UploadRecord(
+            id=f"record_{index}",
+            name=f"demo_{index}.wav",
+            uploaded_file_url=f"/demos/{index}.wav",
+            separated_file_url="",
+            created_at=self.started + timedelta(seconds=index),
+            content_hash=content_hash,
+        )
+
+    async def list_all(self, limit: int):
+        records, cursor = [], None
+        while True:
+            page = await self.repository.list_recent(limit=limit, cursor=cursor)
+            records.extend(page.records)
+            if page.next_cursor is None:
+                return records
+            cursor = page.next_cursor
+
+
+async def test_put_get(kv_impl, tmp_path):
+    """Test a record round-trips with its datetimes and lists"""
+    f = Fixture(kv_impl, tmp_path)
+    record = f.record(0, content_hash="abc")
+    record.stem_object_names = ["stems/drums.wav"]
+    record.finished_at = record.created_at + timedelta(seconds=5)
+    await f.repository.put(record)
+
+    assert await f.repository.get(record.id) == record
+    assert await f.repository.get("nonexistent") is None
+
+
+async def test_list_recent_pages(kv_impl, tmp_path):
+    """Test cursor pages list every record once, most recent first"""
+    f = Fixture(kv_impl, tmp_path)
+    indexes = list(range(25))
+    random.Random(0).shuffle(indexes)
+    for index in indexes:
+        await f.repository.put(f.record(index))
+
+    records = await f.list_all(limit=6)
+    assert [r.id for r in records] == [f"record_{i}" for i in reversed(range(25))]
+
+    first = await f.repository.list_recent(limit=3)
+    assert [r.id for r in first.records] == ["record_24", "record_23", "record_22"]
+
+
+async def test_updates_keep_one_index_entry(kv_impl, tmp_path):
+    """Test rewriting a record does not list it twice"""
+    f = Fixture(kv_impl, tmp_path)
+    record = f.record(0)
+    await f.repository.put(record)
+    record.status = "done"
+    await f.repository.put(record)
+
+    page = await f.repository.list_recent()
+    assert [r.status for r in page.records] == ["done"]
+    assert page.next_cursor is None
+
+
+async def test_find_by_content_hash(kv_impl, tmp_path):
+    """Test records are found by content hash, most recent first"""
+    f = Fixture(kv_impl, tmp_path)
+    await f.repository.put(f.record(0, content_hash="same"))
+    await f.repository.put(f.record(1, content_hash="other"))
+    await f.repository.put(f.record(2, content_hash="same"))
+
+    records = await f.repository.find_by_content_hash("same")
+    assert [r.id for r in records] == ["record_2", "record_0"]
+    assert await f.repository.find_by_content_hash("missing") == []
+
+
+async def test_zap_removes_from_indexes(kv_impl, tmp_path):
+    """Test deleted records are neither listed nor found by hash"""
+    f = Fixture(kv_impl, tmp_path)
+    for index in range(10):
+        await f.repository.put(f.record(index, content_hash=f"hash_{index % 2}"))
+
+    for index in range(0, 10, 2):
+        assert await f.repository.zap(f"record_{index}") is True
+    assert await f.repository.zap("record_0") is False
+
+    records = await f.list_all(limit=3)
+    assert [r.id for r in records] == [f"record_{i}" for i in (9, 7, 5, 3, 1)]
+    assert await f.repository.find_by_content_hash("hash_0") == []
+
+
+async def test_repositories_sharing_a_store(kv_impl, tmp_path):
+    """Test concurrent puts from repositories in several processes lose no index entries"""
+    if kv_impl != "sqlite":
+        pytest.skip("Only persistent stores are shared")
+    f = Fixture(kv_impl, tmp_path)
+    # A second repository on the same file, as another worker process has
+    other = Fixture(kv_impl, tmp_path).repository
+    repositories = [f.repository, other]
+
+    await asyncio.gather(
+        *(repositories[i % 2].put(f.record(i, content_hash="same")) for i in range(60))
+    )
+
+    assert len(await f.list_all(limit=7)) == 60
+    assert len(await other.find_by_content_hash("same")) == 60
@@ -0,0 +1,387 @@
+import asyncio
+import logging
+import os
+import shutil
+import struct
+import tempfile
+from typing import List, Optional, Tuple
+import numpy as np
+from src.decoded_audio import (
+    PCM_SUFFIX,
+    DecodedAudioCache,
+    decode_with_ffmpeg,
+    open_decoded,
+)
+from src.metrics import MetricsRegistry
+from src.object_storage.inter import ObjectStorage
+
+PEAKS_SUFFIX = ".peaks"
+PEAKS_CONTENT_TYPE = "application/octet-stream"
+
+# Magic, format version, bits per value, sample rate, number of levels
+_HEADER = struct.Struct("<4sBBIH")
+# Samples per peak and number of peaks of one level
+_LEVEL_HEADER = struct.Struct("<II")
+_MAGIC = b"WFPK"
+_VERSION = 1
+
+# Channel count and sample rate audio is decoded to when it is neither WAV nor cached
+_FALLBACK_CHANNELS = 2
+_FALLBACK_SAMPLE_RATE = 44_100
+
+# Full scale of each integer WAV sample width, and the offset of unsigned 8-bit samples
+_WAV_INT_FORMATS = {
+    1: ("u1", 128.0, 128.0),
+    2: ("<i2", 0.0, 32768.0),
+    4: ("<i4", 0.0, 2.0**31),
+}
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_IEEE_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+Level = Tuple[int, np.ndarray]
+
+
+def open_wav(path: str) -> Tuple[np.ndarray, int, float, float]:
+    """
+    Memory-map the samples of a PCM or float WAV file without decoding or copying them.
+
+    Args:
+        path (str): Path to the WAV file
+
+    Returns:
+        Tuple[np.ndarray, int, float, float]: Samples shaped (frames, channels) in the
+            file's own type, the sample rate, and the offset and scale that map them to [-1, 1]
+
+    Raises:
+        ValueError: If the file is not a WAV file this reads
+    """
+    with open(path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:] != b"WAVE":
+            raise ValueError(f"{path} is not a WAV file")
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                chunk_size = 0
+            elif chunk_id == b"data":
+                data_offset = f.tell()
+                break
+            # Chunks are padded to an even size
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    if fmt is None or len(fmt) < 16:
+        raise ValueError(f"{path} has no format chunk")
+    format_tag, channels, sample_rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+
+    if format_tag == _WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        dtype, offset, scale = f"<f{bits // 8}", 0.0, 1.0
+    elif format_tag == _WAVE_FORMAT_PCM and bits // 8 in _WAV_INT_FORMATS:
+        dtype, offset, scale = _WAV_INT_FORMATS[bits // 8]
+    else:
+        raise ValueError(f"{path} has unsupported WAV format {format_tag}/{bits} bits")
+
+    frame_bytes = np.dtype(dtype).itemsize * channels
+    # The data size is often wrong in streamed WAVs, so trust the file size
+    frames = (os.path.getsize(path) - data_offset) // frame_bytes
+    if frames <= 0:
+        return np.zeros((0, channels), dtype=dtype), sample_rate, offset, scale
+    samples = np.memmap(
+        path, dtype=dtype, mode="r", offset=data_offset, shape=(frames, channels)
+    )
+    return samples, sample_rate, offset, scale
+
+
+def _reduce(
+    mins: np.ndarray, maxs: np.ndarray, factor: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge every `factor` consecutive peaks into one."""
+    count = -(-len(mins) // factor)
+    pad = count * factor - len(mins)
+    if pad:
+        # Repeating the last peak changes neither the minimum nor the maximum
+        mins = np.concatenate([mins, np.repeat(mins[-1:], pad)])
+        maxs = np.concatenate([maxs, np.repeat(maxs[-1:], pad)])
+    return mins.reshape(count, factor).min(1), maxs.reshape(count, factor).max(1)
+
+
+def compute_peaks(
+    frames: np.ndarray,
+    offset: float = 0.0,
+    scale: float = 1.0,
+    samples_per_peak: int = 256,
+    factor: int = 4,
+    min_peaks: int = 256,
+) -> List[Level]:
+    """
+    Compute min/max peaks of audio at several zoom levels.
+    Each level merges `factor` peaks of the one before, until a level has at most
+    `min_peaks` peaks. The peaks cover every channel.
+
+    Args:
+        frames (np.ndarray): Samples shaped (frames, channels), e.g. from `open_wav`
+        offset (float): Subtracted from every sample before scaling
+        scale (float): Full scale of the samples after the offset
+        samples_per_peak (int): Frames per peak of the most detailed level
+        factor (int): Ratio of frames per peak between consecutive levels
+        min_peaks (int): Levels stop once one has at most this many peaks
+
+    Returns:
+        List[Level]: (frames per peak, int8 peaks shaped (peaks, 2) of min and max) per level
+    """
+    if factor < 2:
+        raise ValueError("Levels must merge at least two peaks")
+
+    num_frames = frames.shape[0]
+    full = num_frames // samples_per_peak
+    if full:
+        # Consecutive frames of a contiguous array reshape into windows without a copy
+        windows = frames[: full * samples_per_peak].reshape(full, -1)
+        mins, maxs = windows.min(1), windows.max(1)
+    else:
+        mins = maxs = np.zeros(0, dtype=frames.dtype)
+    if num_frames % samples_per_peak:
+        tail = frames[full * samples_per_peak :]
+        mins = np.append(mins, tail.min())
+        maxs = np.append(maxs, tail.max())
+
+    levels = []
+    spp = samples_per_peak
+    while True:
+        peaks = np.stack([mins, maxs], axis=1).astype(np.float32)
+        quantized = np.clip(np.round((peaks - offset) / scale * 127), -128, 127)
+        levels.append((spp, quantized.astype(np.int8)))
+        if len(mins) <= min_peaks:
+            return levels
+        mins, maxs = _reduce(mins, maxs, factor)
+        spp *= factor
+
+
+def encode_peaks(levels: List[Level], sample_rate: int) -> bytes:
+    """
+    Serialize peaks as a compact binary object, read by `decode_peaks` or the result page.
+
+    Args:
+        levels (List[Level]): Levels from `compute_peaks`
+        sample_rate (int): Sample rate of the audio, to map peaks to time
+
+    Returns:
+        bytes: Header, then per level its frames per peak and count, then every level's
+               interleaved int8 min/max values
+    """
+    parts = [_HEADER.pack(_MAGIC, _VERSION, 8, sample_rate, len(levels))]
+    parts.extend(_LEVEL_HEADER.pack(spp, len(peaks)) for spp, peaks in levels)
+    parts.extend(peaks.tobytes() for _, peaks in levels)
+    return b"".join(parts)
+
+
+def decode_peaks(data: bytes) -> Tuple[int, List[Level]]:
+    """
+    Deserialize peaks written by `encode_peaks`.
+
+    Args:
+        data (bytes): The serialized peaks
+
+    Returns:
+        Tuple[int, List[Level]]: The sample rate and the levels
+
+    Raises:
+        ValueError: If the data is not peaks in a supported format
+    """
+    magic, version, _, sample_rate, num_levels = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Unsupported waveform peaks format")
+    offset = _HEADER.size
+    counts = []
+    for _ in range(num_levels):
+        counts.append(_LEVEL_HEADER.unpack_from(data, offset))
+        offset += _LEVEL_HEADER.size
+    levels = []
+    for spp, count in counts:
+        peaks = np.frombuffer(data, dtype=np.int8, count=count * 2, offset=offset)
+        levels.append((spp, peaks.reshape(count, 2)))
+        offset += count * 2
+    return sample_rate, levels
+
+
+class WaveformPeaks:
+    """
+    Computes multi-resolution waveform peaks of stored audio and stores them next to it,
+    so a page draws waveforms from kilobytes of peaks instead of downloading the audio.
+    """
+
+    def __init__(
+        self,
+        storage: ObjectStorage,
+        logger: logging.Logger,
+        decoded_audio_cache: Optional[DecodedAudioCache] = None,
+        samples_per_peak: int = 256,
+        factor: int = 4,
+        min_peaks: int = 256,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        """
+        Initialize the stage.
+
+        Args:
+            storage (ObjectStorage): Where the audio is read from and the peaks are stored
+            logger (logging.Logger): Logger for computed peaks
+            decoded_audio_cache (Optional[DecodedAudioCache]): Source of audio that is not WAV;
+                without it such audio is decoded with ffmpeg for each computation
+            samples_per_peak (int): Frames per peak of the most detailed level
+            factor (int): Ratio of frames per peak between consecutive levels
+            min_peaks (int): Levels stop once one has at most this many peaks
+            metrics (Optional[MetricsRegistry]): Where computation times are recorded
+        """
+        self.storage = storage
+        self.logger = logger.getChild(WaveformPeaks.__name__)
+        self.decoded_audio_cache = decoded_audio_cache
+        self.samples_per_peak = samples_per_peak
+        self.factor = factor
+        self.min_peaks = min_peaks
+
+        metrics = metrics or MetricsRegistry()
+        self.compute_seconds = metrics.histogram(
+            "waveform_peaks_seconds", "Time to compute the peaks of one object"
+        )
+
+    @staticmethod
+    def peaks_object_name(object_name: str) -> str:
+        """
+        Name the peaks of an object are stored under.
+
+        Args:
+            object_name (str): Name/path of the audio
+
+        Returns:
+            str: Object name of the peaks
+        """
+        return f"{object_name}{PEAKS_SUFFIX}"
+
+    def _peaks_of_frames(self, frames, sample_rate, offset=0.0, scale=1.0) -> bytes:
+        levels = compute_peaks(
+            frames,
+            offset=offset,
+            scale=scale,
+            samples_per_peak=self.samples_per_peak,
+            factor=self.factor,
+            min_peaks=self.min_peaks,
+        )
+        return encode_peaks(levels, sample_rate)
+
+    def _peaks_of_compressed(self, path: str) -> bytes:
+        if shutil.which("ffmpeg") is None:
+            raise ValueError(f"{path} is not WAV and ffmpeg is not installed")
+        fd, decoded_file = tempfile.mkstemp(suffix=PCM_SUFFIX)
+        os.close(fd)
+        try:
+            decode_with_ffmpeg(
+                path, decoded_file, _FALLBACK_SAMPLE_RATE, _FALLBACK_CHANNELS
+            )
+            pcm = open_decoded(decoded_file, _FALLBACK_CHANNELS)
+            return self._peaks_of_frames(pcm.T, _FALLBACK_SAMPLE_RATE)
+        finally:
+            os.remove(decoded_file)
+
+    async def _peaks_of_path(self, path: str) -> Optional[bytes]:
+        """Peaks of a local file, or None if it is not WAV and the decoded cache should be used."""
+        try:
+            frames, sample_rate, offset, scale = await asyncio.to_thread(open_wav, path)
+        except ValueError:
+            if self.decoded_audio_cache is None:
+                return await asyncio.to_thread(self._peaks_of_compressed, path)
+            return None
+        return await asyncio.to_thread(
+            self._peaks_of_frames, frames, sample_rate, offset, scale
+        )
+
+    async def _peaks(self, object_name: str) -> bytes:
+        async with self.storage.alocal_path(object_name) as path:
+            data = await self._peaks_of_path(path)
+        if data is not None:
+            return data
+
+        # Not WAV; the decoded PCM is shared with separation
+        cache = self.decoded_audio_cache
+        async with cache.open(object_name) as pcm:
+            return await asyncio.to_thread(
+                self._peaks_of_frames, pcm.T, cache.sample_rate
+            )
+
+    async def compute(self, object_name: str) -> str:
+        """
+        Compute and store the peaks of an object, replacing any stored before.
+
+        Args:
+            object_name (str): Name/path of the audio
+
+        Returns:
+            str: Object name of the peaks
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+            ValueError: If the object cannot be read as audio
+        """
+        with self.compute_seconds.time():
+            data = await self._peaks(object_name)
+        return (await self._store(data, [object_name]))[0]
+
+    async def compute_file(self, path: str, object_names: List[str]) -> List[str]:
+        """
+        Compute peaks from a local file and store them as the peaks of objects holding
+        the same audio, e.g. of a WAV stem before it is stored in its encoded forms.
+
+        Args:
+            path (str): Path to the audio
+            object_names (List[str]): Names/paths of the objects the peaks belong to
+
+        Returns:
+            List[str]: Object names of the peaks
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+            ValueError: If the file is neither WAV nor decodable here
+        """
+        with self.compute_seconds.time():
+            data = await self._peaks_of_path(path)
+            if data is None:
+                data = await asyncio.to_thread(self._peaks_of_compressed, path)
+        return await self._store(data, object_names)
+
+    async def _store(self, data: bytes, object_names: List[str]) -> List[str]:
+        peaks_object_names = [self.peaks_object_name(name) for name in object_names]
+        for peaks_object_name in peaks_object_names:
+            await self.storage.aupload(
+                peaks_object_name, data, content_type=PEAKS_CONTENT_TYPE
+            )
+        self.logger.info(
+            f"Stored {len(data)} bytes of peaks for {', '.join(object_names)}"
+        )
+        return peaks_object_names
+
+    async def ensure(self, object_name: str) -> str:
+        """
+        Compute the peaks of an object unless they are stored already.
+        Objects are content-addressed, so stored peaks never go stale.
+
+        Args:
+            object_name (str): Name/path of the audio
+
+        Returns:
+            str: Object name of the peaks
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+            ValueError: If the object cannot be read as audio
+        """
+        peaks_object_name = self.peaks_object_name(object_name)
+        if await self.storage.aexists(peaks_object_name):
+            return peaks_object_name
+        return await self.compute(object_name)
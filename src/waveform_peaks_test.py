@@ -0,0 +1,136 @@
+import logging
+import struct
+import numpy as np
+import pytest
+from fastapi import APIRouter
+from benchmarks.synthetic_audio import synthesize, to_wav_bytes
+from src.object_storage.factory import ObjectStorageFactory
+from src.waveform_peaks import (
+    WaveformPeaks,
+    compute_peaks,
+    decode_peaks,
+    encode_peaks,
+    open_wav,
+)
+
+
+def float_wav_bytes(audio: np.ndarray, sample_rate: int = 44_100) -> bytes:
+    """32-bit float WAV, which the wave module cannot write"""
+    data = audio.T.astype("<f4").tobytes()
+    channels = audio.shape[0]
+    fmt = struct.pack(
+        "<HHIIHH",
+        3,
+        channels,
+        sample_rate,
+        sample_rate * channels * 4,
+        channels * 4,
+        32,
+    )
+    return (
+        b"RIFF"
+        + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(data))
+        + b"WAVE"
+        + b"fmt "
+        + struct.pack("<I", len(fmt))
+        + fmt
+        + b"data"
+        + struct.pack("<I", len(data))
+        + data
+    )
+
+
+def brute_force_peaks(frames: np.ndarray, samples_per_peak: int) -> np.ndarray:
+    return np.array(
+        [
+            [
+                frames[i : i + samples_per_peak].min(),
+                frames[i : i + samples_per_peak].max(),
+            ]
+            for i in range(0, len(frames), samples_per_peak)
+        ]
+    )
+
+
+@pytest.mark.parametrize("num_frames", [0, 1, 1000, 4096, 44_100])
+def test_compute_peaks(num_frames):
+    """Test every level matches a window-by-window min and max"""
+    rng = np.random.default_rng(0)
+    frames = rng.uniform(-1, 1, (num_frames, 2)).astype(np.float32)
+
+    levels = compute_peaks(frames, samples_per_peak=64, factor=4, min_peaks=8)
+
+    assert len(levels[-1][1]) <= 8
+    for spp, peaks in levels:
+        expected = np.round(brute_force_peaks(frames, spp) * 127).reshape(-1, 2)
+        assert spp in (64 * 4**i for i in range(len(levels)))
+        np.testing.assert_array_equal(peaks, expected.astype(np.int8))
+
+
+def test_encode_decode_round_trip():
+    """Test peaks survive serialization and stay compact"""
+    frames = synthesize(30.0).T
+    levels = compute_peaks(frames)
+
+    data = encode_peaks(levels, 44_100)
+    sample_rate, decoded = decode_peaks(data)
+
+    assert sample_rate == 44_100
+    assert len(decoded) == len(levels)
+    for (spp, peaks), (decoded_spp, decoded_peaks) in zip(levels, decoded):
+        assert spp == decoded_spp
+        np.testing.assert_array_equal(peaks, decoded_peaks)
+    # Far smaller than the audio itself
+    assert len(data) < frames.nbytes / 50
+
+
+@pytest.mark.parametrize("encoding", ["int16", "float32"])
+def test_open_wav(tmp_path, encoding):
+    """Test WAV samples are memory-mapped with the scale that maps them to [-1, 1]"""
+    audio = synthesize(1.0)
+    path = tmp_path / "audio.wav"
+    if encoding == "int16":
+        path.write_bytes(to_wav_bytes(audio))
+    else:
+        path.write_bytes(float_wav_bytes(audio))
+
+    frames, sample_rate, offset, scale = open_wav(str(path))
+
+    assert isinstance(frames, np.memmap)
+    assert sample_rate == 44_100
+    assert frames.shape == (44_100, 2)
+    np.testing.assert_allclose((frames - offset) / scale, audio.T, atol=1 / 16384)
+
+
+def test_open_wav_rejects_other_files(tmp_path):
+    """Test files that are not WAV are rejected"""
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(b"ID3" + bytes(100))
+    with pytest.raises(ValueError):
+        open_wav(str(path))
+
+
+@pytest.mark.anyio
+async def test_stage_stores_peaks(tmp_path):
+    """Test the stage stores peaks next to the audio and computes them only once"""
+    storage = ObjectStorageFactory.create(
+        impl="local",
+        base_dir=str(tmp_path / "storage"),
+        base_url="http://testserver",
+        router=APIRouter(),
+        logger=logging.getLogger(__name__),
+    )
+    peaks = WaveformPeaks(storage, logging.getLogger(__name__))
+    storage.upload("demos/a.wav", to_wav_bytes(synthesize(2.0)))
+
+    peaks_object_name = await peaks.ensure("demos/a.wav")
+    assert peaks_object_name == "demos/a.wav.peaks"
+    assert await peaks.ensure("demos/a.wav") == peaks_object_name
+    assert peaks.compute_seconds.count() == 1
+
+    sample_rate, levels = decode_peaks(storage.download(peaks_object_name))
+    assert sample_rate == 44_100
+    assert len(levels[0][1]) == -(-88_200 // 256)
+
+    with pytest.raises(FileNotFoundError):
+        await peaks.ensure("demos/missing.wav")
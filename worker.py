@@ -0,0 +1,39 @@
+import asyncio
+import dataclasses
+import logging
+import signal
+from fastapi import APIRouter
+from src.services import build_services, close_services
+from src.settings import Settings
+
+logging.basicConfig(level=logging.INFO)
+
+
+async def run_worker():
+    """
+    Run separation jobs from the shared job store until SIGINT or SIGTERM, without
+    serving HTTP. Set DEMO_POLISHER_SEPARATION_JOB_STORE and DEMO_POLISHER_KV_IMPL to
+    sqlite and share base_dir with the app's processes on this host: the worker reads
+    and updates the upload records in the shared Kv, which the default in-memory Kv
+    is not.
+    """
+    settings = dataclasses.replace(Settings.from_env(), run_separation_worker=True)
+    if not settings.separation_job_store:
+        raise SystemExit("Set DEMO_POLISHER_SEPARATION_JOB_STORE, e.g. to sqlite")
+    logger = logging.getLogger("worker")
+    # Storage routes are only served by the app; this router is thrown away
+    services = build_services(settings, APIRouter(), logger)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    services.separation_worker.start()
+    await stopping.wait()
+    logger.info("Stopping; finishing the claimed jobs")
+    await close_services(services)
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())